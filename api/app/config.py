@@ -90,6 +90,274 @@ class Settings(BaseSettings):
     Default: /app/config/snmp_credentials.json (dentro del contenedor)
     """
     
+    # ========================================================================
+    # DISCOVERY
+    # ========================================================================
+    reverse_dns_timeout_seconds: float = 1.0
+    """Tiempo máximo de cada consulta de DNS inverso (PTR) durante el descubrimiento."""
+
+    reverse_dns_ttl_seconds: int = 3600
+    """TTL de la caché de hostnames resueltos correctamente."""
+
+    reverse_dns_negative_ttl_seconds: int = 300
+    """TTL de la caché para IPs sin registro PTR o con resolución fallida."""
+
+    discovery_sweep_window: str = "01:00-05:00"
+    """Ventana horaria (HH:MM-HH:MM, hora local) para los barridos automáticos de descubrimiento."""
+    
+    discovery_sweep_interval_hours: int = 24
+    """Horas mínimas entre dos barridos automáticos de la misma configuración."""
+    
+    discovery_sweep_max_workers: int = 16
+    """Sondeos concurrentes máximos durante un barrido (presupuesto de red)."""
+    
+    discovery_sweep_max_probes_per_second: float = 50.0
+    """Tasa máxima de IPs sondeadas por segundo durante un barrido (presupuesto de red)."""
+    
+    discovery_sweep_max_ips: int = 4096
+    """Cantidad máxima de IPs por configuración en un barrido."""
+    
+    discovery_sweep_max_load_per_cpu: float = 0.75
+    """Carga del sistema (loadavg / CPUs) a partir de la cual el barrido se pausa o no inicia."""
+    
+    discovery_sweep_guard_minutes: int = 30
+    """No iniciar un barrido si hay una programación de contadores que vence dentro de estos minutos."""
+    
+    # ========================================================================
+    # COUNTER COLLECTION ENGINE
+    # ========================================================================
+    collection_ping_concurrency: int = 512
+    """Sondeos TCP de conectividad simultáneos (asyncio) durante una recolección."""
+
+    collection_snmp_concurrency: int = 64
+    """Lecturas SNMP/HTTP simultáneas (pool de threads) durante una recolección."""
+
+    collection_time_budget_seconds: int = 900
+    """Tiempo máximo de una recolección; las impresoras no alcanzadas se reportan como fallidas."""
+
+    collection_write_batch_size: int = 200
+    """Resultados acumulados antes de escribirlos en la base de datos."""
+
+    collection_freshness_window_minutes: int = 0
+    """
+    Ventana de frescura por defecto de una recolección manual de toda la flota: no se
+    consultan las impresoras con una lectura automática (de una corrida) más reciente;
+    las cargas manuales no cuentan. 0 (default) desactiva el
+    filtro; no se aplica cuando la recolección indica printer_ids.
+    """
+
+    # ========================================================================
+    # COUNTER COLLECTION QUEUE (Redis + procesos worker)
+    # ========================================================================
+    collection_queue_chunk_size: int = 50
+    """Impresoras por tarea encolada; cada tarea la procesa un único worker."""
+
+    collection_queue_visibility_timeout_seconds: int = 300
+    """Segundos sin heartbeat tras los cuales una tarea tomada vuelve a la cola."""
+
+    collection_queue_max_attempts: int = 3
+    """Intentos por tarea antes de marcar sus impresoras pendientes como fallidas."""
+
+    collection_queue_run_timeout_seconds: int = 3600
+    """Tiempo máximo que una corrida bloquea el inicio de otra del mismo origen."""
+
+    collection_queue_result_ttl_seconds: int = 7 * 24 * 3600
+    """Tiempo que se conservan en Redis el estado y los resultados de una corrida terminada."""
+
+    collection_queue_fairness: str = "round_robin"
+    """
+    Reparto de los workers entre corridas de igual prioridad: "round_robin" (las corridas
+    simultáneas avanzan a la par, una tarea de cada una por turno) o "fifo" (se termina la
+    más antigua antes de empezar la siguiente).
+    """
+
+    collection_manual_priority: int = 10
+    """Prioridad de las recolecciones manuales frente a las programaciones (-100 a 100; éstas usan la suya, default 0)."""
+
+    collection_worker_heartbeat_seconds: int = 30
+    """Intervalo con el que un worker renueva la visibilidad de la tarea que procesa."""
+
+    collection_worker_poll_seconds: float = 1.0
+    """Espera de un worker entre consultas cuando la cola está vacía."""
+
+    # ========================================================================
+    # PRINTER LEASES (una lectura por impresora a la vez)
+    # ========================================================================
+    printer_lease_ttl_seconds: int = 120
+    """Vencimiento del lease de lectura de una impresora (cubre lecturas SNMP con varios perfiles)."""
+
+    printer_lease_wait_seconds: float = 30.0
+    """Espera máxima de una lectura manual por el lease de la impresora antes de responder 409."""
+
+    printer_lease_redis_enabled: bool = True
+    """Compartir los leases entre procesos vía Redis (si no, solo en proceso)."""
+
+    # ========================================================================
+    # SCHEDULER (jobs fuera del event loop de la API)
+    # ========================================================================
+    scheduler_job_processes: int = 4
+    """Procesos del pool que ejecuta los jobs bloqueantes del scheduler (sondeos, limpiezas, análisis)."""
+
+    scheduler_leader_election: bool = True
+    """
+    Elegir vía Redis un único proceso que ejecuta los jobs programados (uvicorn --workers N,
+    varias réplicas). Sin Redis el proceso queda en espera. False: este proceso los ejecuta
+    siempre (despliegue de instancia única, también sin Redis).
+    """
+
+    scheduler_leader_ttl_seconds: int = 30
+    """Vencimiento del lease de líder: lo que tarda otro proceso en tomar los jobs si el líder muere."""
+
+    scheduler_leader_renew_seconds: float = 10.0
+    """Intervalo de renovación del lease de líder (y de reintento en los procesos en espera)."""
+
+    loop_lag_interval_seconds: float = 0.1
+    """Intervalo de muestreo del lag del event loop de la API."""
+
+    loop_lag_window_samples: int = 3000
+    """Muestras recientes usadas para los percentiles de lag en /health/detailed (~5 minutos)."""
+
+    # ========================================================================
+    # FLEET REGISTRY (impresoras en memoria para sondeos y recolección)
+    # ========================================================================
+    fleet_registry_full_reload_seconds: int = 600
+    """Intervalo de recarga completa del registro (sin Redis, lo que tardan en verse los cambios de otros procesos)."""
+
+    fleet_registry_redis_enabled: bool = True
+    """Propagar los cambios de impresoras entre procesos vía Redis (si no, recarga periódica)."""
+
+    # ========================================================================
+    # COUNTER ANOMALY DETECTION
+    # ========================================================================
+    counter_anomaly_lookback_days: int = 365
+    """Historial analizado por defecto (días); 0 analiza todo monthly_counters."""
+
+    counter_anomaly_jump_z: float = 3.5
+    """Z robusto (mediana/MAD de la tasa diaria de la impresora) a partir del cual un salto es atípico."""
+
+    counter_anomaly_jump_min_pages: int = 500
+    """Páginas mínimas de un intervalo para marcarlo como salto (evita ruido en impresoras casi sin uso)."""
+
+    counter_anomaly_min_intervals: int = 5
+    """Intervalos con tasa válida que necesita una impresora para evaluar saltos."""
+
+    counter_anomaly_flatline_days: float = 14
+    """Días con el contador sin cambios (y siguiendo leyéndose) para marcar como plana una impresora en uso."""
+
+    # ========================================================================
+    # RETENTION (borrado por lotes de rangos de id)
+    # ========================================================================
+    retention_usage_reports_days: int = 365
+    """Días de usage_reports que se conservan."""
+
+    retention_usage_reports_chunk_rows: int = 5000
+    """Ancho del rango de ids borrado por transacción en usage_reports."""
+
+    retention_usage_reports_max_rows_per_second: int = 20000
+    """Tope de filas borradas por segundo en usage_reports (0 = sin tope)."""
+
+    retention_snapshots_days: int = 30
+    """Días de medical_printer_snapshots horarios; más atrás queda uno por impresora, bandeja y día."""
+
+    retention_snapshots_lookback_days: int = 3
+    """Días previos al corte que revisa cada pasada diaria (los anteriores ya quedaron raleados)."""
+
+    retention_snapshots_chunk_rows: int = 5000
+    """Ancho del rango de ids revisado por transacción en medical_printer_snapshots."""
+
+    retention_snapshots_max_rows_per_second: int = 5000
+    """Tope de filas borradas por segundo en medical_printer_snapshots (0 = sin tope)."""
+
+    # ========================================================================
+    # ADAPTIVE POLLING (intervalo de sondeo de uso por impresora)
+    # ========================================================================
+    adaptive_polling_enabled: bool = True
+    """Sondear cada impresora según su intervalo propio (si no, un reporte por impresora y por día)."""
+
+    polling_min_interval_minutes: int = 15
+    """Intervalo mínimo entre sondeos de una impresora; también es el tick del job poll_printers."""
+
+    polling_max_interval_minutes: int = 1440
+    """Intervalo máximo entre sondeos de una impresora (impresoras sin uso)."""
+
+    polling_target_pages_per_poll: int = 250
+    """Páginas que se busca que imprima una impresora entre dos sondeos."""
+
+    polling_target_toner_points_per_poll: float = 2.0
+    """Puntos de tóner que se busca que baje una impresora entre dos sondeos (igual al umbral del historial)."""
+
+    polling_rate_lookback_days: int = 7
+    """Ventana usada para estimar el ritmo de páginas y de consumo de tóner."""
+
+    # ========================================================================
+    # REMOTE COLLECTORS (python -m app.workers.collector e ingesta por lotes)
+    # ========================================================================
+    collector_token: str = ""
+    """Token compartido entre colectores y API (header X-Collector-Token); vacío = ingesta sin token."""
+
+    ingest_max_readings: int = 1000
+    """Máximo de lecturas por petición a POST /counter-collection/ingest."""
+
+    ingest_central_holdoff_minutes: int = 120
+    """Tiempo mínimo sin sondeo central de una impresora después de recibir una lectura de un colector."""
+
+    collector_api_url: str = "http://localhost:8000"
+    """URL base de la API central a la que el colector envía las lecturas."""
+
+    collector_id: str = ""
+    """Identificador del colector para la secuencia de idempotencia (vacío = nombre del host)."""
+
+    collector_targets: str = ""
+    """IPs y subredes CIDR a sondear por el colector, separadas por comas (ej: 10.20.0.0/24,10.20.1.15)."""
+
+    collector_snmp_profile: str = "generic_v2c"
+    """Perfil SNMP que usa el colector para todas las impresoras."""
+
+    collector_interval_seconds: int = 900
+    """Segundos entre ciclos de sondeo del colector."""
+
+    collector_batch_size: int = 500
+    """Lecturas por petición de ingesta (no más que ingest_max_readings)."""
+
+    collector_max_pending: int = 50000
+    """Lecturas pendientes de envío que guarda el colector si la API no responde (se descartan las más viejas)."""
+
+    collector_spool_path: str = ""
+    """Archivo JSON donde el colector persiste las lecturas pendientes entre reinicios (vacío = solo en memoria)."""
+
+    # ========================================================================
+    # STATE HISTORY (tóner, papel y estado guardados solo al cambiar)
+    # ========================================================================
+    state_history_level_threshold: float = 2.0
+    """Cambio mínimo de un nivel de tóner o papel (puntos) para escribir una fila en printer_state_changes."""
+
+    usage_reports_store_state: bool = False
+    """Guardar además tóner, papel y estado en cada usage_report (formato anterior, ~10x más espacio)."""
+
+    # ========================================================================
+    # PARTITIONING (PostgreSQL: particiones mensuales por rango)
+    # ========================================================================
+    partition_months_ahead: int = 3
+    """Meses futuros con partición ya creada en monthly_counters y usage_reports."""
+
+    partition_monthly_counters_archive_months: int = 0
+    """Meses de monthly_counters que quedan en la tabla; las particiones más viejas se desenganchan al esquema de archivo (0 = nunca)."""
+
+    partition_archive_schema: str = "archive"
+    """Esquema donde quedan las particiones desenganchadas de monthly_counters."""
+
+    # ========================================================================
+    # HOST REACHABILITY CACHE
+    # ========================================================================
+    reachability_down_ttl_seconds: int = 60
+    """TTL de un resultado "caído" en la caché de alcanzabilidad (corto para detectar recuperación)."""
+
+    reachability_up_ttl_seconds: int = 300
+    """TTL de un resultado "disponible" en la caché de alcanzabilidad."""
+
+    reachability_redis_enabled: bool = True
+    """Compartir la caché de alcanzabilidad entre procesos vía Redis (si no, solo en proceso)."""
+
     # ========================================================================
     # RATE LIMITING
     # ========================================================================
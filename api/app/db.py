@@ -21,4 +21,12 @@ def get_db():
 
 # Function to get database session (for services)
 def get_db_session():
-    return SessionLocal()
\ No newline at end of file
+    return SessionLocal()
+
+# INSERT del dialecto de la sesión (soporta ON CONFLICT en PostgreSQL y SQLite)
+def dialect_insert(db):
+    if db.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert
\ No newline at end of file
@@ -16,6 +16,8 @@ from .db import engine, Base, get_db
 from .routers import auth, printers, incidents, reports, counters, contracts, toner_requests, stock, discovery_configs, billing, exchange_rates, companies, cost_centers, settings as settings_router
 from .routers import location_movements
 from .workers.polling import start_scheduler
+from .services.loop_lag import loop_lag_monitor
+from .services.scheduler_lease import SchedulerLeadership
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,15 +33,24 @@ limiter = Limiter(key_func=get_remote_address, default_limits=[settings.rate_lim
 
 # Initialize scheduler
 scheduler = AsyncIOScheduler()
+scheduler_leadership = SchedulerLeadership([scheduler])
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    loop_lag_monitor.start()
     start_scheduler(scheduler)
-    scheduler.start()
+    # Paused until this process wins scheduler leadership (one process runs the jobs)
+    scheduler.start(paused=True)
+    scheduler_leadership.start()
+    # Auto counter jobs live in this process's memory only: they run wherever they were created
+    counters.auto_scheduler.start()
     yield
     # Shutdown
+    counters.auto_scheduler.shutdown()
+    scheduler_leadership.stop()
     scheduler.shutdown()
+    await loop_lag_monitor.stop()
 
 app = FastAPI(
     title="Printer Fleet Manager API",
@@ -98,6 +109,10 @@ app.include_router(auto_counters.router, prefix="/auto-counters", tags=["auto-co
 from .routers import counter_collection
 app.include_router(counter_collection.router, prefix="/counter-collection", tags=["counter-collection"])
 
+# Import and include counter_anomalies router
+from .routers import counter_anomalies
+app.include_router(counter_anomalies.router, prefix="/counter-anomalies", tags=["counter-anomalies"])
+
 # Import and include printer_tools router
 from .routers import printer_tools
 app.include_router(printer_tools.router, prefix="/printer-tools", tags=["printer-tools"])
@@ -157,13 +172,14 @@ def _check_database(db: Session) -> dict:
 
 
 @app.get("/health/detailed", tags=["health"])
-async def health_detailed(db: Session = Depends(get_db)):
-    """Health check detallado: database, Redis, scheduler y versión."""
+def health_detailed(db: Session = Depends(get_db)):
+    """Health check detallado: database, Redis, scheduler, lag del event loop y versión."""
     db_status = _check_database(db)
     redis_status = _check_redis()
     scheduler_status = {
         "status": "running" if scheduler.running else "stopped",
-        "job_count": len(scheduler.get_jobs())
+        "job_count": len(scheduler.get_jobs()),
+        **scheduler_leadership.status()
     }
 
     services_ok = (
@@ -179,7 +195,8 @@ async def health_detailed(db: Session = Depends(get_db)):
         "services": {
             "database": db_status,
             "redis": redis_status,
-            "scheduler": scheduler_status
+            "scheduler": scheduler_status,
+            "event_loop": loop_lag_monitor.summary()
         }
     }
 
@@ -189,6 +206,7 @@ async def get_scheduler_jobs():
     jobs = scheduler.get_jobs()
     return {
         "total_jobs": len(jobs),
+        "role": "leader" if scheduler_leadership.is_leader else "standby",
         "jobs": [
             {
                 "id": job.id,
@@ -0,0 +1,27 @@
+"""
+Add priority to counter schedules (order and printer ownership when schedules overlap).
+"""
+
+from sqlalchemy import create_engine, inspect, text
+import sys
+
+sys.path.append('/app')
+
+from app.config import settings
+
+
+def run_migration():
+    engine = create_engine(settings.database_url)
+
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        columns = {column["name"] for column in inspector.get_columns("counter_schedules")}
+        if "priority" not in columns:
+            connection.execute(text(
+                "ALTER TABLE counter_schedules ADD COLUMN priority INTEGER NOT NULL DEFAULT 0"
+            ))
+
+
+if __name__ == "__main__":
+    run_migration()
+    print("Migration completed: counter_schedules.priority added")
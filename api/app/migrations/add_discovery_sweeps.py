@@ -0,0 +1,63 @@
+"""
+Migration: Add scheduled discovery sweep support
+Description: Agrega sweep_enabled/last_sweep_at a discovery_configs y crea
+discovery_sweep_runs para guardar el resultado de cada barrido automático.
+"""
+
+import sys
+sys.path.append('/app')
+
+from sqlalchemy import text, create_engine
+from app.config import settings
+
+def run_migration():
+    """Add sweep columns to discovery_configs and create discovery_sweep_runs"""
+
+    database_url = settings.database_url
+    engine = create_engine(database_url)
+
+    with engine.begin() as connection:
+        connection.execute(text("""
+            ALTER TABLE discovery_configs
+            ADD COLUMN IF NOT EXISTS sweep_enabled BOOLEAN DEFAULT FALSE NOT NULL
+        """))
+
+        connection.execute(text("""
+            ALTER TABLE discovery_configs
+            ADD COLUMN IF NOT EXISTS last_sweep_at TIMESTAMP WITH TIME ZONE
+        """))
+
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS discovery_sweep_runs (
+                id SERIAL PRIMARY KEY,
+                config_id INTEGER NOT NULL REFERENCES discovery_configs(id) ON DELETE CASCADE,
+                started_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+                finished_at TIMESTAMP WITH TIME ZONE,
+                status VARCHAR(20) DEFAULT 'running' NOT NULL,
+                trigger VARCHAR(20) DEFAULT 'scheduled',
+                ips_scanned INTEGER DEFAULT 0,
+                ips_responsive INTEGER DEFAULT 0,
+                printers_found INTEGER DEFAULT 0,
+                known_printers INTEGER DEFAULT 0,
+                new_devices INTEGER DEFAULT 0,
+                ip_changes INTEGER DEFAULT 0,
+                duration_seconds FLOAT,
+                message TEXT,
+                details TEXT
+            )
+        """))
+
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_discovery_sweep_runs_config_id
+            ON discovery_sweep_runs(config_id)
+        """))
+
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_discovery_sweep_runs_started_at
+            ON discovery_sweep_runs(started_at DESC)
+        """))
+
+        print("✅ discovery sweep columns and discovery_sweep_runs table ready")
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,34 @@
+"""
+Migration: Add collection_run_id to monthly_counters
+Description: Identificador de la corrida de la cola de recolección que escribió cada
+lectura, con índice único (collection_run_id, printer_id) para que los reintentos de
+una tarea no dupliquen contadores.
+"""
+
+import sys
+sys.path.append('/app')
+
+from sqlalchemy import text, create_engine
+from app.config import settings
+
+def run_migration():
+    """Add collection_run_id and its unique index to monthly_counters"""
+
+    database_url = settings.database_url
+    engine = create_engine(database_url)
+
+    with engine.begin() as connection:
+        connection.execute(text("""
+            ALTER TABLE monthly_counters
+            ADD COLUMN IF NOT EXISTS collection_run_id VARCHAR(36)
+        """))
+
+        connection.execute(text("""
+            CREATE UNIQUE INDEX IF NOT EXISTS ux_monthly_counters_run_printer
+            ON monthly_counters(collection_run_id, printer_id)
+        """))
+
+        print("✅ monthly_counters.collection_run_id and unique index ready")
+
+if __name__ == "__main__":
+    run_migration()
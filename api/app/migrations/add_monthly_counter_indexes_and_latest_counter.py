@@ -0,0 +1,73 @@
+"""
+Migration: Add monthly_counters composite indexes and printer_latest_counter
+Description: Índices (printer_id, recorded_at) y (year, month) en monthly_counters,
+y tabla printer_latest_counter con la última lectura de cada impresora
+(poblada desde el historial existente).
+"""
+
+import sys
+sys.path.append('/app')
+
+from sqlalchemy import text, create_engine
+from app.config import settings
+
+def run_migration():
+    """Create monthly_counters indexes and the printer_latest_counter table"""
+
+    database_url = settings.database_url
+    engine = create_engine(database_url)
+
+    with engine.begin() as connection:
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_monthly_counters_printer_recorded
+            ON monthly_counters(printer_id, recorded_at)
+        """))
+
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_monthly_counters_year_month
+            ON monthly_counters(year, month)
+        """))
+
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS printer_latest_counter (
+                printer_id INTEGER PRIMARY KEY REFERENCES printers(id) ON DELETE CASCADE,
+                counter_id INTEGER REFERENCES monthly_counters(id) ON DELETE SET NULL,
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                counter_bw INTEGER DEFAULT 0,
+                counter_color INTEGER DEFAULT 0,
+                counter_total INTEGER DEFAULT 0,
+                recorded_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+
+        connection.execute(text("""
+            INSERT INTO printer_latest_counter (
+                printer_id, counter_id, year, month,
+                counter_bw, counter_color, counter_total, recorded_at
+            )
+            SELECT DISTINCT ON (printer_id)
+                printer_id, id, year, month,
+                counter_bw, counter_color, counter_total, recorded_at
+            FROM monthly_counters
+            WHERE recorded_at IS NOT NULL
+            ORDER BY printer_id, recorded_at DESC, id DESC
+            ON CONFLICT (printer_id) DO UPDATE SET
+                counter_id = EXCLUDED.counter_id,
+                year = EXCLUDED.year,
+                month = EXCLUDED.month,
+                counter_bw = EXCLUDED.counter_bw,
+                counter_color = EXCLUDED.counter_color,
+                counter_total = EXCLUDED.counter_total,
+                recorded_at = EXCLUDED.recorded_at,
+                updated_at = CURRENT_TIMESTAMP
+        """))
+
+        connection.execute(text("ANALYZE monthly_counters"))
+
+        total = connection.execute(text("SELECT COUNT(*) FROM printer_latest_counter")).scalar()
+        print(f"✅ monthly_counters indexes ready, printer_latest_counter populated ({total} printers)")
+
+if __name__ == "__main__":
+    run_migration()
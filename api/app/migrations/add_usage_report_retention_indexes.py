@@ -0,0 +1,33 @@
+"""
+Migration: Add usage_reports indexes for batched retention
+Description: Índice en created_at (acota el rango de ids vencidos que borra la
+retención por lotes) e índice (printer_id, date) para el chequeo de reporte del día.
+Se crean con CONCURRENTLY para no bloquear las escrituras de los sondeos.
+"""
+
+import sys
+sys.path.append('/app')
+
+from sqlalchemy import text, create_engine
+from app.config import settings
+
+def run_migration():
+    """Create usage_reports retention indexes"""
+
+    engine = create_engine(settings.database_url)
+
+    # CREATE INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_usage_reports_created_at
+            ON usage_reports(created_at)
+        """))
+
+        connection.execute(text("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_usage_reports_printer_date
+            ON usage_reports(printer_id, date)
+        """))
+
+if __name__ == "__main__":
+    run_migration()
+    print("Migration completed: usage_reports retention indexes added")
@@ -0,0 +1,42 @@
+"""
+Migration: Create asset_tag_sequences table
+Description: Contador por prefijo para asignar asset tags PRT-XXX en bloque,
+sembrado con el mayor número PRT existente en printers.
+"""
+
+import sys
+sys.path.append('/app')
+
+from sqlalchemy import text, create_engine
+from app.config import settings
+
+def run_migration():
+    """Create asset_tag_sequences and seed the PRT prefix"""
+
+    database_url = settings.database_url
+    engine = create_engine(database_url)
+
+    with engine.begin() as connection:
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS asset_tag_sequences (
+                prefix VARCHAR(20) PRIMARY KEY,
+                next_value INTEGER NOT NULL DEFAULT 1,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+
+        connection.execute(text("""
+            INSERT INTO asset_tag_sequences (prefix, next_value)
+            SELECT 'PRT', COALESCE(MAX(CAST(SUBSTRING(asset_tag FROM 5) AS INTEGER)), 0) + 1
+            FROM printers
+            WHERE asset_tag ~ '^PRT-[0-9]+$'
+            ON CONFLICT (prefix) DO NOTHING
+        """))
+
+        next_value = connection.execute(text(
+            "SELECT next_value FROM asset_tag_sequences WHERE prefix = 'PRT'"
+        )).scalar()
+        print(f"✅ asset_tag_sequences ready (PRT next_value = {next_value})")
+
+if __name__ == "__main__":
+    run_migration()
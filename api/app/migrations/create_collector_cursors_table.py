@@ -0,0 +1,31 @@
+"""
+Migration: Create collector_cursors
+Description: Última secuencia aplicada de cada colector remoto, para que la
+ingesta por lotes (POST /counter-collection/ingest) sea idempotente
+(ver services.usage_ingest).
+"""
+
+import sys
+sys.path.append('/app')
+
+from sqlalchemy import text, create_engine
+from app.config import settings
+
+def run_migration():
+    """Create collector_cursors"""
+
+    engine = create_engine(settings.database_url)
+
+    with engine.begin() as connection:
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS collector_cursors (
+                collector_id VARCHAR(100) PRIMARY KEY,
+                last_sequence BIGINT NOT NULL DEFAULT 0,
+                readings_accepted BIGINT NOT NULL DEFAULT 0,
+                last_seen_at TIMESTAMP WITH TIME ZONE
+            )
+        """))
+
+if __name__ == "__main__":
+    run_migration()
+    print("Migration completed: collector_cursors created")
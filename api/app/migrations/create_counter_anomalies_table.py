@@ -0,0 +1,53 @@
+"""
+Migration: Create counter_anomalies table
+Description: Anomalías detectadas en el historial de monthly_counters (reseteos,
+desbordes, saltos atípicos y contadores planos), una fila por lectura y tipo.
+"""
+
+import sys
+sys.path.append('/app')
+
+from sqlalchemy import text, create_engine
+from app.config import settings
+
+def run_migration():
+    """Create counter_anomalies and its indexes"""
+
+    database_url = settings.database_url
+    engine = create_engine(database_url)
+
+    with engine.begin() as connection:
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS counter_anomalies (
+                id SERIAL PRIMARY KEY,
+                printer_id INTEGER NOT NULL REFERENCES printers(id) ON DELETE CASCADE,
+                kind VARCHAR(20) NOT NULL,
+                counter_id INTEGER NOT NULL REFERENCES monthly_counters(id) ON DELETE CASCADE,
+                previous_counter_id INTEGER REFERENCES monthly_counters(id) ON DELETE SET NULL,
+                recorded_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                previous_value INTEGER,
+                value INTEGER,
+                delta INTEGER,
+                score DOUBLE PRECISION,
+                details TEXT,
+                acknowledged BOOLEAN NOT NULL DEFAULT FALSE,
+                detected_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                last_seen_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                CONSTRAINT uq_counter_anomalies_counter_kind UNIQUE (counter_id, kind)
+            )
+        """))
+
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_counter_anomalies_printer
+            ON counter_anomalies(printer_id, recorded_at)
+        """))
+
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_counter_anomalies_id
+            ON counter_anomalies(id)
+        """))
+
+        print("✅ counter_anomalies table ready")
+
+if __name__ == "__main__":
+    run_migration()
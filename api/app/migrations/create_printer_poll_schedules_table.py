@@ -0,0 +1,38 @@
+"""
+Migration: Create printer_poll_schedules
+Description: Próximo sondeo de uso e intervalo adaptativo de cada impresora
+(ver services.adaptive_polling). Arranca vacía: cada impresora se sondea al
+intervalo mínimo hasta tener historial para calcular el suyo.
+"""
+
+import sys
+sys.path.append('/app')
+
+from sqlalchemy import text, create_engine
+from app.config import settings
+
+def run_migration():
+    """Create printer_poll_schedules"""
+
+    engine = create_engine(settings.database_url)
+
+    with engine.begin() as connection:
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS printer_poll_schedules (
+                printer_id INTEGER PRIMARY KEY REFERENCES printers(id) ON DELETE CASCADE,
+                interval_minutes INTEGER NOT NULL,
+                next_poll_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                last_polled_at TIMESTAMP WITH TIME ZONE,
+                pages_per_day FLOAT,
+                toner_drop_per_day FLOAT
+            )
+        """))
+
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_printer_poll_schedules_next_poll_at
+            ON printer_poll_schedules(next_poll_at)
+        """))
+
+if __name__ == "__main__":
+    run_migration()
+    print("Migration completed: printer_poll_schedules created")
@@ -0,0 +1,56 @@
+"""
+Migration: Create printer_state_changes
+Description: Historial de tóner, papel y estado codificado por cambios (una fila
+solo cuando algún valor cambia, ver services.state_history). Se carga desde las
+columnas de estado de usage_reports existentes; desde esta versión los nuevos
+usage_reports guardan esas columnas en NULL (salvo USAGE_REPORTS_STORE_STATE=true).
+
+Correr antes de desplegar la versión que deja de escribir el estado en usage_reports.
+"""
+
+import sys
+sys.path.append('/app')
+
+from sqlalchemy import text, create_engine
+from sqlalchemy.orm import sessionmaker
+from app.config import settings
+from app.services.state_history import backfill_state_history
+
+def run_migration():
+    """Create printer_state_changes and backfill it from usage_reports"""
+
+    engine = create_engine(settings.database_url)
+
+    with engine.begin() as connection:
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS printer_state_changes (
+                id SERIAL PRIMARY KEY,
+                printer_id INTEGER NOT NULL REFERENCES printers(id) ON DELETE CASCADE,
+                recorded_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                toner_level_black FLOAT,
+                toner_level_cyan FLOAT,
+                toner_level_magenta FLOAT,
+                toner_level_yellow FLOAT,
+                paper_level FLOAT,
+                status VARCHAR
+            )
+        """))
+
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_printer_state_changes_printer_recorded
+            ON printer_state_changes(printer_id, recorded_at)
+        """))
+
+        is_empty = connection.execute(text("SELECT NOT EXISTS (SELECT 1 FROM printer_state_changes)")).scalar()
+
+    if is_empty:
+        db = sessionmaker(bind=engine)()
+        try:
+            written = backfill_state_history(db)
+            print(f"Backfilled {written} state changes from usage_reports")
+        finally:
+            db.close()
+
+if __name__ == "__main__":
+    run_migration()
+    print("Migration completed: printer_state_changes created")
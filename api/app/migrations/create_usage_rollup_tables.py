@@ -0,0 +1,97 @@
+"""
+Migration: Create usage_rollups_hourly / daily / monthly
+Description: Agregados por impresora y período de usage_reports, mantenidos al
+insertar los reportes (services.usage_rollups). Los reportes /reports/usage/monthly
+y /reports/summary leen de estas tablas. La carga inicial agrega el historial
+existente con un INSERT ... SELECT por tabla (solo si la tabla está vacía): las
+páginas de cada reporte son el incremento de contadores desde la lectura válida
+anterior (LAG), igual que add_usage_rollups. Para recalcular agregados ya cargados
+con otro criterio usar rebuild_usage_rollups.
+
+Correr antes de desplegar la versión que escribe los agregados.
+"""
+
+import sys
+sys.path.append('/app')
+
+from sqlalchemy import text, create_engine
+from app.config import settings
+
+ROLLUPS = (
+    ("usage_rollups_hourly", "hour"),
+    ("usage_rollups_daily", "day"),
+    ("usage_rollups_monthly", "month"),
+)
+
+def run_migration():
+    """Create the rollup tables and backfill them from usage_reports"""
+
+    engine = create_engine(settings.database_url)
+
+    with engine.begin() as connection:
+        for table, period in ROLLUPS:
+            connection.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    printer_id INTEGER NOT NULL REFERENCES printers(id) ON DELETE CASCADE,
+                    bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+                    pages_mono INTEGER NOT NULL DEFAULT 0,
+                    pages_color INTEGER NOT NULL DEFAULT 0,
+                    report_count INTEGER NOT NULL DEFAULT 0,
+                    min_toner_level FLOAT,
+                    PRIMARY KEY (printer_id, bucket_start)
+                )
+            """))
+
+            connection.execute(text(f"""
+                CREATE INDEX IF NOT EXISTS ix_{table}_bucket
+                ON {table}(bucket_start)
+            """))
+
+            is_empty = connection.execute(text(f"SELECT NOT EXISTS (SELECT 1 FROM {table})")).scalar()
+            if is_empty:
+                connection.execute(text(f"""
+                    INSERT INTO {table} (
+                        printer_id, bucket_start, pages_mono, pages_color, report_count, min_toner_level
+                    )
+                    WITH readings AS (
+                        SELECT id, printer_id, date,
+                               COALESCE(pages_printed_mono, 0) AS mono,
+                               COALESCE(pages_printed_color, 0) AS color,
+                               LEAST(toner_level_black, toner_level_cyan,
+                                     toner_level_magenta, toner_level_yellow) AS min_toner,
+                               COALESCE(pages_printed_mono, 0) + COALESCE(pages_printed_color, 0) > 0
+                                   AND status IS DISTINCT FROM 'offline' AS valid
+                        FROM usage_reports
+                        WHERE printer_id IN (SELECT id FROM printers)
+                    ),
+                    chained AS (
+                        SELECT id, mono, color,
+                               LAG(mono) OVER w AS prev_mono,
+                               LAG(color) OVER w AS prev_color
+                        FROM readings
+                        WHERE valid
+                        WINDOW w AS (PARTITION BY printer_id ORDER BY date, id)
+                    ),
+                    increments AS (
+                        SELECT id,
+                               CASE WHEN prev_mono IS NULL OR mono + color < prev_mono + prev_color THEN 0
+                                    ELSE GREATEST(mono - prev_mono, 0) END AS pages_mono,
+                               CASE WHEN prev_mono IS NULL OR mono + color < prev_mono + prev_color THEN 0
+                                    ELSE GREATEST(color - prev_color, 0) END AS pages_color
+                        FROM chained
+                    )
+                    SELECT
+                        r.printer_id,
+                        date_trunc('{period}', r.date),
+                        SUM(COALESCE(i.pages_mono, 0)),
+                        SUM(COALESCE(i.pages_color, 0)),
+                        COUNT(*),
+                        MIN(r.min_toner)
+                    FROM readings r
+                    LEFT JOIN increments i ON i.id = r.id
+                    GROUP BY r.printer_id, date_trunc('{period}', r.date)
+                """))
+
+if __name__ == "__main__":
+    run_migration()
+    print("Migration completed: usage rollup tables created and backfilled")
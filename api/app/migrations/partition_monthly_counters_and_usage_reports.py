@@ -0,0 +1,122 @@
+"""
+Migration: Partition monthly_counters and usage_reports by month (PostgreSQL)
+Description: Convierte ambas tablas en tablas particionadas por rango, una partición
+por mes (monthly_counters por (year, month), usage_reports por date) más una
+partición DEFAULT. Las particiones futuras las crea el job maintain_partitions y la
+retención borra o archiva particiones enteras (ver services.partitions).
+
+- La clave primaria pasa a incluir la clave de partición: (id, year, month) y
+  (id, date). Los ids siguen saliendo de la misma secuencia.
+- ux_monthly_counters_run_printer pasa a (collection_run_id, printer_id, year, month).
+- Las FK de counter_anomalies y printer_latest_counter hacia monthly_counters(id) se
+  eliminan (PostgreSQL no admite FK hacia una columna que no es única por sí sola);
+  la aplicación limpia las anomalías al borrar una lectura. Los modelos tampoco las
+  declaran, así una base creada con create_all queda igual que una migrada.
+
+Copia los datos dentro de una transacción: correr en una ventana de mantenimiento.
+En SQLite no hace nada (las tablas quedan como las crea create_all).
+"""
+
+import sys
+sys.path.append('/app')
+
+from datetime import date
+
+from sqlalchemy import text, create_engine
+from app.config import settings
+from app.services.partitions import add_months, partition_bounds, partition_name
+
+TABLES = {
+    "monthly_counters": {
+        "key": "year, month",
+        "first_period": "SELECT year, month FROM monthly_counters_legacy ORDER BY year, month LIMIT 1",
+        "indexes": [
+            "CREATE INDEX ix_monthly_counters_id ON monthly_counters(id)",
+            "CREATE INDEX ix_monthly_counters_printer_recorded ON monthly_counters(printer_id, recorded_at)",
+            "CREATE INDEX ix_monthly_counters_year_month ON monthly_counters(year, month)",
+            "CREATE UNIQUE INDEX ux_monthly_counters_run_printer ON monthly_counters(collection_run_id, printer_id, year, month)",
+        ],
+    },
+    "usage_reports": {
+        "key": "date",
+        "first_period": "SELECT EXTRACT(YEAR FROM MIN(date))::int, EXTRACT(MONTH FROM MIN(date))::int FROM usage_reports_legacy",
+        "indexes": [
+            "CREATE INDEX ix_usage_reports_id ON usage_reports(id)",
+            "CREATE INDEX ix_usage_reports_date ON usage_reports(date)",
+            "CREATE INDEX ix_usage_reports_printer_date ON usage_reports(printer_id, date)",
+        ],
+    },
+}
+
+def _is_partitioned(connection, table):
+    return connection.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = :table AND c.relnamespace = 'public'::regnamespace
+        )
+    """), {"table": table}).scalar()
+
+def _drop_referencing_foreign_keys(connection, table):
+    constraints = connection.execute(text("""
+        SELECT conrelid::regclass::text, conname FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = CAST(:table AS regclass)
+    """), {"table": table}).all()
+    for referencing_table, constraint in constraints:
+        connection.execute(text(f'ALTER TABLE {referencing_table} DROP CONSTRAINT "{constraint}"'))
+
+def _partition_table(connection, table, spec):
+    legacy = f"{table}_legacy"
+    _drop_referencing_foreign_keys(connection, table)
+    connection.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+    sequence = connection.execute(text(f"SELECT pg_get_serial_sequence('{legacy}', 'id')")).scalar()
+
+    connection.execute(text(f"""
+        CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS)
+        PARTITION BY RANGE ({spec['key']})
+    """))
+    connection.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, {spec['key']})"))
+    connection.execute(text(f"ALTER TABLE {table} ADD FOREIGN KEY (printer_id) REFERENCES printers(id)"))
+
+    # Un mes por partición desde el dato más viejo hasta partition_months_ahead
+    today = date.today()
+    first = connection.execute(text(spec["first_period"])).first()
+    year, month = (first[0], first[1]) if first and first[0] else (today.year, today.month)
+    last = add_months(today.year, today.month, settings.partition_months_ahead)
+    while (year, month) <= last:
+        lower, upper = partition_bounds(table, year, month)
+        connection.execute(text(
+            f"CREATE TABLE {partition_name(table, year, month)} PARTITION OF {table} "
+            f"FOR VALUES FROM {lower} TO {upper}"
+        ))
+        year, month = add_months(year, month, 1)
+    connection.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+
+    connection.execute(text(f"INSERT INTO {table} SELECT * FROM {legacy}"))
+    if sequence:
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id"))
+    connection.execute(text(f"DROP TABLE {legacy}"))
+
+    # Índices en la tabla padre (se propagan a cada partición), después de la copia
+    for statement in spec["indexes"]:
+        connection.execute(text(statement))
+
+def run_migration():
+    """Convert monthly_counters and usage_reports to monthly range-partitioned tables"""
+
+    engine = create_engine(settings.database_url)
+    if engine.dialect.name != "postgresql":
+        print("Skipped: table partitioning requires PostgreSQL")
+        return
+
+    with engine.begin() as connection:
+        for table, spec in TABLES.items():
+            if _is_partitioned(connection, table):
+                print(f"{table} is already partitioned")
+                continue
+            _partition_table(connection, table, spec)
+            print(f"{table} partitioned by month")
+
+if __name__ == "__main__":
+    run_migration()
+    print("Migration completed: monthly partitions for monthly_counters and usage_reports")
@@ -0,0 +1,44 @@
+"""
+Migration: Index usage_reports by date for retention
+Description: La retención de usage_reports corta por date, la misma columna que la
+clave de partición, así las particiones borradas y el borrado por lotes usan el
+mismo criterio. Reemplaza ix_usage_reports_created_at por ix_usage_reports_date.
+Con la tabla sin particionar se usa CONCURRENTLY para no bloquear los sondeos;
+PostgreSQL no lo admite sobre una tabla particionada.
+"""
+
+import sys
+sys.path.append('/app')
+
+from sqlalchemy import text, create_engine
+from app.config import settings
+
+def _is_partitioned(connection):
+    return connection.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = 'usage_reports' AND c.relnamespace = 'public'::regnamespace
+        )
+    """)).scalar()
+
+def run_migration():
+    """Replace the usage_reports created_at index with a date index"""
+
+    engine = create_engine(settings.database_url)
+    if engine.dialect.name != "postgresql":
+        print("Skipped: the index comes from create_all")
+        return
+
+    # CREATE INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        concurrently = "" if _is_partitioned(connection) else "CONCURRENTLY"
+        connection.execute(text(f"""
+            CREATE INDEX {concurrently} IF NOT EXISTS ix_usage_reports_date
+            ON usage_reports(date)
+        """))
+        connection.execute(text(f"DROP INDEX {concurrently} IF EXISTS ix_usage_reports_created_at"))
+
+if __name__ == "__main__":
+    run_migration()
+    print("Migration completed: usage_reports retention index on date")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Float, UniqueConstraint, Index
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, Text, ForeignKey, Float, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .db import Base
@@ -127,6 +127,112 @@ class UsageReport(Base):
     # Relationships
     printer = relationship("Printer", back_populates="usage_reports")
 
+    __table_args__ = (
+        Index("ix_usage_reports_printer_date", "printer_id", "date"),
+        Index("ix_usage_reports_date", "date"),
+    )
+
+class PrinterPollSchedule(Base):
+    """
+    Próximo sondeo de uso de cada impresora con sondeo adaptativo: el intervalo sale del
+    ritmo de páginas y de consumo de tóner recientes (ver services.adaptive_polling).
+    """
+    __tablename__ = "printer_poll_schedules"
+
+    printer_id = Column(Integer, ForeignKey("printers.id", ondelete="CASCADE"), primary_key=True)
+    interval_minutes = Column(Integer, nullable=False)
+    next_poll_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    last_polled_at = Column(DateTime(timezone=True))
+    pages_per_day = Column(Float)  # None = sin historial suficiente
+    toner_drop_per_day = Column(Float)  # Puntos por día del color que más baja
+
+
+class CollectorCursor(Base):
+    """
+    Última secuencia aplicada de cada colector remoto (python -m app.workers.collector).
+    La ingesta descarta las lecturas con secuencia menor o igual: reenviar un lote es
+    inofensivo (ver services.usage_ingest).
+    """
+    __tablename__ = "collector_cursors"
+
+    collector_id = Column(String(100), primary_key=True)
+    last_sequence = Column(BigInteger, nullable=False, default=0)
+    readings_accepted = Column(BigInteger, nullable=False, default=0)
+    last_seen_at = Column(DateTime(timezone=True))
+
+
+class PrinterStateChange(Base):
+    """
+    Historial de tóner, papel y estado codificado por cambios: se escribe una fila solo
+    cuando algún valor se mueve más que state_history_level_threshold (o cambia el
+    estado) respecto del último guardado. El valor en un instante es el del último
+    cambio anterior (ver services.state_history).
+    """
+    __tablename__ = "printer_state_changes"
+
+    id = Column(Integer, primary_key=True)
+    printer_id = Column(Integer, ForeignKey("printers.id", ondelete="CASCADE"), nullable=False)
+    recorded_at = Column(DateTime(timezone=True), nullable=False)
+    toner_level_black = Column(Float)
+    toner_level_cyan = Column(Float)
+    toner_level_magenta = Column(Float)
+    toner_level_yellow = Column(Float)
+    paper_level = Column(Float)
+    status = Column(String)
+
+    __table_args__ = (
+        Index("ix_printer_state_changes_printer_recorded", "printer_id", "recorded_at"),
+    )
+
+class UsageRollupHourly(Base):
+    """
+    Agregado por impresora y hora de usage_reports (mantenido al insertar los reportes,
+    ver services.usage_rollups). Los reportes leen de estas tablas en lugar de
+    re-agregar el historial crudo.
+    """
+    __tablename__ = "usage_rollups_hourly"
+
+    printer_id = Column(Integer, ForeignKey("printers.id", ondelete="CASCADE"), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    pages_mono = Column(Integer, nullable=False, default=0)
+    pages_color = Column(Integer, nullable=False, default=0)
+    report_count = Column(Integer, nullable=False, default=0)
+    min_toner_level = Column(Float)  # Menor nivel de tóner (cualquier color) del período
+
+    __table_args__ = (
+        Index("ix_usage_rollups_hourly_bucket", "bucket_start"),
+    )
+
+class UsageRollupDaily(Base):
+    """Agregado por impresora y día de usage_reports (ver UsageRollupHourly)."""
+    __tablename__ = "usage_rollups_daily"
+
+    printer_id = Column(Integer, ForeignKey("printers.id", ondelete="CASCADE"), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    pages_mono = Column(Integer, nullable=False, default=0)
+    pages_color = Column(Integer, nullable=False, default=0)
+    report_count = Column(Integer, nullable=False, default=0)
+    min_toner_level = Column(Float)
+
+    __table_args__ = (
+        Index("ix_usage_rollups_daily_bucket", "bucket_start"),
+    )
+
+class UsageRollupMonthly(Base):
+    """Agregado por impresora y mes de usage_reports (ver UsageRollupHourly)."""
+    __tablename__ = "usage_rollups_monthly"
+
+    printer_id = Column(Integer, ForeignKey("printers.id", ondelete="CASCADE"), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    pages_mono = Column(Integer, nullable=False, default=0)
+    pages_color = Column(Integer, nullable=False, default=0)
+    report_count = Column(Integer, nullable=False, default=0)
+    min_toner_level = Column(Float)
+
+    __table_args__ = (
+        Index("ix_usage_rollups_monthly_bucket", "bucket_start"),
+    )
+
 class MonthlyCounter(Base):
     __tablename__ = "monthly_counters"
 
@@ -154,6 +260,7 @@ class MonthlyCounter(Base):
     location_snapshot = Column(String)  # Printer location when this counter was recorded
     notes = Column(Text)
     locked = Column(Boolean, default=True)  # Locked by default after creation
+    collection_run_id = Column(String(36), nullable=True)  # Corrida de la cola que lo escribió (idempotencia)
     recorded_at = Column(DateTime(timezone=True), server_default=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -164,7 +271,66 @@ class MonthlyCounter(Base):
     # CONSTRAINT REMOVED: Allow multiple records per printer/month for full history
     # Original constraint: UniqueConstraint('printer_id', 'year', 'month', name='unique_printer_month_year')
     # Removed to enable complete counter collection history
-    __table_args__ = ()
+    __table_args__ = (
+        Index("ix_monthly_counters_printer_recorded", "printer_id", "recorded_at"),
+        Index("ix_monthly_counters_year_month", "year", "month"),
+        # Una lectura por impresora y corrida: los reintentos de la cola no duplican registros
+        # (incluye year/month, la clave de partición en PostgreSQL; una corrida es de un solo mes)
+        Index("ux_monthly_counters_run_printer", "collection_run_id", "printer_id", "year", "month", unique=True),
+    )
+
+
+class PrinterLatestCounter(Base):
+    """
+    Última lectura de contador de cada impresora.
+    Se actualiza en cada inserción de MonthlyCounter para que el "contador anterior"
+    sea una búsqueda por clave primaria en lugar de un max/group-by sobre el historial.
+    """
+    __tablename__ = "printer_latest_counter"
+
+    printer_id = Column(Integer, ForeignKey("printers.id", ondelete="CASCADE"), primary_key=True)
+    # Sin FK: monthly_counters particionada no la admite; refresh_latest_counter la mantiene
+    counter_id = Column(Integer, nullable=True)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    counter_bw = Column(Integer, default=0)
+    counter_color = Column(Integer, default=0)
+    counter_total = Column(Integer, default=0)
+    recorded_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class CounterAnomaly(Base):
+    """
+    Anomalía detectada en el historial de monthly_counters (ver services/counter_anomalies).
+    Una fila por lectura y tipo: reanalizar el historial actualiza la fila existente
+    sin perder el reconocimiento del usuario, y borra las no reconocidas que ya no aparecen.
+    """
+    __tablename__ = "counter_anomalies"
+
+    id = Column(Integer, primary_key=True, index=True)
+    printer_id = Column(Integer, ForeignKey("printers.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String(20), nullable=False)  # reset, wrap, jump, flatline
+    # Lecturas de monthly_counters sin FK (la tabla particionada no la admite):
+    # el borrado de una lectura limpia sus anomalías en la aplicación
+    counter_id = Column(Integer, nullable=False)
+    previous_counter_id = Column(Integer, nullable=True)
+    recorded_at = Column(DateTime(timezone=True), nullable=False)
+    previous_value = Column(Integer, nullable=True)
+    value = Column(Integer, nullable=True)
+    delta = Column(Integer, nullable=True)
+    score = Column(Float, nullable=True)  # z robusto (jump) o días sin cambios (flatline)
+    details = Column(Text)
+    acknowledged = Column(Boolean, default=False, nullable=False)
+    detected_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_seen_at = Column(DateTime(timezone=True), nullable=False)  # Último análisis que la encontró
+
+    printer = relationship("Printer", foreign_keys=[printer_id])
+
+    __table_args__ = (
+        UniqueConstraint("counter_id", "kind", name="uq_counter_anomalies_counter_kind"),
+        Index("ix_counter_anomalies_printer", "printer_id", "recorded_at"),
+    )
 
 class User(Base):
     __tablename__ = "users"
@@ -512,6 +678,7 @@ class CounterSchedule(Base):
 
     # Estado y configuración
     is_active = Column(Boolean, default=True)
+    priority = Column(Integer, default=0, nullable=False)  # Mayor = antes; gana las impresoras compartidas
     last_run = Column(DateTime(timezone=True))
     next_run = Column(DateTime(timezone=True))
     run_count = Column(Integer, default=0)
@@ -613,13 +780,40 @@ class DiscoveryConfig(Base):
     ip_ranges = Column(Text, nullable=False)    # Rangos IP separados por comas (ej: "10.10.9.1-10.10.9.50,192.168.1.1-192.168.1.100")
     description = Column(String(255), nullable=True)  # Descripción opcional
     is_active = Column(Boolean, default=True)   # Si la configuración está activa
+    sweep_enabled = Column(Boolean, default=False, nullable=False)  # Incluir en barridos automáticos fuera de horario
+    last_sweep_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    sweep_runs = relationship("DiscoverySweepRun", back_populates="config", cascade="all, delete-orphan")
+
     def __repr__(self):
         return f"<DiscoveryConfig(name='{self.name}', ip_ranges='{self.ip_ranges}')>"
 
 
+class DiscoverySweepRun(Base):
+    """Resultado de un barrido automático de descubrimiento sobre una DiscoveryConfig"""
+    __tablename__ = "discovery_sweep_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    config_id = Column(Integer, ForeignKey("discovery_configs.id", ondelete="CASCADE"), nullable=False, index=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    status = Column(String(20), default="running", nullable=False)  # running, completed, aborted, error
+    trigger = Column(String(20), default="scheduled")  # scheduled, manual
+    ips_scanned = Column(Integer, default=0)
+    ips_responsive = Column(Integer, default=0)
+    printers_found = Column(Integer, default=0)
+    known_printers = Column(Integer, default=0)
+    new_devices = Column(Integer, default=0)
+    ip_changes = Column(Integer, default=0)
+    duration_seconds = Column(Float, nullable=True)
+    message = Column(Text, nullable=True)
+    details = Column(Text, nullable=True)  # JSON: dispositivos nuevos, cambios de IP, conflictos
+
+    config = relationship("DiscoveryConfig", back_populates="sweep_runs")
+
+
 # =============================================================================
 # BILLING MODELS
 # =============================================================================
@@ -1400,3 +1594,16 @@ class LocationCounterSegment(Base):
         Index("ix_location_segments_printer_month", "printer_id", "year", "month"),
         Index("ix_location_segments_location", "location", "year", "month"),
     )
+
+
+class AssetTagSequence(Base):
+    """
+    Contador de asset tags por prefijo (PRT-001, PRT-002, ...).
+    next_value es el próximo número libre; se incrementa de forma atómica
+    para reservar bloques sin escanear la tabla printers.
+    """
+    __tablename__ = "asset_tag_sequences"
+
+    prefix = Column(String(20), primary_key=True)
+    next_value = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -8,6 +8,7 @@ import json
 
 from ..db import SessionLocal, get_db
 from ..models import CounterSchedule, Printer, MonthlyCounter
+from ..services import collection_queue
 from ..services.snmp import SNMPService
 from ..workers.polling import execute_scheduled_counter_job, get_auto_counter_runtime_status
 
@@ -25,6 +26,7 @@ class CounterScheduleCreate(BaseModel):
     day_of_month: Optional[int] = None  # 1-31
     target_type: str  # all, selection, single
     printer_ids: Optional[List[int]] = None
+    priority: int = 0  # Mayor = antes; gana las impresoras compartidas con otras programaciones
     is_active: bool = True
     retry_on_failure: bool = True
     max_retries: int = 3
@@ -43,6 +45,7 @@ class CounterScheduleUpdate(BaseModel):
     day_of_month: Optional[int] = None
     target_type: Optional[str] = None
     printer_ids: Optional[List[int]] = None
+    priority: Optional[int] = None
     is_active: Optional[bool] = None
     retry_on_failure: Optional[bool] = None
     max_retries: Optional[int] = None
@@ -61,6 +64,7 @@ class CounterScheduleResponse(BaseModel):
     day_of_month: Optional[int]
     target_type: str
     printer_ids: Optional[List[int]] = []  # List instead of JSON string for API response
+    priority: int = 0
     is_active: bool
     last_run: Optional[datetime]
     next_run: Optional[datetime]
@@ -505,6 +509,7 @@ def create_schedule(schedule: CounterScheduleCreate, db: Session = Depends(get_d
         day_of_month=schedule.day_of_month,
         target_type=schedule.target_type,
         printer_ids=serialize_printer_ids(schedule.printer_ids),
+        priority=schedule.priority,
         is_active=schedule.is_active,
         retry_on_failure=schedule.retry_on_failure,
         max_retries=schedule.max_retries,
@@ -594,11 +599,15 @@ async def run_schedule_now(schedule_id: int, background_tasks: BackgroundTasks,
     if not schedule:
         raise HTTPException(status_code=404, detail="Schedule not found")
 
-    runtime = get_auto_counter_runtime_status()
-    if runtime.get("is_busy"):
+    # Solo bloquea una corrida anterior de esta misma programación; las demás corren en paralelo
+    try:
+        active_run = collection_queue.get_active_run(f"{collection_queue.SOURCE_SCHEDULE}:{schedule_id}")
+    except collection_queue.CollectionQueueError as e:
+        raise HTTPException(status_code=503, detail=f"Cola de recolección no disponible: {e}")
+    if active_run:
         raise HTTPException(
             status_code=409,
-            detail="Ya hay una toma automatica en ejecucion. Espere a que finalice.",
+            detail="Esta programacion ya tiene una toma en ejecucion. Espere a que finalice.",
         )
 
     background_tasks.add_task(_run_schedule_job_in_background, schedule_id)
@@ -15,6 +15,7 @@ from ..models import (
 )
 from ..services import billing_engine
 from ..services.snmp import SNMPService
+from ..services.printer_lease import OP_BILLING, PrinterBusyError, single_flight
 
 router = APIRouter(prefix="/billing", tags=["billing"])
 
@@ -873,8 +874,22 @@ def create_snmp_bulk_readings(
                 elif 'ricoh' in brand_lower:
                     profile = 'ricoh'
             
-            # Realizar consulta SNMP
-            snmp_data = snmp_service.poll_printer(printer.ip, profile)
+            # Realizar consulta SNMP (sin esperar si otra lectura de la impresora está en curso)
+            try:
+                snmp_data = single_flight(
+                    printer.id,
+                    OP_BILLING,
+                    lambda: snmp_service.poll_printer(printer.ip, profile),
+                    wait_seconds=0,
+                    holder="api:/readings/snmp-bulk"
+                ).value
+            except PrinterBusyError as e:
+                results["errors"].append({
+                    "printer_id": printer.id,
+                    "ip_address": printer.ip,
+                    "error": str(e)
+                })
+                continue
             
             if not snmp_data or snmp_data.get('status') == 'offline':
                 results["errors"].append({
@@ -0,0 +1,106 @@
+"""
+Counter Anomalies API Routes
+Anomalías detectadas en el historial de monthly_counters (reseteos, desbordes,
+saltos atípicos y contadores planos). Ver services/counter_anomalies.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+
+from ..db import get_db
+from ..models import CounterAnomaly, Printer
+from ..services.counter_anomalies import KINDS, analyze_counters
+
+router = APIRouter()
+
+
+class AnomalyPrinter(BaseModel):
+    brand: str
+    model: str
+    ip: str
+    location: Optional[str] = None
+    asset_tag: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class CounterAnomalyResponse(BaseModel):
+    id: int
+    printer_id: int
+    printer: Optional[AnomalyPrinter] = None
+    kind: str
+    counter_id: int
+    previous_counter_id: Optional[int] = None
+    recorded_at: datetime
+    previous_value: Optional[int] = None
+    value: Optional[int] = None
+    delta: Optional[int] = None
+    score: Optional[float] = None
+    details: Optional[str] = None
+    acknowledged: bool
+    detected_at: Optional[datetime] = None
+    last_seen_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class AnomalyAnalysisResult(BaseModel):
+    printers_analyzed: int
+    readings_analyzed: int
+    anomalies_found: int
+    by_kind: Dict[str, int]
+    timings: Dict[str, Any]
+
+
+@router.get("/", response_model=List[CounterAnomalyResponse])
+def list_anomalies(
+    printer_id: Optional[int] = None,
+    kind: Optional[str] = None,
+    include_acknowledged: bool = False,
+    limit: int = Query(200, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Anomalías más recientes primero (por defecto solo las no reconocidas)."""
+    if kind is not None and kind not in KINDS:
+        raise HTTPException(status_code=400, detail=f"kind debe ser uno de: {', '.join(KINDS)}")
+
+    query = db.query(CounterAnomaly)
+    if printer_id is not None:
+        query = query.filter(CounterAnomaly.printer_id == printer_id)
+    if kind is not None:
+        query = query.filter(CounterAnomaly.kind == kind)
+    if not include_acknowledged:
+        query = query.filter(CounterAnomaly.acknowledged.is_(False))
+    return query.order_by(CounterAnomaly.recorded_at.desc(), CounterAnomaly.id.desc()).limit(limit).all()
+
+
+@router.post("/analyze", response_model=AnomalyAnalysisResult)
+def run_analysis(
+    printer_id: Optional[int] = None,
+    lookback_days: Optional[int] = Query(None, ge=0),
+    db: Session = Depends(get_db)
+):
+    """Analiza el historial de contadores (toda la flota o una impresora) y actualiza las anomalías."""
+    printer_ids = None
+    if printer_id is not None:
+        if not db.get(Printer, printer_id):
+            raise HTTPException(status_code=404, detail="Printer not found")
+        printer_ids = [printer_id]
+    return analyze_counters(db, printer_ids, lookback_days)
+
+
+@router.patch("/{anomaly_id}/acknowledge", response_model=CounterAnomalyResponse)
+def acknowledge_anomaly(anomaly_id: int, acknowledged: bool = True, db: Session = Depends(get_db)):
+    """Marca (o desmarca) una anomalía como revisada; las reconocidas no se borran al reanalizar."""
+    anomaly = db.get(CounterAnomaly, anomaly_id)
+    if not anomaly:
+        raise HTTPException(status_code=404, detail="Anomaly not found")
+    anomaly.acknowledged = acknowledged
+    db.commit()
+    db.refresh(anomaly)
+    return anomaly
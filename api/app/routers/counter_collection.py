@@ -1,20 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy import and_
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
+import asyncio
 import json
 import logging
+import secrets
 import socket
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-from ..db import get_db
-from ..models import Printer, MonthlyCounter
+from ..config import settings
+from ..db import dialect_insert, get_db
+from ..models import Printer, MonthlyCounter, PrinterLatestCounter
 from ..services.snmp import SNMPService
-from ..services.location_counter_sync import sync_location_segments_for_printer_month
+from ..services.location_counter_sync import (
+    apply_new_counters_to_segments,
+    sync_location_segments_for_printer_month
+)
+from ..services.latest_counters import get_latest_counters, record_latest_counter, upsert_latest_counters
+from ..services import adaptive_polling, collection_events, collection_queue
+from ..services.collection_engine import CollectionOutcome, CollectionTarget
+from ..services.fleet_registry import get_fleet_registry
+from ..services.printer_lease import OP_COUNTERS, PrinterBusyError, single_flight
+from ..services.usage_ingest import collector_cursor, ingest_readings
+from ..services.reachability import PROTOCOL_HTTP, PROTOCOL_SNMP, PROTOCOL_TCP, forget, is_known_down, record_probe
 from ..services.medical_printer_service import (
+    DRYPIX_PORT,
     MedicalPrinterService,
     is_medical_printer,
     get_medical_printer_type
@@ -23,21 +36,6 @@ from ..services.medical_printer_service import (
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-_collection_lock = Lock()
-_collection_state_lock = Lock()
-_collection_runtime_state: Dict[str, Any] = {
-    "is_running": False,
-    "started_at": None,
-    "mode": None,
-    "printers_total": 0,
-    "printers_processed": 0,
-    "printers_successful": 0,
-    "printers_failed": 0,
-}
-
-MAX_COLLECTION_WORKERS = 6
-MAX_PRINTERS_PER_COLLECTION = 200
-
 class CounterCollectionResult(BaseModel):
     success: bool
     message: str
@@ -49,6 +47,24 @@ class CounterCollectionResult(BaseModel):
     errors: List[str]
     execution_time: float
     results: List[Dict[str, Any]]
+    phase_timings: Optional[Dict[str, Any]] = None
+    printers_skipped: int = 0  # Leídas dentro de la ventana de frescura o con otra lectura en curso (no se consultaron)
+
+
+class CollectionRunStatus(CounterCollectionResult):
+    """Corrida encolada: estado en la cola más el resumen compatible con CounterCollectionResult."""
+    run_id: str
+    status: str  # queued, running, completed
+    kind: str
+    source: str
+    printers_total: int
+    counters_skipped: int = 0
+    fresh_within_minutes: int = 0
+    tasks_total: int = 0
+    tasks_pending: int = 0
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
 
 class PrinterCounterData(BaseModel):
     printer_id: int
@@ -61,7 +77,7 @@ class PrinterCounterData(BaseModel):
     profile_used: Optional[str] = None
     response_time: Optional[float] = None
     error_message: Optional[str] = None
-    action_taken: Optional[str] = None  # 'created', 'updated', 'skipped'
+    action_taken: Optional[str] = None  # 'created', 'updated', 'skipped', 'fresh', 'in_flight', 'shared'
     ping_check: Optional[bool] = None  # True if ping successful, False if failed
 
 
@@ -69,18 +85,290 @@ class CollectionRuntimeStatus(BaseModel):
     is_running: bool
     started_at: Optional[str] = None
     mode: Optional[str] = None
+    run_id: Optional[str] = None
     printers_total: int
     printers_processed: int
     printers_successful: int
     printers_failed: int
 
 
+def _queue_unavailable(e: collection_queue.CollectionQueueError) -> HTTPException:
+    logger.error(str(e))
+    return HTTPException(status_code=503, detail="La cola de recolección (Redis) no está disponible")
+
+
+def _run_status(run: Dict[str, Any]) -> CollectionRunStatus:
+    """Convierte el estado de la cola al formato de respuesta (incluye resultados si se cargaron)."""
+    results = run.get("results", [])
+    errors = [
+        f"Printer {result['printer_id']} ({result.get('printer_ip')}): {result['error_message']}"
+        for result in results
+        if not result.get("success") and result.get("error_message")
+    ]
+    started = run.get("started_at") or run.get("created_at")
+    ended = run.get("finished_at")
+    execution_time = 0.0
+    if started:
+        end_time = datetime.fromisoformat(ended) if ended else datetime.now()
+        execution_time = max(0.0, (end_time - datetime.fromisoformat(started)).total_seconds())
+
+    if run["status"] == collection_queue.STATUS_COMPLETED:
+        message = (
+            f"Processed {run['printers_processed']} printers: {run['printers_successful']} successful, "
+            f"{run['printers_failed']} failed, {run['printers_skipped']} skipped (read within the last "
+            f"{run['fresh_within_minutes']} minutes or already being read). Created {run['counters_created']} counter records"
+            f" ({run['counters_skipped']} already saved by a previous attempt)."
+        )
+    else:
+        message = f"Recolección {run['status']}: {run['printers_processed']}/{run['printers_total']} impresoras procesadas"
+
+    return CollectionRunStatus(
+        run_id=run["run_id"],
+        status=run["status"],
+        kind=run.get("kind") or collection_queue.KIND_COUNTERS,
+        source=run.get("source") or collection_queue.SOURCE_MANUAL,
+        success=run["status"] == collection_queue.STATUS_COMPLETED and run["printers_failed"] == 0,
+        message=message,
+        printers_total=run["printers_total"],
+        printers_processed=run["printers_processed"],
+        printers_successful=run["printers_successful"],
+        printers_failed=run["printers_failed"],
+        printers_skipped=run["printers_skipped"],
+        fresh_within_minutes=run["fresh_within_minutes"],
+        counters_created=run["counters_created"],
+        counters_updated=0,
+        counters_skipped=run["counters_skipped"],
+        tasks_total=run["tasks_total"],
+        tasks_pending=run["tasks_pending"],
+        created_at=run.get("created_at"),
+        started_at=run.get("started_at"),
+        finished_at=run.get("finished_at"),
+        errors=errors,
+        execution_time=execution_time,
+        results=results,
+    )
+
+
 @router.get("/runtime-status", response_model=CollectionRuntimeStatus)
 def get_collection_runtime_status():
-    with _collection_state_lock:
-        return CollectionRuntimeStatus(**_collection_runtime_state)
+    try:
+        run = collection_queue.get_active_run(collection_queue.SOURCE_MANUAL)
+    except collection_queue.CollectionQueueError as e:
+        raise _queue_unavailable(e)
+    if not run:
+        return CollectionRuntimeStatus(
+            is_running=False, printers_total=0, printers_processed=0,
+            printers_successful=0, printers_failed=0
+        )
+    return CollectionRuntimeStatus(
+        is_running=True,
+        started_at=run.get("started_at") or run.get("created_at"),
+        mode="manual_collect",
+        run_id=run["run_id"],
+        printers_total=run["printers_total"],
+        printers_processed=run["printers_processed"],
+        printers_successful=run["printers_successful"],
+        printers_failed=run["printers_failed"],
+    )
+
+
+def is_collection_running() -> bool:
+    """Indica si hay una recolección manual de contadores en curso (en cualquier worker)."""
+    try:
+        return collection_queue.get_active_run(collection_queue.SOURCE_MANUAL) is not None
+    except collection_queue.CollectionQueueError as e:
+        logger.warning(str(e))
+        return False
+
+
+@router.get("/runs", response_model=List[CollectionRunStatus])
+def list_collection_runs(limit: int = 20, source: Optional[str] = None):
+    """Corridas recientes de la cola de recolección (sin resultados por impresora)."""
+    try:
+        return [_run_status(run) for run in collection_queue.list_runs(limit=limit, source=source)]
+    except collection_queue.CollectionQueueError as e:
+        raise _queue_unavailable(e)
+
+
+@router.get("/runs/{run_id}", response_model=CollectionRunStatus)
+def get_collection_run(run_id: str, include_results: bool = True):
+    """Estado de una corrida; al terminar, el resumen final y los resultados por impresora."""
+    try:
+        run = collection_queue.get_run(run_id, include_results=include_results)
+    except collection_queue.CollectionQueueError as e:
+        raise _queue_unavailable(e)
+    if not run:
+        raise HTTPException(status_code=404, detail="Collection run not found")
+    return _run_status(run)
+
+
+_SSE_KEEPALIVE_SECONDS = 15
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+async def _event_stream(request: Request, channel: str, snapshot, until_completed: bool):
+    """
+    Generador SSE sobre un canal de eventos de recolección.
+    
+    ``snapshot`` (sync) devuelve los eventos iniciales y se ejecuta ya suscrito, así no
+    se pierde nada publicado entre la foto y el primer evento en vivo.
+    """
+    async with collection_events.subscribe(channel) as queue:
+        try:
+            initial = await asyncio.to_thread(snapshot)
+        except collection_queue.CollectionQueueError as e:
+            logger.error(str(e))
+            yield collection_events.format_sse({"event": "error", "message": "Cola de recolección no disponible"})
+            return
+        for event in initial:
+            yield collection_events.format_sse(event)
+            if until_completed and event["event"] == "completed":
+                return
+        
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=_SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield collection_events.format_sse(event)
+            if event["event"] == "error" or (until_completed and event["event"] == "completed"):
+                return
+
 
-def ping_printer(ip: str, timeout: float = 0.5, ports: List[int] = None) -> Dict[str, Any]:
+@router.get("/runs/{run_id}/events")
+async def stream_collection_run_events(run_id: str, request: Request):
+    """
+    Progreso en vivo de una corrida (Server-Sent Events).
+    
+    Eventos: ``progress`` (totales de la corrida, el primero es el estado actual),
+    ``printer`` (una impresora terminada: id, éxito, latencia y acción) y
+    ``completed`` (totales finales; cierra el stream).
+    """
+    try:
+        exists = await asyncio.to_thread(collection_queue.get_run, run_id)
+    except collection_queue.CollectionQueueError as e:
+        raise _queue_unavailable(e)
+    if not exists:
+        raise HTTPException(status_code=404, detail="Collection run not found")
+    
+    def snapshot():
+        run = collection_queue.get_run(run_id)
+        if run is None:
+            return [{"event": "error", "message": "Collection run expired"}]
+        event = "completed" if run["status"] == collection_queue.STATUS_COMPLETED else "progress"
+        return [collection_queue.run_progress(run, event)]
+    
+    return StreamingResponse(
+        _event_stream(request, collection_queue.run_channel(run_id), snapshot, until_completed=True),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS
+    )
+
+
+@router.get("/events")
+async def stream_collection_events(request: Request):
+    """
+    Progreso en vivo de todas las corridas (manuales y programadas), sin detalle por impresora.
+    Al conectar se envía un ``progress`` por cada corrida activa.
+    """
+    def snapshot():
+        return [
+            collection_queue.run_progress(run)
+            for run in collection_queue.list_runs(limit=20)
+            if collection_queue.is_run_active(run)
+        ]
+    
+    return StreamingResponse(
+        _event_stream(request, collection_queue.EVENTS_CHANNEL, snapshot, until_completed=False),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS
+    )
+
+
+@router.get("/fleet-registry")
+def get_fleet_registry_stats():
+    """Tamaño y versión del registro de impresoras en memoria de este proceso."""
+    return get_fleet_registry().stats()
+
+
+@router.get("/poll-schedule")
+def get_poll_schedule_summary(db: Session = Depends(get_db)):
+    """Intervalos del sondeo de uso adaptativo y carga de sondeos estimada por día."""
+    fleet_size = len(get_fleet_registry().select(active_only=False))
+    return {
+        "adaptive": settings.adaptive_polling_enabled,
+        **adaptive_polling.schedule_summary(db, fleet_size),
+    }
+
+
+class IngestReading(BaseModel):
+    """Lectura de uso de un colector remoto; la impresora se identifica por printer_id o por ip."""
+    sequence: int = Field(..., ge=1)
+    printer_id: Optional[int] = None
+    ip: Optional[str] = None
+    read_at: datetime
+    pages_printed_mono: int = 0
+    pages_printed_color: int = 0
+    toner_level_black: Optional[float] = None
+    toner_level_cyan: Optional[float] = None
+    toner_level_magenta: Optional[float] = None
+    toner_level_yellow: Optional[float] = None
+    paper_level: Optional[float] = None
+    status: str = "unknown"
+
+
+class IngestBatch(BaseModel):
+    collector_id: str = Field(..., min_length=1, max_length=100)
+    readings: List[IngestReading]
+
+
+def _check_collector_token(token: Optional[str]) -> None:
+    if settings.collector_token and not secrets.compare_digest(token or "", settings.collector_token):
+        raise HTTPException(status_code=401, detail="Token de colector inválido")
+
+
+@router.get("/ingest/cursor")
+def get_collector_cursor(
+    collector_id: str = Query(..., min_length=1, max_length=100),
+    x_collector_token: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Última secuencia aplicada de un colector: al arrancar numera sus lecturas a partir de ella."""
+    _check_collector_token(x_collector_token)
+    return collector_cursor(db, collector_id)
+
+
+@router.post("/ingest")
+def ingest_usage_readings(
+    batch: IngestBatch,
+    x_collector_token: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Ingesta por lotes de lecturas de uso de colectores remotos (python -m app.workers.collector).
+    Idempotente por (collector_id, sequence): reenviar un lote no duplica reportes.
+    """
+    _check_collector_token(x_collector_token)
+    if len(batch.readings) > settings.ingest_max_readings:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo {settings.ingest_max_readings} lecturas por petición ({len(batch.readings)} recibidas)"
+        )
+
+    result = ingest_readings(db, batch.collector_id, [reading.dict() for reading in batch.readings])
+    if result.unknown:
+        logger.warning(f"Colector {batch.collector_id}: {len(result.unknown)} lecturas de impresoras no registradas")
+    return result.as_dict()
+
+
+def ping_printer(
+    ip: str,
+    timeout: float = 0.5,
+    ports: List[int] = None,
+    protocol: str = PROTOCOL_TCP,
+    use_cache: bool = True
+) -> Dict[str, Any]:
     """
     Verifica conectividad de la impresora antes de intentar SNMP
     Optimizado para ser rápido y evitar timeouts largos
@@ -89,7 +377,18 @@ def ping_printer(ip: str, timeout: float = 0.5, ports: List[int] = None) -> Dict
         ip: Dirección IP de la impresora
         timeout: Timeout en segundos para cada intento
         ports: Lista de puertos a probar (None usa puertos por defecto)
+        protocol: Clave de la caché de alcanzabilidad bajo la que se registra el resultado
+        use_cache: Si es True, falla de inmediato cuando la caché sabe que el host está caído
     """
+    if use_cache and is_known_down(ip, protocol):
+        return {
+            'success': False,
+            'response_time': 0.0,
+            'port_responsive': None,
+            'error': 'No hay conectividad - host caído en un sondeo reciente (caché)',
+            'cached': True
+        }
+    
     start_time = datetime.now()
     
     # Puertos de impresoras en orden de prioridad
@@ -115,6 +414,7 @@ def ping_printer(ip: str, timeout: float = 0.5, ports: List[int] = None) -> Dict
             if result == 0:
                 end_time = datetime.now()
                 response_time = (end_time - start_time).total_seconds()
+                record_probe(ip, protocol, True)
                 return {
                     'success': True,
                     'response_time': response_time,
@@ -125,6 +425,7 @@ def ping_printer(ip: str, timeout: float = 0.5, ports: List[int] = None) -> Dict
             continue
     
     # Si ningún puerto respondió
+    record_probe(ip, protocol, False)
     end_time = datetime.now()
     response_time = (end_time - start_time).total_seconds()
     return {
@@ -134,100 +435,175 @@ def ping_printer(ip: str, timeout: float = 0.5, ports: List[int] = None) -> Dict
         'error': 'No hay conectividad - impresora apagada o fuera de línea'
     }
 
-def process_single_printer_threaded(printer_dict: Dict, year: int = None, month: int = None, previous_counters_cache: Dict[int, MonthlyCounter] = None) -> PrinterCounterData:
+def build_collection_target(printer: Printer) -> CollectionTarget:
     """
-    Procesa una impresora individual de forma thread-safe
-    Recibe un diccionario con los datos de la impresora para evitar problemas de serialización
+    Arma el objetivo del motor de recolección para una impresora.
+    Las DRYPIX (sin SNMP) se verifican solo en el puerto HTTP 20051, el mismo que se
+    registra como alcanzabilidad HTTP; el resto por los puertos de servicio de
+    impresora con timeout agresivo.
     """
-    from ..db import get_db
+    is_drypix = 'DRYPIX' in (printer.model or '').upper()
+    payload = {
+        'id': printer.id,
+        'ip': printer.ip,
+        'brand': printer.brand,
+        'model': printer.model,
+        'snmp_profile': printer.snmp_profile,
+        'location': printer.location,
+        'is_drypix': is_drypix,
+    }
+    if is_drypix:
+        return CollectionTarget(
+            printer_id=printer.id, ip=printer.ip, ports=[DRYPIX_PORT],
+            ping_timeout=1.0, protocol=PROTOCOL_HTTP, payload=payload
+        )
+    return CollectionTarget(printer_id=printer.id, ip=printer.ip, ping_timeout=0.3, payload=payload)
+
+
+def fetch_printer_counters(target: CollectionTarget, snmp_service: SNMPService = None) -> Dict[str, Any]:
+    """Lee los contadores de una impresora (DRYPIX por HTTP, el resto por SNMP)."""
+    if target.payload.get('is_drypix'):
+        return get_medical_printer_counters(target.payload)
+    return get_printer_counters_via_snmp(target.ip, target.payload.get('snmp_profile'), snmp_service=snmp_service)
+
+
+def _insert_monthly_counters(db: Session, rows: List[Dict[str, Any]]) -> Dict[int, int]:
+    """
+    INSERT multi-fila con RETURNING, sin refresh por registro.
     
-    # Crear una nueva sesión de base de datos para este hilo
-    db = next(get_db())
+    Las filas que ya existen para la misma corrida (collection_run_id, printer_id) se
+    omiten (ON CONFLICT DO NOTHING). Retorna {printer_id: id} de las filas insertadas.
+    """
+    table = MonthlyCounter.__table__
+    stmt = dialect_insert(db)(table).on_conflict_do_nothing(
+        # year/month forman parte del índice único (clave de partición en PostgreSQL);
+        # una corrida es de un solo período, así que sigue siendo una fila por impresora
+        index_elements=[table.c.collection_run_id, table.c.printer_id, table.c.year, table.c.month]
+    ).returning(table.c.id, table.c.printer_id)
+    return {printer_id: counter_id for counter_id, printer_id in db.execute(stmt, rows)}
+
+
+def persist_monthly_counters(
+    db: Session,
+    outcomes: List[CollectionOutcome],
+    year: int = None,
+    month: int = None,
+    previous_counters_cache: Dict[int, PrinterLatestCounter] = None,
+    collection_run_id: str = None
+) -> None:
+    """
+    Guarda un lote de contadores leídos: un INSERT multi-fila con RETURNING, una
+    sincronización de segmentos por ubicación para todo el lote y un único commit.
     
-    try:
-        printer_result = PrinterCounterData(
-            printer_id=printer_dict['id'],
-            printer_ip=printer_dict['ip'],
-            printer_name=f"{printer_dict['brand']} {printer_dict['model']}",
-            success=False
-        )
-        
-        logger.info(f"[Thread] Processing printer {printer_dict['id']}: {printer_dict['brand']} {printer_dict['model']} ({printer_dict['ip']})")
-        
-        # Verificar si es una impresora médica (no usa SNMP)
-        is_drypix = 'DRYPIX' in printer_dict.get('model', '').upper()
-        
-        if is_drypix:
-            # Para DRYPIX, saltar ping estándar y verificar puerto 20051
-            logger.info(f"[Thread] Detected medical printer (DRYPIX) - checking HTTP connectivity on port 20051")
-            ping_result = ping_printer(printer_dict['ip'], timeout=1.0, ports=[20051, 80])
-            printer_result.ping_check = ping_result['success']
-            
-            if not ping_result['success']:
-                printer_result.error_message = f"Sin conectividad HTTP: {ping_result['error']}"
-                printer_result.response_time = ping_result['response_time']
-                logger.warning(f"[Thread] No HTTP connectivity for DRYPIX printer {printer_dict['id']}")
-                return printer_result
-            
-            logger.info(f"[Thread] DRYPIX connectivity OK on port {ping_result['port_responsive']}")
-            medical_result = get_medical_printer_counters(printer_dict)
-            snmp_result = medical_result
-        else:
-            # Para impresoras estándar, verificar conectividad SNMP
-            ping_result = ping_printer(printer_dict['ip'], timeout=0.3)
-            printer_result.ping_check = ping_result['success']
-            
-            if not ping_result['success']:
-                printer_result.error_message = f"Sin conectividad: {ping_result['error']}"
-                printer_result.response_time = ping_result['response_time']
-                logger.warning(f"[Thread] No connectivity for printer {printer_dict['id']} - {ping_result['error']}")
-                return printer_result
-            
-            logger.info(f"[Thread] Connectivity OK for {printer_dict['ip']} (port {ping_result['port_responsive']}, {ping_result['response_time']:.3f}s)")
-            # Obtener contadores vía SNMP para impresoras estándar
-            snmp_result = get_printer_counters_via_snmp(printer_dict['ip'], printer_dict['snmp_profile'])
-        
-        printer_result.response_time = snmp_result['response_time']
-        
-        if snmp_result['success']:
-            counters = snmp_result['counters']
-            printer_result.counter_bw = counters['bw_counter']
-            printer_result.counter_color = counters['color_counter']
-            printer_result.counter_total = counters['total_counter']
-            printer_result.profile_used = counters['profile_used']
-            
-            # Crear o actualizar registro MonthlyCounter (thread-safe con cache)
-            action, counter_record = create_or_update_monthly_counter(
-                printer_id=printer_dict['id'],
-                counter_bw=counters['bw_counter'],
-                counter_color=counters['color_counter'],
-                counter_total=counters['total_counter'],
-                db=db,
-                year=year,
-                month=month,
-                location_snapshot=printer_dict.get('location'),
-                previous_counters_cache=previous_counters_cache
-            )
-            
-            printer_result.action_taken = action
-            printer_result.success = True
-            logger.info(f"[Thread] Successfully processed printer {printer_dict['id']}: {action} counter record")
-            
-        else:
-            printer_result.error_message = snmp_result['error']
-            logger.error(f"[Thread] SNMP failed for printer {printer_dict['id']}: {snmp_result['error']}")
+    Si el INSERT del lote falla se reintenta fila por fila (cada una en su SAVEPOINT),
+    así un registro inválido no afecta a las demás impresoras del lote.
+    
+    Con ``collection_run_id`` la escritura es idempotente: si la corrida ya guardó
+    una lectura de la impresora (tarea reintentada por la cola) no se inserta otra
+    y el resultado queda como 'skipped'.
+    """
+    now = datetime.now()
+    year = year or now.year
+    month = month or now.month
+    
+    if previous_counters_cache is None:
+        previous_counters_cache = get_latest_counters(db, [o.target.printer_id for o in outcomes])
+    
+    rows = []
+    for outcome in outcomes:
+        counters = outcome.data['counters']
+        prev_counter = previous_counters_cache.get(outcome.target.printer_id)
         
-        return printer_result
+        # Valores anteriores (0 si no hay registro previo)
+        prev_bw = prev_counter.counter_bw if prev_counter else 0
+        prev_color = prev_counter.counter_color if prev_counter else 0
+        prev_total = prev_counter.counter_total if prev_counter else 0
         
+        rows.append({
+            'printer_id': outcome.target.printer_id,
+            'year': year,
+            'month': month,
+            'counter_bw': counters['bw_counter'],
+            'counter_color': counters['color_counter'],
+            'counter_total': counters['total_counter'],
+            'previous_counter_bw': prev_bw,
+            'previous_counter_color': prev_color,
+            'previous_counter_total': prev_total,
+            'pages_printed_bw': max(0, counters['bw_counter'] - prev_bw),
+            'pages_printed_color': max(0, counters['color_counter'] - prev_color),
+            'pages_printed_total': max(0, counters['total_counter'] - prev_total),
+            'location_snapshot': outcome.target.payload.get('location'),
+            'notes': f"Contador automático - {now.strftime('%Y-%m-%d %H:%M')}",
+            'locked': False,  # Por defecto no bloqueado para permitir ajustes
+            'collection_run_id': collection_run_id,
+            'recorded_at': now,
+        })
+    
+    counter_ids: Dict[int, int] = {}
+    stored = []
+    try:
+        with db.begin_nested():
+            counter_ids = _insert_monthly_counters(db, rows)
+        stored = list(zip(outcomes, rows))
     except Exception as e:
-        error_msg = f"Thread error processing printer {printer_dict['id']}: {str(e)}"
-        logger.error(error_msg)
-        printer_result.error_message = error_msg
-        return printer_result
+        logger.warning(f"Batch insert of {len(rows)} counters failed, retrying row by row: {e}")
+        for outcome, row in zip(outcomes, rows):
+            try:
+                with db.begin_nested():
+                    counter_ids.update(_insert_monthly_counters(db, [row]))
+                stored.append((outcome, row))
+            except Exception as row_error:
+                outcome.success = False
+                outcome.error = f"Error guardando contador: {str(row_error)}"
+                logger.error(f"Failed to save counter for printer {outcome.target.printer_id}: {row_error}")
+    
+    inserted = [(outcome, row) for outcome, row in stored if row['printer_id'] in counter_ids]
+    if inserted:
+        # Lecturas nuevas (las más recientes de cada impresora): actualización incremental de segmentos
+        apply_new_counters_to_segments(db, [MonthlyCounter(**row) for _, row in inserted])
+        upsert_latest_counters(
+            db, [{**row, 'counter_id': counter_ids[row['printer_id']]} for _, row in inserted]
+        )
+    db.commit()
     
-    finally:
-        # Cerrar la sesión de base de datos del hilo
-        db.close()
+    for outcome, row in stored:
+        counter_id = counter_ids.get(row['printer_id'])
+        if counter_id is None:
+            # La corrida ya había guardado esta impresora en un intento anterior
+            outcome.action = "skipped"
+        else:
+            outcome.action = "created"
+            outcome.data['counter_id'] = counter_id
+
+
+def outcome_to_counter_data(outcome: CollectionOutcome) -> PrinterCounterData:
+    """Convierte el resultado del motor al formato de respuesta de la API."""
+    payload = outcome.target.payload
+    result = PrinterCounterData(
+        printer_id=outcome.target.printer_id,
+        printer_ip=outcome.target.ip,
+        printer_name=f"{payload.get('brand')} {payload.get('model')}",
+        success=outcome.success,
+        ping_check=outcome.ping_ok,
+        action_taken=outcome.action
+    )
+    if outcome.data:
+        result.response_time = outcome.data.get('response_time')
+    else:
+        result.response_time = round(outcome.ping_seconds, 3)
+
+    if outcome.success:
+        counters = outcome.data['counters']
+        result.counter_bw = counters['bw_counter']
+        result.counter_color = counters['color_counter']
+        result.counter_total = counters['total_counter']
+        result.profile_used = counters['profile_used']
+    elif outcome.ping_ok is False:
+        prefix = "Sin conectividad HTTP" if payload.get('is_drypix') else "Sin conectividad"
+        result.error_message = f"{prefix}: {outcome.error}"
+    else:
+        result.error_message = outcome.error
+    return result
 
 def get_medical_printer_counters(printer_dict: Dict) -> Dict[str, Any]:
     """
@@ -298,14 +674,27 @@ def get_medical_printer_counters(printer_dict: Dict) -> Dict[str, Any]:
             'error': error_msg
         }
 
-def get_printer_counters_via_snmp(printer_ip: str, printer_profile: str = None) -> Dict[str, Any]:
+def get_printer_counters_via_snmp(
+    printer_ip: str,
+    printer_profile: str = None,
+    snmp_service: SNMPService = None
+) -> Dict[str, Any]:
     """
     Obtiene los contadores acumulativos de una impresora via SNMP
     Estos son los valores totales desde que se encendió la impresora por primera vez
     """
+    if is_known_down(printer_ip, PROTOCOL_SNMP):
+        return {
+            'success': False,
+            'counters': {},
+            'response_time': 0.0,
+            'error': 'Sin respuesta SNMP en un sondeo reciente (caché)'
+        }
+    
     try:
         start_time = datetime.now()
-        snmp_service = SNMPService()
+        snmp_service = snmp_service or SNMPService()
+        snmp_answered = False
         
         # Determinar perfiles a probar basado en el perfil de la impresora
         if printer_profile:
@@ -348,6 +737,8 @@ def get_printer_counters_via_snmp(printer_ip: str, printer_profile: str = None)
                 total_counter = snmp_service.get_snmp_value(printer_ip, total_oid)
                 
                 logger.info(f"Raw SNMP values - BW: {bw_counter}, Color: {color_counter}, Total: {total_counter}")
+                if bw_counter is not None or color_counter is not None or total_counter is not None:
+                    snmp_answered = True
                 
                 # Convertir a enteros con validación
                 bw_value = None
@@ -390,6 +781,7 @@ def get_printer_counters_via_snmp(printer_ip: str, printer_profile: str = None)
         
         end_time = datetime.now()
         response_time = (end_time - start_time).total_seconds()
+        record_probe(printer_ip, PROTOCOL_SNMP, snmp_answered)
         
         if best_result:
             return {
@@ -424,7 +816,7 @@ def create_or_update_monthly_counter(
     year: int = None,
     month: int = None,
     location_snapshot: str = None,
-    previous_counters_cache: Dict[int, MonthlyCounter] = None
+    previous_counters_cache: Dict[int, PrinterLatestCounter] = None
 ) -> tuple[str, MonthlyCounter]:
     """
     Crea o actualiza un registro de contador mensual
@@ -490,10 +882,8 @@ def create_or_update_monthly_counter(
         if previous_counters_cache and printer_id in previous_counters_cache:
             prev_counter = previous_counters_cache[printer_id]
         else:
-            # Fallback: buscar el contador del día anterior más reciente 
-            prev_counter = db.query(MonthlyCounter).filter(
-                MonthlyCounter.printer_id == printer_id
-            ).order_by(MonthlyCounter.recorded_at.desc()).first()
+            # Fallback: última lectura de la impresora (búsqueda por clave primaria)
+            prev_counter = db.get(PrinterLatestCounter, printer_id)
         
         # Valores anteriores (0 si no hay registro previo)
         prev_bw = prev_counter.counter_bw if prev_counter else 0
@@ -526,267 +916,90 @@ def create_or_update_monthly_counter(
         )
         
         db.add(new_counter)
-        sync_location_segments_for_printer_month(db, printer_id, year, month)
+        apply_new_counters_to_segments(db, [new_counter])
+        record_latest_counter(db, new_counter)
         # Commit individual para thread-safety (batch commits se harían a nivel superior)
         db.commit()
         db.refresh(new_counter)
         
         return ("created", new_counter)
 
-@router.post("/collect", response_model=CounterCollectionResult)
+@router.post("/collect", response_model=CollectionRunStatus)
 def collect_all_counters(
-    background_tasks: BackgroundTasks,
     year: Optional[int] = None,
     month: Optional[int] = None,
     printer_ids: Optional[str] = None,  # Cambiar a string para recibir comma-separated
     lease_contract: Optional[str] = None,
+    fresh_within_minutes: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
     """
-    Recolecta contadores de todas las impresoras activas (o las especificadas) vía SNMP
-    y crea/actualiza registros MonthlyCounter
+    Encola la recolección de contadores de todas las impresoras activas (o las especificadas).
+    
+    Las lecturas las hacen los procesos de app.workers.collection_worker y crean registros
+    MonthlyCounter; el progreso y el resultado final se consultan en GET /runs/{run_id}.
+    
+    Las impresoras leídas por una corrida dentro de los últimos ``fresh_within_minutes``
+    (las cargas manuales no cuentan) no se consultan y se informan como salteadas. Sin el parámetro se usa
+    COLLECTION_FRESHNESS_WINDOW_MINUTES (default 0 = leer todas), salvo que se pidan
+    impresoras puntuales con ``printer_ids``: esas se leen siempre.
     """
-    if not _collection_lock.acquire(blocking=False):
+    if fresh_within_minutes is None:
+        fresh_within_minutes = 0 if printer_ids else settings.collection_freshness_window_minutes
+    if fresh_within_minutes < 0:
+        raise HTTPException(status_code=400, detail="fresh_within_minutes must be >= 0")
+    # Obtener impresoras a procesar (activas y con contadores, del registro en memoria)
+    ids_list = None
+    
+    # Filtrar por IDs específicos si se proporcionan
+    if printer_ids:
+        try:
+            ids_list = [int(id.strip()) for id in printer_ids.split(',') if id.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid printer IDs format: {printer_ids}")
+        logger.info(f"Filtering by printer IDs: {ids_list}")
+    
+    # Filtrar por contrato si se proporciona
+    if lease_contract:
+        logger.info(f"Filtering by lease contract: {lease_contract}")
+    
+    target_ids = [
+        printer.id
+        for printer in get_fleet_registry().select(printer_ids=ids_list, lease_contract=lease_contract or None)
+    ]
+    
+    if not target_ids:
+        filter_type = "all active printers"
+        if printer_ids:
+            filter_type = f"printer IDs: {printer_ids}"
+        elif lease_contract:
+            filter_type = f"lease contract: {lease_contract}"
         raise HTTPException(
-            status_code=409,
-            detail="Ya hay una recoleccion de contadores en ejecucion. Espere a que finalice.",
+            status_code=404,
+            detail=f"No hay impresoras activas para procesar ({filter_type})"
         )
-
-    start_time = datetime.now()
-    errors = []
-    results = []
-    printers_processed = 0
-    printers_successful = 0
-    printers_failed = 0
-    counters_created = 0
-    counters_updated = 0
     
     try:
-        with _collection_state_lock:
-            _collection_runtime_state.update({
-                "is_running": True,
-                "started_at": start_time.isoformat(),
-                "mode": "manual_collect",
-                "printers_total": 0,
-                "printers_processed": 0,
-                "printers_successful": 0,
-                "printers_failed": 0,
-            })
-
-        # Obtener impresoras a procesar
-        query = db.query(Printer).filter(
-            Printer.status == "active",
-            Printer.ignore_counters == False
-        )
-        
-        # Filtrar por IDs específicos si se proporcionan
-        if printer_ids:
-            try:
-                ids_list = [int(id.strip()) for id in printer_ids.split(',') if id.strip()]
-                query = query.filter(Printer.id.in_(ids_list))
-                logger.info(f"Filtering by printer IDs: {ids_list}")
-            except ValueError as e:
-                return CounterCollectionResult(
-                    success=False,
-                    message=f"Invalid printer IDs format: {printer_ids}",
-                    printers_processed=0,
-                    printers_successful=0,
-                    printers_failed=0,
-                    counters_created=0,
-                    counters_updated=0,
-                    errors=[f"Invalid printer IDs: {str(e)}"],
-                    execution_time=0.0,
-                    results=[]
-                )
-        
-        # Filtrar por contrato si se proporciona
-        if lease_contract:
-            query = query.filter(Printer.lease_contract == lease_contract)
-            logger.info(f"Filtering by lease contract: {lease_contract}")
-        
-        printers = query.all()
-        
-        if not printers:
-            filter_type = "all active printers"
-            if printer_ids:
-                filter_type = f"printer IDs: {printer_ids}"
-            elif lease_contract:
-                filter_type = f"lease contract: {lease_contract}"
-                
-            return CounterCollectionResult(
-                success=False,
-                message=f"No hay impresoras activas para procesar ({filter_type})",
-                printers_processed=0,
-                printers_successful=0,
-                printers_failed=0,
-                counters_created=0,
-                counters_updated=0,
-                errors=[f"No active printers found for {filter_type}"],
-                execution_time=0.0,
-                results=[]
-            )
-        
-        filter_info = ""
-        if printer_ids:
-            filter_info = f" (filtered by IDs: {printer_ids})"
-        elif lease_contract:
-            filter_info = f" (filtered by lease contract: {lease_contract})"
-        
-        if len(printers) > MAX_PRINTERS_PER_COLLECTION:
-            errors.append(
-                f"Run limited to first {MAX_PRINTERS_PER_COLLECTION} printers to protect resources"
-            )
-            printers = printers[:MAX_PRINTERS_PER_COLLECTION]
-
-        with _collection_state_lock:
-            _collection_runtime_state["printers_total"] = len(printers)
-
-        logger.info(f"Starting PARALLEL counter collection for {len(printers)} printers{filter_info}")
-        
-        # PRE-CARGA: Obtener todos los contadores anteriores en una sola consulta optimizada
-        logger.info("Pre-loading previous counters for all printers...")
-        printer_ids = [p.id for p in printers]
-        
-        # Subconsulta para obtener el último contador de cada impresora
-        from sqlalchemy import func
-        subquery = db.query(
-            MonthlyCounter.printer_id,
-            func.max(MonthlyCounter.recorded_at).label('max_recorded_at')
-        ).filter(
-            MonthlyCounter.printer_id.in_(printer_ids)
-        ).group_by(MonthlyCounter.printer_id).subquery()
-        
-        # Consulta principal para obtener los registros completos
-        previous_counters = db.query(MonthlyCounter).join(
-            subquery,
-            (MonthlyCounter.printer_id == subquery.c.printer_id) &
-            (MonthlyCounter.recorded_at == subquery.c.max_recorded_at)
-        ).all()
-        
-        # Crear cache (diccionario) de contadores anteriores
-        previous_counters_cache = {counter.printer_id: counter for counter in previous_counters}
-        logger.info(f"Pre-loaded {len(previous_counters_cache)} previous counter records")
-        
-        # Convertir objetos Printer a diccionarios para thread-safety
-        printer_data_list = []
-        for printer in printers:
-            printer_data_list.append({
-                'id': printer.id,
-                'ip': printer.ip,
-                'brand': printer.brand,
-                'model': printer.model,
-                'snmp_profile': printer.snmp_profile,
-                'location': printer.location
-            })
-        
-        # Calcular número óptimo de workers (máximo 10 para no saturar la red)
-        max_workers = min(len(printers), MAX_COLLECTION_WORKERS)
-        logger.info(f"Using {max_workers} parallel workers for processing")
-        
-        # Procesamiento paralelo con ThreadPoolExecutor
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Enviar todas las tareas con cache de contadores anteriores
-            future_to_printer = {
-                executor.submit(process_single_printer_threaded, printer_data, year, month, previous_counters_cache): printer_data 
-                for printer_data in printer_data_list
-            }
-            
-            # Recolectar resultados conforme se completen
-            for future in as_completed(future_to_printer):
-                printer_data = future_to_printer[future]
-                printers_processed += 1
-                
-                try:
-                    printer_result = future.result()
-                    
-                    # Compilar estadísticas thread-safe
-                    if printer_result.success:
-                        printers_successful += 1
-                        if printer_result.action_taken == "created":
-                            counters_created += 1
-                        elif printer_result.action_taken == "updated":
-                            counters_updated += 1
-                    else:
-                        printers_failed += 1
-                        if printer_result.error_message:
-                            errors.append(f"Printer {printer_data['id']} ({printer_data['ip']}): {printer_result.error_message}")
-                    
-                    results.append(printer_result.dict())
-                    logger.info(f"Completed printer {printer_data['id']}: success={printer_result.success}")
-
-                    with _collection_state_lock:
-                        _collection_runtime_state["printers_processed"] = printers_processed
-                        _collection_runtime_state["printers_successful"] = printers_successful
-                        _collection_runtime_state["printers_failed"] = printers_failed
-                    
-                except Exception as e:
-                    # Error en el futuro
-                    error_msg = f"Future error for printer {printer_data['id']}: {str(e)}"
-                    printers_failed += 1
-                    errors.append(error_msg)
-                    logger.error(error_msg)
-                    
-                    # Agregar resultado fallido
-                    failed_result = PrinterCounterData(
-                        printer_id=printer_data['id'],
-                        printer_ip=printer_data['ip'],
-                        printer_name=f"{printer_data['brand']} {printer_data['model']}",
-                        success=False,
-                        error_message=error_msg
-                    )
-                    results.append(failed_result.dict())
-                    with _collection_state_lock:
-                        _collection_runtime_state["printers_processed"] = printers_processed
-                        _collection_runtime_state["printers_successful"] = printers_successful
-                        _collection_runtime_state["printers_failed"] = printers_failed
-        
-        end_time = datetime.now()
-        execution_time = (end_time - start_time).total_seconds()
-        
-        success = printers_failed == 0
-        message = f"Processed {printers_processed} printers: {printers_successful} successful, {printers_failed} failed. Created {counters_created}, updated {counters_updated} counter records."
-        
-        logger.info(f"Counter collection completed: {message}")
-        
-        return CounterCollectionResult(
-            success=success,
-            message=message,
-            printers_processed=printers_processed,
-            printers_successful=printers_successful,
-            printers_failed=printers_failed,
-            counters_created=counters_created,
-            counters_updated=counters_updated,
-            errors=errors,
-            execution_time=execution_time,
-            results=results
+        run = collection_queue.enqueue_run(
+            collection_queue.KIND_COUNTERS,
+            target_ids,
+            source=collection_queue.SOURCE_MANUAL,
+            year=year,
+            month=month,
+            fresh_within_minutes=fresh_within_minutes,
+            priority=settings.collection_manual_priority
         )
-        
-    except Exception as e:
-        end_time = datetime.now()
-        execution_time = (end_time - start_time).total_seconds()
-        error_msg = f"Fatal error in counter collection: {str(e)}"
-        logger.error(error_msg)
-        
-        return CounterCollectionResult(
-            success=False,
-            message=error_msg,
-            printers_processed=printers_processed,
-            printers_successful=printers_successful,
-            printers_failed=printers_failed,
-            counters_created=counters_created,
-            counters_updated=counters_updated,
-            errors=[error_msg],
-            execution_time=execution_time,
-            results=results
+    except collection_queue.CollectionQueueError as e:
+        raise _queue_unavailable(e)
+    
+    if run is None:
+        raise HTTPException(
+            status_code=409,
+            detail="Ya hay una recoleccion de contadores en ejecucion. Espere a que finalice.",
         )
-    finally:
-        with _collection_state_lock:
-            _collection_runtime_state.update({
-                "is_running": False,
-                "started_at": None,
-                "mode": None,
-            })
-        _collection_lock.release()
+    
+    logger.info(f"Counter collection run {run['run_id']} queued for {len(target_ids)} printers")
+    return _run_status(run)
 
 @router.post("/collect/{printer_id}", response_model=PrinterCounterData)
 def collect_single_printer_counter(
@@ -796,7 +1009,9 @@ def collect_single_printer_counter(
     db: Session = Depends(get_db)
 ):
     """
-    Recolecta contadores de una impresora específica vía SNMP
+    Recolecta contadores de una impresora específica vía SNMP.
+    Si la impresora ya se está leyendo, espera esa lectura y devuelve su resultado
+    (action_taken='shared') en lugar de consultarla y registrar otro contador.
     """
     try:
         # Obtener impresora
@@ -811,75 +1026,20 @@ def collect_single_printer_counter(
         if not printer:
             raise HTTPException(status_code=404, detail="Printer not found or not active")
         
-        logger.info(f"Collecting counters for printer {printer.id}: {printer.brand} {printer.model} ({printer.ip})")
-        
-        # Verificar conectividad antes de SNMP
-        logger.info(f"Checking connectivity for printer {printer.ip}...")
-        ping_result = ping_printer(printer.ip, timeout=1.0)
-        
-        result = PrinterCounterData(
-            printer_id=printer.id,
-            printer_ip=printer.ip,
-            printer_name=f"{printer.brand} {printer.model}",
-            success=False,
-            response_time=ping_result['response_time'],
-            ping_check=ping_result['success']
+        flight = single_flight(
+            printer.id,
+            OP_COUNTERS,
+            lambda: _collect_printer_counter(printer, year, month, db).dict(),
+            holder="api:/counter-collection/collect"
         )
-        
-        if not ping_result['success']:
-            # Si no hay conectividad, retornar error inmediatamente
-            result.error_message = f"Sin conectividad: {ping_result['error']}"
-            logger.warning(f"No connectivity for printer {printer.id}: {ping_result['error']}")
-            return result
-        
-        logger.info(f"Connectivity OK for {printer.ip}, proceeding with counter collection...")
-        
-        # Verificar si es una impresora médica (no usa SNMP)
-        if 'DRYPIX' in printer.model.upper():
-            logger.info(f"Detected medical printer (DRYPIX) - using HTTP scraping")
-            printer_dict = {
-                'id': printer.id,
-                'ip': printer.ip,
-                'model': printer.model,
-                'brand': printer.brand
-            }
-            snmp_result = get_medical_printer_counters(printer_dict)
-        else:
-            # Obtener contadores vía SNMP (solo si hay conectividad)
-            snmp_result = get_printer_counters_via_snmp(printer.ip, printer.snmp_profile)
-        
-        # Actualizar el objeto result con datos de SNMP
-        result.success = snmp_result['success']
-        result.response_time = snmp_result['response_time']
-        
-        if snmp_result['success']:
-            counters = snmp_result['counters']
-            result.counter_bw = counters['bw_counter']
-            result.counter_color = counters['color_counter']
-            result.counter_total = counters['total_counter']
-            result.profile_used = counters['profile_used']
-            
-            # Crear o actualizar registro MonthlyCounter
-            action, counter_record = create_or_update_monthly_counter(
-                printer_id=printer.id,
-                counter_bw=counters['bw_counter'],
-                counter_color=counters['color_counter'],
-                counter_total=counters['total_counter'],
-                db=db,
-                year=year,
-                month=month,
-                location_snapshot=printer.location
-            )
-            
-            result.action_taken = action
-            logger.info(f"Successfully processed printer {printer.id}: {action} counter record")
-            
-        else:
-            result.error_message = snmp_result['error']
-            logger.error(f"Failed to get counters for printer {printer.id}: {snmp_result['error']}")
-        
+        result = PrinterCounterData(**flight.value)
+        if flight.shared:
+            result.action_taken = "shared"
         return result
         
+    except PrinterBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -887,6 +1047,78 @@ def collect_single_printer_counter(
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
+def _collect_printer_counter(printer: Printer, year: Optional[int], month: Optional[int], db: Session) -> PrinterCounterData:
+    """Lectura y registro del contador de una impresora (corre con el lease de la impresora)."""
+    logger.info(f"Collecting counters for printer {printer.id}: {printer.brand} {printer.model} ({printer.ip})")
+    
+    # Verificar conectividad antes de SNMP (solicitud explícita: ignorar resultados cacheados)
+    logger.info(f"Checking connectivity for printer {printer.ip}...")
+    forget(printer.ip)
+    ping_result = ping_printer(printer.ip, timeout=1.0)
+    
+    result = PrinterCounterData(
+        printer_id=printer.id,
+        printer_ip=printer.ip,
+        printer_name=f"{printer.brand} {printer.model}",
+        success=False,
+        response_time=ping_result['response_time'],
+        ping_check=ping_result['success']
+    )
+    
+    if not ping_result['success']:
+        # Si no hay conectividad, retornar error inmediatamente
+        result.error_message = f"Sin conectividad: {ping_result['error']}"
+        logger.warning(f"No connectivity for printer {printer.id}: {ping_result['error']}")
+        return result
+    
+    logger.info(f"Connectivity OK for {printer.ip}, proceeding with counter collection...")
+    
+    # Verificar si es una impresora médica (no usa SNMP)
+    if 'DRYPIX' in printer.model.upper():
+        logger.info(f"Detected medical printer (DRYPIX) - using HTTP scraping")
+        printer_dict = {
+            'id': printer.id,
+            'ip': printer.ip,
+            'model': printer.model,
+            'brand': printer.brand
+        }
+        snmp_result = get_medical_printer_counters(printer_dict)
+    else:
+        # Obtener contadores vía SNMP (solo si hay conectividad)
+        snmp_result = get_printer_counters_via_snmp(printer.ip, printer.snmp_profile)
+    
+    # Actualizar el objeto result con datos de SNMP
+    result.success = snmp_result['success']
+    result.response_time = snmp_result['response_time']
+    
+    if snmp_result['success']:
+        counters = snmp_result['counters']
+        result.counter_bw = counters['bw_counter']
+        result.counter_color = counters['color_counter']
+        result.counter_total = counters['total_counter']
+        result.profile_used = counters['profile_used']
+        
+        # Crear o actualizar registro MonthlyCounter
+        action, counter_record = create_or_update_monthly_counter(
+            printer_id=printer.id,
+            counter_bw=counters['bw_counter'],
+            counter_color=counters['color_counter'],
+            counter_total=counters['total_counter'],
+            db=db,
+            year=year,
+            month=month,
+            location_snapshot=printer.location
+        )
+        
+        result.action_taken = action
+        logger.info(f"Successfully processed printer {printer.id}: {action} counter record")
+        
+    else:
+        result.error_message = snmp_result['error']
+        logger.error(f"Failed to get counters for printer {printer.id}: {snmp_result['error']}")
+    
+    return result
+
 @router.get("/test/{printer_id}")
 def test_printer_snmp(printer_id: int, db: Session = Depends(get_db)):
     """
@@ -903,6 +1135,7 @@ def test_printer_snmp(printer_id: int, db: Session = Depends(get_db)):
         
         # Primero probar conectividad básica
         logger.info(f"Testing basic connectivity for {printer.ip}...")
+        forget(printer.ip)
         ping_result = ping_printer(printer.ip, timeout=1.0)
         
         # Luego probar SNMP solo si hay conectividad
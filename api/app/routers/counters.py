@@ -12,10 +12,14 @@ import traceback
 import json
 
 from ..db import get_db
-from ..models import MonthlyCounter, Printer, CounterLocationExportHistory
+from ..models import MonthlyCounter, Printer, CounterLocationExportHistory, PrinterLatestCounter, CounterAnomaly
 from ..services.snmp import SNMPService
 from ..services.export_service import ExportService
-from ..services.location_counter_sync import sync_location_segments_for_printer_month
+from ..services.latest_counters import record_latest_counter, refresh_latest_counter
+from ..services.location_counter_sync import (
+    apply_new_counters_to_segments,
+    sync_location_segments_for_printer_month
+)
 
 router = APIRouter()
 
@@ -128,11 +132,23 @@ MONTH_NAMES_ES = {
 }
 
 def calculate_pages_printed(current: int, previous: int) -> int:
-    """Calculate pages printed, ensuring non-negative result"""
+    """
+    Calculate pages printed, ensuring non-negative result.
+    Negative deltas (resets, wraps) are flagged by services/counter_anomalies.
+    """
     return max(0, current - previous)
 
-def get_previous_counter(db: Session, printer_id: int, exclude_counter_id: int = None) -> Optional[MonthlyCounter]:
+def get_previous_counter(
+    db: Session,
+    printer_id: int,
+    exclude_counter_id: int = None
+) -> Optional[MonthlyCounter | PrinterLatestCounter]:
     """Get the most recent previous counter for a printer by recorded_at date"""
+    # Fast path: primary-key lookup on the latest-counter table
+    latest = db.get(PrinterLatestCounter, printer_id)
+    if latest is not None and (not exclude_counter_id or latest.counter_id != exclude_counter_id):
+        return latest
+    
     query = db.query(MonthlyCounter).filter(
         MonthlyCounter.printer_id == printer_id
     )
@@ -328,7 +344,12 @@ def create_monthly_counter(counter: MonthlyCounterCreate, db: Session = Depends(
         db_counter.recorded_at = counter.recorded_at
     
     db.add(db_counter)
-    sync_location_segments_for_printer_month(db, counter.printer_id, counter.year, counter.month)
+    if counter.recorded_at:
+        # Registro con fecha explícita (puede ser retroactivo): recálculo completo del mes
+        sync_location_segments_for_printer_month(db, counter.printer_id, counter.year, counter.month)
+    else:
+        apply_new_counters_to_segments(db, [db_counter])
+    record_latest_counter(db, db_counter)
     db.commit()
     db.refresh(db_counter)
     
@@ -411,6 +432,7 @@ def update_monthly_counter(
     db_counter.notes = counter_update.notes
     
     sync_location_segments_for_printer_month(db, db_counter.printer_id, db_counter.year, db_counter.month)
+    refresh_latest_counter(db, db_counter.printer_id)
     db.commit()
     db.refresh(db_counter)
     
@@ -458,8 +480,14 @@ def delete_monthly_counter(counter_id: int, db: Session = Depends(get_db)):
     target_year = db_counter.year
     target_month = db_counter.month
     
+    # Sin FK en la tabla particionada: las anomalías de la lectura se limpian acá
+    db.query(CounterAnomaly).filter(CounterAnomaly.counter_id == counter_id).delete(synchronize_session=False)
+    db.query(CounterAnomaly).filter(CounterAnomaly.previous_counter_id == counter_id).update(
+        {"previous_counter_id": None}, synchronize_session=False
+    )
     db.delete(db_counter)
     sync_location_segments_for_printer_month(db, target_printer, target_year, target_month)
+    refresh_latest_counter(db, target_printer)
     db.commit()
     
     return {"message": "Counter record deleted successfully"}
@@ -695,9 +723,8 @@ def toggle_counter_lock(counter_id: int, db: Session = Depends(get_db)):
 # AUTO COUNTER MODULE - Módulo de Toma Automática de Contadores
 # ============================================================================
 
-# Scheduler global para las lecturas automáticas
+# Scheduler global para las lecturas automáticas (se inicia en main.lifespan)
 auto_scheduler = BackgroundScheduler()
-auto_scheduler.start()
 
 # Configuraciones activas en memoria
 active_configs: Dict[int, 'AutoCounterConfig'] = {}
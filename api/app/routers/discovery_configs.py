@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
+import json
 from app.db import get_db
-from app.models import DiscoveryConfig
+from app.models import DiscoveryConfig, DiscoverySweepRun
+from app.workers.discovery_sweeps import run_single_sweep_now, is_sweep_running
 
 router = APIRouter()
 
@@ -13,12 +15,14 @@ class DiscoveryConfigCreate(BaseModel):
     name: str
     ip_ranges: str
     description: str = None
+    sweep_enabled: bool = False
 
 class DiscoveryConfigUpdate(BaseModel):
     name: str = None
     ip_ranges: str = None
     description: str = None
     is_active: bool = None
+    sweep_enabled: bool = None
 
 class DiscoveryConfigResponse(BaseModel):
     id: int
@@ -26,12 +30,31 @@ class DiscoveryConfigResponse(BaseModel):
     ip_ranges: str
     description: Optional[str] = None
     is_active: bool
+    sweep_enabled: bool = False
+    last_sweep_at: Optional[datetime] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
+class DiscoverySweepRunResponse(BaseModel):
+    id: int
+    config_id: int
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    status: str
+    trigger: Optional[str] = None
+    ips_scanned: int
+    ips_responsive: int
+    printers_found: int
+    known_printers: int
+    new_devices: int
+    ip_changes: int
+    duration_seconds: Optional[float] = None
+    message: Optional[str] = None
+    details: Optional[dict] = None
+
 @router.get("/configs", response_model=List[DiscoveryConfigResponse])
 def get_discovery_configs(db: Session = Depends(get_db)):
     """Obtener todas las configuraciones de descubrimiento"""
@@ -136,4 +159,63 @@ def get_discovery_config(config_id: int, db: Session = Depends(get_db)):
             detail="Configuración no encontrada"
         )
     
-    return config
\ No newline at end of file
+    return config
+
+def _sweep_run_to_response(run: DiscoverySweepRun) -> DiscoverySweepRunResponse:
+    return DiscoverySweepRunResponse(
+        id=run.id,
+        config_id=run.config_id,
+        started_at=run.started_at,
+        finished_at=run.finished_at,
+        status=run.status,
+        trigger=run.trigger,
+        ips_scanned=run.ips_scanned or 0,
+        ips_responsive=run.ips_responsive or 0,
+        printers_found=run.printers_found or 0,
+        known_printers=run.known_printers or 0,
+        new_devices=run.new_devices or 0,
+        ip_changes=run.ip_changes or 0,
+        duration_seconds=run.duration_seconds,
+        message=run.message,
+        details=json.loads(run.details) if run.details else None
+    )
+
+@router.get("/sweeps", response_model=List[DiscoverySweepRunResponse])
+def get_discovery_sweeps(
+    config_id: Optional[int] = None,
+    limit: int = 50,
+    db: Session = Depends(get_db)
+):
+    """Historial de barridos automáticos de descubrimiento"""
+    query = db.query(DiscoverySweepRun)
+    if config_id is not None:
+        query = query.filter(DiscoverySweepRun.config_id == config_id)
+    runs = query.order_by(DiscoverySweepRun.started_at.desc()).limit(limit).all()
+    return [_sweep_run_to_response(run) for run in runs]
+
+@router.post("/configs/{config_id}/sweep")
+def trigger_discovery_sweep(
+    config_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """Lanza en segundo plano un barrido de la configuración, fuera de la ventana programada"""
+    config = db.query(DiscoveryConfig).filter(
+        DiscoveryConfig.id == config_id,
+        DiscoveryConfig.is_active == True
+    ).first()
+    
+    if not config:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Configuración no encontrada"
+        )
+    
+    if is_sweep_running():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Ya hay un barrido de descubrimiento en ejecución"
+        )
+    
+    background_tasks.add_task(run_single_sweep_now, config_id)
+    return {"message": f"Barrido de '{config.name}' iniciado en segundo plano"}
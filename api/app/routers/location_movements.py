@@ -14,6 +14,7 @@ import logging
 from ..db import get_db
 from ..models import PrinterMovement, LocationCounterSegment, Printer, MonthlyCounter
 from ..services.snmp import SNMPService
+from ..services.location_counter_sync import rebuild_location_segments_for_month
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -303,57 +304,17 @@ def sync_segments_from_monthly_counters(
 ):
     """
     Sync location counter segments from monthly_counters table.
-    For each monthly_counter record, create or update segments.
-    This is typically called after counter collection.
+    Full recompute of the automatic segments (movement_id NULL) for the period,
+    aggregated in a single SQL query. Manual segments from movements are not touched.
     """
 
     try:
-        # Get all monthly counters for this period
-        counters = db.query(MonthlyCounter)\
-            .filter(
-                and_(
-                    MonthlyCounter.year == year,
-                    MonthlyCounter.month == month
-                )
-            ).all()
-
-        created_count = 0
-
-        for counter in counters:
-            # Try to find existing segment for this printer/location/month
-            segment = db.query(LocationCounterSegment)\
-                .filter(
-                    and_(
-                        LocationCounterSegment.printer_id == counter.printer_id,
-                        LocationCounterSegment.location == (counter.location_snapshot or "Descubierto automaticamente"),
-                        LocationCounterSegment.year == year,
-                        LocationCounterSegment.month == month
-                    )
-                ).first()
-
-            if not segment:
-                # Create new segment (full month by default)
-                segment = LocationCounterSegment(
-                    printer_id=counter.printer_id,
-                    location=counter.location_snapshot or "Descubierto automaticamente",
-                    year=year,
-                    month=month,
-                    segment_start_date=1,
-                    segment_end_date=31,  # Full month
-                    counter_total_start=counter.counter_total,
-                    counter_total_end=counter.counter_total,
-                    pages_total=0,
-                    data_quality="real"
-                )
-                db.add(segment)
-                created_count += 1
-
+        summary = rebuild_location_segments_for_month(db, year, month)
         db.commit()
 
         return {
             "status": "success",
-            "created_segments": created_count,
-            "total_counters": len(counters)
+            **summary
         }
 
     except Exception as e:
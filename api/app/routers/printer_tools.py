@@ -12,6 +12,7 @@ import json
 from ..db import get_db
 from ..models import Printer
 from ..services.snmp import SNMPService
+from ..services.reachability import PROTOCOL_ICMP, forget, record_probe
 
 router = APIRouter()
 
@@ -59,6 +60,9 @@ async def test_connectivity(printer_id: int, db: Session = Depends(get_db)):
         "timestamp": datetime.now().isoformat()
     }
     
+    # Es un diagnóstico explícito: sondear de nuevo aunque la caché diga que está caída
+    forget(printer.ip)
+    
     # Test de ping
     ping_result = await _test_ping(printer.ip)
     result["tests"]["ping"] = ping_result
@@ -287,6 +291,7 @@ async def _test_ping(ip: str) -> Dict[str, Any]:
         
         end_time = time.time()
         response_time = round((end_time - start_time) * 1000, 2)
+        record_probe(ip, PROTOCOL_ICMP, result.returncode == 0)
         
         return {
             "success": result.returncode == 0,
@@ -295,6 +300,7 @@ async def _test_ping(ip: str) -> Dict[str, Any]:
         }
         
     except subprocess.TimeoutExpired:
+        record_probe(ip, PROTOCOL_ICMP, False)
         return {
             "success": False,
             "response_time_ms": None,
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable
 from datetime import datetime
 import concurrent.futures
+import errno
 import ipaddress
+import selectors
 import socket
+import time
 
 from ..db import get_db
 from ..models import Printer, UsageReport, PrinterSupply, StockItem, LeaseContract, ContractPrinter
@@ -14,63 +17,25 @@ from ..services.medical_printer_service import (
     MedicalPrinterService, 
     is_medical_printer,
     discover_medical_printers,
-    discover_medical_printers_in_range
+    discover_medical_printers_in_range,
+    create_discovery_http_session,
+    probe_medical_printer,
+    DRYPIX_PORT
+)
+from ..services.reverse_dns import resolve_hostnames, get_cached_hostname
+from ..services.reachability import PROTOCOL_HTTP, PROTOCOL_TCP, get_host_reachability, is_known_down, record_probe
+from ..services.printer_lease import OP_USAGE, PrinterBusyError, single_flight
+from ..services.state_history import has_state, latest_states, record_states, usage_report_values
+from ..services.usage_rollups import add_usage_rollups, delete_usage_rollups
+from ..services.asset_tags import (
+    peek_asset_tags,
+    reserve_asset_tags,
+    release_unused_asset_tags,
+    register_asset_tag
 )
 
 router = APIRouter()
 
-def generate_sequential_asset_tag(db: Session, used_asset_tags: set) -> str:
-    """
-    Genera asset tags secuenciales en formato PRT-001, PRT-002, PRT-003, etc.
-    
-    Args:
-        db: Sesión de base de datos
-        used_asset_tags: Set de asset tags ya usados en el lote actual
-    
-    Returns:
-        str: Asset tag único en formato PRT-XXX
-    """
-    # Obtener todos los asset tags existentes que siguen el patrón PRT-XXX
-    existing_tags = db.query(Printer.asset_tag).filter(
-        Printer.asset_tag.like('PRT-%')
-    ).all()
-    
-    # Extraer números de los asset tags existentes
-    existing_numbers = set()
-    for tag_tuple in existing_tags:
-        tag = tag_tuple[0]
-        if tag and len(tag) == 7 and tag.startswith('PRT-'):
-            try:
-                number = int(tag[4:])  # Extraer los 3 dígitos después de "PRT-"
-                existing_numbers.add(number)
-            except ValueError:
-                continue
-    
-    # También verificar números usados en el lote actual
-    for tag in used_asset_tags:
-        if tag and len(tag) == 7 and tag.startswith('PRT-'):
-            try:
-                number = int(tag[4:])
-                existing_numbers.add(number)
-            except ValueError:
-                continue
-    
-    # Encontrar el siguiente número disponible (empezando desde 1)
-    next_number = 1
-    while next_number in existing_numbers:
-        next_number += 1
-    
-    # Generar el asset tag con formato PRT-XXX (3 dígitos con ceros a la izquierda)
-    return f"PRT-{next_number:03d}"
-    
-    # Encontrar el siguiente número disponible empezando desde 1
-    next_number = 1
-    while next_number in existing_numbers:
-        next_number += 1
-    
-    # Formatear como PRT-XXX (3 dígitos con ceros a la izquierda)
-    return f"PRT-{next_number:03d}"
-
 class PrinterCreate(BaseModel):
     # Información básica
     brand: str
@@ -313,6 +278,7 @@ def create_printer(printer: PrinterCreate, db: Session = Depends(get_db)):
     
     db_printer = Printer(**printer.dict())
     db.add(db_printer)
+    register_asset_tag(db, db_printer.asset_tag)
     db.commit()
     db.refresh(db_printer)
     return db_printer
@@ -366,6 +332,9 @@ def update_printer(printer_id: int, printer_update: PrinterUpdate, db: Session =
     for field, value in update_data.items():
         setattr(printer, field, value)
     
+    if 'asset_tag' in update_data:
+        register_asset_tag(db, update_data['asset_tag'])
+    
     # Actualizar timestamp
     printer.updated_at = datetime.now()
     
@@ -381,7 +350,7 @@ def delete_printer(printer_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Printer not found")
     
     # Check for related records
-    from ..models import MonthlyCounter, UsageReport
+    from ..models import MonthlyCounter, PrinterLatestCounter, UsageReport
     
     # Check monthly counters
     monthly_counters_count = db.query(MonthlyCounter).filter(MonthlyCounter.printer_id == printer_id).count()
@@ -391,8 +360,10 @@ def delete_printer(printer_id: int, db: Session = Depends(get_db)):
     
     if monthly_counters_count > 0 or usage_reports_count > 0:
         # Delete related records first
+        db.query(PrinterLatestCounter).filter(PrinterLatestCounter.printer_id == printer_id).delete()
         db.query(MonthlyCounter).filter(MonthlyCounter.printer_id == printer_id).delete()
         db.query(UsageReport).filter(UsageReport.printer_id == printer_id).delete()
+        delete_usage_rollups(db, [printer_id])
     
     # Now delete the printer
     db.delete(printer)
@@ -406,79 +377,97 @@ def delete_printer(printer_id: int, db: Session = Depends(get_db)):
 
 @router.post("/{printer_id}/poll")
 def poll_printer(printer_id: int, db: Session = Depends(get_db)):
-    """Force SNMP poll for a specific printer (or web scraping for medical printers)"""
+    """
+    Force SNMP poll for a specific printer (or web scraping for medical printers).
+    If the printer is already being polled, waits for that poll and returns its result.
+    """
     printer = db.query(Printer).filter(Printer.id == printer_id).first()
     if not printer:
         raise HTTPException(status_code=404, detail="Printer not found")
     
     try:
-        # Determinar si es impresora médica o estándar
-        if is_medical_printer(printer):
-            # Usar web scraping para impresoras médicas
-            medical_service = MedicalPrinterService()
-            data = medical_service.poll_printer(printer)
-            
-            if data is None:
-                raise HTTPException(
-                    status_code=500, 
-                    detail="Failed to poll medical printer - check connection and credentials"
-                )
-            
-            # Crear reporte de uso adaptado para impresoras médicas
-            # Las impresoras médicas usan "films" en lugar de "pages"
-            usage_report = UsageReport(
-                printer_id=printer.id,
-                date=datetime.utcnow(),
-                pages_printed_mono=data.get('pages_printed', 0),  # Films = pages para compatibilidad
-                pages_printed_color=0,  # DRYPIX no tiene color
-                toner_level_black=None,  # No aplica para DRYPIX
-                toner_level_cyan=None,
-                toner_level_magenta=None,
-                toner_level_yellow=None,
-                paper_level=data.get('summary', {}).get('total_available', 0),  # Films disponibles
-                status=data.get('status', 'online')
-            )
-            
-            db.add(usage_report)
-            db.commit()
-            
-            return {
-                "message": "Medical printer polled successfully", 
-                "data": data,
-                "printer_type": "medical"
-            }
-        else:
-            # Impresora estándar - usar SNMP
-            snmp_service = SNMPService()
-            data = snmp_service.poll_printer(printer.ip, printer.snmp_profile)
-            
-            # Create usage report
-            usage_report = UsageReport(
-                printer_id=printer.id,
-                date=datetime.utcnow(),
-                pages_printed_mono=data.get('pages_printed_mono', 0),
-                pages_printed_color=data.get('pages_printed_color', 0),
-                toner_level_black=data.get('toner_level_black'),
-                toner_level_cyan=data.get('toner_level_cyan'),
-                toner_level_magenta=data.get('toner_level_magenta'),
-                toner_level_yellow=data.get('toner_level_yellow'),
-                paper_level=data.get('paper_level'),
-                status=data.get('status', 'unknown')
-            )
-            
-            db.add(usage_report)
-            db.commit()
-            
-            return {
-                "message": "Printer polled successfully", 
-                "data": data,
-                "printer_type": "standard"
-            }
-    
+        flight = single_flight(printer.id, OP_USAGE, lambda: _poll_and_report(printer, db), holder="api:/printers/poll")
+    except PrinterBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to poll printer: {str(e)}")
+    
+    if flight.shared:
+        # Otro llamador ya leyó la impresora y guardó el reporte: se reutiliza su resultado
+        return {**flight.value, "shared": True}
+    return flight.value
+
+def _save_usage_report(db: Session, values: Dict[str, Any]) -> None:
+    """Guarda el reporte de uso con sus agregados y el cambio de tóner/estado (si lo hubo)"""
+    db.add(UsageReport(**usage_report_values(values)))
+    add_usage_rollups(db, [values])
+    record_states(db, [values])
+    db.commit()
+
+def _poll_and_report(printer: Printer, db: Session) -> Dict[str, Any]:
+    """Poll the printer and save a UsageReport (runs under the printer lease)"""
+    # Determinar si es impresora médica o estándar
+    if is_medical_printer(printer):
+        # Usar web scraping para impresoras médicas
+        medical_service = MedicalPrinterService()
+        data = medical_service.poll_printer(printer)
+        
+        if data is None:
+            raise HTTPException(
+                status_code=500, 
+                detail="Failed to poll medical printer - check connection and credentials"
+            )
+        
+        # Crear reporte de uso adaptado para impresoras médicas
+        # Las impresoras médicas usan "films" en lugar de "pages"
+        report_values = dict(
+            printer_id=printer.id,
+            date=datetime.utcnow(),
+            pages_printed_mono=data.get('pages_printed', 0),  # Films = pages para compatibilidad
+            pages_printed_color=0,  # DRYPIX no tiene color
+            toner_level_black=None,  # No aplica para DRYPIX
+            toner_level_cyan=None,
+            toner_level_magenta=None,
+            toner_level_yellow=None,
+            paper_level=data.get('summary', {}).get('total_available', 0),  # Films disponibles
+            status=data.get('status', 'online')
+        )
+        
+        _save_usage_report(db, report_values)
+        
+        return {
+            "message": "Medical printer polled successfully", 
+            "data": data,
+            "printer_type": "medical"
+        }
+    else:
+        # Impresora estándar - usar SNMP
+        snmp_service = SNMPService()
+        data = snmp_service.poll_printer(printer.ip, printer.snmp_profile)
+        
+        # Create usage report
+        report_values = dict(
+            printer_id=printer.id,
+            date=datetime.utcnow(),
+            pages_printed_mono=data.get('pages_printed_mono', 0),
+            pages_printed_color=data.get('pages_printed_color', 0),
+            toner_level_black=data.get('toner_level_black'),
+            toner_level_cyan=data.get('toner_level_cyan'),
+            toner_level_magenta=data.get('toner_level_magenta'),
+            toner_level_yellow=data.get('toner_level_yellow'),
+            paper_level=data.get('paper_level'),
+            status=data.get('status', 'unknown')
+        )
+        
+        _save_usage_report(db, report_values)
+        
+        return {
+            "message": "Printer polled successfully", 
+            "data": data,
+            "printer_type": "standard"
+        }
 
 @router.get("/{printer_id}/status")
 def get_printer_status(printer_id: int, db: Session = Depends(get_db)):
@@ -494,6 +483,9 @@ def get_printer_status(printer_id: int, db: Session = Depends(get_db)):
     if not latest_report:
         return {"message": "No status data available"}
     
+    # Tóner, papel y estado: del historial por cambios (los reportes viejos los traen en la fila)
+    state = latest_report if has_state(latest_report) else latest_states(db, [printer_id]).get(printer_id, latest_report)
+    
     # Determinar si es impresora médica
     is_medical = is_medical_printer(printer)
     
@@ -501,14 +493,15 @@ def get_printer_status(printer_id: int, db: Session = Depends(get_db)):
         "printer_id": printer.id,
         "printer_type": "medical" if is_medical else "standard",
         "model": printer.model,
-        "status": latest_report.status,
+        "status": state.status,
         "last_update": latest_report.created_at,
+        "reachability": get_host_reachability(printer.ip),
     }
     
     if is_medical:
         # Para impresoras médicas (DRYPIX, etc.)
         response.update({
-            "films_available": latest_report.paper_level,  # Films disponibles
+            "films_available": state.paper_level,  # Films disponibles
             "films_printed": latest_report.pages_printed_mono,  # Films impresos
             "message": "Medical printer - films data"
         })
@@ -516,12 +509,12 @@ def get_printer_status(printer_id: int, db: Session = Depends(get_db)):
         # Para impresoras estándar
         response.update({
             "toner_levels": {
-                "black": latest_report.toner_level_black,
-                "cyan": latest_report.toner_level_cyan,
-                "magenta": latest_report.toner_level_magenta,
-                "yellow": latest_report.toner_level_yellow
+                "black": state.toner_level_black,
+                "cyan": state.toner_level_cyan,
+                "magenta": state.toner_level_magenta,
+                "yellow": state.toner_level_yellow
             },
-            "paper_level": latest_report.paper_level,
+            "paper_level": state.paper_level,
             "pages_printed": {
                 "mono": latest_report.pages_printed_mono,
                 "color": latest_report.pages_printed_color
@@ -968,29 +961,72 @@ def sync_multiple_printers_snmp_data(printer_ids: List[int], db: Session = Depen
 
 import threading
 
-def ping_icmp(ip: str, timeout: int = 1) -> bool:
-    """Verifica si un host responde a ping TCP en varios puertos comunes"""
+def probe_ports(ip: str, ports: List[int], timeout: float = 1) -> List[int]:
+    """
+    Connect TCP no bloqueante a todos los puertos a la vez (un solo plazo de ``timeout``
+    para el conjunto, no por puerto).
+
+    Returns:
+        Puertos abiertos, en el orden de ``ports``
+    """
+    selector = selectors.DefaultSelector()
+    open_ports = set()
     try:
-        # Lista de puertos comunes para probar conectividad
-        common_ports = [80, 443, 161, 9100, 515, 631, 20051]  # HTTP, HTTPS, SNMP, IPP, LPR, CUPS, DRYPIX
-        
-        for port in common_ports:
+        for port in ports:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setblocking(False)
             try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(timeout)
                 result = sock.connect_ex((ip, port))
+            except OSError:
                 sock.close()
-                
-                # Si cualquier puerto responde, el host está "vivo"
-                if result == 0:
-                    return True
-            except:
                 continue
-        
-        return False
-        
-    except Exception:
-        return False
+            if result == 0:
+                open_ports.add(port)
+                sock.close()
+            elif result in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+                selector.register(sock, selectors.EVENT_WRITE, port)
+            else:
+                sock.close()
+
+        deadline = time.monotonic() + timeout
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for key, _ in selector.select(remaining):
+                if key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    open_ports.add(key.data)
+                selector.unregister(key.fileobj)
+                key.fileobj.close()
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+    return [port for port in ports if port in open_ports]
+
+def ping_icmp(ip: str, timeout: int = 1) -> bool:
+    """Verifica si un host responde a ping TCP en alguno de varios puertos comunes (sondeados a la vez)"""
+    # HTTP, HTTPS, SNMP, IPP, LPR, CUPS, DRYPIX
+    return bool(probe_ports(ip, [80, 443, 161, 9100, 515, 631, DRYPIX_PORT], timeout=timeout))
+
+DISCOVERY_PORTS = [80, 443, 161, 9100, 515, 631]  # HTTP, HTTPS, SNMP, IPP, LPR, CUPS
+
+def scan_discovery_ports(ip: str, timeout: int = 1) -> List[int]:
+    """
+    Escaneo de puertos para descubrimiento: los puertos de impresora y el DRYPIX
+    (20051) se sondean a la vez, así una IP sin respuesta cuesta un solo ``timeout``.
+    El resultado del puerto DRYPIX queda en la caché para el pase médico.
+    
+    Returns:
+        Lista de puertos abiertos encontrados (vacía si el host no responde)
+    """
+    if is_known_down(ip, PROTOCOL_TCP):
+        return []
+    
+    open_ports = probe_ports(ip, [DRYPIX_PORT] + DISCOVERY_PORTS, timeout=timeout)
+    record_probe(ip, PROTOCOL_HTTP, DRYPIX_PORT in open_ports)
+    record_probe(ip, PROTOCOL_TCP, bool(open_ports))
+    return open_ports
 
 class DiscoveredDevice(BaseModel):
     ip: str
@@ -1025,16 +1061,29 @@ def ping_host(ip: str, timeout: int = 1) -> bool:
     except:
         return False
 
-def discover_single_device(ip: str, timeout: int = 3) -> DiscoveredDevice:
-    """Descubre un dispositivo individual en la IP especificada"""
+def discover_single_device(
+    ip: str,
+    timeout: int = 3,
+    on_port_scan: Optional[Callable[[str, List[int]], None]] = None
+) -> DiscoveredDevice:
+    """
+    Descubre un dispositivo individual en la IP especificada.
+    
+    on_port_scan se invoca con los puertos abiertos apenas termina el escaneo,
+    antes del trabajo SNMP, para que otros pases (p. ej. el médico) arranquen
+    en paralelo sin volver a sondear la IP.
+    """
     import time
     start_time = time.time()
     
     device = DiscoveredDevice(ip=ip)
     
     try:
-        # Verificar respuesta a ping ICMP primero
-        device.ping_response = ping_icmp(ip, timeout=1)
+        # Escaneo de puertos (equivalente a ping TCP)
+        open_ports = scan_discovery_ports(ip, timeout=1)
+        device.ping_response = bool(open_ports)
+        if on_port_scan:
+            on_port_scan(ip, open_ports)
         
         # Verificar conexión SNMP directamente
         snmp_service = SNMPService()
@@ -1042,12 +1091,7 @@ def discover_single_device(ip: str, timeout: int = 3) -> DiscoveredDevice:
             device.error = "No responde a SNMP"
             return device
         
-        # Obtener hostname si es posible
-        try:
-            hostname = socket.gethostbyaddr(ip)[0]
-            device.hostname = hostname
-        except:
-            pass
+        # El hostname se resuelve en lote al final del escaneo (ver fill_discovered_hostnames)
         
         # Usar el servicio SNMP+HTTP combinado para obtener información más completa
         combined_info = snmp_service.get_device_info_combined(ip)
@@ -1092,6 +1136,21 @@ def discover_single_device(ip: str, timeout: int = 3) -> DiscoveredDevice:
     
     return device
 
+def fill_discovered_hostnames(devices: List[DiscoveredDevice]) -> None:
+    """
+    Completa el hostname de los dispositivos descubiertos usando DNS inverso en lote.
+    Las IPs que no resuelven dentro del timeout quedan sin hostname y se
+    completan en la caché para escaneos posteriores.
+    """
+    pending_ips = [d.ip for d in devices if d.is_printer and not d.hostname]
+    if not pending_ips:
+        return
+    
+    hostnames = resolve_hostnames(pending_ips)
+    for device in devices:
+        if not device.hostname and hostnames.get(device.ip):
+            device.hostname = hostnames[device.ip]
+
 def parse_ip_range(ip_range: str) -> List[str]:
     """Convierte un rango de IPs en una lista de IPs individuales"""
     ips = []
@@ -1163,6 +1222,10 @@ def ping_single_ip(ip: str, timeout: int = 1) -> bool:
     # Timeout balanceado: más generoso para evitar perder dispositivos lentos
     balanced_timeout = min(2.0, timeout * 0.8)  # Máximo 2s por puerto, usar 80% del timeout total
     
+    # Host encontrado caído por otro sondeo reciente (descubrimiento, recolección, herramientas)
+    if is_known_down(ip, PROTOCOL_TCP):
+        return False
+    
     # Probar puertos en orden de prioridad con salida temprana
     for port in priority_ports:
         try:
@@ -1173,12 +1236,14 @@ def ping_single_ip(ip: str, timeout: int = 1) -> bool:
             
             if result == 0:
                 # ¡Encontramos un puerto abierto! Salir inmediatamente
+                record_probe(ip, PROTOCOL_TCP, True)
                 return True
                 
         except Exception:
             # Error de red, continuar con siguiente puerto
             continue
     
+    record_probe(ip, PROTOCOL_TCP, False)
     return False
 
 @router.post("/ping-range", response_model=PingRangeResponse)
@@ -1315,10 +1380,30 @@ def discover_printers(request: DiscoveryRequest, db: Session = Depends(get_db)):
     # Descubrir dispositivos en paralelo
     discovered_devices = []
     
+    # Pase médico concurrente: solo se sondean por HTTP las IPs con el puerto 20051
+    # abierto según el escaneo de puertos del pase SNMP, con un pool keep-alive compartido
+    medical_executor = None
+    medical_session = None
+    medical_futures: Dict[str, concurrent.futures.Future] = {}
+    medical_lock = threading.Lock()
+    
+    if request.include_medical:
+        medical_workers = min(20, request.max_workers)
+        medical_executor = concurrent.futures.ThreadPoolExecutor(max_workers=medical_workers)
+        medical_session = create_discovery_http_session(pool_size=medical_workers)
+    
+    def on_port_scan(ip: str, open_ports: List[int]):
+        if medical_executor is None or DRYPIX_PORT not in open_ports:
+            return
+        with medical_lock:
+            medical_futures[ip] = medical_executor.submit(
+                probe_medical_printer, ip, DRYPIX_PORT, request.timeout, medical_session, True
+            )
+    
     with concurrent.futures.ThreadPoolExecutor(max_workers=request.max_workers) as executor:
         # Crear tasks para cada IP
         future_to_ip = {
-            executor.submit(discover_single_device, ip, request.timeout): ip 
+            executor.submit(discover_single_device, ip, request.timeout, on_port_scan): ip 
             for ip in ip_list
         }
         
@@ -1341,15 +1426,20 @@ def discover_printers(request: DiscoveryRequest, db: Session = Depends(get_db)):
     
     # DESCUBRIMIENTO DE IMPRESORAS MÉDICAS (si está habilitado)
     if request.include_medical:
-        print("🏥 Iniciando descubrimiento de impresoras médicas...")
+        print(f"🏥 Esperando sondeos médicos ({len(medical_futures)} IPs con puerto {DRYPIX_PORT} abierto)...")
         
-        # Usar las mismas IPs que se escanearon para SNMP
-        medical_devices = discover_medical_printers(
-            ip_list=ip_list,
-            port=20051,  # Puerto estándar DRYPIX
-            timeout=request.timeout,
-            max_workers=min(20, request.max_workers)  # Limitar workers para web scraping
-        )
+        medical_devices = []
+        try:
+            for medical_ip, medical_future in medical_futures.items():
+                try:
+                    medical_info = medical_future.result()
+                    if medical_info:
+                        medical_devices.append(medical_info)
+                except Exception as e:
+                    print(f"❌ Error en sondeo médico de {medical_ip}: {str(e)}")
+        finally:
+            medical_executor.shutdown(wait=True)
+            medical_session.close()
         
         # Integrar dispositivos médicos encontrados
         for medical_info in medical_devices:
@@ -1402,6 +1492,9 @@ def discover_printers(request: DiscoveryRequest, db: Session = Depends(get_db)):
         medical_count = len([d for d in discovered_devices if d.is_medical])
         print(f"🏥 Descubrimiento médico completado: {medical_count} dispositivos médicos encontrados")
     
+    # Resolver hostnames en lote una vez terminado el escaneo
+    fill_discovered_hostnames(discovered_devices)
+    
     # Verificar si alguna de las IPs descubiertas ya existe en la base de datos
     for device in discovered_devices:
         if device.is_printer:
@@ -1517,6 +1610,8 @@ def discover_medical_printers_only(request: DiscoveryRequest, db: Session = Depe
     # Ordenar por IP
     discovered_devices.sort(key=lambda x: ipaddress.IPv4Address(x.ip))
     
+    fill_discovered_hostnames(discovered_devices)
+    
     elapsed_time = time.time() - start_time
     
     print(f"🏥 Descubrimiento médico completado: {len(discovered_devices)} impresoras médicas encontradas "
@@ -1535,7 +1630,8 @@ def validate_discovered_printers(
     Con manejo mejorado de asset tags únicos por lote
     """
     validation_results = []
-    used_asset_tags = set()  # Track asset tags used in this validation batch
+    # Previsualizar los próximos asset tags sin reservarlos (se reservan al agregar)
+    proposed_asset_tags = iter(peek_asset_tags(db, len(devices)))
     
     for device_data in devices:
         conflicts = []
@@ -1574,11 +1670,8 @@ def validate_discovered_printers(
                     }
                 })
         
-        # Generar asset tag secuencial en formato PRT-001, PRT-002, etc.
-        proposed_asset_tag = generate_sequential_asset_tag(db, used_asset_tags)
-        
-        # Marcar este asset tag como usado en esta validación
-        used_asset_tags.add(proposed_asset_tag)
+        # Asset tag secuencial propuesto en formato PRT-001, PRT-002, etc.
+        proposed_asset_tag = next(proposed_asset_tags)
         
         # Verificar si hay dispositivos similares en base de datos
         similar_devices = db.query(Printer).filter(
@@ -1627,9 +1720,13 @@ def add_discovered_printers(
     Con procesamiento individual para evitar fallos en lote y detección inteligente de cambios de IP
     """
     results = []
-    used_asset_tags = set()  # Track asset tags used in this operation
     snmp_service = SNMPService()
     
+    # Reservar de una vez un bloque de asset tags para todo el lote; la cola
+    # que no se use (duplicados, errores) se devuelve a la secuencia al final
+    reserved_asset_tags = reserve_asset_tags(db, len(devices))
+    next_tag_index = 0
+    
     for device_data in devices:
         try:
             # 🔍 BÚSQUEDA INTELIGENTE: Verificar si ya existe por serial o MAC
@@ -1706,11 +1803,9 @@ def add_discovered_printers(
                 })
                 continue
             
-            # Generar asset_tag secuencial en formato PRT-XXX
-            asset_tag = generate_sequential_asset_tag(db, used_asset_tags)
-            
-            # Marcar este asset tag como usado en esta operación
-            used_asset_tags.add(asset_tag)
+            # Tomar el siguiente asset_tag del bloque reservado (formato PRT-XXX)
+            asset_tag = reserved_asset_tags[next_tag_index]
+            next_tag_index += 1
             
             # Crear nueva impresora con valores seguros
             # Manejar serial_number vacío para evitar constraint duplicados
@@ -1724,7 +1819,7 @@ def add_discovered_printers(
                 serial_number=serial_number,
                 asset_tag=asset_tag,
                 ip=device_data['ip'],
-                hostname=device_data.get('hostname'),
+                hostname=device_data.get('hostname') or get_cached_hostname(device_data['ip'])[1],
                 snmp_profile=device_data.get('snmp_profile', 'generic_v2c'),
                 is_color=device_data.get('is_color', False),
                 printer_type='printer',
@@ -1764,6 +1859,12 @@ def add_discovered_printers(
                 'error': f"Error preparando impresora: {str(e)}"
             })
     
+    try:
+        release_unused_asset_tags(db, reserved_asset_tags[next_tag_index:])
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ No se pudieron liberar asset tags no utilizados: {str(e)}")
+    
     success_count = sum(1 for r in results if r['success'])
     total_count = len(results)
     
@@ -1898,7 +1999,7 @@ def bulk_delete_printers(request: dict, db: Session = Depends(get_db)):
     """Elimina múltiples impresoras y todos sus registros relacionados"""
     from ..models import (
         Incident, UsageReport, MonthlyCounter, CounterReading, 
-        InvoiceLine, ContractPrinter
+        InvoiceLine, ContractPrinter, PrinterLatestCounter
     )
     
     printer_ids = request.get("printer_ids", [])
@@ -1929,8 +2030,12 @@ def bulk_delete_printers(request: dict, db: Session = Depends(get_db)):
         usage_reports_deleted = db.query(UsageReport).filter(UsageReport.printer_id.in_(existing_ids)).delete(
             synchronize_session=False
         )
+        delete_usage_rollups(db, existing_ids)
         
-        # 3. Eliminar contadores mensuales
+        # 3. Eliminar contadores mensuales (y su última lectura)
+        db.query(PrinterLatestCounter).filter(PrinterLatestCounter.printer_id.in_(existing_ids)).delete(
+            synchronize_session=False
+        )
         monthly_counters_deleted = db.query(MonthlyCounter).filter(MonthlyCounter.printer_id.in_(existing_ids)).delete(
             synchronize_session=False
         )
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+from sqlalchemy import func
 from typing import List, Optional
 from datetime import datetime, timedelta
 
 from ..db import get_db
-from ..models import UsageReport, Printer
+from ..models import UsageReport, UsageRollupHourly, UsageRollupMonthly, Printer
+from ..services.state_history import has_state, latest_states, states_at
 
 router = APIRouter()
 
@@ -38,9 +39,13 @@ def get_usage_report(
     
     reports = query.order_by(UsageReport.date.desc()).all()
     
+    # Tóner, papel y estado del historial por cambios (los reportes viejos los traen en la fila)
+    states = states_at(db, [(report.printer_id, report.date) for report in reports if not has_state(report)])
+    
     # Add printer info to each report
     result = []
     for report in reports:
+        state = report if has_state(report) else states.get((report.printer_id, report.date), report)
         printer = db.query(Printer).filter(Printer.id == report.printer_id).first()
         result.append({
             "id": report.id,
@@ -54,13 +59,13 @@ def get_usage_report(
             "pages_printed_mono": report.pages_printed_mono,
             "pages_printed_color": report.pages_printed_color,
             "toner_levels": {
-                "black": report.toner_level_black,
-                "cyan": report.toner_level_cyan,
-                "magenta": report.toner_level_magenta,
-                "yellow": report.toner_level_yellow
+                "black": state.toner_level_black,
+                "cyan": state.toner_level_cyan,
+                "magenta": state.toner_level_magenta,
+                "yellow": state.toner_level_yellow
             },
-            "paper_level": report.paper_level,
-            "status": report.status,
+            "paper_level": state.paper_level,
+            "status": state.status,
             "created_at": report.created_at
         })
     
@@ -76,30 +81,29 @@ def get_monthly_usage(
     if not year:
         year = datetime.now().year
     
+    # Agregados mensuales (usage_rollups_monthly): a lo sumo 12 filas por impresora
+    month_start = UsageRollupMonthly.bucket_start
     query = db.query(
-        extract('month', UsageReport.date).label('month'),
-        func.sum(UsageReport.pages_printed_mono).label('total_mono'),
-        func.sum(UsageReport.pages_printed_color).label('total_color'),
-        func.count(UsageReport.id).label('report_count')
+        month_start.label('month_start'),
+        func.sum(UsageRollupMonthly.pages_mono).label('total_mono'),
+        func.sum(UsageRollupMonthly.pages_color).label('total_color'),
+        func.sum(UsageRollupMonthly.report_count).label('report_count')
     ).filter(
-        extract('year', UsageReport.date) == year
+        month_start >= datetime(year, 1, 1),
+        month_start < datetime(year + 1, 1, 1)
     )
     
     if printer_id:
-        query = query.filter(UsageReport.printer_id == printer_id)
+        query = query.filter(UsageRollupMonthly.printer_id == printer_id)
     
-    monthly_data = query.group_by(
-        extract('month', UsageReport.date)
-    ).order_by(
-        extract('month', UsageReport.date)
-    ).all()
+    monthly_data = query.group_by(month_start).all()
     
     # Create a complete 12-month dataset
     months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
               'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
     
     result = []
-    data_dict = {int(row.month): row for row in monthly_data}
+    data_dict = {row.month_start.month: row for row in monthly_data}
     
     for i in range(1, 13):
         if i in data_dict:
@@ -127,21 +131,21 @@ def get_monthly_usage(
 @router.get("/toner")
 def get_toner_levels(db: Session = Depends(get_db)):
     """Get current toner levels for all printers"""
-    # Get the latest report for each printer
-    subquery = db.query(
-        UsageReport.printer_id,
-        func.max(UsageReport.created_at).label('latest')
-    ).group_by(UsageReport.printer_id).subquery()
-    
-    latest_reports = db.query(UsageReport).join(
-        subquery,
-        (UsageReport.printer_id == subquery.c.printer_id) &
-        (UsageReport.created_at == subquery.c.latest)
-    ).all()
+    # Último estado de cada impresora en el historial por cambios
+    states = latest_states(db)
+    printers = {
+        printer.id: printer for printer in db.query(Printer).filter(Printer.id.in_(list(states)))
+    } if states else {}
+    
+    # Última lectura (el estado solo se guarda al cambiar); ventana corta sobre (printer_id, date)
+    last_seen = dict(db.query(UsageReport.printer_id, func.max(UsageReport.date)).filter(
+        UsageReport.printer_id.in_(list(printers)),
+        UsageReport.date >= datetime.utcnow() - timedelta(days=2)
+    ).group_by(UsageReport.printer_id).all()) if printers else {}
     
     result = []
-    for report in latest_reports:
-        printer = db.query(Printer).filter(Printer.id == report.printer_id).first()
+    for printer_id, state in states.items():
+        printer = printers.get(printer_id)
         if printer:
             result.append({
                 "printer_id": printer.id,
@@ -151,14 +155,14 @@ def get_toner_levels(db: Session = Depends(get_db)):
                     "location": printer.location
                 },
                 "toner_levels": {
-                    "black": report.toner_level_black,
-                    "cyan": report.toner_level_cyan,
-                    "magenta": report.toner_level_magenta,
-                    "yellow": report.toner_level_yellow
+                    "black": state.toner_level_black,
+                    "cyan": state.toner_level_cyan,
+                    "magenta": state.toner_level_magenta,
+                    "yellow": state.toner_level_yellow
                 },
-                "paper_level": report.paper_level,
-                "status": report.status,
-                "last_update": report.created_at
+                "paper_level": state.paper_level,
+                "status": state.status,
+                "last_update": last_seen.get(printer_id, state.recorded_at)
             })
     
     return result
@@ -169,25 +173,22 @@ def get_summary_stats(db: Session = Depends(get_db)):
     # Total printers
     total_printers = db.query(Printer).count()
     
-    # Active printers (those with reports in last 24 hours)
-    yesterday = datetime.utcnow() - timedelta(days=1)
-    active_printers = db.query(UsageReport.printer_id).filter(
-        UsageReport.created_at >= yesterday
+    # Active printers (those with reports in last 24 hours, by hourly rollup)
+    last_hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    active_printers = db.query(UsageRollupHourly.printer_id).filter(
+        UsageRollupHourly.bucket_start >= last_hour - timedelta(days=1)
     ).distinct().count()
     
     # Total pages printed this month
     current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     monthly_stats = db.query(
-        func.sum(UsageReport.pages_printed_mono).label('total_mono'),
-        func.sum(UsageReport.pages_printed_color).label('total_color')
-    ).filter(UsageReport.date >= current_month).first()
+        func.sum(UsageRollupMonthly.pages_mono).label('total_mono'),
+        func.sum(UsageRollupMonthly.pages_color).label('total_color')
+    ).filter(UsageRollupMonthly.bucket_start >= current_month).first()
     
     # Low toner alerts (< 20%)
-    low_toner_count = db.query(UsageReport.printer_id).filter(
-        (UsageReport.toner_level_black < 20) |
-        (UsageReport.toner_level_cyan < 20) |
-        (UsageReport.toner_level_magenta < 20) |
-        (UsageReport.toner_level_yellow < 20)
+    low_toner_count = db.query(UsageRollupMonthly.printer_id).filter(
+        UsageRollupMonthly.min_toner_level < 20
     ).distinct().count()
     
     return {
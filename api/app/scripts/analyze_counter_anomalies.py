@@ -0,0 +1,44 @@
+"""
+Analyze the monthly_counters history for anomalies and print the open ones.
+Replaces the ad-hoc analyze_counters.py / check_duplicates.py scripts.
+
+Usage: python -m app.scripts.analyze_counter_anomalies [printer_id]
+"""
+
+import sys
+sys.path.append('/app')
+
+from app.db import SessionLocal
+from app.models import CounterAnomaly
+from app.services.counter_anomalies import analyze_counters
+
+def main():
+    printer_ids = [int(sys.argv[1])] if len(sys.argv) > 1 else None
+    db = SessionLocal()
+
+    try:
+        summary = analyze_counters(db, printer_ids)
+        print(f"Impresoras analizadas: {summary['printers_analyzed']}")
+        print(f"Lecturas analizadas: {summary['readings_analyzed']}")
+        print(f"Tiempos: {summary['timings']}")
+        print()
+        for kind, count in summary['by_kind'].items():
+            print(f"  {kind:10s}: {count:5d}")
+
+        query = db.query(CounterAnomaly).filter(CounterAnomaly.acknowledged.is_(False))
+        if printer_ids:
+            query = query.filter(CounterAnomaly.printer_id.in_(printer_ids))
+        anomalies = query.order_by(CounterAnomaly.recorded_at.desc()).limit(50).all()
+
+        print()
+        print("🔍 ANOMALÍAS SIN REVISAR (últimas 50):")
+        print("-" * 100)
+        for a in anomalies:
+            print(f"⚠️  {a.recorded_at:%Y-%m-%d %H:%M} | Printer {a.printer_id:5d} | {a.kind:9s} | {a.details}")
+        if not anomalies:
+            print("✅ No se encontraron anomalías")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Sondeo de uso adaptativo: intervalo propio por impresora (printer_poll_schedules).
+
+El job poll_printers corre cada polling_min_interval_minutes y solo sondea las
+impresoras con next_poll_at vencido. Después de cada sondeo el intervalo se
+recalcula con el ritmo de la ventana polling_rate_lookback_days:
+
+- páginas por día: incrementos de contadores (mono + color) entre usage_reports
+  válidos consecutivos de la ventana (sin sondeos fallidos ni reinicios de contador);
+- consumo de tóner: bajadas acumuladas por color en printer_state_changes (las
+  subidas son cambios de cartucho y no cuentan), el color que más baja.
+
+El intervalo es el tiempo en que se esperan polling_target_pages_per_poll páginas o
+polling_target_toner_points_per_poll puntos de tóner (lo que llegue antes), acotado
+entre polling_min_interval_minutes y polling_max_interval_minutes. Una impresora sin
+historial suficiente se sondea al máximo (como el sondeo diario) hasta tenerlo; un
+sondeo fallido se reintenta en el próximo tick sin cambiar el intervalo. Los agregados
+de /reports suman incrementos de contadores (services.usage_rollups), así que varios
+reportes por día no inflan los totales.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import dialect_insert
+from ..models import PrinterPollSchedule, PrinterStateChange, UsageReport
+from .usage_rollups import is_valid_reading
+
+_TONER_FIELDS = ("toner_level_black", "toner_level_cyan", "toner_level_magenta", "toner_level_yellow")
+_MIN_SPAN_DAYS = 1 / 24  # Menos de una hora de historial no da un ritmo confiable
+
+
+def poll_interval_minutes(pages_per_day: Optional[float], toner_drop_per_day: Optional[float]) -> int:
+    """Intervalo de sondeo para los ritmos dados (None = desconocido)."""
+    shortest = settings.polling_min_interval_minutes
+    longest = max(shortest, settings.polling_max_interval_minutes)
+    if pages_per_day is None and toner_drop_per_day is None:
+        return longest
+
+    candidates = [longest]
+    if pages_per_day:
+        candidates.append(settings.polling_target_pages_per_poll / pages_per_day * 1440)
+    if toner_drop_per_day:
+        candidates.append(settings.polling_target_toner_points_per_poll / toner_drop_per_day * 1440)
+    return int(max(shortest, min(candidates)))
+
+
+def not_due(db: Session, printer_ids: List[int], now: datetime) -> Set[int]:
+    """Impresoras de la lista cuyo próximo sondeo todavía no llegó."""
+    if not printer_ids:
+        return set()
+    return {
+        printer_id for (printer_id,) in db.query(PrinterPollSchedule.printer_id).filter(
+            PrinterPollSchedule.printer_id.in_(printer_ids),
+            PrinterPollSchedule.next_poll_at > now
+        )
+    }
+
+
+def _naive_utc(moment: datetime) -> datetime:
+    # Las columnas timezone=True vuelven con zona en PostgreSQL; ``now`` es utcnow() sin zona
+    return moment.astimezone(timezone.utc).replace(tzinfo=None) if moment.tzinfo else moment
+
+
+def _span_days(start: datetime, end: datetime) -> float:
+    return (_naive_utc(end) - _naive_utc(start)).total_seconds() / 86400
+
+
+def page_rates(db: Session, printer_ids: List[int], now: datetime) -> Dict[int, float]:
+    """
+    Páginas por día en la ventana (solo impresoras con al menos una hora de historial).
+    Se ignoran las lecturas fallidas (estado offline o contadores en cero, ver
+    SNMPService._offline_poll_data) y las bajadas del contador (reinicios): el ritmo
+    es la suma de los incrementos entre lecturas válidas consecutivas.
+    """
+    rows = db.query(
+        UsageReport.printer_id, UsageReport.date, UsageReport.pages_printed_mono,
+        UsageReport.pages_printed_color, UsageReport.status
+    ).filter(
+        UsageReport.printer_id.in_(printer_ids),
+        UsageReport.date >= now - timedelta(days=settings.polling_rate_lookback_days)
+    ).order_by(UsageReport.printer_id, UsageReport.date, UsageReport.id)
+
+    history: Dict[int, List[Tuple[datetime, int]]] = defaultdict(list)
+    for printer_id, date, mono, color, status in rows:
+        if is_valid_reading(mono, color, status):
+            history[printer_id].append((date, (mono or 0) + (color or 0)))
+
+    rates = {}
+    for printer_id, readings in history.items():
+        span = _span_days(readings[0][0], readings[-1][0])
+        if span >= _MIN_SPAN_DAYS:
+            pages = sum(max(0, after - before) for (_, before), (_, after) in zip(readings, readings[1:]))
+            rates[printer_id] = pages / span
+    return rates
+
+
+def toner_rates(db: Session, printer_ids: List[int], now: datetime) -> Dict[int, float]:
+    """Puntos de tóner por día del color que más baja en la ventana."""
+    rows = db.query(PrinterStateChange).filter(
+        PrinterStateChange.printer_id.in_(printer_ids),
+        PrinterStateChange.recorded_at >= now - timedelta(days=settings.polling_rate_lookback_days)
+    ).order_by(PrinterStateChange.printer_id, PrinterStateChange.recorded_at, PrinterStateChange.id)
+
+    history: Dict[int, List[PrinterStateChange]] = defaultdict(list)
+    for row in rows:
+        history[row.printer_id].append(row)
+
+    rates = {}
+    for printer_id, changes in history.items():
+        span = _span_days(changes[0].recorded_at, now)
+        if span < _MIN_SPAN_DAYS:
+            continue
+        drops = []
+        for field in _TONER_FIELDS:
+            levels = [getattr(change, field) for change in changes if getattr(change, field) is not None]
+            drops.append(sum(max(0.0, before - after) for before, after in zip(levels, levels[1:])))
+        rates[printer_id] = max(drops) / span
+    return rates
+
+
+def _upsert(db: Session, rows: List[Dict[str, Any]], columns: Iterable[str]) -> None:
+    table = PrinterPollSchedule.__table__
+    stmt = dialect_insert(db)(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.printer_id],
+        set_={column: stmt.excluded[column] for column in columns},
+    )
+    db.execute(stmt)
+
+
+def reschedule(
+    db: Session, polled_ids: List[int], failed_ids: List[int], now: datetime,
+    hold_until: Optional[datetime] = None
+) -> Dict[int, int]:
+    """
+    Recalcula el intervalo de las impresoras sondeadas con éxito y reprograma las que
+    fallaron para el próximo tick. ``hold_until`` posterga el próximo sondeo de las
+    sondeadas al menos hasta ese instante (lecturas de colectores remotos).
+    Devuelve printer_id -> intervalo nuevo. No hace commit.
+    """
+    intervals = {}
+    if polled_ids:
+        pages = page_rates(db, polled_ids, now)
+        toner = toner_rates(db, polled_ids, now)
+        rows = []
+        for printer_id in sorted(polled_ids):
+            interval = poll_interval_minutes(pages.get(printer_id), toner.get(printer_id))
+            intervals[printer_id] = interval
+            rows.append({
+                "printer_id": printer_id,
+                "interval_minutes": interval,
+                "next_poll_at": max(now + timedelta(minutes=interval), hold_until or now),
+                "last_polled_at": now,
+                "pages_per_day": pages.get(printer_id),
+                "toner_drop_per_day": toner.get(printer_id),
+            })
+        _upsert(db, rows, ("interval_minutes", "next_poll_at", "last_polled_at", "pages_per_day", "toner_drop_per_day"))
+
+    if failed_ids:
+        retry = settings.polling_min_interval_minutes
+        _upsert(db, [
+            {"printer_id": printer_id, "interval_minutes": retry, "next_poll_at": now + timedelta(minutes=retry)}
+            for printer_id in sorted(failed_ids)
+        ], ("next_poll_at",))
+    return intervals
+
+
+def schedule_summary(db: Session, fleet_size: int) -> Dict[str, Any]:
+    """Carga de sondeos estimada frente a sondear toda la flota al intervalo mínimo."""
+    rows = db.query(PrinterPollSchedule.interval_minutes).all()
+    scheduled = len(rows)
+    unscheduled = max(0, fleet_size - scheduled)
+    shortest = settings.polling_min_interval_minutes
+    longest = max(shortest, settings.polling_max_interval_minutes)
+    # Sin programación todavía: se sondean en el próximo tick y quedan al máximo (sin historial)
+    polls_per_day = sum(1440 / interval for (interval,) in rows) + unscheduled * 1440 / longest
+    fixed_polls_per_day = fleet_size * 1440 / shortest
+
+    buckets: Dict[str, int] = {"<=1h": 0, "<=6h": 0, "<=24h": 0}
+    for (interval,) in rows:
+        key = "<=1h" if interval <= 60 else "<=6h" if interval <= 360 else "<=24h"
+        buckets[key] += 1
+    return {
+        "printers_scheduled": scheduled,
+        "printers_unscheduled": unscheduled,
+        "interval_buckets": buckets,
+        "polls_per_day": round(polls_per_day, 1),
+        "polls_per_day_at_min_interval": round(fixed_polls_per_day, 1),
+        "load_ratio": round(polls_per_day / fixed_polls_per_day, 3) if fixed_polls_per_day else None,
+    }
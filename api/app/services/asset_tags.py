@@ -0,0 +1,175 @@
+"""
+Asignación de asset tags secuenciales (PRT-001, PRT-002, ...).
+
+El próximo número libre vive en una fila de ``asset_tag_sequences`` por prefijo.
+Reservar N tags es un único ``UPDATE ... RETURNING`` atómico, por lo que dos
+importaciones concurrentes nunca reciben el mismo bloque y no hace falta
+escanear la tabla ``printers`` por cada dispositivo.
+"""
+
+from typing import List, Optional
+import logging
+
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models import AssetTagSequence, Printer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFIX = "PRT"
+
+
+def format_asset_tag(number: int, prefix: str = DEFAULT_PREFIX) -> str:
+    """Formatea un número como asset tag (3 dígitos mínimo con ceros a la izquierda)."""
+    return f"{prefix}-{number:03d}"
+
+
+def parse_asset_tag_number(tag: Optional[str], prefix: str = DEFAULT_PREFIX) -> Optional[int]:
+    """Extrae el número de un asset tag con el prefijo dado, o None si no sigue el patrón."""
+    if not tag or not tag.startswith(f"{prefix}-"):
+        return None
+    digits = tag[len(prefix) + 1:]
+    if not digits.isdigit():
+        return None
+    return int(digits)
+
+
+def _seed_value(db: Session, prefix: str) -> int:
+    """Calcula el valor inicial de la secuencia a partir de los asset tags existentes."""
+    highest = 0
+    rows = db.query(Printer.asset_tag).filter(Printer.asset_tag.like(f"{prefix}-%"))
+    for (tag,) in rows:
+        number = parse_asset_tag_number(tag, prefix)
+        if number is not None and number > highest:
+            highest = number
+    return highest + 1
+
+
+def _current_value(db: Session, prefix: str) -> Optional[int]:
+    return db.execute(
+        select(AssetTagSequence.next_value).where(AssetTagSequence.prefix == prefix)
+    ).scalar_one_or_none()
+
+
+def _ensure_sequence(db: Session, prefix: str) -> int:
+    """
+    Devuelve el next_value actual, creando la fila de la secuencia si no existe.
+
+    La siembra escanea los asset tags existentes una única vez por prefijo. Si otra
+    petición crea la fila en paralelo, el IntegrityError se descarta y se relee.
+    """
+    current = _current_value(db, prefix)
+    if current is not None:
+        return current
+
+    seed = _seed_value(db, prefix)
+    try:
+        db.execute(insert(AssetTagSequence).values(prefix=prefix, next_value=seed))
+        db.commit()
+        logger.info(f"Secuencia de asset tags '{prefix}' inicializada en {seed}")
+        return seed
+    except IntegrityError:
+        db.rollback()
+        return db.execute(
+            select(AssetTagSequence.next_value).where(AssetTagSequence.prefix == prefix)
+        ).scalar_one()
+
+
+def peek_asset_tags(db: Session, count: int, prefix: str = DEFAULT_PREFIX) -> List[str]:
+    """
+    Devuelve los próximos ``count`` asset tags sin reservarlos.
+    Útil para previsualizar (validación de descubrimiento): no escribe nada; si la
+    secuencia aún no existe, calcula la siembra sin crearla.
+    """
+    if count <= 0:
+        return []
+    start = _current_value(db, prefix)
+    if start is None:
+        start = _seed_value(db, prefix)
+    return [format_asset_tag(start + offset, prefix) for offset in range(count)]
+
+
+def reserve_asset_tags(db: Session, count: int, prefix: str = DEFAULT_PREFIX) -> List[str]:
+    """
+    Reserva un bloque de ``count`` asset tags de forma atómica y confirma la transacción.
+
+    Debe llamarse sin cambios pendientes en la sesión, ya que hace commit para
+    liberar el lock de la fila de la secuencia lo antes posible.
+    """
+    if count <= 0:
+        return []
+    _ensure_sequence(db, prefix)
+    new_next = db.execute(
+        update(AssetTagSequence)
+        .where(AssetTagSequence.prefix == prefix)
+        .values(next_value=AssetTagSequence.next_value + count)
+        .returning(AssetTagSequence.next_value)
+    ).scalar_one()
+    db.commit()
+    start = new_next - count
+    return [format_asset_tag(start + offset, prefix) for offset in range(count)]
+
+
+def release_unused_asset_tags(db: Session, unused_tags: List[str], prefix: str = DEFAULT_PREFIX) -> int:
+    """
+    Devuelve a la secuencia la cola no utilizada de un bloque reservado.
+
+    Solo retrocede si nadie reservó después (compare-and-set sobre next_value) y nunca
+    por debajo de un asset tag ya usado: un tag manual dentro del bloque no adelanta
+    la secuencia (ya estaba por encima), así que sin ese tope se volvería a entregar.
+    En el peor caso quedan huecos. Retorna la cantidad de tags liberados.
+    """
+    numbers = sorted(
+        n for n in (parse_asset_tag_number(tag, prefix) for tag in unused_tags) if n is not None
+    )
+    if not numbers:
+        return 0
+
+    # Solo la cola contigua del bloque puede devolverse
+    tail_start = numbers[-1]
+    for number in reversed(numbers[:-1]):
+        if number != tail_start - 1:
+            break
+        tail_start = number
+
+    # Tags asignados (p. ej. manualmente) dentro de la cola: se libera solo lo que queda por encima
+    used = db.query(Printer.asset_tag).filter(
+        Printer.asset_tag.in_([format_asset_tag(n, prefix) for n in range(tail_start, numbers[-1] + 1)])
+    )
+    used_numbers = [parse_asset_tag_number(tag, prefix) for (tag,) in used]
+    if used_numbers:
+        tail_start = max(used_numbers) + 1
+    if tail_start > numbers[-1]:
+        return 0
+
+    result = db.execute(
+        update(AssetTagSequence)
+        .where(
+            AssetTagSequence.prefix == prefix,
+            AssetTagSequence.next_value == numbers[-1] + 1,
+        )
+        .values(next_value=tail_start)
+    )
+    db.commit()
+    return (numbers[-1] - tail_start + 1) if result.rowcount else 0
+
+
+def register_asset_tag(db: Session, tag: Optional[str], prefix: str = DEFAULT_PREFIX) -> None:
+    """
+    Adelanta la secuencia si se asigna manualmente un asset tag con el prefijo gestionado,
+    para que el allocator no lo vuelva a entregar. No hace commit: se confirma junto
+    con la impresora que lo usa.
+    """
+    number = parse_asset_tag_number(tag, prefix)
+    if number is None:
+        return
+    db.execute(
+        update(AssetTagSequence)
+        .where(
+            AssetTagSequence.prefix == prefix,
+            AssetTagSequence.next_value <= number,
+        )
+        .values(next_value=number + 1)
+    )
@@ -5,7 +5,7 @@ Detecta cambios de cartucho comparando snapshots horarios
 
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, desc
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Optional, Dict, List
 import logging
 
@@ -15,6 +15,7 @@ from ..models import (
     MedicalPrinterRefill,
     Printer
 )
+from .retention import thin_medical_snapshots
 
 logger = logging.getLogger(__name__)
 
@@ -230,52 +231,23 @@ class CartridgeDetectionService:
         return snapshot
     
     @staticmethod
-    def cleanup_old_snapshots(db: Session, days_to_keep: int = 30) -> int:
+    def cleanup_old_snapshots(db: Session, days_to_keep: Optional[int] = None) -> int:
         """
         Limpiar snapshots antiguos:
-        - Últimos 30 días: mantener todos (horarios)
-        - Más de 30 días: mantener solo 1 snapshot diario (el primero del día)
-        
+        - Últimos days_to_keep días: mantener todos (horarios)
+        - Más antiguos: mantener solo 1 snapshot diario (el primero del día)
+
+        El borrado se hace por lotes de rangos de id (ver services.retention).
+
         Args:
             db: Sesión de base de datos
-            days_to_keep: Días de snapshots horarios a mantener
-            
+            days_to_keep: Días de snapshots horarios a mantener (default: retention_snapshots_days)
+
         Returns:
             Cantidad de snapshots eliminados
         """
-        cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
-        
-        # Obtener snapshots antiguos agrupados por día
-        old_snapshots = db.query(MedicalPrinterSnapshot).filter(
-            MedicalPrinterSnapshot.snapshot_time < cutoff_date
-        ).all()
-        
-        # Agrupar por (printer_id, tray_number, día)
-        daily_snapshots = {}
-        for snapshot in old_snapshots:
-            day_key = (
-                snapshot.printer_id,
-                snapshot.tray_number,
-                snapshot.snapshot_time.date()
-            )
-            
-            if day_key not in daily_snapshots:
-                daily_snapshots[day_key] = []
-            daily_snapshots[day_key].append(snapshot)
-        
-        # Para cada día, mantener solo el primero (más temprano) y eliminar el resto
-        deleted_count = 0
-        for day_snapshots in daily_snapshots.values():
-            if len(day_snapshots) > 1:
-                # Ordenar por hora
-                day_snapshots.sort(key=lambda s: s.snapshot_time)
-                # Mantener el primero, eliminar el resto
-                for snapshot in day_snapshots[1:]:
-                    db.delete(snapshot)
-                    deleted_count += 1
-        
-        if deleted_count > 0:
-            db.commit()
-            logger.info(f"🧹 Limpieza completada: {deleted_count} snapshots antiguos eliminados")
-        
-        return deleted_count
+        result = thin_medical_snapshots(db, days=days_to_keep)
+        if result.deleted > 0:
+            logger.info(f"🧹 Limpieza completada: {result.deleted} snapshots antiguos eliminados "
+                        f"en {result.chunks} lotes ({result.seconds:.1f}s)")
+        return result.deleted
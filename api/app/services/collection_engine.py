@@ -0,0 +1,347 @@
+"""
+Motor de recolección asíncrono para flotas grandes (miles de impresoras por corrida).
+
+Cada impresora pasa por tres fases encadenadas, cada una con su propia concurrencia:
+- ping: connect TCP con asyncio, miles de sondeos en vuelo limitados por un semáforo.
+- lectura: SNMP/HTTP (bibliotecas síncronas) en un pool de threads acotado.
+- persistencia: un único escritor que recibe los resultados por una cola y los
+  guarda en lotes con una sola sesión de base de datos.
+
+La corrida completa respeta un presupuesto de tiempo: las impresoras que no terminan
+dentro del plazo se reportan como fallidas, nunca se descartan en silencio.
+Se miden los tiempos acumulados de cada fase (ping, snmp, db) y el tiempo total.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import SessionLocal
+from .reachability import PROTOCOL_TCP, get_known_down, record_probes
+
+logger = logging.getLogger(__name__)
+
+# Puertos de impresoras en orden de prioridad (mismo criterio que ping_printer)
+DEFAULT_PING_PORTS = [80, 9100, 161, 515, 631]
+
+_WRITER_LINGER_SECONDS = 0.5
+
+
+@dataclass
+class CollectionTarget:
+    """Impresora a recolectar. ``payload`` lleva los datos que necesitan fetch/persist."""
+    printer_id: int
+    ip: str
+    ports: List[int] = field(default_factory=lambda: list(DEFAULT_PING_PORTS))
+    ping_timeout: float = 0.5
+    protocol: str = PROTOCOL_TCP
+    payload: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class CollectionOutcome:
+    """Resultado de una impresora a lo largo de las tres fases."""
+    target: CollectionTarget
+    ping_ok: Optional[bool] = None
+    port_responsive: Optional[int] = None
+    ping_seconds: float = 0.0
+    fetch_seconds: float = 0.0
+    success: bool = False
+    data: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    action: Optional[str] = None
+
+
+@dataclass
+class CollectionReport:
+    outcomes: List[CollectionOutcome]
+    timings: Dict[str, Any]
+    wall_seconds: float
+    budget_exceeded: int = 0
+
+
+class PhaseTimings:
+    """Acumulador thread-safe de tiempos por fase."""
+
+    PHASES = ("ping", "snmp", "db")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases = {
+            phase: {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            for phase in self.PHASES
+        }
+
+    def add(self, phase: str, seconds: float, count: int = 1) -> None:
+        with self._lock:
+            stats = self._phases[phase]
+            stats["count"] += count
+            stats["total_seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+    def as_dict(self, wall_seconds: float) -> Dict[str, Any]:
+        with self._lock:
+            phases = {
+                phase: {
+                    "count": stats["count"],
+                    "total_seconds": round(stats["total_seconds"], 3),
+                    "max_seconds": round(stats["max_seconds"], 3),
+                }
+                for phase, stats in self._phases.items()
+            }
+        phases["wall_seconds"] = round(wall_seconds, 3)
+        return phases
+
+
+FetchFn = Callable[[CollectionTarget], Dict[str, Any]]
+PersistFn = Callable[[Session, List[CollectionOutcome]], None]
+
+
+class CollectionEngine:
+    """
+    Orquesta ping → lectura → persistencia para una lista de impresoras.
+
+    Args:
+        fetch: Lectura síncrona de una impresora (corre en el pool de threads).
+            Debe devolver un dict con al menos 'success' y 'error'; si no se leyó
+            puede indicar el motivo en 'action'.
+        persist: Guarda un lote de resultados exitosos con la sesión del escritor.
+            Puede marcar outcomes individuales como fallidos (success/error) y
+            debe asignar ``action``; si lanza una excepción se hace rollback y
+            todo el lote se marca como fallido.
+        on_outcome: Callback opcional por impresora terminada (progreso de UI).
+    """
+
+    def __init__(
+        self,
+        fetch: FetchFn,
+        persist: PersistFn,
+        ping_concurrency: Optional[int] = None,
+        fetch_concurrency: Optional[int] = None,
+        budget_seconds: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        on_outcome: Optional[Callable[[CollectionOutcome], None]] = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        self.fetch = fetch
+        self.persist = persist
+        self.ping_concurrency = max(1, ping_concurrency or settings.collection_ping_concurrency)
+        self.fetch_concurrency = max(1, fetch_concurrency or settings.collection_snmp_concurrency)
+        self.budget_seconds = budget_seconds or settings.collection_time_budget_seconds
+        self.batch_size = max(1, batch_size or settings.collection_write_batch_size)
+        self.on_outcome = on_outcome
+        self.session_factory = session_factory
+        self.timings = PhaseTimings()
+        self._db: Optional[Session] = None
+        self._probe_results: Dict[str, Dict[str, bool]] = {}
+
+    def run(self, targets: List[CollectionTarget]) -> CollectionReport:
+        """Ejecuta la corrida completa (bloqueante; crea su propio event loop)."""
+        return asyncio.run(self._run(targets))
+
+    async def _run(self, targets: List[CollectionTarget]) -> CollectionReport:
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        outcomes = [CollectionOutcome(target=target) for target in targets]
+
+        known_down = await loop.run_in_executor(None, self._load_known_down, targets)
+
+        ping_semaphore = asyncio.Semaphore(self.ping_concurrency)
+        queue: asyncio.Queue = asyncio.Queue()
+        fetch_executor = ThreadPoolExecutor(max_workers=self.fetch_concurrency, thread_name_prefix="collect")
+        db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="collect-db")
+
+        writer = asyncio.create_task(self._writer(queue, db_executor))
+        tasks = [
+            asyncio.create_task(self._process(outcome, known_down, ping_semaphore, fetch_executor, queue))
+            for outcome in outcomes
+        ]
+
+        budget_exceeded = 0
+        try:
+            if tasks:
+                _, pending = await asyncio.wait(tasks, timeout=self.budget_seconds)
+                budget_exceeded = len(pending)
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.gather(*pending, return_exceptions=True)
+                    logger.warning(
+                        f"Recolección: {budget_exceeded} impresoras sin terminar dentro del "
+                        f"presupuesto de {self.budget_seconds}s"
+                    )
+        finally:
+            await queue.put(None)
+            await writer
+            await loop.run_in_executor(db_executor, self._close_session)
+            db_executor.shutdown(wait=True)
+            fetch_executor.shutdown(wait=False, cancel_futures=True)
+            await loop.run_in_executor(None, self._flush_probe_results)
+
+        wall_seconds = time.perf_counter() - started
+        return CollectionReport(
+            outcomes=outcomes,
+            timings=self.timings.as_dict(wall_seconds),
+            wall_seconds=wall_seconds,
+            budget_exceeded=budget_exceeded,
+        )
+
+    # ------------------------------------------------------------------
+    # Fases
+    # ------------------------------------------------------------------
+
+    async def _process(
+        self,
+        outcome: CollectionOutcome,
+        known_down: Dict[str, set],
+        ping_semaphore: asyncio.Semaphore,
+        fetch_executor: ThreadPoolExecutor,
+        queue: asyncio.Queue,
+    ) -> None:
+        target = outcome.target
+        try:
+            if target.ip in known_down.get(target.protocol, ()):
+                outcome.ping_ok = False
+                outcome.error = "No hay conectividad - host caído en un sondeo reciente (caché)"
+                self._notify(outcome)
+                return
+
+            async with ping_semaphore:
+                ping_started = time.perf_counter()
+                outcome.ping_ok, outcome.port_responsive = await self._ping(target)
+                outcome.ping_seconds = time.perf_counter() - ping_started
+            self.timings.add("ping", outcome.ping_seconds)
+            self._probe_results.setdefault(target.protocol, {})[target.ip] = outcome.ping_ok
+
+            if not outcome.ping_ok:
+                outcome.error = "No hay conectividad - impresora apagada o fuera de línea"
+                self._notify(outcome)
+                return
+
+            loop = asyncio.get_running_loop()
+            outcome.data = await loop.run_in_executor(fetch_executor, self._timed_fetch, target)
+            outcome.fetch_seconds = outcome.data.pop("_fetch_seconds", 0.0)
+
+            if not outcome.data.get("success"):
+                outcome.error = outcome.data.get("error") or "Lectura fallida"
+                outcome.action = outcome.data.get("action")  # p. ej. 'in_flight' (no se leyó)
+                self._notify(outcome)
+                return
+
+            outcome.success = True
+            await queue.put(outcome)
+
+        except asyncio.CancelledError:
+            outcome.success = False
+            outcome.error = f"No completada dentro del presupuesto de {self.budget_seconds}s"
+            self._notify(outcome)
+            raise
+        except Exception as e:
+            outcome.success = False
+            outcome.error = f"Error procesando impresora {target.printer_id}: {e}"
+            logger.error(outcome.error)
+            self._notify(outcome)
+
+    async def _ping(self, target: CollectionTarget) -> Tuple[bool, Optional[int]]:
+        """Connect TCP no bloqueante; sale en el primer puerto que responde."""
+        for port in target.ports:
+            try:
+                _, writer = await asyncio.wait_for(
+                    asyncio.open_connection(target.ip, port), timeout=target.ping_timeout
+                )
+            except (OSError, asyncio.TimeoutError):
+                continue
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+            return True, port
+        return False, None
+
+    def _timed_fetch(self, target: CollectionTarget) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            data = self.fetch(target)
+        except Exception as e:
+            data = {"success": False, "error": str(e)}
+        elapsed = time.perf_counter() - started
+        self.timings.add("snmp", elapsed)
+        data["_fetch_seconds"] = elapsed
+        return data
+
+    async def _writer(self, queue: asyncio.Queue, db_executor: ThreadPoolExecutor) -> None:
+        """Agrupa resultados exitosos en lotes y los persiste en un único thread."""
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            item = await queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + _WRITER_LINGER_SECONDS
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+
+            await loop.run_in_executor(db_executor, self._persist_batch, batch)
+            for outcome in batch:
+                self._notify(outcome)
+
+    def _persist_batch(self, batch: List[CollectionOutcome]) -> None:
+        if self._db is None:
+            self._db = self.session_factory()
+        started = time.perf_counter()
+        try:
+            self.persist(self._db, batch)
+        except Exception as e:
+            logger.error(f"Error persistiendo lote de {len(batch)} resultados: {e}")
+            self._db.rollback()
+            for outcome in batch:
+                if outcome.action is None:
+                    outcome.success = False
+                    outcome.error = f"Error de base de datos: {e}"
+        self.timings.add("db", time.perf_counter() - started, count=len(batch))
+
+    def _close_session(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    # ------------------------------------------------------------------
+    # Caché de alcanzabilidad y progreso
+    # ------------------------------------------------------------------
+
+    def _load_known_down(self, targets: List[CollectionTarget]) -> Dict[str, set]:
+        by_protocol: Dict[str, List[str]] = {}
+        for target in targets:
+            by_protocol.setdefault(target.protocol, []).append(target.ip)
+        return {protocol: get_known_down(ips, protocol) for protocol, ips in by_protocol.items()}
+
+    def _flush_probe_results(self) -> None:
+        for protocol, results in self._probe_results.items():
+            record_probes(results, protocol)
+
+    def _notify(self, outcome: CollectionOutcome) -> None:
+        if self.on_outcome is None:
+            return
+        try:
+            self.on_outcome(outcome)
+        except Exception as e:
+            logger.warning(f"Error en callback de progreso: {e}")
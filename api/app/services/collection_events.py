@@ -0,0 +1,120 @@
+"""
+Difusión en proceso de los eventos de recolección publicados en Redis.
+
+Los workers publican en Redis un evento por impresora terminada y los totales de
+cada corrida (ver collection_queue). Cada proceso de la API mantiene una sola
+suscripción de Redis por canal, compartida por todos los clientes SSE que siguen
+ese canal: diez pestañas mirando la misma corrida son una suscripción, no diez,
+y ninguna consulta la base de datos ni toma locks.
+
+Si un cliente no consume a tiempo se descartan sus eventos más viejos (nunca se
+bloquea al lector compartido); los eventos de progreso llevan siempre los totales
+completos, así que la vista se corrige con el siguiente.
+"""
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Set
+import asyncio
+import json
+import logging
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+_LISTENER_QUEUE_SIZE = 1000
+_READ_TIMEOUT_SECONDS = 1.0
+
+_client = None
+
+
+def _get_async_client():
+    global _client
+    if _client is None:
+        import redis.asyncio as redis_async
+
+        _client = redis_async.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            password=settings.redis_password,
+            socket_connect_timeout=2,
+            decode_responses=True
+        )
+    return _client
+
+
+class _ChannelSubscription:
+    """Suscripción de Redis a un canal, compartida por los oyentes de este proceso."""
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.listeners: Set[asyncio.Queue] = set()
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def dispatch(self, event: Dict[str, Any]) -> None:
+        for queue in list(self.listeners):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def read(self) -> None:
+        pubsub = _get_async_client().pubsub()
+        try:
+            await pubsub.subscribe(self.channel)
+            self.ready.set()
+            while True:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=_READ_TIMEOUT_SECONDS
+                )
+                if message is None:
+                    continue
+                try:
+                    self.dispatch(json.loads(message["data"]))
+                except ValueError:
+                    logger.warning(f"Evento de recolección inválido en {self.channel}: {message['data']!r}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Suscripción a {self.channel} interrumpida: {e}")
+            self.dispatch({"event": "error", "message": "Se perdió la conexión con Redis"})
+        finally:
+            self.ready.set()
+            try:
+                await pubsub.reset()
+            except Exception:
+                pass
+
+
+_subscriptions: Dict[str, _ChannelSubscription] = {}
+
+
+@asynccontextmanager
+async def subscribe(channel: str) -> AsyncIterator[asyncio.Queue]:
+    """
+    Cola con los eventos (dicts) del canal mientras dure el contexto.
+
+    Al entrar la suscripción de Redis ya está activa: lo que se lea después (por
+    ejemplo una foto del estado actual) no pierde eventos publicados entre medio.
+    """
+    subscription = _subscriptions.get(channel)
+    if subscription is None or subscription.task.done():
+        subscription = _ChannelSubscription(channel)
+        subscription.task = asyncio.create_task(subscription.read())
+        _subscriptions[channel] = subscription
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=_LISTENER_QUEUE_SIZE)
+    subscription.listeners.add(queue)
+    try:
+        await subscription.ready.wait()
+        yield queue
+    finally:
+        subscription.listeners.discard(queue)
+        if not subscription.listeners and _subscriptions.get(channel) is subscription:
+            del _subscriptions[channel]
+            subscription.task.cancel()
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Serializa un evento al formato text/event-stream (el tipo va en ``event:``)."""
+    return f"event: {event.get('event', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
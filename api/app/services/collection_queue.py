@@ -0,0 +1,591 @@
+"""
+Cola durable de recolección de contadores sobre Redis.
+
+La API solo encola corridas y consulta su estado; las lecturas las hacen procesos
+worker independientes (``python -m app.workers.collection_worker``), en uno o
+varios hosts, que comparten esta cola.
+
+Estructuras en Redis:
+- collect:ready              ZSET run_id -> turno, con las corridas que tienen tareas
+                             pendientes. Los workers atienden siempre la de menor
+                             turno: prioridad primero (carril = 100 - prioridad) y,
+                             dentro del mismo carril, según
+                             collection_queue_fairness: "round_robin" (la corrida
+                             atendida pasa al final de su carril, así las corridas
+                             simultáneas avanzan a la par) o "fifo" (la más antigua
+                             se termina antes de empezar la siguiente).
+- collect:queue:{run_id}     LIST con los ids de tarea pendientes de la corrida (LPUSH / RPOP).
+- collect:processing         ZSET id de tarea -> vencimiento de visibilidad (epoch).
+                             Una tarea tomada cuyo worker deja de enviar heartbeat
+                             vuelve a la cola al vencer; tras max_attempts sus
+                             impresoras pendientes se marcan como fallidas.
+- collect:task:{id}          HASH run_id, printer_ids (JSON), attempts, last_error.
+- collect:run:{run_id}       HASH con el estado y los totales de la corrida.
+- collect:run:{id}:results   HASH printer_id -> resultado JSON. Se escribe con HSETNX,
+                             así un reintento nunca cuenta dos veces una impresora.
+- collect:runs               ZSET run_id -> creación (historial reciente).
+- collect:active:{source}    run_id de la corrida en curso por origen (manual, o
+                             schedule:{id} por cada programación).
+
+Eventos (pub/sub, publicados desde los mismos scripts Lua que cambian el estado):
+- collect:events:{run_id}    un evento "printer" por impresora terminada y "progress" /
+                             "completed" con los totales de la corrida.
+- collect:events             solo "progress" / "completed" de todas las corridas.
+
+Los tiempos de visibilidad usan el reloj de Redis (TIME) para no depender del
+reloj de cada host worker.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+import json
+import logging
+import threading
+import time
+import uuid
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+KIND_COUNTERS = "counters"  # MonthlyCounter (recolección manual)
+KIND_USAGE = "usage"        # UsageReport (programaciones CounterSchedule)
+
+SOURCE_MANUAL = "manual"
+SOURCE_SCHEDULE = "schedule"
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+
+_READY_KEY = "collect:ready"
+EVENTS_CHANNEL = "collect:events"
+_PROCESSING_KEY = "collect:processing"
+_RUNS_KEY = "collect:runs"
+
+_INT_FIELDS = (
+    "schedule_id", "year", "month", "printers_total", "printers_processed",
+    "printers_successful", "printers_failed", "printers_skipped", "counters_created",
+    "counters_skipped", "tasks_total", "tasks_pending", "fresh_within_minutes", "priority",
+)
+
+# Turno en collect:ready = carril * _LANE_WIDTH + milisegundos
+_LANE_WIDTH = 10 ** 13
+_MAX_PRIORITY = 100
+
+# KEYS: ready, processing | ARGV: visibilidad (s), round robin (1/0)
+_DEQUEUE_LUA = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+while true do
+  local head = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+  if #head == 0 then return false end
+  local run_id = head[1]
+  local queue = 'collect:queue:' .. run_id
+  local task_id = redis.call('RPOP', queue)
+  if task_id then
+    if redis.call('LLEN', queue) == 0 then
+      redis.call('ZREM', KEYS[1], run_id)
+    elseif ARGV[2] == '1' then
+      local lane = math.floor(tonumber(head[2]) / """ + str(_LANE_WIDTH) + """)
+      redis.call('ZADD', KEYS[1], lane * """ + str(_LANE_WIDTH) + """ + now_ms, run_id)
+    end
+    redis.call('ZADD', KEYS[2], tonumber(now[1]) + tonumber(ARGV[1]), task_id)
+    return task_id
+  end
+  redis.call('ZREM', KEYS[1], run_id)
+end
+"""
+
+# KEYS: processing | ARGV: task_id, visibilidad (s)
+_HEARTBEAT_LUA = """
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then return 0 end
+local now = redis.call('TIME')
+redis.call('ZADD', KEYS[1], tonumber(now[1]) + tonumber(ARGV[2]), ARGV[1])
+return 1
+"""
+
+# Evento con los totales de la corrida, publicado en su canal y en el canal global.
+# Mismos campos que run_progress().
+_PUBLISH_PROGRESS_LUA = """
+local function publish_progress(run_key, run_id, event)
+  local f = redis.call('HMGET', run_key, 'status', 'kind', 'source', 'schedule_id', 'schedule_name',
+    'printers_total', 'printers_processed', 'printers_successful', 'printers_failed',
+    'counters_created', 'counters_skipped', 'tasks_total', 'tasks_pending', 'printers_skipped')
+  local payload = cjson.encode({
+    event = event, run_id = run_id, status = f[1], kind = f[2], source = f[3],
+    schedule_id = tonumber(f[4]), schedule_name = f[5] or nil,
+    printers_total = tonumber(f[6]), printers_processed = tonumber(f[7]),
+    printers_successful = tonumber(f[8]), printers_failed = tonumber(f[9]),
+    counters_created = tonumber(f[10]), counters_skipped = tonumber(f[11]),
+    tasks_total = tonumber(f[12]), tasks_pending = tonumber(f[13]),
+    printers_skipped = tonumber(f[14])
+  })
+  redis.call('PUBLISH', 'collect:events:' .. run_id, payload)
+  redis.call('PUBLISH', 'collect:events', payload)
+end
+"""
+
+# KEYS: run | ARGV: run_id, started_at
+_MARK_STARTED_LUA = _PUBLISH_PROGRESS_LUA + """
+if redis.call('HGET', KEYS[1], 'status') == 'queued' then
+  redis.call('HSET', KEYS[1], 'status', 'running', 'started_at', ARGV[2])
+  publish_progress(KEYS[1], ARGV[1], 'progress')
+end
+return 1
+"""
+
+# KEYS: results, run | ARGV: run_id, luego grupos de 4 (printer_id, json, éxito 1/0, acción)
+# Las acciones 'fresh' (lectura reciente) e 'in_flight' (otra lectura de la impresora en
+# curso) no consultaron la impresora: cuentan como salteadas.
+_RECORD_RESULTS_LUA = _PUBLISH_PROGRESS_LUA + """
+local recorded = 0
+local channel = 'collect:events:' .. ARGV[1]
+for i = 2, #ARGV, 4 do
+  if redis.call('HSETNX', KEYS[1], ARGV[i], ARGV[i + 1]) == 1 then
+    recorded = recorded + 1
+    redis.call('HINCRBY', KEYS[2], 'printers_processed', 1)
+    if ARGV[i + 3] == 'fresh' or ARGV[i + 3] == 'in_flight' then
+      redis.call('HINCRBY', KEYS[2], 'printers_skipped', 1)
+    elseif ARGV[i + 2] == '1' then
+      redis.call('HINCRBY', KEYS[2], 'printers_successful', 1)
+    else
+      redis.call('HINCRBY', KEYS[2], 'printers_failed', 1)
+    end
+    if ARGV[i + 3] == 'created' then
+      redis.call('HINCRBY', KEYS[2], 'counters_created', 1)
+    elseif ARGV[i + 3] == 'skipped' then
+      redis.call('HINCRBY', KEYS[2], 'counters_skipped', 1)
+    end
+    redis.call('PUBLISH', channel, '{"event":"printer","run_id":"' .. ARGV[1] .. '","result":' .. ARGV[i + 1] .. '}')
+  end
+end
+if recorded > 0 then
+  publish_progress(KEYS[2], ARGV[1], 'progress')
+end
+local ttl = redis.call('TTL', KEYS[2])
+if ttl > 0 then redis.call('EXPIRE', KEYS[1], ttl) end
+return recorded
+"""
+
+# KEYS: processing, task, run, active, results | ARGV: task_id, run_id, finished_at, ttl
+# Retorna -1 si la tarea ya no estaba tomada, 1 si la corrida terminó, 0 si no.
+_COMPLETE_LUA = _PUBLISH_PROGRESS_LUA + """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then return -1 end
+redis.call('DEL', KEYS[2])
+local pending = redis.call('HINCRBY', KEYS[3], 'tasks_pending', -1)
+if pending > 0 then return 0 end
+redis.call('HSET', KEYS[3], 'status', 'completed', 'finished_at', ARGV[3])
+if redis.call('GET', KEYS[4]) == ARGV[2] then redis.call('DEL', KEYS[4]) end
+redis.call('EXPIRE', KEYS[3], tonumber(ARGV[4]))
+redis.call('EXPIRE', KEYS[5], tonumber(ARGV[4]))
+publish_progress(KEYS[3], ARGV[2], 'completed')
+return 1
+"""
+
+# KEYS: processing, ready, task | ARGV: task_id, max_attempts, error, visibilidad,
+#       solo si venció (1/0)
+# Retorna -1 si la tarea ya no estaba tomada (o aún no vence), 0 si volvió a la cola
+# de su corrida (al final), 1 si agotó sus intentos (queda tomada por quien llamó para cerrarla).
+_RELEASE_LUA = """
+local deadline = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not deadline then return -1 end
+local now = redis.call('TIME')
+if ARGV[5] == '1' and tonumber(deadline) > tonumber(now[1]) then return -1 end
+local attempts = redis.call('HINCRBY', KEYS[3], 'attempts', 1)
+redis.call('HSET', KEYS[3], 'last_error', ARGV[3])
+if attempts < tonumber(ARGV[2]) then
+  local task = redis.call('HMGET', KEYS[3], 'run_id', 'lane')
+  local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+  redis.call('ZREM', KEYS[1], ARGV[1])
+  redis.call('LPUSH', 'collect:queue:' .. task[1], ARGV[1])
+  redis.call('ZADD', KEYS[2], 'NX', tonumber(task[2] or 100) * """ + str(_LANE_WIDTH) + """ + now_ms, task[1])
+  return 0
+end
+redis.call('ZADD', KEYS[1], tonumber(now[1]) + tonumber(ARGV[4]), ARGV[1])
+return 1
+"""
+
+
+class CollectionQueueError(Exception):
+    """Redis no está disponible o rechazó la operación."""
+
+
+class CollectionTask:
+    """Tarea tomada de la cola: un bloque de impresoras de una corrida."""
+
+    def __init__(self, task_id: str, run_id: str, printer_ids: List[int], attempts: int = 0):
+        self.task_id = task_id
+        self.run_id = run_id
+        self.printer_ids = printer_ids
+        self.attempts = attempts
+
+
+_client_lock = threading.Lock()
+_client = None
+_scripts: Dict[str, Any] = {}
+
+
+def _get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            import redis as redis_lib
+
+            _client = redis_lib.Redis(
+                host=settings.redis_host,
+                port=settings.redis_port,
+                password=settings.redis_password,
+                socket_connect_timeout=2,
+                socket_timeout=5,
+                decode_responses=True
+            )
+            _scripts.update({
+                "dequeue": _client.register_script(_DEQUEUE_LUA),
+                "heartbeat": _client.register_script(_HEARTBEAT_LUA),
+                "mark_started": _client.register_script(_MARK_STARTED_LUA),
+                "record_results": _client.register_script(_RECORD_RESULTS_LUA),
+                "complete": _client.register_script(_COMPLETE_LUA),
+                "release": _client.register_script(_RELEASE_LUA),
+            })
+        return _client
+
+
+def _call(operation: str, fn, *args, **kwargs):
+    try:
+        _get_client()
+        return fn(*args, **kwargs)
+    except CollectionQueueError:
+        raise
+    except Exception as e:
+        raise CollectionQueueError(f"Cola de recolección no disponible ({operation}): {e}") from e
+
+
+def _script(name: str, keys: List[str], args: List[Any]):
+    return _call(name, lambda: _scripts[name](keys=keys, args=args))
+
+
+def _run_key(run_id: str) -> str:
+    return f"collect:run:{run_id}"
+
+
+def _results_key(run_id: str) -> str:
+    return f"collect:run:{run_id}:results"
+
+
+def _task_key(task_id: str) -> str:
+    return f"collect:task:{task_id}"
+
+
+def _run_queue_key(run_id: str) -> str:
+    return f"collect:queue:{run_id}"
+
+
+def _lane(priority: int) -> int:
+    """Carril de la corrida en collect:ready (menor = se atiende antes)."""
+    return _MAX_PRIORITY - max(-_MAX_PRIORITY, min(_MAX_PRIORITY, priority))
+
+
+def _active_key(source: str) -> str:
+    return f"collect:active:{source}"
+
+
+def _now_iso() -> str:
+    return datetime.now().isoformat()
+
+
+def run_channel(run_id: str) -> str:
+    """Canal pub/sub con los eventos por impresora y de progreso de una corrida."""
+    return f"{EVENTS_CHANNEL}:{run_id}"
+
+
+_PROGRESS_FIELDS = (
+    "run_id", "status", "kind", "source", "schedule_id", "schedule_name", "printers_total",
+    "printers_processed", "printers_successful", "printers_failed", "printers_skipped",
+    "counters_created", "counters_skipped", "tasks_total", "tasks_pending",
+)
+
+
+def run_progress(run: Dict[str, Any], event: str = "progress") -> Dict[str, Any]:
+    """Evento de progreso (mismo formato que los publicados por los scripts Lua)."""
+    return {"event": event, **{field: run.get(field) for field in _PROGRESS_FIELDS}}
+
+
+def _decode_run(run_id: str, raw: Dict[str, str]) -> Dict[str, Any]:
+    run: Dict[str, Any] = {"run_id": run_id, **raw}
+    for field in _INT_FIELDS:
+        value = raw.get(field)
+        run[field] = int(value) if value not in (None, "") else (None if field in ("schedule_id", "year", "month") else 0)
+    return run
+
+
+# ----------------------------------------------------------------------
+# API: encolar y consultar
+# ----------------------------------------------------------------------
+
+def enqueue_run(
+    kind: str,
+    printer_ids: List[int],
+    source: str = SOURCE_MANUAL,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    schedule_id: Optional[int] = None,
+    schedule_name: Optional[str] = None,
+    fresh_within_minutes: int = 0,
+    priority: int = 0,
+) -> Optional[Dict[str, Any]]:
+    """
+    Crea una corrida y encola sus tareas (bloques de collection_queue_chunk_size).
+
+    Con ``fresh_within_minutes`` > 0 los workers no consultan las impresoras leídas
+    con éxito dentro de esa ventana; quedan en el resumen como salteadas.
+
+    Las tareas de una corrida con mayor ``priority`` (-100 a 100) se atienden antes
+    que las de corridas de menor prioridad, aunque éstas se hayan encolado antes.
+
+    Returns:
+        Estado inicial de la corrida, o None si ya hay una corrida activa del mismo origen.
+    """
+    run_id = str(uuid.uuid4())
+    active_key = _active_key(source if schedule_id is None else f"{source}:{schedule_id}")
+    chunk_size = max(1, settings.collection_queue_chunk_size)
+    chunks = [printer_ids[i:i + chunk_size] for i in range(0, len(printer_ids), chunk_size)]
+    client = _call("enqueue", _get_client)
+
+    acquired = _call(
+        "enqueue", client.set, active_key, run_id,
+        nx=True, ex=settings.collection_queue_run_timeout_seconds
+    )
+    if not acquired:
+        return None
+
+    created_at = _now_iso()
+    run = {
+        "kind": kind,
+        "source": source,
+        "active_key": active_key,
+        "status": STATUS_QUEUED,
+        "created_at": created_at,
+        "year": year or "",
+        "month": month or "",
+        "schedule_id": schedule_id or "",
+        "schedule_name": schedule_name or "",
+        "printers_total": len(printer_ids),
+        "printers_processed": 0,
+        "printers_successful": 0,
+        "printers_failed": 0,
+        "printers_skipped": 0,
+        "fresh_within_minutes": max(0, fresh_within_minutes or 0),
+        "priority": priority,
+        "counters_created": 0,
+        "counters_skipped": 0,
+        "tasks_total": len(chunks),
+        "tasks_pending": len(chunks),
+    }
+
+    def _enqueue():
+        pipe = client.pipeline(transaction=True)
+        pipe.hset(_run_key(run_id), mapping=run)
+        pipe.expire(_run_key(run_id), settings.collection_queue_result_ttl_seconds)
+        pipe.zadd(_RUNS_KEY, {run_id: datetime.now().timestamp()})
+        pipe.zremrangebyscore(
+            _RUNS_KEY, "-inf", datetime.now().timestamp() - settings.collection_queue_result_ttl_seconds
+        )
+        task_ids = []
+        for chunk in chunks:
+            task_id = str(uuid.uuid4())
+            pipe.hset(_task_key(task_id), mapping={
+                "run_id": run_id, "printer_ids": json.dumps(chunk), "attempts": 0, "lane": _lane(priority)
+            })
+            pipe.expire(_task_key(task_id), settings.collection_queue_result_ttl_seconds)
+            task_ids.append(task_id)
+        queued_event = json.dumps(run_progress(_decode_run(run_id, {k: str(v) for k, v in run.items()})))
+        pipe.publish(EVENTS_CHANNEL, queued_event)
+        if task_ids:
+            pipe.lpush(_run_queue_key(run_id), *task_ids)
+            pipe.expire(_run_queue_key(run_id), settings.collection_queue_result_ttl_seconds)
+            pipe.zadd(_READY_KEY, {run_id: _lane(priority) * _LANE_WIDTH + int(time.time() * 1000)})
+        else:
+            pipe.hset(_run_key(run_id), mapping={"status": STATUS_COMPLETED, "finished_at": created_at})
+            pipe.delete(active_key)
+        pipe.execute()
+
+    try:
+        _call("enqueue", _enqueue)
+    except CollectionQueueError:
+        try:
+            client.delete(active_key)
+        except Exception:
+            pass
+        raise
+    logger.info(f"Corrida {run_id} ({kind}/{source}) encolada: {len(printer_ids)} impresoras en {len(chunks)} tareas")
+    return _decode_run(run_id, {k: str(v) for k, v in run.items()})
+
+
+def get_run(run_id: str, include_results: bool = False) -> Optional[Dict[str, Any]]:
+    """Estado de una corrida (y sus resultados por impresora si se piden)."""
+    client = _call("get_run", _get_client)
+    raw = _call("get_run", client.hgetall, _run_key(run_id))
+    if not raw:
+        return None
+    run = _decode_run(run_id, raw)
+    if include_results:
+        values = _call("get_run", client.hvals, _results_key(run_id))
+        run["results"] = sorted((json.loads(value) for value in values), key=lambda r: r.get("printer_id", 0))
+    return run
+
+
+def list_runs(limit: int = 20, source: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Corridas más recientes primero (sin resultados por impresora)."""
+    client = _call("list_runs", _get_client)
+    run_ids = _call("list_runs", client.zrevrange, _RUNS_KEY, 0, max(limit * 5, 50) - 1)
+
+    def _fetch():
+        pipe = client.pipeline(transaction=False)
+        for run_id in run_ids:
+            pipe.hgetall(_run_key(run_id))
+        return pipe.execute()
+
+    runs = []
+    for run_id, raw in zip(run_ids, _call("list_runs", _fetch)):
+        if not raw or (source and raw.get("source") != source):
+            continue
+        runs.append(_decode_run(run_id, raw))
+        if len(runs) >= limit:
+            break
+    return runs
+
+
+def is_run_active(run: Dict[str, Any]) -> bool:
+    """
+    True si la corrida no terminó y sigue dentro de collection_queue_run_timeout_seconds
+    (una corrida sin workers que la consuman deja de contar como activa al vencer).
+    """
+    if run.get("status") == STATUS_COMPLETED:
+        return False
+    created_at = datetime.fromisoformat(run["created_at"])
+    return (datetime.now() - created_at).total_seconds() < settings.collection_queue_run_timeout_seconds
+
+
+def get_active_run(source: str) -> Optional[Dict[str, Any]]:
+    """Corrida en curso de un origen, si la hay."""
+    client = _call("get_active_run", _get_client)
+    run_id = _call("get_active_run", client.get, _active_key(source))
+    return get_run(run_id) if run_id else None
+
+
+# ----------------------------------------------------------------------
+# Worker: tomar, renovar, registrar y cerrar tareas
+# ----------------------------------------------------------------------
+
+def dequeue_task() -> Optional[CollectionTask]:
+    """Toma la próxima tarea (queda invisible para otros workers hasta su vencimiento)."""
+    task_id = _script("dequeue", [_READY_KEY, _PROCESSING_KEY], [
+        settings.collection_queue_visibility_timeout_seconds,
+        "1" if settings.collection_queue_fairness == "round_robin" else "0",
+    ])
+    if not task_id:
+        return None
+    client = _get_client()
+    raw = _call("dequeue", client.hgetall, _task_key(task_id))
+    if not raw:
+        # Tarea huérfana (corrida expirada): se descarta
+        _call("dequeue", client.zrem, _PROCESSING_KEY, task_id)
+        return None
+    task = CollectionTask(task_id, raw["run_id"], json.loads(raw["printer_ids"]), int(raw.get("attempts") or 0))
+    _script("mark_started", [_run_key(task.run_id)], [task.run_id, _now_iso()])
+    return task
+
+
+def heartbeat(task: CollectionTask) -> bool:
+    """Renueva la visibilidad de la tarea. False si ya no la tiene este worker."""
+    return bool(_script(
+        "heartbeat", [_PROCESSING_KEY], [task.task_id, settings.collection_queue_visibility_timeout_seconds]
+    ))
+
+
+def record_results(run_id: str, results: Iterable[Dict[str, Any]]) -> int:
+    """
+    Registra resultados por impresora (dicts con printer_id, success y action_taken).
+    Una impresora ya registrada en la corrida se ignora; retorna cuántas se registraron.
+    """
+    args: List[Any] = [run_id]
+    for result in results:
+        args.extend([
+            result["printer_id"],
+            json.dumps(result, default=str),
+            "1" if result.get("success") else "0",
+            result.get("action_taken") or "",
+        ])
+    if len(args) == 1:
+        return 0
+    return int(_script("record_results", [_results_key(run_id), _run_key(run_id)], args))
+
+
+def get_recorded_printer_ids(run_id: str) -> set:
+    """Impresoras que ya tienen resultado en la corrida (para saltearlas al reintentar)."""
+    client = _call("get_recorded_printer_ids", _get_client)
+    return {int(printer_id) for printer_id in _call("get_recorded_printer_ids", client.hkeys, _results_key(run_id))}
+
+
+def complete_task(task: CollectionTask) -> bool:
+    """Cierra la tarea. Retorna True si era la última pendiente de su corrida."""
+    run = get_run(task.run_id) or {}
+    finished = _script("complete", [
+        _PROCESSING_KEY, _task_key(task.task_id), _run_key(task.run_id),
+        run.get("active_key") or _active_key(SOURCE_MANUAL), _results_key(task.run_id),
+    ], [task.task_id, task.run_id, _now_iso(), settings.collection_queue_result_ttl_seconds])
+    return finished == 1
+
+
+def release_task(task: CollectionTask, error: str) -> bool:
+    """
+    Devuelve la tarea a la cola tras un error (cuenta como intento).
+
+    Returns:
+        True si agotó sus intentos: el llamador debe cerrarla con fail_task.
+    """
+    result = _script("release", [_PROCESSING_KEY, _READY_KEY, _task_key(task.task_id)], [
+        task.task_id, settings.collection_queue_max_attempts, error[:500],
+        settings.collection_queue_visibility_timeout_seconds, "0",
+    ])
+    return result == 1
+
+
+def fail_task(task: CollectionTask, error: str) -> bool:
+    """Marca como fallidas las impresoras sin resultado de la tarea y la cierra."""
+    recorded = get_recorded_printer_ids(task.run_id)
+    record_results(task.run_id, [
+        {"printer_id": printer_id, "success": False, "error_message": error}
+        for printer_id in task.printer_ids
+        if printer_id not in recorded
+    ])
+    return complete_task(task)
+
+
+def reap_expired(limit: int = 100) -> List[CollectionTask]:
+    """
+    Devuelve a la cola las tareas tomadas cuyo worker dejó de enviar heartbeat.
+
+    Returns:
+        Tareas que agotaron sus intentos; el llamador debe cerrarlas con fail_task.
+    """
+    client = _call("reap", _get_client)
+    redis_now = _call("reap", client.time)[0]
+    expired = _call("reap", client.zrangebyscore, _PROCESSING_KEY, "-inf", redis_now, start=0, num=limit)
+
+    dead = []
+    for task_id in expired:
+        raw = _call("reap", client.hgetall, _task_key(task_id))
+        if not raw:
+            _call("reap", client.zrem, _PROCESSING_KEY, task_id)
+            continue
+        result = _script("release", [_PROCESSING_KEY, _READY_KEY, _task_key(task_id)], [
+            task_id, settings.collection_queue_max_attempts, "Vencida la visibilidad (worker sin heartbeat)",
+            settings.collection_queue_visibility_timeout_seconds, "1",
+        ])
+        if result == 0:
+            logger.warning(f"Tarea {task_id} de la corrida {raw['run_id']} devuelta a la cola (sin heartbeat)")
+        elif result == 1:
+            dead.append(CollectionTask(task_id, raw["run_id"], json.loads(raw["printer_ids"]), int(raw.get("attempts") or 0)))
+    return dead
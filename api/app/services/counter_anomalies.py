@@ -0,0 +1,306 @@
+"""
+Detección de anomalías en el historial de contadores (monthly_counters).
+
+Las páginas impresas se calculan como max(0, actual - anterior): un reseteo, un
+cambio de placa, el desborde de un contador de 32 bits o la lectura de otra
+impresora quedan ocultos en ese cálculo hasta que alguien los factura. Este
+análisis carga el historial de toda la flota en arreglos de NumPy (una consulta
+ordenada por impresora y fecha) y marca, sin recorrer lectura por lectura:
+
+- reset: el contador total baja.
+- wrap: el contador baja desde cerca de 2**31 o 2**32 (desborde del contador).
+- jump: la tasa diaria de un intervalo es atípica para esa impresora (z robusto
+  con mediana y MAD de las tasas de la propia impresora).
+- flatline: el contador no cambia durante counter_anomaly_flatline_days o más
+  pese a seguir leyéndose, en una impresora que imprimió en la ventana analizada.
+
+Los hallazgos se guardan en counter_anomalies con upsert por (lectura, tipo).
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+import logging
+import time
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import dialect_insert
+from ..models import CounterAnomaly, MonthlyCounter
+
+logger = logging.getLogger(__name__)
+
+KIND_RESET = "reset"
+KIND_WRAP = "wrap"
+KIND_JUMP = "jump"
+KIND_FLATLINE = "flatline"
+KINDS = (KIND_RESET, KIND_WRAP, KIND_JUMP, KIND_FLATLINE)
+
+# Rangos en los que desbordan los contadores (32 bits con y sin signo), de menor a mayor
+WRAP_MODULI = (2 ** 31, 2 ** 32)
+# Si la lectura anterior estaba en el último 5% de un rango, la bajada es un desborde
+_WRAP_HEADROOM = 0.95
+# Intervalos más cortos que esto no dan una tasa diaria confiable
+_MIN_INTERVAL_DAYS = 1 / 24
+# Escala de la MAD (y de la desviación media absoluta) a desvío estándar normal
+_MAD_SCALE = 0.6745
+_MEAN_AD_SCALE = 1.253314
+
+_SECONDS_PER_DAY = 86400.0
+_UPSERT_BATCH_SIZE = 500
+
+
+@dataclass
+class CounterSeries:
+    """Historial de lecturas de la flota, ordenado por (printer_id, recorded_at)."""
+    counter_ids: np.ndarray
+    printer_ids: np.ndarray
+    timestamps: np.ndarray  # segundos epoch (float64)
+    totals: np.ndarray
+    recorded_at: List[datetime]
+
+    def __len__(self) -> int:
+        return len(self.counter_ids)
+
+
+@dataclass
+class Anomaly:
+    printer_id: int
+    kind: str
+    counter_id: int
+    previous_counter_id: Optional[int]
+    recorded_at: datetime
+    previous_value: Optional[int]
+    value: Optional[int]
+    delta: Optional[int]
+    score: Optional[float]
+    details: str
+
+
+def build_series(rows: Sequence[Sequence[Any]]) -> CounterSeries:
+    """Arma la serie desde filas (counter_id, printer_id, recorded_at, counter_total) ya ordenadas."""
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return CounterSeries(empty, empty, np.empty(0), empty, [])
+    counter_ids, printer_ids, recorded_at, totals = zip(*rows)
+    return CounterSeries(
+        counter_ids=np.asarray(counter_ids, dtype=np.int64),
+        printer_ids=np.asarray(printer_ids, dtype=np.int64),
+        timestamps=np.fromiter((moment.timestamp() for moment in recorded_at), dtype=np.float64, count=len(rows)),
+        totals=np.asarray(totals, dtype=np.int64),
+        recorded_at=list(recorded_at),
+    )
+
+
+def load_series(db: Session, printer_ids: Optional[List[int]] = None, since: Optional[datetime] = None) -> CounterSeries:
+    """Historial de monthly_counters (todas las impresoras o las indicadas) desde ``since``."""
+    query = db.query(
+        MonthlyCounter.id, MonthlyCounter.printer_id, MonthlyCounter.recorded_at, MonthlyCounter.counter_total
+    ).filter(
+        MonthlyCounter.recorded_at.isnot(None),
+        MonthlyCounter.counter_total.isnot(None)
+    )
+    if printer_ids:
+        query = query.filter(MonthlyCounter.printer_id.in_(printer_ids))
+    if since is not None:
+        query = query.filter(MonthlyCounter.recorded_at >= since)
+    return build_series(
+        query.order_by(MonthlyCounter.printer_id, MonthlyCounter.recorded_at, MonthlyCounter.id).all()
+    )
+
+
+def _group_median(values: np.ndarray, groups: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Mediana de ``values`` por grupo (grupos densos 0..n-1, todos con al menos un valor)."""
+    sorted_values = values[np.lexsort((values, groups))]
+    starts = np.cumsum(counts) - counts
+    return (sorted_values[starts + (counts - 1) // 2] + sorted_values[starts + counts // 2]) / 2
+
+
+def detect_anomalies(
+    series: CounterSeries,
+    jump_z: Optional[float] = None,
+    jump_min_pages: Optional[int] = None,
+    min_intervals: Optional[int] = None,
+    flatline_days: Optional[float] = None,
+) -> List[Anomaly]:
+    """Anomalías de la serie; los umbrales no indicados salen de settings."""
+    jump_z = settings.counter_anomaly_jump_z if jump_z is None else jump_z
+    jump_min_pages = settings.counter_anomaly_jump_min_pages if jump_min_pages is None else jump_min_pages
+    min_intervals = settings.counter_anomaly_min_intervals if min_intervals is None else min_intervals
+    flatline_days = settings.counter_anomaly_flatline_days if flatline_days is None else flatline_days
+
+    if len(series) < 2:
+        return []
+
+    # Intervalo j: lectura prev[j] -> cur[j] de la misma impresora
+    prev = np.nonzero(series.printer_ids[1:] == series.printer_ids[:-1])[0]
+    cur = prev + 1
+    if prev.size == 0:
+        return []
+    printers = series.printer_ids[cur]
+    delta = series.totals[cur] - series.totals[prev]
+    days = (series.timestamps[cur] - series.timestamps[prev]) / _SECONDS_PER_DAY
+
+    anomalies: List[Anomaly] = []
+
+    def interval_anomaly(j: int, kind: str, score: Optional[float], details: str, pages: Optional[int] = None) -> Anomaly:
+        return Anomaly(
+            printer_id=int(printers[j]),
+            kind=kind,
+            counter_id=int(series.counter_ids[cur[j]]),
+            previous_counter_id=int(series.counter_ids[prev[j]]),
+            recorded_at=series.recorded_at[cur[j]],
+            previous_value=int(series.totals[prev[j]]),
+            value=int(series.totals[cur[j]]),
+            delta=int(delta[j]) if pages is None else pages,
+            score=score,
+            details=details,
+        )
+
+    # Bajadas del contador: desborde si venía del final del rango, reseteo si no
+    drop = delta < 0
+    previous_totals = series.totals[prev]
+    modulus = np.zeros_like(delta)
+    for limit in WRAP_MODULI:
+        modulus[(previous_totals >= int(limit * _WRAP_HEADROOM)) & (previous_totals < limit)] = limit
+    wrap = drop & (modulus > 0)
+    for j in np.nonzero(wrap)[0].tolist():
+        pages = int(delta[j] + modulus[j])
+        anomalies.append(interval_anomaly(
+            j, KIND_WRAP, None, f"Desborde del contador: {pages} páginas reales en el intervalo", pages
+        ))
+    for j in np.nonzero(drop & ~wrap)[0].tolist():
+        anomalies.append(interval_anomaly(
+            j, KIND_RESET, None,
+            f"El contador bajó {-int(delta[j])} páginas (reseteo, cambio de placa u otra impresora)"
+        ))
+
+    # Tasas diarias de los intervalos válidos, agrupadas por impresora
+    valid = ~drop & (days >= _MIN_INTERVAL_DAYS)
+    valid_idx = np.nonzero(valid)[0]
+    rated_printers = np.empty(0, dtype=np.int64)
+    mean_rate = np.empty(0)
+    if valid_idx.size:
+        rate = delta[valid_idx] / days[valid_idx]
+        rated_printers, groups = np.unique(printers[valid_idx], return_inverse=True)
+        counts = np.bincount(groups)
+        mean_rate = np.bincount(groups, weights=rate) / counts
+        median = _group_median(rate, groups, counts)
+        deviation = np.abs(rate - median[groups])
+        mad = _group_median(deviation, groups, counts)
+        mean_ad = np.bincount(groups, weights=deviation) / counts
+        # Con MAD 0 (la mayoría de las tasas iguales) se usa la desviación media absoluta
+        scale = np.where(mad > 0, mad / _MAD_SCALE, mean_ad * _MEAN_AD_SCALE)
+        z = np.divide(rate - median[groups], scale[groups], out=np.zeros_like(rate), where=scale[groups] > 0)
+        jump = (z > jump_z) & (counts[groups] >= min_intervals) & (delta[valid_idx] >= jump_min_pages)
+        for k in np.nonzero(jump)[0].tolist():
+            j = int(valid_idx[k])
+            anomalies.append(interval_anomaly(
+                j, KIND_JUMP, round(float(z[k]), 2),
+                f"{rate[k]:.0f} páginas/día contra una mediana de {median[groups[k]]:.0f} páginas/día"
+            ))
+
+    # Rachas de intervalos consecutivos sin cambios
+    flat = delta == 0
+    continues = np.zeros_like(flat)
+    continues[1:] = flat[1:] & flat[:-1] & (prev[1:] == prev[:-1] + 1)
+    run_starts = np.nonzero(flat & ~continues)[0]
+    run_ends = np.nonzero(flat & ~np.append(continues[1:], False))[0]
+    if run_starts.size:
+        first, last = prev[run_starts], cur[run_ends]
+        flat_days = (series.timestamps[last] - series.timestamps[first]) / _SECONDS_PER_DAY
+        # Solo impresoras que imprimieron algo en la ventana: una guardada no está "plana"
+        active_printers = rated_printers[mean_rate > 0]
+        flatline = (flat_days >= flatline_days) & np.isin(series.printer_ids[first], active_printers)
+        for r in np.nonzero(flatline)[0].tolist():
+            a, b = int(first[r]), int(last[r])
+            anomalies.append(Anomaly(
+                printer_id=int(series.printer_ids[a]),
+                kind=KIND_FLATLINE,
+                # La racha se identifica por su primera lectura: sigue siendo la misma fila mientras crece
+                counter_id=int(series.counter_ids[a]),
+                previous_counter_id=None,
+                recorded_at=series.recorded_at[a],
+                previous_value=int(series.totals[a]),
+                value=int(series.totals[b]),
+                delta=0,
+                score=round(float(flat_days[r]), 1),
+                details=(
+                    f"Contador sin cambios durante {flat_days[r]:.1f} días ({b - a + 1} lecturas, "
+                    f"hasta {series.recorded_at[b]:%Y-%m-%d %H:%M})"
+                ),
+            ))
+
+    return anomalies
+
+
+def persist_anomalies(
+    db: Session,
+    anomalies: List[Anomaly],
+    seen_at: datetime,
+    printer_ids: Optional[List[int]] = None,
+    since: Optional[datetime] = None,
+) -> None:
+    """
+    Upsert de las anomalías y borrado de las no reconocidas del mismo alcance
+    (impresoras y ventana analizadas) que este análisis ya no encontró.
+    """
+    table = CounterAnomaly.__table__
+    insert = dialect_insert(db)
+    rows = [{**anomaly.__dict__, "acknowledged": False, "last_seen_at": seen_at} for anomaly in anomalies]
+    updated = ("previous_counter_id", "recorded_at", "previous_value", "value", "delta", "score", "details", "last_seen_at")
+    for start in range(0, len(rows), _UPSERT_BATCH_SIZE):
+        stmt = insert(table).values(rows[start:start + _UPSERT_BATCH_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["counter_id", "kind"],
+            set_={column: stmt.excluded[column] for column in updated}
+        )
+        db.execute(stmt)
+
+    stale = db.query(CounterAnomaly).filter(
+        CounterAnomaly.acknowledged.is_(False),
+        CounterAnomaly.last_seen_at < seen_at
+    )
+    if printer_ids:
+        stale = stale.filter(CounterAnomaly.printer_id.in_(printer_ids))
+    if since is not None:
+        stale = stale.filter(CounterAnomaly.recorded_at >= since)
+    stale.delete(synchronize_session=False)
+    db.commit()
+
+
+def analyze_counters(
+    db: Session,
+    printer_ids: Optional[List[int]] = None,
+    lookback_days: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Analiza el historial (flota completa por defecto) y guarda los hallazgos."""
+    started = time.perf_counter()
+    seen_at = datetime.now()
+    lookback_days = settings.counter_anomaly_lookback_days if lookback_days is None else lookback_days
+    since = seen_at - timedelta(days=lookback_days) if lookback_days > 0 else None
+
+    series = load_series(db, printer_ids, since)
+    loaded = time.perf_counter()
+    anomalies = detect_anomalies(series)
+    detected = time.perf_counter()
+    persist_anomalies(db, anomalies, seen_at, printer_ids, since)
+
+    by_kind = {kind: 0 for kind in KINDS}
+    for anomaly in anomalies:
+        by_kind[anomaly.kind] += 1
+    summary = {
+        "printers_analyzed": int(np.unique(series.printer_ids).size),
+        "readings_analyzed": len(series),
+        "anomalies_found": len(anomalies),
+        "by_kind": by_kind,
+        "timings": {
+            "load_seconds": round(loaded - started, 3),
+            "detect_seconds": round(detected - loaded, 3),
+            "total_seconds": round(time.perf_counter() - started, 3),
+        },
+    }
+    logger.info(f"Análisis de anomalías de contadores: {summary}")
+    return summary
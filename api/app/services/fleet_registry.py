@@ -0,0 +1,397 @@
+"""
+Registro en memoria de la flota para los caminos de sondeo y recolección.
+
+Los programadores y colectores solo necesitan unos pocos campos de cada impresora
+(id, IP, perfil SNMP, marca/modelo, ubicación y flags). En lugar de volver a
+consultar Printer por el ORM en cada ciclo, cada proceso mantiene un registro
+compacto: un FleetEntry con __slots__ por impresora, los estados como bits de un
+entero y los textos repetidos (marca, modelo, perfil, ubicación) internados, de modo
+que cada impresora ocupa unos 240 bytes (~12 MB con 50.000; ver FleetRegistry.stats()).
+
+Actualización incremental:
+- Los commits del ORM que crean, modifican o borran impresoras se detectan con
+  eventos de la sesión y se publican con mark_changed(): se incrementa un contador
+  de versión en Redis y cada impresora queda anotada con la versión de su cambio.
+- Antes de usarse, el registro compara su versión con la de Redis (como mucho una
+  vez por segundo) y recarga solo las impresoras cambiadas desde entonces. Los
+  UPDATE/DELETE masivos piden una recarga completa.
+- Sin Redis, los cambios del propio proceso se aplican igual. En todos los casos se
+  recarga completo cada fleet_registry_full_reload_seconds, lo que también cubre
+  cambios hechos fuera del ORM.
+"""
+
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Set
+import logging
+import sys
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import SessionLocal
+from ..models import Printer
+
+logger = logging.getLogger(__name__)
+
+FLAG_ACTIVE = 1            # status == 'active'
+FLAG_IGNORE_COUNTERS = 2
+FLAG_MEDICAL = 4           # is_medical (DRYPIX y similares)
+FLAG_DRYPIX = 8            # modelo DRYPIX: lectura por HTTP en lugar de SNMP
+
+_VERSION_KEY = "fleet:version"
+_CHANGES_KEY = "fleet:changes"          # ZSET printer_id -> versión de su último cambio
+_RELOAD_KEY = "fleet:reload_version"    # versión a partir de la cual hay que recargar todo
+_REDIS_RETRY_SECONDS = 30
+_CHECK_INTERVAL_SECONDS = 1.0
+
+# KEYS: version, changes, reload | ARGV: recarga completa (1/0), printer_ids...
+_MARK_CHANGED_LUA = """
+local version = redis.call('INCR', KEYS[1])
+if ARGV[1] == '1' then
+  redis.call('SET', KEYS[3], version)
+end
+for i = 2, #ARGV do
+  redis.call('ZADD', KEYS[2], version, ARGV[i])
+end
+return version
+"""
+
+_COLUMNS = (
+    Printer.id, Printer.ip, Printer.brand, Printer.model, Printer.snmp_profile, Printer.location,
+    Printer.lease_contract, Printer.status, Printer.ignore_counters, Printer.is_medical,
+)
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+class FleetEntry:
+    """Campos de una impresora que usan los sondeos (mismos nombres que Printer)."""
+
+    __slots__ = ("id", "ip", "brand", "model", "snmp_profile", "location", "lease_contract", "flags")
+
+    def __init__(self, id: int, ip: str, brand: str, model: str, snmp_profile: Optional[str],
+                 location: Optional[str], lease_contract: Optional[str], flags: int):
+        self.id = id
+        self.ip = ip
+        self.brand = brand
+        self.model = model
+        self.snmp_profile = snmp_profile
+        self.location = location
+        self.lease_contract = lease_contract
+        self.flags = flags
+
+    @classmethod
+    def from_row(cls, row) -> "FleetEntry":
+        printer_id, ip, brand, model, snmp_profile, location, lease_contract, status, ignore_counters, is_medical = row
+        flags = 0
+        if status == "active":
+            flags |= FLAG_ACTIVE
+        if ignore_counters:
+            flags |= FLAG_IGNORE_COUNTERS
+        if is_medical:
+            flags |= FLAG_MEDICAL
+        if "DRYPIX" in (model or "").upper():
+            flags |= FLAG_DRYPIX
+        return cls(
+            printer_id, ip, _intern(brand), _intern(model), _intern(snmp_profile),
+            _intern(location), _intern(lease_contract), flags,
+        )
+
+    @property
+    def is_active(self) -> bool:
+        return bool(self.flags & FLAG_ACTIVE)
+
+    @property
+    def ignore_counters(self) -> bool:
+        return bool(self.flags & FLAG_IGNORE_COUNTERS)
+
+    @property
+    def is_medical(self) -> bool:
+        return bool(self.flags & FLAG_MEDICAL)
+
+    def __repr__(self) -> str:
+        return f"FleetEntry(id={self.id}, ip={self.ip!r}, model={self.model!r}, flags={self.flags})"
+
+
+class FleetRegistry:
+    """Registro de la flota de un proceso (usar get_fleet_registry())."""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._lock = threading.RLock()
+        self._entries: Dict[int, FleetEntry] = {}
+        self._loaded = False
+        self._version = 0
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._pending_ids: Set[int] = set()
+        self._pending_reload = False
+        self._redis = None
+        self._redis_disabled_until = 0.0
+        self._mark_script = None
+
+    # ------------------------------------------------------------------
+    # Redis
+    # ------------------------------------------------------------------
+
+    def _get_redis(self):
+        """Cliente Redis perezoso; None si Redis no está disponible (con reintento diferido)."""
+        if not settings.fleet_registry_redis_enabled:
+            return None
+        if self._redis is not None:
+            return self._redis
+        if time.monotonic() < self._redis_disabled_until:
+            return None
+        try:
+            import redis as redis_lib
+
+            client = redis_lib.Redis(
+                host=settings.redis_host,
+                port=settings.redis_port,
+                password=settings.redis_password,
+                socket_connect_timeout=0.5,
+                socket_timeout=0.5,
+                decode_responses=True
+            )
+            client.ping()
+            self._mark_script = client.register_script(_MARK_CHANGED_LUA)
+            self._redis = client
+            return client
+        except Exception as e:
+            logger.warning(f"Registro de flota sin Redis (recarga completa periódica): {e}")
+            self._redis_disabled_until = time.monotonic() + _REDIS_RETRY_SECONDS
+            return None
+
+    def _redis_failed(self, e: Exception) -> None:
+        logger.warning(f"Error de Redis en el registro de flota: {e}")
+        self._redis = None
+        self._redis_disabled_until = time.monotonic() + _REDIS_RETRY_SECONDS
+
+    # ------------------------------------------------------------------
+    # Carga
+    # ------------------------------------------------------------------
+
+    def _load(self, printer_ids: Optional[Iterable[int]] = None) -> None:
+        """Carga completa (printer_ids=None) o de las impresoras indicadas (las que ya no existen se quitan)."""
+        db = self.session_factory()
+        try:
+            query = db.query(*_COLUMNS)
+            if printer_ids is not None:
+                printer_ids = list(printer_ids)
+                if not printer_ids:
+                    return
+                query = query.filter(Printer.id.in_(printer_ids))
+            entries = {row[0]: FleetEntry.from_row(row) for row in query}
+        finally:
+            db.close()
+
+        with self._lock:
+            if printer_ids is None:
+                self._entries = entries
+                self._loaded = True
+                self._loaded_at = time.monotonic()
+            else:
+                for printer_id in printer_ids:
+                    entry = entries.get(printer_id)
+                    if entry is None:
+                        self._entries.pop(printer_id, None)
+                    else:
+                        self._entries[printer_id] = entry
+
+    def refresh(self, force: bool = False) -> None:
+        """Aplica los cambios publicados desde la última actualización."""
+        now = time.monotonic()
+        with self._lock:
+            if not force and self._loaded and now - self._checked_at < _CHECK_INTERVAL_SECONDS \
+                    and not self._pending_ids and not self._pending_reload:
+                return
+            self._checked_at = now
+            pending_ids, self._pending_ids = self._pending_ids, set()
+            full = force or not self._loaded or self._pending_reload
+            self._pending_reload = False
+
+            remote_ids: Optional[List[int]] = None
+            version = self._version
+            client = self._get_redis()
+            if client is not None:
+                try:
+                    raw_version, raw_reload = client.mget(_VERSION_KEY, _RELOAD_KEY)
+                    version, reload_version = int(raw_version or 0), int(raw_reload or 0)
+                    if version < self._version or reload_version > self._version:
+                        full = True  # Redis reiniciado o UPDATE/DELETE masivo
+                    elif version > self._version and not full:
+                        remote_ids = [
+                            int(printer_id)
+                            for printer_id in client.zrangebyscore(_CHANGES_KEY, f"({self._version}", version)
+                        ]
+                except Exception as e:
+                    self._redis_failed(e)
+                    version = self._version
+            if now - self._loaded_at >= settings.fleet_registry_full_reload_seconds:
+                full = True  # También cubre cambios hechos fuera del ORM (SQL directo, otros sistemas)
+
+            try:
+                if full:
+                    self._load()
+                else:
+                    changed = pending_ids.union(remote_ids or ())
+                    if changed:
+                        self._load(changed)
+            except Exception:
+                # Se reintenta en la próxima consulta
+                self._pending_ids |= pending_ids
+                self._pending_reload = self._pending_reload or full or bool(remote_ids)
+                raise
+            self._version = version
+
+    # ------------------------------------------------------------------
+    # Cambios
+    # ------------------------------------------------------------------
+
+    def mark_changed(self, printer_ids: Iterable[int] = (), full_reload: bool = False) -> None:
+        """Publica cambios de impresoras (tras el commit) para este y los demás procesos."""
+        printer_ids = {int(printer_id) for printer_id in printer_ids}
+        if not printer_ids and not full_reload:
+            return
+        with self._lock:
+            self._pending_ids |= printer_ids
+            self._pending_reload = self._pending_reload or full_reload
+
+        client = self._get_redis()
+        if client is None:
+            return
+        try:
+            self._mark_script(
+                keys=[_VERSION_KEY, _CHANGES_KEY, _RELOAD_KEY],
+                args=["1" if full_reload else "0", *sorted(printer_ids)]
+            )
+        except Exception as e:
+            self._redis_failed(e)
+
+    # ------------------------------------------------------------------
+    # Consultas (sin base de datos)
+    # ------------------------------------------------------------------
+
+    def get(self, printer_id: int) -> Optional[FleetEntry]:
+        self.refresh()
+        return self._entries.get(printer_id)
+
+    def get_many(self, printer_ids: Iterable[int]) -> List[FleetEntry]:
+        """Entradas de las impresoras indicadas que existen, en el orden pedido."""
+        self.refresh()
+        entries = self._entries
+        return [entries[printer_id] for printer_id in printer_ids if printer_id in entries]
+
+    def select(
+        self,
+        printer_ids: Optional[Iterable[int]] = None,
+        active_only: bool = True,
+        counters_only: bool = True,
+        medical: Optional[bool] = None,
+        lease_contract: Optional[str] = None,
+    ) -> List[FleetEntry]:
+        """
+        Impresoras a sondear, ordenadas por id.
+
+        Por defecto las activas con contadores habilitados (mismo filtro que usaban
+        las consultas de recolección: status == 'active' y ignore_counters == False).
+        """
+        self.refresh()
+        required = (FLAG_ACTIVE if active_only else 0)
+        if printer_ids is not None:
+            entries = self.get_many(sorted(set(printer_ids)))
+        else:
+            entries = sorted(self._entries.values(), key=lambda entry: entry.id)
+        return [
+            entry for entry in entries
+            if entry.flags & required == required
+            and not (counters_only and entry.flags & FLAG_IGNORE_COUNTERS)
+            and (medical is None or bool(entry.flags & FLAG_MEDICAL) == medical)
+            and (lease_contract is None or entry.lease_contract == lease_contract)
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        """Tamaño del registro en memoria (los textos compartidos se cuentan una vez)."""
+        self.refresh()
+        with self._lock:
+            entries = list(self._entries.items())
+            total = sys.getsizeof(self._entries)
+            version = self._version
+        seen: Set[int] = set()
+        for printer_id, entry in entries:
+            total += sys.getsizeof(printer_id) + sys.getsizeof(entry)
+            for value in (entry.ip, entry.brand, entry.model, entry.snmp_profile, entry.location, entry.lease_contract):
+                if value is not None and id(value) not in seen:
+                    seen.add(id(value))
+                    total += sys.getsizeof(value)
+        count = len(entries)
+        return {
+            "printers": count,
+            "version": version,
+            "memory_bytes": total,
+            "bytes_per_printer": round(total / count, 1) if count else 0,
+        }
+
+
+_registry: Optional[FleetRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def _get_registry() -> FleetRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = FleetRegistry()
+    return _registry
+
+
+def get_fleet_registry() -> FleetRegistry:
+    """Registro de la flota del proceso, ya actualizado."""
+    registry = _get_registry()
+    registry.refresh()
+    return registry
+
+
+# ----------------------------------------------------------------------
+# Detección de cambios de Printer en las sesiones del ORM
+# ----------------------------------------------------------------------
+
+_INFO_IDS = "fleet_changed_ids"
+_INFO_RELOAD = "fleet_full_reload"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_printers(session, flush_context):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Printer) and obj.id is not None:
+            session.info.setdefault(_INFO_IDS, set()).add(obj.id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_printer_changes(orm_execute_state):
+    # query(Printer).update()/delete() no pasan por la unidad de trabajo: recarga completa
+    mapper = orm_execute_state.bind_mapper
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and mapper is not None \
+            and mapper.class_ is Printer:
+        orm_execute_state.session.info[_INFO_RELOAD] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_printer_changes(session):
+    printer_ids = session.info.pop(_INFO_IDS, None)
+    full_reload = session.info.pop(_INFO_RELOAD, False)
+    if printer_ids or full_reload:
+        # No carga el registro: en un proceso que no lo usa solo avisa a los demás
+        _get_registry().mark_changed(printer_ids or (), full_reload)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_printer_changes(session):
+    session.info.pop(_INFO_IDS, None)
+    session.info.pop(_INFO_RELOAD, None)
@@ -0,0 +1,123 @@
+"""
+Mantenimiento de printer_latest_counter (última lectura de contador por impresora).
+
+Cada inserción de MonthlyCounter debe pasar por upsert_latest_counters (o
+record_latest_counter); las ediciones y borrados llaman a refresh_latest_counter,
+que recalcula la fila desde el historial. El upsert solo avanza la fila si la
+lectura es igual o más reciente que la guardada, así los registros retroactivos
+no pisan la última lectura real.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy.orm import Session
+
+from ..db import dialect_insert
+from ..models import MonthlyCounter, PrinterLatestCounter
+
+_COLUMNS = ("counter_id", "year", "month", "counter_bw", "counter_color", "counter_total", "recorded_at")
+
+
+def upsert_latest_counters(db: Session, rows: Iterable[Dict[str, Any]]) -> None:
+    """
+    Upsert en lote (una sola sentencia INSERT ... ON CONFLICT).
+
+    Cada fila: printer_id, counter_id, year, month, counter_bw, counter_color,
+    counter_total, recorded_at. No hace commit.
+    """
+    # Una fila por impresora: la más reciente del lote
+    latest: Dict[int, Dict[str, Any]] = {}
+    for row in rows:
+        current = latest.get(row["printer_id"])
+        if current is None or row["recorded_at"] >= current["recorded_at"]:
+            latest[row["printer_id"]] = row
+    if not latest:
+        return
+
+    table = PrinterLatestCounter.__table__
+    values = [
+        {"printer_id": printer_id, **{column: row[column] for column in _COLUMNS}}
+        for printer_id, row in latest.items()
+    ]
+    stmt = dialect_insert(db)(table).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.printer_id],
+        set_={column: stmt.excluded[column] for column in _COLUMNS},
+        where=table.c.recorded_at <= stmt.excluded.recorded_at,
+    )
+    db.execute(stmt)
+
+
+def record_latest_counter(db: Session, counter: MonthlyCounter) -> None:
+    """Registra un MonthlyCounter recién agregado (hace flush para obtener su id)."""
+    if counter.id is None or counter.recorded_at is None:
+        db.flush()
+        db.refresh(counter, ["id", "recorded_at"])
+    upsert_latest_counters(db, [{
+        "printer_id": counter.printer_id,
+        "counter_id": counter.id,
+        "year": counter.year,
+        "month": counter.month,
+        "counter_bw": counter.counter_bw,
+        "counter_color": counter.counter_color,
+        "counter_total": counter.counter_total,
+        "recorded_at": counter.recorded_at,
+    }])
+
+
+def refresh_latest_counter(db: Session, printer_id: int) -> None:
+    """Recalcula la última lectura de una impresora desde el historial (tras editar o borrar)."""
+    db.flush()
+    counter = (
+        db.query(MonthlyCounter)
+        .filter(MonthlyCounter.printer_id == printer_id)
+        .order_by(MonthlyCounter.recorded_at.desc(), MonthlyCounter.id.desc())
+        .first()
+    )
+    latest = db.get(PrinterLatestCounter, printer_id)
+
+    if counter is None:
+        if latest is not None:
+            db.delete(latest)
+        return
+
+    if latest is None:
+        latest = PrinterLatestCounter(printer_id=printer_id)
+        db.add(latest)
+    latest.counter_id = counter.id
+    latest.year = counter.year
+    latest.month = counter.month
+    latest.counter_bw = counter.counter_bw
+    latest.counter_color = counter.counter_color
+    latest.counter_total = counter.counter_total
+    latest.recorded_at = counter.recorded_at
+
+
+def get_latest_counters(db: Session, printer_ids: List[int]) -> Dict[int, PrinterLatestCounter]:
+    """Última lectura de cada impresora de la lista (búsqueda por clave primaria)."""
+    if not printer_ids:
+        return {}
+    return {
+        row.printer_id: row
+        for row in db.query(PrinterLatestCounter).filter(PrinterLatestCounter.printer_id.in_(printer_ids))
+    }
+
+
+def get_recently_read(db: Session, printer_ids: List[int], since: datetime) -> Dict[int, datetime]:
+    """
+    Impresoras de la lista cuya última lectura es de una corrida de recolección
+    (collection_run_id) registrada desde ``since`` -> fecha de esa lectura.
+    Las cargas y ediciones manuales no cuentan como lectura reciente.
+    """
+    if not printer_ids:
+        return {}
+    return dict(
+        db.query(PrinterLatestCounter.printer_id, PrinterLatestCounter.recorded_at)
+        .join(MonthlyCounter, MonthlyCounter.id == PrinterLatestCounter.counter_id)
+        .filter(
+            PrinterLatestCounter.printer_id.in_(printer_ids),
+            PrinterLatestCounter.recorded_at >= since,
+            MonthlyCounter.collection_run_id.isnot(None),
+        )
+    )
@@ -1,6 +1,7 @@
 from calendar import monthrange
-from typing import Dict, List
+from typing import Dict, Iterable, List, Set, Tuple
 
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from ..models import LocationCounterSegment, MonthlyCounter
@@ -32,8 +33,6 @@ def sync_location_segments_for_printer_month(
 ) -> None:
     """Synchronize auto-generated location segments (movement_id NULL) for a printer-month."""
 
-    month_end = monthrange(year, month)[1]
-
     counters = (
         db.query(MonthlyCounter)
         .filter(
@@ -56,6 +55,19 @@ def sync_location_segments_for_printer_month(
         .all()
     )
 
+    _apply_auto_segments(db, printer_id, year, month, counters, auto_segments)
+
+
+def _apply_auto_segments(
+    db: Session,
+    printer_id: int,
+    year: int,
+    month: int,
+    counters: List[MonthlyCounter],
+    auto_segments: List[LocationCounterSegment],
+) -> None:
+    month_end = monthrange(year, month)[1]
+
     if not counters:
         for segment in auto_segments:
             db.delete(segment)
@@ -112,3 +124,186 @@ def sync_location_segments_for_printer_month(
         )
         if is_auto_full_month and segment.location not in valid_locations:
             db.delete(segment)
+
+
+def apply_new_counters_to_segments(db: Session, counters: Iterable[MonthlyCounter]) -> None:
+    """
+    Incremental update of auto segments for newly appended counter readings.
+
+    Each reading must be the latest one of its printer-month (e.g. automatic
+    collection, recorded_at = now): its deltas are added to the matching
+    (printer, location, month) segment and the segment end counters move to the
+    reading. Existing history is not reloaded. Edits, deletes, backdated records
+    and location corrections must use sync_location_segments_for_printer_month.
+    """
+
+    counters = list(counters)
+    if not counters:
+        return
+
+    printers_by_month: Dict[Tuple[int, int], Set[int]] = {}
+    for row in counters:
+        printers_by_month.setdefault((row.year, row.month), set()).add(row.printer_id)
+
+    segments: Dict[Tuple[int, str, int, int], LocationCounterSegment] = {}
+    for (year, month), printer_ids in printers_by_month.items():
+        month_end = monthrange(year, month)[1]
+        for segment in (
+            db.query(LocationCounterSegment)
+            .filter(
+                LocationCounterSegment.printer_id.in_(printer_ids),
+                LocationCounterSegment.year == year,
+                LocationCounterSegment.month == month,
+                LocationCounterSegment.movement_id.is_(None),
+                LocationCounterSegment.segment_start_date == 1,
+                LocationCounterSegment.segment_end_date == month_end,
+            )
+        ):
+            segments[(segment.printer_id, segment.location, year, month)] = segment
+
+    for row in counters:
+        location = _normalize_location(row.location_snapshot)
+        key = (row.printer_id, location, row.year, row.month)
+        segment = segments.get(key)
+        if not segment:
+            segment = LocationCounterSegment(
+                printer_id=row.printer_id,
+                location=location,
+                year=row.year,
+                month=row.month,
+                segment_start_date=1,
+                segment_end_date=monthrange(row.year, row.month)[1],
+                movement_id=None,
+                counter_bw_start=row.previous_counter_bw or 0,
+                counter_color_start=row.previous_counter_color or 0,
+                counter_total_start=row.previous_counter_total or 0,
+                pages_bw=0,
+                pages_color=0,
+                pages_total=0,
+            )
+            db.add(segment)
+            segments[key] = segment
+
+        segment.counter_bw_end = row.counter_bw or 0
+        segment.counter_color_end = row.counter_color or 0
+        segment.counter_total_end = row.counter_total or 0
+        segment.pages_bw = (segment.pages_bw or 0) + (row.pages_printed_bw or 0)
+        segment.pages_color = (segment.pages_color or 0) + (row.pages_printed_color or 0)
+        segment.pages_total = (segment.pages_total or 0) + (row.pages_printed_total or 0)
+        segment.data_quality = "real"
+
+
+_MONTH_SEGMENTS_SQL = text("""
+    WITH normalized AS (
+        SELECT
+            id,
+            printer_id,
+            recorded_at,
+            CASE
+                WHEN location_snapshot IS NULL OR TRIM(location_snapshot) = '' THEN :default_location
+                WHEN LOWER(TRIM(location_snapshot)) IN ('descubierto automaticamente', 'descubierto automáticamente')
+                    THEN :default_location
+                ELSE TRIM(location_snapshot)
+            END AS location,
+            previous_counter_bw, previous_counter_color, previous_counter_total,
+            counter_bw, counter_color, counter_total,
+            pages_printed_bw, pages_printed_color, pages_printed_total
+        FROM monthly_counters
+        WHERE year = :year AND month = :month
+    ),
+    ranked AS (
+        SELECT
+            *,
+            ROW_NUMBER() OVER (PARTITION BY printer_id, location ORDER BY recorded_at ASC, id ASC) AS rn_first,
+            ROW_NUMBER() OVER (PARTITION BY printer_id, location ORDER BY recorded_at DESC, id DESC) AS rn_last
+        FROM normalized
+    )
+    SELECT
+        printer_id,
+        location,
+        MAX(CASE WHEN rn_first = 1 THEN COALESCE(previous_counter_bw, 0) END) AS counter_bw_start,
+        MAX(CASE WHEN rn_last = 1 THEN COALESCE(counter_bw, 0) END) AS counter_bw_end,
+        MAX(CASE WHEN rn_first = 1 THEN COALESCE(previous_counter_color, 0) END) AS counter_color_start,
+        MAX(CASE WHEN rn_last = 1 THEN COALESCE(counter_color, 0) END) AS counter_color_end,
+        MAX(CASE WHEN rn_first = 1 THEN COALESCE(previous_counter_total, 0) END) AS counter_total_start,
+        MAX(CASE WHEN rn_last = 1 THEN COALESCE(counter_total, 0) END) AS counter_total_end,
+        SUM(COALESCE(pages_printed_bw, 0)) AS pages_bw,
+        SUM(COALESCE(pages_printed_color, 0)) AS pages_color,
+        SUM(COALESCE(pages_printed_total, 0)) AS pages_total,
+        COUNT(*) AS counters
+    FROM ranked
+    GROUP BY printer_id, location
+""")
+
+
+def rebuild_location_segments_for_month(db: Session, year: int, month: int) -> Dict[str, int]:
+    """
+    Full recompute of the auto segments of every printer for a month.
+
+    Same result as calling sync_location_segments_for_printer_month for each
+    printer, but the per-location aggregation runs as a single SQL query and the
+    existing segments are loaded with one more query. Does not commit.
+    """
+
+    month_end = monthrange(year, month)[1]
+    aggregates = db.execute(
+        _MONTH_SEGMENTS_SQL,
+        {"year": year, "month": month, "default_location": DEFAULT_LOCATION},
+    ).mappings().all()
+
+    existing = {
+        (seg.printer_id, seg.location): seg
+        for seg in db.query(LocationCounterSegment).filter(
+            LocationCounterSegment.year == year,
+            LocationCounterSegment.month == month,
+            LocationCounterSegment.movement_id.is_(None),
+            LocationCounterSegment.segment_start_date == 1,
+            LocationCounterSegment.segment_end_date == month_end,
+        )
+    }
+
+    created = 0
+    updated = 0
+    seen = set()
+    for row in aggregates:
+        key = (row["printer_id"], row["location"])
+        seen.add(key)
+        segment = existing.get(key)
+        if segment:
+            updated += 1
+        else:
+            segment = LocationCounterSegment(
+                printer_id=row["printer_id"],
+                location=row["location"],
+                year=year,
+                month=month,
+                segment_start_date=1,
+                segment_end_date=month_end,
+                movement_id=None,
+            )
+            db.add(segment)
+            created += 1
+
+        segment.counter_bw_start = row["counter_bw_start"]
+        segment.counter_bw_end = row["counter_bw_end"]
+        segment.counter_color_start = row["counter_color_start"]
+        segment.counter_color_end = row["counter_color_end"]
+        segment.counter_total_start = row["counter_total_start"]
+        segment.counter_total_end = row["counter_total_end"]
+        segment.pages_bw = row["pages_bw"]
+        segment.pages_color = row["pages_color"]
+        segment.pages_total = row["pages_total"]
+        segment.data_quality = "real"
+
+    deleted = 0
+    for key, segment in existing.items():
+        if key not in seen:
+            db.delete(segment)
+            deleted += 1
+
+    return {
+        "created_segments": created,
+        "updated_segments": updated,
+        "deleted_segments": deleted,
+        "total_counters": sum(row["counters"] for row in aggregates),
+    }
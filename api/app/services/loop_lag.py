@@ -0,0 +1,77 @@
+"""
+Medición del retraso (lag) del event loop de la API.
+
+Una tarea duerme ``loop_lag_interval_seconds`` en bucle y registra cuánto más tardó
+en despertar: es lo que esperó el loop por código que lo bloqueaba (jobs síncronos,
+endpoints async con I/O bloqueante, contención del GIL). Las muestras recientes se
+resumen en /health/detailed y el histograma ``event_loop_lag_seconds`` queda en
+/metrics.
+"""
+
+from collections import deque
+from typing import Any, Dict, Optional
+import asyncio
+import logging
+
+from prometheus_client import Histogram
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Retraso del event loop de la API al despertar de un sleep",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+
+def _percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LoopLagMonitor:
+    """Muestrea el lag del loop en el que corre (ver start())."""
+
+    def __init__(self, interval: Optional[float] = None, window: Optional[int] = None):
+        self.interval = interval or settings.loop_lag_interval_seconds
+        self.samples: deque = deque(maxlen=window or settings.loop_lag_window_samples)
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.samples.append(lag)
+            LOOP_LAG.observe(lag)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def summary(self) -> Dict[str, Any]:
+        """Percentiles (ms) de las muestras recientes."""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"samples": 0}
+        return {
+            "samples": len(ordered),
+            "window_seconds": round(len(ordered) * self.interval, 1),
+            "p50_ms": round(_percentile(ordered, 0.50) * 1000, 1),
+            "p99_ms": round(_percentile(ordered, 0.99) * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1),
+        }
+
+
+loop_lag_monitor = LoopLagMonitor()
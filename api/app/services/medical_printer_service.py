@@ -13,6 +13,7 @@ import socket
 import concurrent.futures
 
 from ..config import settings
+from .reachability import PROTOCOL_HTTP, is_known_down, record_probe
 
 
 class MedicalPrinterService:
@@ -415,7 +416,42 @@ def get_medical_printer_type(printer) -> Optional[str]:
 
 # ==================== DESCUBRIMIENTO DE IMPRESORAS MÉDICAS ====================
 
-def check_drypix_web_interface(ip: str, port: int = 20051, timeout: int = 3) -> Optional[Dict]:
+DRYPIX_PORT = 20051
+
+
+def create_discovery_http_session(pool_size: int = 20) -> requests.Session:
+    """
+    Crea una sesión HTTP con pool keep-alive para compartir entre los sondeos de
+    descubrimiento médico (evita abrir una conexión nueva por cada request).
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=0
+    )
+    session.mount("http://", adapter)
+    return session
+
+
+def is_port_open(ip: str, port: int = DRYPIX_PORT, timeout: float = 1.0) -> bool:
+    """Sondeo TCP rápido de un puerto (sin HTTP). El resultado del puerto DRYPIX se registra en la caché de alcanzabilidad."""
+    try:
+        with socket.create_connection((ip, port), timeout=timeout):
+            is_open = True
+    except OSError:
+        is_open = False
+    if port == DRYPIX_PORT:
+        record_probe(ip, PROTOCOL_HTTP, is_open)
+    return is_open
+
+
+def check_drypix_web_interface(
+    ip: str,
+    port: int = DRYPIX_PORT,
+    timeout: int = 3,
+    session: Optional[requests.Session] = None
+) -> Optional[Dict]:
     """
     Verifica si existe una interfaz web DRYPIX en la IP y puerto especificados
     
@@ -423,6 +459,7 @@ def check_drypix_web_interface(ip: str, port: int = 20051, timeout: int = 3) ->
         ip: Dirección IP a verificar
         port: Puerto (por defecto 20051 para DRYPIX)
         timeout: Timeout en segundos
+        session: Sesión HTTP compartida (pool keep-alive) para el sondeo inicial
         
     Returns:
         Dict con información del dispositivo si es DRYPIX, None si no
@@ -430,7 +467,7 @@ def check_drypix_web_interface(ip: str, port: int = 20051, timeout: int = 3) ->
     try:
         # Intentar conexión al endpoint de login
         login_url = f"http://{ip}:{port}/USER/Login.htm"
-        response = requests.get(login_url, timeout=timeout)
+        response = (session or requests).get(login_url, timeout=timeout)
         
         if response.status_code == 200:
             html_lower = response.text.lower()
@@ -486,11 +523,32 @@ def check_drypix_web_interface(ip: str, port: int = 20051, timeout: int = 3) ->
         return None
 
 
+def probe_medical_printer(
+    ip: str,
+    port: int = DRYPIX_PORT,
+    timeout: int = 3,
+    session: Optional[requests.Session] = None,
+    port_known_open: bool = False
+) -> Optional[Dict]:
+    """
+    Sondea una IP en busca de impresora médica. Si no se sabe de antemano que el
+    puerto está abierto, hace primero un connect TCP barato y solo si responde
+    realiza el sondeo HTTP.
+    """
+    if not port_known_open:
+        if port == DRYPIX_PORT and is_known_down(ip, PROTOCOL_HTTP):
+            return None
+        if not is_port_open(ip, port, timeout=min(1.0, timeout)):
+            return None
+    return check_drypix_web_interface(ip, port, timeout, session=session)
+
+
 def discover_medical_printers(
     ip_list: List[str], 
-    port: int = 20051, 
+    port: int = DRYPIX_PORT, 
     timeout: int = 3,
-    max_workers: int = 20
+    max_workers: int = 20,
+    ports_known_open: bool = False
 ) -> List[Dict]:
     """
     Descubre impresoras médicas DRYPIX en una lista de IPs
@@ -501,6 +559,7 @@ def discover_medical_printers(
         port: Puerto a verificar (por defecto 20051)
         timeout: Timeout por IP en segundos
         max_workers: Número de workers paralelos
+        ports_known_open: True si ip_list ya viene filtrada por un escaneo de puertos
         
     Returns:
         Lista de dispositivos médicos encontrados
@@ -509,10 +568,11 @@ def discover_medical_printers(
     
     print(f"🏥 Iniciando descubrimiento de impresoras médicas en {len(ip_list)} IPs...")
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+    session = create_discovery_http_session(pool_size=max_workers)
+    with session, concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
         # Crear tasks para cada IP
         future_to_ip = {
-            executor.submit(check_drypix_web_interface, ip, port, timeout): ip 
+            executor.submit(probe_medical_printer, ip, port, timeout, session, ports_known_open): ip 
             for ip in ip_list
         }
         
@@ -0,0 +1,173 @@
+"""
+Particiones mensuales de monthly_counters y usage_reports (PostgreSQL).
+
+La migración partition_monthly_counters_and_usage_reports convierte ambas tablas en
+tablas particionadas por rango, una partición por mes:
+
+- monthly_counters por (year, month): las consultas por período (year/month) solo
+  tocan la partición del mes.
+- usage_reports por date: los rangos de fecha (reporte del día, /reports/usage)
+  solo tocan los meses del rango.
+
+Cada tabla tiene además una partición DEFAULT como red de seguridad. Este módulo
+crea por adelantado las particiones de los próximos meses y resuelve la retención
+como operación de metadatos: las particiones vencidas de usage_reports se
+desenganchan y borran (DROP TABLE, sin DELETE fila por fila) y las viejas de
+monthly_counters se desenganchan y pasan al esquema de archivo.
+
+En SQLite (tests) o con las tablas sin particionar todas las funciones no hacen nada.
+"""
+
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+import logging
+import re
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ("monthly_counters", "usage_reports")
+
+_PARTITION_NAME = re.compile(r"_y(\d{4})m(\d{2})$")
+
+
+def add_months(year: int, month: int, months: int) -> Tuple[int, int]:
+    index = year * 12 + (month - 1) + months
+    return index // 12, index % 12 + 1
+
+
+def partition_name(table: str, year: int, month: int) -> str:
+    return f"{table}_y{year}m{month:02d}"
+
+
+def partition_bounds(table: str, year: int, month: int) -> Tuple[str, str]:
+    """Límites FROM/TO (SQL) de la partición de un mes."""
+    next_year, next_month = add_months(year, month, 1)
+    if table == "monthly_counters":
+        return f"({year}, {month})", f"({next_year}, {next_month})"
+    return f"('{year}-{month:02d}-01')", f"('{next_year}-{next_month:02d}-01')"
+
+
+def is_partitioned(db: Session, table: str) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return bool(db.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = :table AND c.relnamespace = 'public'::regnamespace
+        )
+    """), {"table": table}).scalar())
+
+
+def monthly_partitions(db: Session, table: str) -> List[Tuple[int, int, str]]:
+    """Particiones mensuales (año, mes, nombre) de la tabla, ordenadas; sin la DEFAULT."""
+    rows = db.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :table AND p.relnamespace = 'public'::regnamespace
+    """), {"table": table}).scalars()
+    partitions = []
+    for name in rows:
+        match = _PARTITION_NAME.search(name)
+        if match:
+            partitions.append((int(match.group(1)), int(match.group(2)), name))
+    return sorted(partitions)
+
+
+def create_partition(db: Session, table: str, year: int, month: int) -> str:
+    name = partition_name(table, year, month)
+    lower, upper = partition_bounds(table, year, month)
+    db.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} FOR VALUES FROM {lower} TO {upper}"
+    ))
+    return name
+
+
+def ensure_partitions(db: Session, months_ahead: Optional[int] = None, today: Optional[date] = None) -> List[str]:
+    """Crea las particiones del mes actual y de los próximos meses que falten. Hace commit."""
+    months_ahead = settings.partition_months_ahead if months_ahead is None else months_ahead
+    today = today or date.today()
+    created = []
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(db, table):
+            continue
+        existing = {(year, month) for year, month, _ in monthly_partitions(db, table)}
+        for offset in range(months_ahead + 1):
+            year, month = add_months(today.year, today.month, offset)
+            if (year, month) in existing:
+                continue
+            try:
+                with db.begin_nested():
+                    created.append(create_partition(db, table, year, month))
+            except Exception as e:
+                # Típicamente filas de ese mes ya caídas en la partición DEFAULT
+                logger.error(f"No se pudo crear la partición {partition_name(table, year, month)}: {e}")
+    db.commit()
+    if created:
+        logger.info(f"Particiones creadas: {', '.join(created)}")
+    return created
+
+
+def _detach_before(db: Session, table: str, year: int, month: int) -> List[str]:
+    detached = []
+    for partition_year, partition_month, name in monthly_partitions(db, table):
+        if (partition_year, partition_month) >= (year, month):
+            break
+        db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        detached.append(name)
+    return detached
+
+
+def drop_partitions_before(db: Session, table: str, year: int, month: int) -> List[str]:
+    """Borra las particiones de los meses anteriores a year/month (retención por metadatos). Hace commit."""
+    if not is_partitioned(db, table):
+        return []
+    dropped = _detach_before(db, table, year, month)
+    for name in dropped:
+        db.execute(text(f"DROP TABLE {name}"))
+    db.commit()
+    if dropped:
+        logger.info(f"Particiones borradas de {table}: {', '.join(dropped)}")
+    return dropped
+
+
+def archive_partitions_before(db: Session, table: str, year: int, month: int) -> List[str]:
+    """Desengancha las particiones anteriores a year/month y las mueve al esquema de archivo. Hace commit."""
+    if not is_partitioned(db, table):
+        return []
+    schema = settings.partition_archive_schema
+    archived = _detach_before(db, table, year, month)
+    if archived:
+        db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+    for name in archived:
+        db.execute(text(f"ALTER TABLE {name} SET SCHEMA {schema}"))
+    db.commit()
+    if archived:
+        logger.info(f"Particiones archivadas de {table} en {schema}: {', '.join(archived)}")
+    return archived
+
+
+def maintain_partitions(db: Session, today: Optional[date] = None) -> Dict[str, List[str]]:
+    """
+    Mantenimiento diario: particiones futuras y archivo de monthly_counters.
+    La retención de usage_reports borra sus particiones (services.retention).
+    """
+    today = today or date.today()
+    summary = {"created": ensure_partitions(db, today=today), "archived": []}
+    keep_months = settings.partition_monthly_counters_archive_months
+    if keep_months > 0:
+        year, month = add_months(today.year, today.month, -keep_months)
+        summary["archived"] = archive_partitions_before(db, "monthly_counters", year, month)
+
+    for table in PARTITIONED_TABLES:
+        if is_partitioned(db, table):
+            rows = db.execute(text(f"SELECT EXISTS (SELECT 1 FROM {table}_default)")).scalar()
+            if rows:
+                logger.warning(f"{table}_default tiene filas: faltan particiones para esos meses")
+    return summary
@@ -0,0 +1,303 @@
+"""
+Lease por impresora: una sola lectura del mismo equipo a la vez.
+
+Los caminos que leen una impresora (POST /printers/{id}/poll,
+POST /counter-collection/collect/{id}, el sondeo programado, las corridas de la
+cola y las lecturas SNMP de facturación) pasan por single_flight():
+
+- Si nadie está leyendo la impresora, el llamador toma el lease, ejecuta su lectura
+  y deja el resultado disponible unos segundos para quien esté esperando.
+- Si otro llamador ya está haciendo la misma operación, se espera su resultado y se
+  reutiliza (single-flight): no se consulta el equipo ni se escribe otra fila.
+- Si la lectura en curso es de otra operación, se espera a que libere el lease.
+- Sin espera (wait_seconds=0, caminos en lote) o al vencer la espera se lanza
+  PrinterBusyError: ya hay una lectura en curso.
+
+El lease vive en Redis (SET NX PX, compartido entre la API y los workers). Si Redis
+no responde se usa un registro del proceso, con el mismo esquema de reintento
+diferido que la caché de alcanzabilidad.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+OP_USAGE = "usage"        # poll_printer + UsageReport
+OP_COUNTERS = "counters"  # contadores + MonthlyCounter
+OP_BILLING = "billing"    # lectura SNMP de un período de facturación
+OP_COLLECTION = "collection"  # lectura de una corrida en lote (cola o sondeo programado; se persiste aparte)
+
+_KEY_PREFIX = "printer-lease"
+_REDIS_RETRY_SECONDS = 30
+_RESULT_TTL_SECONDS = 30
+_POLL_INTERVAL_SECONDS = 0.1
+
+# Libera el lease solo si sigue siendo del mismo token (pudo vencer y tomarlo otro)
+_RELEASE_LUA = """
+local current = redis.call('GET', KEYS[1])
+if current and cjson.decode(current)['token'] == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_PROCESS = f"{socket.gethostname()}:{os.getpid()}"
+
+_cond = threading.Condition()
+# printer_id -> datos del lease (token, operation, holder, ...) y vencimiento monotonic
+_local_leases: Dict[int, Dict[str, Any]] = {}
+# token -> (resultado JSON, vencimiento monotonic)
+_local_results: Dict[str, tuple] = {}
+
+_redis_client = None
+_redis_disabled_until = 0.0
+_release_script = None
+
+
+class PrinterBusyError(Exception):
+    """Otra lectura de la impresora está en curso (y no se esperó o no terminó a tiempo)."""
+
+    def __init__(self, printer_id: int, lease: Optional[Dict[str, Any]] = None):
+        self.printer_id = printer_id
+        self.lease = lease or {}
+        super().__init__(
+            f"Ya hay una lectura en curso de la impresora {printer_id} "
+            f"({self.lease.get('operation', 'desconocida')}, {self.lease.get('holder', 'otro proceso')})"
+        )
+
+
+@dataclass
+class FlightResult:
+    value: Any
+    shared: bool = False  # True: es el resultado de la lectura de otro llamador
+
+
+def _get_redis():
+    """Cliente Redis perezoso; None si Redis no está disponible (con reintento diferido)."""
+    global _redis_client, _redis_disabled_until, _release_script
+
+    if not settings.printer_lease_redis_enabled:
+        return None
+    if _redis_client is not None:
+        return _redis_client
+    if time.monotonic() < _redis_disabled_until:
+        return None
+
+    try:
+        import redis as redis_lib
+
+        client = redis_lib.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            password=settings.redis_password,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5,
+            decode_responses=True
+        )
+        client.ping()
+        _release_script = client.register_script(_RELEASE_LUA)
+        _redis_client = client
+        return client
+    except Exception as e:
+        logger.warning(f"Leases de impresoras sin Redis (solo proceso): {e}")
+        _redis_disabled_until = time.monotonic() + _REDIS_RETRY_SECONDS
+        return None
+
+
+def _redis_failed(e: Exception) -> None:
+    global _redis_client, _redis_disabled_until
+    logger.warning(f"Error de Redis en leases de impresoras: {e}")
+    _redis_client = None
+    _redis_disabled_until = time.monotonic() + _REDIS_RETRY_SECONDS
+
+
+def _lease_key(printer_id: int) -> str:
+    return f"{_KEY_PREFIX}:{printer_id}"
+
+
+def _result_key(token: str) -> str:
+    return f"{_KEY_PREFIX}:result:{token}"
+
+
+def _purge_local(now: float) -> None:
+    for printer_id in [p for p, lease in _local_leases.items() if lease["expires_at"] <= now]:
+        del _local_leases[printer_id]
+    for token in [t for t, (_, expires_at) in _local_results.items() if expires_at <= now]:
+        del _local_results[token]
+
+
+def _try_acquire(printer_id: int, lease: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """None si se tomó el lease; si no, los datos del lease vigente ({} si acaba de liberarse)."""
+    client = _get_redis()
+    if client is not None:
+        key = _lease_key(printer_id)
+        try:
+            if client.set(key, json.dumps(lease), nx=True, px=int(settings.printer_lease_ttl_seconds * 1000)):
+                return None
+            current = client.get(key)
+            return json.loads(current) if current else {}
+        except Exception as e:
+            _redis_failed(e)
+
+    with _cond:
+        now = time.monotonic()
+        _purge_local(now)
+        current = _local_leases.get(printer_id)
+        if current is None:
+            _local_leases[printer_id] = {**lease, "expires_at": now + settings.printer_lease_ttl_seconds}
+            return None
+        return current
+
+
+def _current_token(printer_id: int) -> Optional[str]:
+    client = _get_redis()
+    if client is not None:
+        try:
+            current = client.get(_lease_key(printer_id))
+            return json.loads(current)["token"] if current else None
+        except Exception as e:
+            _redis_failed(e)
+
+    with _cond:
+        _purge_local(time.monotonic())
+        current = _local_leases.get(printer_id)
+        return current["token"] if current else None
+
+
+def _release(printer_id: int, token: str) -> None:
+    with _cond:
+        current = _local_leases.get(printer_id)
+        if current is not None and current["token"] == token:
+            del _local_leases[printer_id]
+        _cond.notify_all()
+
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        _release_script(keys=[_lease_key(printer_id)], args=[token])
+    except Exception as e:
+        _redis_failed(e)
+
+
+def _publish(token: str, payload: Dict[str, Any]) -> None:
+    encoded = json.dumps(payload, default=str)
+    with _cond:
+        _local_results[token] = (encoded, time.monotonic() + _RESULT_TTL_SECONDS)
+        _cond.notify_all()
+
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        client.set(_result_key(token), encoded, ex=_RESULT_TTL_SECONDS)
+    except Exception as e:
+        _redis_failed(e)
+
+
+def _get_result(token: str) -> Optional[Dict[str, Any]]:
+    with _cond:
+        local = _local_results.get(token)
+    if local is not None:
+        return json.loads(local[0])
+
+    client = _get_redis()
+    if client is None:
+        return None
+    try:
+        encoded = client.get(_result_key(token))
+    except Exception as e:
+        _redis_failed(e)
+        return None
+    return json.loads(encoded) if encoded else None
+
+
+def _sleep(deadline: float) -> None:
+    timeout = min(_POLL_INTERVAL_SECONDS, max(0.0, deadline - time.monotonic()))
+    with _cond:
+        _cond.wait(timeout)
+
+
+def _wait_for_result(printer_id: int, token: str, deadline: float) -> Optional[Dict[str, Any]]:
+    """Resultado publicado por el dueño de ``token``; None si soltó el lease sin publicar o venció la espera."""
+    while True:
+        payload = _get_result(token)
+        if payload is not None:
+            return payload
+        if _current_token(printer_id) != token:
+            return _get_result(token)
+        if time.monotonic() >= deadline:
+            return None
+        _sleep(deadline)
+
+
+def _wait_for_release(printer_id: int, token: Optional[str], deadline: float) -> None:
+    while time.monotonic() < deadline and _current_token(printer_id) == token:
+        _sleep(deadline)
+
+
+def single_flight(
+    printer_id: int,
+    operation: str,
+    fn: Callable[[], Any],
+    wait_seconds: Optional[float] = None,
+    holder: Optional[str] = None,
+) -> FlightResult:
+    """
+    Ejecuta ``fn`` (lectura y escritura de una impresora) con el lease del equipo.
+
+    ``fn`` debe devolver un valor serializable a JSON: es lo que reciben los llamadores
+    de la misma operación que esperaban (FlightResult.shared=True). Si ``fn`` falla,
+    quienes esperaban intentan su propia lectura.
+
+    Raises:
+        PrinterBusyError: la impresora sigue ocupada al terminar ``wait_seconds``
+            (default: settings.printer_lease_wait_seconds; 0 no espera).
+    """
+    wait_seconds = settings.printer_lease_wait_seconds if wait_seconds is None else wait_seconds
+    deadline = time.monotonic() + max(0.0, wait_seconds)
+    lease = {
+        "token": uuid.uuid4().hex,
+        "operation": operation,
+        "holder": holder or _PROCESS,
+        "process": _PROCESS,
+        "started_at": time.time(),
+    }
+
+    while True:
+        current = _try_acquire(printer_id, lease)
+        if current is None:
+            break
+        if not current:
+            continue  # Se liberó entre SET NX y GET
+
+        if current.get("operation") == operation:
+            payload = _wait_for_result(printer_id, current["token"], deadline)
+            if payload is not None and "error" not in payload:
+                return FlightResult(payload["value"], shared=True)
+        # Otra operación, o la misma que falló: se espera el lease para leer directamente
+        _wait_for_release(printer_id, current["token"], deadline)
+
+        if time.monotonic() >= deadline:
+            raise PrinterBusyError(printer_id, current)
+
+    try:
+        value = fn()
+    except BaseException as e:
+        _publish(lease["token"], {"error": str(e)})
+        raise
+    else:
+        _publish(lease["token"], {"value": value})
+        return FlightResult(value)
+    finally:
+        _release(printer_id, lease["token"])
@@ -0,0 +1,248 @@
+"""
+Caché compartida de alcanzabilidad de hosts (por IP y protocolo).
+
+Cada sondeo (ping TCP, SNMP, HTTP DRYPIX, ping ICMP) registra su resultado aquí y
+cualquier llamador puede consultarlo para fallar rápido en lugar de volver a
+pagar los timeouts de un host que otro componente acaba de encontrar caído.
+
+Dos niveles:
+- Caché de proceso (dict con lock), siempre disponible.
+- Redis, compartida entre procesos/workers. Si Redis no responde se sigue solo con
+  la caché local y se reintenta después de un tiempo de espera.
+
+Los resultados "caído" usan un TTL corto y los "disponible" uno más largo.
+"""
+
+from typing import Dict, Iterable, Optional, Set, Tuple
+import logging
+import threading
+import time
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_ICMP = "icmp"
+PROTOCOL_TCP = "tcp"    # Algún puerto de servicio de impresora (80, 9100, 161, 515, 631...)
+PROTOCOL_SNMP = "snmp"
+PROTOCOL_HTTP = "http"  # Interfaz web DRYPIX (puerto 20051)
+
+_KEY_PREFIX = "reachability"
+_REDIS_RETRY_SECONDS = 30
+
+_lock = threading.Lock()
+# (ip, protocolo) -> (alcanzable, verificado_en epoch, expira_en monotonic)
+_cache: Dict[Tuple[str, str], Tuple[bool, float, float]] = {}
+
+_redis_client = None
+_redis_disabled_until = 0.0
+
+
+def _get_redis():
+    """Cliente Redis perezoso; None si Redis no está disponible (con reintento diferido)."""
+    global _redis_client, _redis_disabled_until
+
+    if not settings.reachability_redis_enabled:
+        return None
+    if _redis_client is not None:
+        return _redis_client
+    if time.monotonic() < _redis_disabled_until:
+        return None
+
+    try:
+        import redis as redis_lib
+
+        client = redis_lib.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            password=settings.redis_password,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5,
+            decode_responses=True
+        )
+        client.ping()
+        _redis_client = client
+        return client
+    except Exception as e:
+        logger.warning(f"Caché de alcanzabilidad sin Redis (solo proceso): {e}")
+        _redis_disabled_until = time.monotonic() + _REDIS_RETRY_SECONDS
+        return None
+
+
+def _redis_failed(e: Exception) -> None:
+    global _redis_client, _redis_disabled_until
+    logger.warning(f"Error de Redis en caché de alcanzabilidad: {e}")
+    _redis_client = None
+    _redis_disabled_until = time.monotonic() + _REDIS_RETRY_SECONDS
+
+
+def _redis_key(ip: str, protocol: str) -> str:
+    return f"{_KEY_PREFIX}:{protocol}:{ip}"
+
+
+def _ttl_for(reachable: bool) -> int:
+    return settings.reachability_up_ttl_seconds if reachable else settings.reachability_down_ttl_seconds
+
+
+def record_probe(ip: str, protocol: str, reachable: bool) -> None:
+    """Registra el resultado de un sondeo en la caché local y en Redis."""
+    if not ip:
+        return
+
+    ttl = _ttl_for(reachable)
+    checked_at = time.time()
+    with _lock:
+        _cache[(ip, protocol)] = (reachable, checked_at, time.monotonic() + ttl)
+
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        client.set(_redis_key(ip, protocol), f"{int(reachable)}:{checked_at:.0f}", ex=ttl)
+    except Exception as e:
+        _redis_failed(e)
+
+
+def get_reachability(ip: str, protocol: str) -> Optional[bool]:
+    """
+    Estado conocido de un host para un protocolo.
+
+    Returns:
+        True/False si hay un resultado vigente, None si no se sabe.
+    """
+    entry = _get_entry(ip, protocol)
+    return entry[0] if entry else None
+
+
+def is_known_down(ip: str, protocol: str) -> bool:
+    """True si un sondeo reciente (dentro del TTL negativo) encontró el host caído."""
+    return get_reachability(ip, protocol) is False
+
+
+def is_known_up(ip: str, protocol: str) -> bool:
+    """True si un sondeo reciente (dentro del TTL positivo) encontró el host disponible."""
+    return get_reachability(ip, protocol) is True
+
+
+def record_probes(results: Dict[str, bool], protocol: str) -> None:
+    """Registra en lote resultados de un mismo protocolo (un solo pipeline de Redis)."""
+    if not results:
+        return
+
+    now_wall = time.time()
+    now = time.monotonic()
+    with _lock:
+        for ip, reachable in results.items():
+            _cache[(ip, protocol)] = (reachable, now_wall, now + _ttl_for(reachable))
+
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for ip, reachable in results.items():
+            pipe.set(_redis_key(ip, protocol), f"{int(reachable)}:{now_wall:.0f}", ex=_ttl_for(reachable))
+        pipe.execute()
+    except Exception as e:
+        _redis_failed(e)
+
+
+def get_known_down(ips: Iterable[str], protocol: str) -> Set[str]:
+    """IPs de la lista que un sondeo reciente encontró caídas (una sola consulta MGET a Redis)."""
+    now = time.monotonic()
+    down: Set[str] = set()
+    missing = []
+    with _lock:
+        for ip in dict.fromkeys(ips):
+            entry = _cache.get((ip, protocol))
+            if entry is not None and entry[2] > now:
+                if not entry[0]:
+                    down.add(ip)
+            else:
+                missing.append(ip)
+
+    client = _get_redis() if missing else None
+    if client is None:
+        return down
+    try:
+        values = client.mget([_redis_key(ip, protocol) for ip in missing])
+    except Exception as e:
+        _redis_failed(e)
+        return down
+
+    for ip, value in zip(missing, values):
+        if value and value.startswith("0:"):
+            down.add(ip)
+    return down
+
+
+def forget(ip: str, protocol: Optional[str] = None) -> None:
+    """Elimina las entradas de una IP (de un protocolo o de todos)."""
+    protocols = [protocol] if protocol else [PROTOCOL_ICMP, PROTOCOL_TCP, PROTOCOL_SNMP, PROTOCOL_HTTP]
+    with _lock:
+        for proto in protocols:
+            _cache.pop((ip, proto), None)
+
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        client.delete(*[_redis_key(ip, proto) for proto in protocols])
+    except Exception as e:
+        _redis_failed(e)
+
+
+def get_host_reachability(ip: str) -> Dict[str, Dict]:
+    """Resumen de los resultados vigentes de una IP para todos los protocolos conocidos."""
+    summary = {}
+    for protocol in (PROTOCOL_ICMP, PROTOCOL_TCP, PROTOCOL_SNMP, PROTOCOL_HTTP):
+        entry = _get_entry(ip, protocol)
+        if entry:
+            reachable, checked_at = entry
+            summary[protocol] = {
+                "reachable": reachable,
+                "checked_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(checked_at)),
+            }
+    return summary
+
+
+def clear_cache() -> None:
+    """Vacía la caché local (no toca Redis)."""
+    with _lock:
+        _cache.clear()
+
+
+def _get_entry(ip: str, protocol: str) -> Optional[Tuple[bool, float]]:
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get((ip, protocol))
+        if entry is not None:
+            reachable, checked_at, expires_at = entry
+            if expires_at > now:
+                return reachable, checked_at
+            del _cache[(ip, protocol)]
+
+    client = _get_redis()
+    if client is None:
+        return None
+    try:
+        pipe = client.pipeline()
+        pipe.get(_redis_key(ip, protocol))
+        pipe.pttl(_redis_key(ip, protocol))
+        value, pttl = pipe.execute()
+    except Exception as e:
+        _redis_failed(e)
+        return None
+
+    if not value or pttl is None or pttl <= 0:
+        return None
+
+    try:
+        flag, checked_at = value.split(":", 1)
+        reachable, checked_at = flag == "1", float(checked_at)
+    except ValueError:
+        return None
+
+    with _lock:
+        _cache[(ip, protocol)] = (reachable, checked_at, now + pttl / 1000.0)
+    return reachable, checked_at
@@ -0,0 +1,189 @@
+"""
+Retención de las tablas de historial por lotes de rangos de clave primaria.
+
+Un único DELETE ... WHERE date < corte recorre toda la tabla y mantiene los
+locks hasta terminar. Acá cada tabla se recorre en rangos de id (id >= desde AND
+id < hasta, sobre la clave primaria) con una transacción corta por rango y un tope
+de filas por segundo, para que el borrado conviva con las escrituras de los sondeos:
+
+- usage_reports: se borran las filas con date (la clave de partición) anterior al
+  corte. El rango a recorrer se acota con min/max(id) de las filas vencidas
+  (ix_usage_reports_date).
+  Si la tabla está particionada por mes (PostgreSQL), los meses completos anteriores
+  al corte se borran antes como particiones enteras (services.partitions) y el
+  borrado por lotes solo queda para el mes del corte.
+- medical_printer_snapshots: pasado el corte se conserva el primer snapshot de cada
+  (impresora, bandeja, día) y el resto se borra por id. Los días más viejos ya quedaron
+  raleados en pasadas anteriores, así que cada pasada solo revisa los
+  retention_snapshots_lookback_days días previos al corte.
+
+Cada pasada devuelve un RetentionResult con las filas borradas, los lotes y la duración.
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Any, Dict, Optional, Tuple
+import logging
+import time
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import MedicalPrinterSnapshot, UsageReport
+from .partitions import drop_partitions_before
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionResult:
+    table: str
+    cutoff: datetime
+    deleted: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    partitions_dropped: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "table": self.table,
+            "cutoff": self.cutoff.isoformat(),
+            "deleted": self.deleted,
+            "chunks": self.chunks,
+            "seconds": round(self.seconds, 3),
+            "partitions_dropped": self.partitions_dropped,
+        }
+
+
+class _Throttle:
+    """Duerme lo necesario para no superar max_rows_per_second (0 = sin tope)."""
+
+    def __init__(self, max_rows_per_second: int):
+        self.rate = max_rows_per_second
+        self.rows = 0
+        self.started = time.monotonic()
+
+    def wait(self, rows: int) -> None:
+        if self.rate <= 0 or rows <= 0:
+            return
+        self.rows += rows
+        ahead = self.rows / self.rate - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def _id_range(db: Session, model, expired) -> Tuple[Optional[int], Optional[int]]:
+    return db.query(func.min(model.id), func.max(model.id)).filter(expired).one()
+
+
+def purge_usage_reports(
+    db: Session,
+    days: Optional[int] = None,
+    chunk_rows: Optional[int] = None,
+    max_rows_per_second: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> RetentionResult:
+    """Borra los usage_reports anteriores a la retención, un rango de ids por transacción."""
+    days = settings.retention_usage_reports_days if days is None else days
+    chunk_rows = max(1, chunk_rows or settings.retention_usage_reports_chunk_rows)
+    if max_rows_per_second is None:
+        max_rows_per_second = settings.retention_usage_reports_max_rows_per_second
+
+    started = time.perf_counter()
+    result = RetentionResult("usage_reports", (now or datetime.utcnow()) - timedelta(days=days))
+    result.partitions_dropped = len(
+        drop_partitions_before(db, "usage_reports", result.cutoff.year, result.cutoff.month)
+    )
+    expired = UsageReport.date < result.cutoff
+    first_id, last_id = _id_range(db, UsageReport, expired)
+    throttle = _Throttle(max_rows_per_second)
+
+    lower = first_id
+    while lower is not None and lower <= last_id:
+        upper = lower + chunk_rows
+        deleted = db.query(UsageReport).filter(
+            UsageReport.id >= lower, UsageReport.id < upper, expired
+        ).delete(synchronize_session=False)
+        db.commit()
+        result.deleted += deleted
+        result.chunks += 1
+        throttle.wait(deleted)
+        lower = upper
+
+    result.seconds = time.perf_counter() - started
+    logger.info(f"Retención usage_reports: {result.partitions_dropped} particiones y {result.deleted} filas "
+                f"en {result.chunks} lotes ({result.seconds:.2f}s)")
+    return result
+
+
+def thin_medical_snapshots(
+    db: Session,
+    days: Optional[int] = None,
+    chunk_rows: Optional[int] = None,
+    max_rows_per_second: Optional[int] = None,
+    now: Optional[datetime] = None,
+    lookback_days: Optional[int] = None,
+) -> RetentionResult:
+    """
+    Deja un snapshot por impresora, bandeja y día (el primero) en los anteriores a la
+    retención. Solo se revisan los ``lookback_days`` días previos al corte; para ralear
+    un historial que nunca pasó por la retención, usar un valor mayor una vez.
+    """
+    days = settings.retention_snapshots_days if days is None else days
+    if lookback_days is None:
+        lookback_days = settings.retention_snapshots_lookback_days
+    chunk_rows = max(1, chunk_rows or settings.retention_snapshots_chunk_rows)
+    if max_rows_per_second is None:
+        max_rows_per_second = settings.retention_snapshots_max_rows_per_second
+
+    started = time.perf_counter()
+    result = RetentionResult("medical_printer_snapshots", (now or datetime.utcnow()) - timedelta(days=days))
+    # Desde el inicio de un día, así cada día se revisa completo
+    window_start = datetime.combine(result.cutoff.date() - timedelta(days=lookback_days), dt_time.min)
+    expired = and_(
+        MedicalPrinterSnapshot.snapshot_time >= window_start,
+        MedicalPrinterSnapshot.snapshot_time < result.cutoff,
+    )
+    first_id, last_id = _id_range(db, MedicalPrinterSnapshot, expired)
+    throttle = _Throttle(max_rows_per_second)
+
+    # (impresora, bandeja, día) -> (hora, id) del snapshot que se conserva, entre lotes
+    kept: Dict[Tuple[int, int, date], Tuple[datetime, int]] = {}
+    lower = first_id
+    while lower is not None and lower <= last_id:
+        upper = lower + chunk_rows
+        rows = db.query(
+            MedicalPrinterSnapshot.id, MedicalPrinterSnapshot.printer_id,
+            MedicalPrinterSnapshot.tray_number, MedicalPrinterSnapshot.snapshot_time
+        ).filter(MedicalPrinterSnapshot.id >= lower, MedicalPrinterSnapshot.id < upper, expired).all()
+
+        doomed = []
+        for snapshot_id, printer_id, tray_number, snapshot_time in rows:
+            key = (printer_id, tray_number, snapshot_time.date())
+            candidate = (snapshot_time, snapshot_id)
+            current = kept.get(key)
+            if current is None:
+                kept[key] = candidate
+            elif candidate < current:
+                # Uno más temprano en un lote posterior (id fuera de orden): se cambia el conservado
+                doomed.append(current[1])
+                kept[key] = candidate
+            else:
+                doomed.append(snapshot_id)
+
+        if doomed:
+            db.query(MedicalPrinterSnapshot).filter(
+                MedicalPrinterSnapshot.id.in_(doomed)
+            ).delete(synchronize_session=False)
+            db.commit()
+        result.deleted += len(doomed)
+        result.chunks += 1
+        throttle.wait(len(doomed))
+        lower = upper
+
+    result.seconds = time.perf_counter() - started
+    logger.info(
+        f"Retención medical_printer_snapshots: {result.deleted} filas en {result.chunks} lotes ({result.seconds:.2f}s)"
+    )
+    return result
@@ -0,0 +1,142 @@
+"""
+Resolución inversa de DNS (PTR) asíncrona y en lote, con caché TTL de proceso.
+
+Cada consulta PTR se hace con dnspython y un lifetime de
+reverse_dns_timeout_seconds: un servidor DNS que no responde corta esa consulta,
+no ocupa un thread del pool indefinidamente. Las consultas del lote corren en un
+pool de threads dedicado y una misma IP pedida varias veces (o desde varios
+escaneos a la vez) se resuelve una sola vez. Los fallos (sin PTR, NXDOMAIN,
+timeout) se cachean como negativos con un TTL más corto.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Optional, Tuple
+import logging
+import math
+import threading
+import time
+
+import dns.exception
+import dns.resolver
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+_MAX_RESOLVER_THREADS = 32
+
+_executor = ThreadPoolExecutor(max_workers=_MAX_RESOLVER_THREADS, thread_name_prefix="rdns")
+_lock = threading.Lock()
+_cache: Dict[str, Tuple[Optional[str], float]] = {}  # ip -> (hostname | None, expires_at)
+_inflight: Dict[str, Future] = {}
+
+
+def get_cached_hostname(ip: str) -> Tuple[bool, Optional[str]]:
+    """
+    Consulta la caché sin resolver.
+
+    Returns:
+        (encontrado, hostname): hostname es None para entradas negativas.
+    """
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(ip)
+        if entry is None:
+            return False, None
+        hostname, expires_at = entry
+        if expires_at <= now:
+            del _cache[ip]
+            return False, None
+        return True, hostname
+
+
+def _store(ip: str, hostname: Optional[str]) -> None:
+    ttl = settings.reverse_dns_ttl_seconds if hostname else settings.reverse_dns_negative_ttl_seconds
+    with _lock:
+        _cache[ip] = (hostname, time.monotonic() + ttl)
+        _inflight.pop(ip, None)
+
+
+def _lookup(ip: str, timeout: float) -> Optional[str]:
+    try:
+        answer = dns.resolver.resolve_address(ip, lifetime=timeout)
+    except (dns.exception.DNSException, OSError):
+        return None
+    return str(answer[0].target).rstrip(".") or None
+
+
+def _on_done(ip: str, future: Future) -> None:
+    try:
+        hostname = future.result()
+    except Exception:
+        hostname = None
+    _store(ip, hostname)
+
+
+def _submit(ip: str, timeout: float) -> Tuple[Future, bool]:
+    """
+    Lanza (o reutiliza) la resolución de una IP. Debe llamarse con _lock tomado.
+    Devuelve (future, nueva); el llamador engancha _on_done a las nuevas después de
+    soltar _lock: si la consulta ya terminó, el callback corre en el mismo thread y
+    _store vuelve a tomar el lock.
+    """
+    future = _inflight.get(ip)
+    if future is not None:
+        return future, False
+    future = _executor.submit(_lookup, ip, timeout)
+    _inflight[ip] = future
+    return future, True
+
+
+def resolve_hostnames(ips: Iterable[str], timeout: Optional[float] = None) -> Dict[str, Optional[str]]:
+    """
+    Resuelve en lote los hostnames de varias IPs.
+
+    ``timeout`` es el límite de cada consulta PTR (no del lote): las consultas corren
+    en paralelo de a _MAX_RESOLVER_THREADS, así que el lote tarda como máximo
+    ``timeout`` por cada tanda. Las IPs sin PTR o que no responden a tiempo se
+    devuelven con None.
+    """
+    if timeout is None:
+        timeout = settings.reverse_dns_timeout_seconds
+
+    results: Dict[str, Optional[str]] = {}
+    pending: Dict[str, Future] = {}
+
+    for ip in dict.fromkeys(ips):
+        found, hostname = get_cached_hostname(ip)
+        if found:
+            results[ip] = hostname
+            continue
+        with _lock:
+            future, created = _submit(ip, timeout)
+        if created:
+            future.add_done_callback(lambda f, ip=ip: _on_done(ip, f))
+        pending[ip] = future
+
+    if pending:
+        # Margen por si el pool está ocupado con consultas de otro escaneo
+        rounds = math.ceil(len(pending) / _MAX_RESOLVER_THREADS) + 1
+        wait(pending.values(), timeout=timeout * rounds + 1)
+
+    unresolved = 0
+    for ip, future in pending.items():
+        if future.done():
+            try:
+                results[ip] = future.result()
+            except Exception:
+                results[ip] = None
+        else:
+            results[ip] = None
+            unresolved += 1
+
+    if unresolved:
+        logger.info(f"DNS inverso: {unresolved}/{len(pending)} IPs siguen resolviéndose en segundo plano")
+
+    return results
+
+
+def clear_cache() -> None:
+    """Vacía la caché de hostnames (no cancela consultas en curso)."""
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,272 @@
+"""
+Coordinación de los jobs programados entre procesos de la API vía Redis.
+
+Con uvicorn --workers N (o varias réplicas) cada proceso arranca su scheduler, pero
+los jobs deben dispararse una sola vez:
+
+- SchedulerLeadership: un único proceso tiene el lease ``scheduler:leader`` (SET NX PX,
+  renovado periódicamente desde un thread) y es el único con el scheduler activo; el
+  resto lo deja pausado y reintenta tomar el lease. Si el líder muere, el lease vence
+  y otro proceso reanuda su scheduler (los disparos vencidos durante el traspaso se
+  descartan según el misfire_grace_time de cada job).
+- JobLock: lock con la interfaz de threading.Lock (acquire(blocking=False), release(),
+  locked()) respaldado por un lease de Redis renovado mientras se tiene, para los
+  trabajos que también se pueden lanzar a mano desde cualquier proceso.
+
+Si Redis no responde se sigue solo en proceso, con el mismo esquema de reintento
+diferido que la caché de alcanzabilidad: los JobLock quedan locales y el rol del
+scheduler no cambia. Un proceso que arranca sin Redis queda en espera y reintenta
+tomar el lease (sin Redis no puede saber si otro proceso ya es líder); para correr
+los jobs sin Redis hay que desactivar SCHEDULER_LEADER_ELECTION.
+"""
+
+from typing import Iterable, Optional
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "scheduler"
+_REDIS_RETRY_SECONDS = 30
+
+# Renueva o libera el lease solo si sigue siendo del mismo token
+_RENEW_LUA = """
+local current = redis.call('GET', KEYS[1])
+if current and cjson.decode(current)['token'] == ARGV[1] then
+  return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LUA = """
+local current = redis.call('GET', KEYS[1])
+if current and cjson.decode(current)['token'] == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_PROCESS = f"{socket.gethostname()}:{os.getpid()}"
+
+_redis_client = None
+_redis_disabled_until = 0.0
+_renew_script = None
+_release_script = None
+
+
+class _RedisUnavailable(Exception):
+    pass
+
+
+def _get_redis():
+    """Cliente Redis perezoso; None si Redis no está disponible (con reintento diferido)."""
+    global _redis_client, _redis_disabled_until, _renew_script, _release_script
+
+    if _redis_client is not None:
+        return _redis_client
+    if time.monotonic() < _redis_disabled_until:
+        return None
+
+    try:
+        import redis as redis_lib
+
+        client = redis_lib.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            password=settings.redis_password,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5,
+            decode_responses=True
+        )
+        client.ping()
+        _renew_script = client.register_script(_RENEW_LUA)
+        _release_script = client.register_script(_RELEASE_LUA)
+        _redis_client = client
+        return client
+    except Exception as e:
+        logger.warning(f"Coordinación del scheduler sin Redis (solo proceso): {e}")
+        _redis_disabled_until = time.monotonic() + _REDIS_RETRY_SECONDS
+        return None
+
+
+def _redis_failed(e: Exception) -> None:
+    global _redis_client, _redis_disabled_until
+    logger.warning(f"Error de Redis en la coordinación del scheduler: {e}")
+    _redis_client = None
+    _redis_disabled_until = time.monotonic() + _REDIS_RETRY_SECONDS
+
+
+class _Lease:
+    """Lease de Redis con token; las operaciones lanzan _RedisUnavailable si Redis no responde."""
+
+    def __init__(self, name: str, ttl_seconds: float):
+        self.key = f"{_KEY_PREFIX}:{name}"
+        self.ttl_ms = int(ttl_seconds * 1000)
+        self.token: Optional[str] = None
+
+    def _client(self):
+        client = _get_redis()
+        if client is None:
+            raise _RedisUnavailable()
+        return client
+
+    def _call(self, fn):
+        client = self._client()
+        try:
+            return fn(client)
+        except Exception as e:
+            _redis_failed(e)
+            raise _RedisUnavailable() from e
+
+    def acquire(self) -> bool:
+        token = uuid.uuid4().hex
+        value = json.dumps({"token": token, "process": _PROCESS, "started_at": time.time()})
+        if self._call(lambda client: client.set(self.key, value, nx=True, px=self.ttl_ms)):
+            self.token = token
+            return True
+        return False
+
+    def renew(self) -> bool:
+        if self.token is None:
+            return False
+        token = self.token
+        return bool(self._call(lambda client: _renew_script(keys=[self.key], args=[token, self.ttl_ms])))
+
+    def release(self) -> None:
+        token, self.token = self.token, None
+        if token is not None:
+            self._call(lambda client: _release_script(keys=[self.key], args=[token]))
+
+    def holder(self) -> Optional[str]:
+        current = self._call(lambda client: client.get(self.key))
+        return json.loads(current)["process"] if current else None
+
+
+class JobLock:
+    """Lock entre procesos para un trabajo (misma interfaz que threading.Lock, sin espera)."""
+
+    def __init__(self, name: str, ttl_seconds: float = 60):
+        self.name = name
+        self._local = threading.Lock()
+        self._lease = _Lease(f"lock:{name}", ttl_seconds)
+        self._renew_every = max(1.0, ttl_seconds / 3)
+        self._stop: Optional[threading.Event] = None
+
+    def acquire(self, blocking: bool = False) -> bool:
+        if blocking:
+            raise ValueError("JobLock solo admite acquire(blocking=False)")
+        if not self._local.acquire(blocking=False):
+            return False
+        try:
+            acquired = self._lease.acquire()
+        except _RedisUnavailable:
+            return True  # Solo en proceso
+        if not acquired:
+            self._local.release()
+            return False
+        self._stop = threading.Event()
+        threading.Thread(target=self._keepalive, args=(self._stop,), daemon=True,
+                         name=f"job-lock:{self.name}").start()
+        return True
+
+    def _keepalive(self, stop: threading.Event) -> None:
+        while not stop.wait(self._renew_every):
+            try:
+                if not self._lease.renew():
+                    logger.warning(f"Lock {self.name}: el lease venció mientras se ejecutaba el trabajo")
+                    return
+            except _RedisUnavailable:
+                continue
+
+    def release(self) -> None:
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+        try:
+            self._lease.release()
+        except _RedisUnavailable:
+            pass
+        finally:
+            self._local.release()
+
+    def locked(self) -> bool:
+        """Indica si algún proceso (este incluido) tiene el lock."""
+        if self._local.locked():
+            return True
+        try:
+            return self._lease.holder() is not None
+        except _RedisUnavailable:
+            return False
+
+
+class SchedulerLeadership:
+    """Elige un proceso líder y deja activos los schedulers solo en ese proceso."""
+
+    def __init__(self, schedulers: Iterable, ttl_seconds: Optional[float] = None,
+                 renew_seconds: Optional[float] = None):
+        self.schedulers = list(schedulers)
+        self._lease = _Lease("leader", ttl_seconds or settings.scheduler_leader_ttl_seconds)
+        self.renew_seconds = renew_seconds or settings.scheduler_leader_renew_seconds
+        self.is_leader = False
+        self._decided = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Primera elección (sincrónica, antes de atender pedidos) y thread de renovación."""
+        if not settings.scheduler_leader_election:
+            self._set_leader(True)
+            return
+        self._elect()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="scheduler-leadership")
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self.is_leader and settings.scheduler_leader_election:
+            try:
+                self._lease.release()  # Traspaso inmediato en lugar de esperar el vencimiento
+            except _RedisUnavailable:
+                pass
+        self.is_leader = False
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.renew_seconds):
+            self._elect()
+
+    def _elect(self) -> None:
+        try:
+            leader = self._lease.renew() if self.is_leader else self._lease.acquire()
+        except _RedisUnavailable:
+            if self._decided:
+                return  # Se mantiene el rol hasta que Redis vuelva
+            leader = False  # Arranque sin Redis: en espera hasta poder tomar el lease
+        self._decided = True
+        if leader != self.is_leader:
+            self._set_leader(leader)
+
+    def _set_leader(self, leader: bool) -> None:
+        self.is_leader = leader
+        for scheduler in self.schedulers:
+            if leader:
+                scheduler.resume()
+            else:
+                scheduler.pause()
+        logger.info(f"Scheduler {'activo (líder)' if leader else 'en espera'} en {_PROCESS}")
+        print(f"Scheduler role: {'leader' if leader else 'standby'} ({_PROCESS})")
+
+    def status(self) -> dict:
+        try:
+            holder = self._lease.holder() if settings.scheduler_leader_election else _PROCESS
+        except _RedisUnavailable:
+            holder = None
+        return {"role": "leader" if self.is_leader else "standby", "process": _PROCESS, "leader": holder}
@@ -10,6 +10,7 @@ import logging
 import json
 
 from ..config import settings
+from .reachability import PROTOCOL_SNMP, is_known_down, record_probe
 
 logger = logging.getLogger(__name__)
 
@@ -413,11 +414,28 @@ class SNMPService:
         except (ValueError, TypeError):
             return None
     
+    def _offline_poll_data(self) -> Dict:
+        """Result of poll_printer for a printer that did not answer SNMP"""
+        return {
+            'pages_printed_mono': 0,
+            'pages_printed_color': 0,
+            'toner_level_black': None,
+            'toner_level_cyan': None,
+            'toner_level_magenta': None,
+            'toner_level_yellow': None,
+            'paper_level': None,
+            'status': 'offline'
+        }
+    
     def poll_printer(self, ip: str, profile: str = 'generic_v2c') -> Dict:
         """Poll a printer using SNMP and return structured data"""
         if profile not in self.profiles:
             profile = 'generic_v2c'
         
+        # Fail fast if another component just found this host without SNMP
+        if is_known_down(ip, PROTOCOL_SNMP):
+            return self._offline_poll_data()
+        
         oids = self.profiles[profile]
         data = {}
         
@@ -426,6 +444,13 @@ class SNMPService:
         pages_mono = self.get_snmp_value(ip, oids['pages_mono'])
         pages_color = self.get_snmp_value(ip, oids['pages_color'])
         
+        # No answer at all: confirm with the status OID before paying the toner/paper timeouts
+        if pages_total is None and pages_mono is None and pages_color is None:
+            if self.get_snmp_value(ip, oids['status']) is None:
+                record_probe(ip, PROTOCOL_SNMP, False)
+                return self._offline_poll_data()
+        record_probe(ip, PROTOCOL_SNMP, True)
+        
         try:
             data['pages_printed_mono'] = int(pages_mono) if pages_mono and pages_mono.isdigit() else 0
             data['pages_printed_color'] = int(pages_color) if pages_color and pages_color.isdigit() else 0
@@ -527,6 +552,7 @@ class SNMPService:
         """Test SNMP connection to a printer"""
         try:
             result = self.get_snmp_value(ip, '1.3.6.1.2.1.1.1.0')  # System description
+            record_probe(ip, PROTOCOL_SNMP, result is not None)
             return result is not None
         except Exception:
             return False
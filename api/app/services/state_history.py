@@ -0,0 +1,176 @@
+"""
+Historial de tóner, papel y estado codificado por cambios (printer_state_changes).
+
+Los niveles de tóner cambian unas pocas veces por semana pero se leen cada 30
+minutos. En lugar de repetirlos en cada usage_report, record_states escribe una
+fila solo cuando algún nivel se mueve state_history_level_threshold puntos o más
+respecto del último valor guardado (no del último leído, así una deriva lenta
+igual termina registrándose) o cuando cambia el estado. usage_report_values deja
+esas columnas en NULL en usage_reports salvo que usage_reports_store_state esté activo.
+
+Lectura: el valor en un instante es el del último cambio anterior o igual. latest_states
+da el estado actual, states_at el de varios instantes y state_series reconstruye la
+serie de una impresora a cualquier resolución.
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import PrinterStateChange, UsageReport
+
+LEVEL_FIELDS = ("toner_level_black", "toner_level_cyan", "toner_level_magenta", "toner_level_yellow", "paper_level")
+STATE_FIELDS = LEVEL_FIELDS + ("status",)
+
+
+def _state(source: Any) -> Dict[str, Any]:
+    if isinstance(source, dict):
+        return {field: source.get(field) for field in STATE_FIELDS}
+    return {field: getattr(source, field) for field in STATE_FIELDS}
+
+
+def has_state(source: Any) -> bool:
+    """Indica si la fila trae algún valor de tóner, papel o estado."""
+    return any(value is not None for value in _state(source).values())
+
+
+def state_changed(previous: Optional[Dict[str, Any]], current: Dict[str, Any], threshold: float) -> bool:
+    if previous is None:
+        return True
+    if previous["status"] != current["status"]:
+        return True
+    for field in LEVEL_FIELDS:
+        before, after = previous[field], current[field]
+        if (before is None) != (after is None):
+            return True
+        if before is not None and abs(after - before) >= threshold:
+            return True
+    return False
+
+
+def usage_report_values(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Columnas a guardar en usage_reports: sin tóner, papel ni estado salvo usage_reports_store_state."""
+    if settings.usage_reports_store_state:
+        return dict(row)
+    return {key: (None if key in STATE_FIELDS else value) for key, value in row.items()}
+
+
+def latest_states(db: Session, printer_ids: Optional[List[int]] = None) -> Dict[int, PrinterStateChange]:
+    """Último estado guardado de cada impresora (de la lista, o de todas)."""
+    latest = db.query(
+        PrinterStateChange.printer_id,
+        func.max(PrinterStateChange.recorded_at).label("recorded_at")
+    )
+    if printer_ids is not None:
+        if not printer_ids:
+            return {}
+        latest = latest.filter(PrinterStateChange.printer_id.in_(printer_ids))
+    latest = latest.group_by(PrinterStateChange.printer_id).subquery()
+
+    rows = db.query(PrinterStateChange).join(
+        latest,
+        (PrinterStateChange.printer_id == latest.c.printer_id)
+        & (PrinterStateChange.recorded_at == latest.c.recorded_at)
+    ).order_by(PrinterStateChange.id)
+    return {row.printer_id: row for row in rows}
+
+
+def record_states(db: Session, rows: Iterable[Dict[str, Any]], threshold: Optional[float] = None) -> int:
+    """
+    Registra las lecturas (dicts con printer_id, date y las columnas de estado) que
+    cambian el estado guardado. Un solo INSERT por lote; no hace commit.
+    Devuelve la cantidad de filas escritas.
+    """
+    threshold = settings.state_history_level_threshold if threshold is None else threshold
+    readings = sorted(
+        (row for row in rows if row.get("date") is not None and has_state(row)),
+        key=lambda row: (row["printer_id"], row["date"])
+    )
+    if not readings:
+        return 0
+
+    current = {
+        printer_id: _state(change)
+        for printer_id, change in latest_states(db, list({row["printer_id"] for row in readings})).items()
+    }
+    changes = []
+    for row in readings:
+        state = _state(row)
+        if state_changed(current.get(row["printer_id"]), state, threshold):
+            changes.append({"printer_id": row["printer_id"], "recorded_at": row["date"], **state})
+            current[row["printer_id"]] = state
+    if changes:
+        db.execute(insert(PrinterStateChange), changes)
+    return len(changes)
+
+
+def _changes_until(db: Session, printer_ids: List[int], until: datetime) -> Dict[int, Tuple[List[datetime], List[PrinterStateChange]]]:
+    history: Dict[int, Tuple[List[datetime], List[PrinterStateChange]]] = {}
+    rows = db.query(PrinterStateChange).filter(
+        PrinterStateChange.printer_id.in_(printer_ids),
+        PrinterStateChange.recorded_at <= until
+    ).order_by(PrinterStateChange.printer_id, PrinterStateChange.recorded_at, PrinterStateChange.id)
+    for row in rows:
+        times, changes = history.setdefault(row.printer_id, ([], []))
+        times.append(row.recorded_at)
+        changes.append(row)
+    return history
+
+
+def states_at(db: Session, points: Iterable[Tuple[int, datetime]]) -> Dict[Tuple[int, datetime], PrinterStateChange]:
+    """Estado vigente de cada (impresora, instante); los instantes sin historial previo no aparecen."""
+    points = list(points)
+    if not points:
+        return {}
+    history = _changes_until(db, list({printer_id for printer_id, _ in points}), max(moment for _, moment in points))
+    result = {}
+    for printer_id, moment in points:
+        if printer_id not in history:
+            continue
+        times, changes = history[printer_id]
+        index = bisect_right(times, moment)
+        if index:
+            result[(printer_id, moment)] = changes[index - 1]
+    return result
+
+
+def state_series(
+    db: Session, printer_id: int, start: datetime, end: datetime, resolution: timedelta
+) -> List[Dict[str, Any]]:
+    """Serie de la impresora muestreada cada ``resolution`` entre start y end (incluidos)."""
+    if resolution <= timedelta(0):
+        raise ValueError("resolution debe ser positiva")
+    moments = []
+    moment = start
+    while moment <= end:
+        moments.append(moment)
+        moment += resolution
+    states = states_at(db, [(printer_id, moment) for moment in moments])
+    series = []
+    for moment in moments:
+        change = states.get((printer_id, moment))
+        series.append({"time": moment, **(_state(change) if change else {field: None for field in STATE_FIELDS})})
+    return series
+
+
+def backfill_state_history(db: Session, chunk_rows: int = 5000, threshold: Optional[float] = None) -> int:
+    """
+    Carga printer_state_changes desde las columnas de estado de usage_reports (por lotes
+    de id, una transacción por lote). Para la migración: correr una sola vez, con la
+    tabla vacía. Devuelve la cantidad de cambios escritos.
+    """
+    columns = [UsageReport.id, UsageReport.printer_id, UsageReport.date,
+               *(getattr(UsageReport, field) for field in STATE_FIELDS)]
+    written = 0
+    last_id = 0
+    while True:
+        rows = db.query(*columns).filter(UsageReport.id > last_id).order_by(UsageReport.id).limit(chunk_rows).all()
+        if not rows:
+            return written
+        written += record_states(db, [row._asdict() for row in rows], threshold)
+        db.commit()
+        last_id = rows[-1].id
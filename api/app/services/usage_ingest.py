@@ -0,0 +1,170 @@
+"""
+Reportes de uso: guardado compartido e ingesta por lotes desde colectores remotos.
+
+save_usage_rows guarda un lote de lecturas igual para el sondeo central
+(workers.polling) y para la ingesta: un INSERT multi-fila en usage_reports (sin
+tóner ni estado, ver services.state_history), los agregados por hora/día/mes y
+el historial de cambios.
+
+Los colectores (python -m app.workers.collector) sondean por SNMP en la LAN del
+sitio y envían las lecturas a POST /counter-collection/ingest. Cada colector numera
+sus lecturas con una secuencia estrictamente creciente y collector_cursors guarda la
+última aplicada: en un lote solo se guardan las lecturas con secuencia mayor, de
+modo que reenviar un lote (timeout, reintento, reinicio del colector) no duplica
+reportes. Al arrancar, el colector lee su cursor (GET /counter-collection/ingest/cursor)
+y numera a partir de él, así un reinicio sin spool no genera secuencias ya aplicadas. La fila del colector se bloquea durante el lote, así dos envíos
+simultáneos del mismo colector se aplican uno después del otro.
+
+Las impresoras que reciben lecturas de un colector se reprograman en el sondeo
+adaptativo al menos ingest_central_holdoff_minutes hacia adelante, para que la API
+no las consulte además a través de la WAN.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import dialect_insert
+from ..models import CollectorCursor, UsageReport
+from . import adaptive_polling
+from .fleet_registry import get_fleet_registry
+from .state_history import record_states, usage_report_values
+from .usage_rollups import add_usage_rollups
+
+USAGE_FIELDS = (
+    "pages_printed_mono", "pages_printed_color",
+    "toner_level_black", "toner_level_cyan", "toner_level_magenta", "toner_level_yellow",
+    "paper_level", "status",
+)
+
+
+def usage_row(printer_id: int, date: datetime, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Fila de usage_reports a partir del resultado de SNMPService.poll_printer."""
+    return {
+        "printer_id": printer_id,
+        "date": date,
+        "pages_printed_mono": data.get("pages_printed_mono", 0),
+        "pages_printed_color": data.get("pages_printed_color", 0),
+        "toner_level_black": data.get("toner_level_black"),
+        "toner_level_cyan": data.get("toner_level_cyan"),
+        "toner_level_magenta": data.get("toner_level_magenta"),
+        "toner_level_yellow": data.get("toner_level_yellow"),
+        "paper_level": data.get("paper_level"),
+        "status": data.get("status", "unknown"),
+    }
+
+
+def save_usage_rows(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Guarda los reportes de uso con sus agregados y cambios de estado. No hace commit."""
+    if not rows:
+        return
+    db.execute(insert(UsageReport), [usage_report_values(row) for row in rows])
+    add_usage_rollups(db, rows)
+    record_states(db, rows)
+
+
+@dataclass
+class IngestResult:
+    collector_id: str
+    accepted: int = 0
+    duplicates: int = 0
+    unknown: List[str] = field(default_factory=list)
+    last_sequence: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "collector_id": self.collector_id,
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "unknown": self.unknown,
+            "last_sequence": self.last_sequence,
+        }
+
+
+def _utc(moment: datetime) -> datetime:
+    # Mismo criterio que el sondeo central: UTC sin zona
+    return moment.astimezone(timezone.utc).replace(tzinfo=None) if moment.tzinfo else moment
+
+
+def _fleet_printer_ids() -> Tuple[Set[int], Dict[str, int]]:
+    """Ids de la flota sondeada e id por IP (la primera impresora de cada IP)."""
+    printer_ids: Set[int] = set()
+    by_ip: Dict[str, int] = {}
+    for entry in get_fleet_registry().select(active_only=False):
+        printer_ids.add(entry.id)
+        by_ip.setdefault(entry.ip, entry.id)
+    return printer_ids, by_ip
+
+
+def collector_cursor(db: Session, collector_id: str) -> Dict[str, Any]:
+    """Última secuencia aplicada de un colector (0 si nunca envió lecturas)."""
+    cursor = db.get(CollectorCursor, collector_id)
+    return {
+        "collector_id": collector_id,
+        "last_sequence": cursor.last_sequence if cursor else 0,
+        "readings_accepted": cursor.readings_accepted if cursor else 0,
+        "last_seen_at": cursor.last_seen_at if cursor else None,
+    }
+
+
+def _locked_cursor(db: Session, collector_id: str) -> CollectorCursor:
+    table = CollectorCursor.__table__
+    db.execute(
+        dialect_insert(db)(table).values(collector_id=collector_id, last_sequence=0, readings_accepted=0)
+        .on_conflict_do_nothing(index_elements=[table.c.collector_id])
+    )
+    return db.query(CollectorCursor).filter(
+        CollectorCursor.collector_id == collector_id
+    ).with_for_update().one()
+
+
+def ingest_readings(
+    db: Session, collector_id: str, readings: List[Dict[str, Any]], now: Optional[datetime] = None
+) -> IngestResult:
+    """
+    Aplica un lote de lecturas de un colector (dicts con sequence, printer_id o ip,
+    read_at y las columnas de USAGE_FIELDS). Las secuencias ya aplicadas cuentan como
+    duplicadas y las impresoras que no están en el registro como desconocidas (su
+    secuencia se consume igual: reenviarlas no cambiaría el resultado). Hace commit.
+    """
+    now = now or datetime.utcnow()
+    result = IngestResult(collector_id)
+    # La flota se resuelve antes de bloquear el cursor: el refresco del registro usa
+    # otra sesión y así el FOR UPDATE dura solo lo que tarda en guardarse el lote
+    printer_ids, by_ip = _fleet_printer_ids()
+
+    cursor = _locked_cursor(db, collector_id)
+    applied = cursor.last_sequence
+    rows = []
+    for reading in sorted(readings, key=lambda reading: reading["sequence"]):
+        if reading["sequence"] <= applied:
+            result.duplicates += 1
+            continue
+        applied = reading["sequence"]
+
+        printer_id = reading.get("printer_id")
+        if printer_id not in printer_ids:
+            printer_id = by_ip.get(reading.get("ip"))
+        if printer_id is None:
+            result.unknown.append(str(reading.get("ip") or reading.get("printer_id")))
+            continue
+        rows.append(usage_row(printer_id, _utc(reading["read_at"]), reading))
+
+    save_usage_rows(db, rows)
+    if rows and settings.adaptive_polling_enabled:
+        adaptive_polling.reschedule(
+            db, sorted({row["printer_id"] for row in rows}), [], now,
+            hold_until=now + timedelta(minutes=settings.ingest_central_holdoff_minutes)
+        )
+
+    result.accepted = len(rows)
+    cursor.last_sequence = applied
+    cursor.readings_accepted += len(rows)
+    cursor.last_seen_at = now
+    result.last_sequence = applied
+    db.commit()
+    return result
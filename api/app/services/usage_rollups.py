@@ -0,0 +1,208 @@
+"""
+Mantenimiento de los agregados de usage_reports por hora, día y mes.
+
+Cada inserción de UsageReport debe pasar por add_usage_rollups, en la misma
+transacción que el reporte: suma páginas y cantidad de reportes al período de
+cada granularidad con un upsert por tabla (INSERT ... ON CONFLICT DO UPDATE SET
+x = x + excluded.x).
+
+Los reportes traen los contadores acumulados de la impresora, así que las páginas de
+un reporte son el incremento desde la lectura válida anterior de la misma impresora
+(del lote o, para la primera del lote, de usage_reports). Así una impresora puede
+reportar varias veces por día (sondeo adaptativo, colectores) sin inflar los totales.
+La primera lectura de una impresora es la base (0 páginas); los sondeos fallidos
+(contadores en cero o estado offline) no mueven la base y una bajada del contador
+(reinicio) cuenta 0 páginas y pasa a ser la nueva base. Los reportes leen de usage_rollups_* en lugar de
+re-agregar el historial crudo, así que su costo depende de la cantidad de
+impresoras y períodos consultados, no de la cantidad de filas de usage_reports.
+
+La retención de usage_reports no toca los agregados. Los borrados de impresoras los
+limpian por la FK (ON DELETE CASCADE) o con delete_usage_rollups.
+rebuild_usage_rollups recalcula todo desde el historial (carga inicial).
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.orm import Session
+
+from ..db import dialect_insert
+from ..models import UsageReport, UsageRollupDaily, UsageRollupHourly, UsageRollupMonthly
+
+_TONER_COLUMNS = ("toner_level_black", "toner_level_cyan", "toner_level_magenta", "toner_level_yellow")
+
+ROLLUP_MODELS = {
+    "hour": UsageRollupHourly,
+    "day": UsageRollupDaily,
+    "month": UsageRollupMonthly,
+}
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Inicio del período (hora, día o mes) que contiene ``moment``."""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == "hour":
+        return moment
+    moment = moment.replace(hour=0)
+    if granularity == "day":
+        return moment
+    return moment.replace(day=1)
+
+
+def _value(report: Any, key: str) -> Any:
+    return report.get(key) if isinstance(report, dict) else getattr(report, key, None)
+
+
+def _min_toner(report: Any):
+    levels = [level for level in (_value(report, column) for column in _TONER_COLUMNS) if level is not None]
+    return min(levels) if levels else None
+
+
+def _merge_min(current, new):
+    if current is None:
+        return new
+    if new is None:
+        return current
+    return min(current, new)
+
+
+def is_valid_reading(mono: Optional[int], color: Optional[int], status: Optional[str]) -> bool:
+    """Falso para los sondeos fallidos (SNMPService._offline_poll_data: contadores en cero u offline)."""
+    return (mono or 0) + (color or 0) > 0 and status != "offline"
+
+
+def _previous_readings(db: Session, first_dates: Dict[int, datetime]) -> Dict[int, Tuple[int, int]]:
+    """Contadores (mono, color) de la última lectura válida de cada impresora anterior a su fecha."""
+    if not first_dates:
+        return {}
+    valid = and_(
+        func.coalesce(UsageReport.pages_printed_mono, 0) + func.coalesce(UsageReport.pages_printed_color, 0) > 0,
+        or_(UsageReport.status.is_(None), UsageReport.status != "offline"),
+    )
+    latest = db.query(
+        UsageReport.printer_id, func.max(UsageReport.date).label("date")
+    ).filter(
+        or_(*(and_(UsageReport.printer_id == printer_id, UsageReport.date < first)
+              for printer_id, first in first_dates.items())),
+        valid,
+    ).group_by(UsageReport.printer_id).subquery()
+    rows = db.query(
+        UsageReport.printer_id, UsageReport.pages_printed_mono, UsageReport.pages_printed_color
+    ).join(
+        latest, and_(UsageReport.printer_id == latest.c.printer_id, UsageReport.date == latest.c.date)
+    ).filter(valid)
+    return {printer_id: (mono or 0, color or 0) for printer_id, mono, color in rows}
+
+
+def _page_deltas(db: Session, reports: List[Any]) -> List[Tuple[Any, int, int]]:
+    """(reporte, páginas mono, páginas color) de cada reporte, por incremento de contadores."""
+    reports = sorted(reports, key=lambda report: (_value(report, "printer_id"), _value(report, "date")))
+    first_dates: Dict[int, datetime] = {}
+    for report in reports:
+        first_dates.setdefault(_value(report, "printer_id"), _value(report, "date"))
+    previous = _previous_readings(db, first_dates)
+
+    deltas = []
+    for report in reports:
+        printer_id = _value(report, "printer_id")
+        mono = _value(report, "pages_printed_mono") or 0
+        color = _value(report, "pages_printed_color") or 0
+        if not is_valid_reading(mono, color, _value(report, "status")):
+            deltas.append((report, 0, 0))
+            continue
+        before = previous.get(printer_id)
+        if before is None or mono + color < sum(before):
+            deltas.append((report, 0, 0))  # Base inicial o reinicio del contador
+        else:
+            deltas.append((report, max(0, mono - before[0]), max(0, color - before[1])))
+        previous[printer_id] = (mono, color)
+    return deltas
+
+
+def add_usage_rollups(db: Session, reports: Iterable[Any]) -> None:
+    """
+    Suma un lote de reportes (dicts con las columnas de UsageReport u objetos
+    UsageReport) a los agregados. Una sentencia por granularidad más la búsqueda de
+    la lectura anterior de cada impresora; no hace commit.
+    """
+    totals: Dict[str, Dict[Tuple[int, datetime], Dict[str, Any]]] = {granularity: {} for granularity in ROLLUP_MODELS}
+    reports = [report for report in reports if _value(report, "date") is not None]
+    for report, mono, color in _page_deltas(db, reports):
+        report_date = _value(report, "date")
+        toner = _min_toner(report)
+        for granularity, buckets in totals.items():
+            key = (_value(report, "printer_id"), bucket_start(report_date, granularity))
+            entry = buckets.get(key)
+            if entry is None:
+                buckets[key] = {"pages_mono": mono, "pages_color": color, "report_count": 1, "min_toner_level": toner}
+            else:
+                entry["pages_mono"] += mono
+                entry["pages_color"] += color
+                entry["report_count"] += 1
+                entry["min_toner_level"] = _merge_min(entry["min_toner_level"], toner)
+
+    for granularity, buckets in totals.items():
+        if not buckets:
+            continue
+        table = ROLLUP_MODELS[granularity].__table__
+        # Orden estable de claves: dos lotes concurrentes bloquean las filas en el mismo orden
+        values = [
+            {"printer_id": printer_id, "bucket_start": start, **entry}
+            for (printer_id, start), entry in sorted(buckets.items(), key=lambda item: item[0])
+        ]
+        stmt = dialect_insert(db)(table).values(values)
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.printer_id, table.c.bucket_start],
+            set_={
+                "pages_mono": table.c.pages_mono + excluded.pages_mono,
+                "pages_color": table.c.pages_color + excluded.pages_color,
+                "report_count": table.c.report_count + excluded.report_count,
+                "min_toner_level": case(
+                    (excluded.min_toner_level.is_(None), table.c.min_toner_level),
+                    (table.c.min_toner_level.is_(None), excluded.min_toner_level),
+                    (excluded.min_toner_level < table.c.min_toner_level, excluded.min_toner_level),
+                    else_=table.c.min_toner_level,
+                ),
+            },
+        )
+        db.execute(stmt)
+
+
+def delete_usage_rollups(db: Session, printer_ids: List[int]) -> None:
+    """Borra los agregados de las impresoras (junto con sus usage_reports)."""
+    for model in ROLLUP_MODELS.values():
+        db.query(model).filter(model.printer_id.in_(printer_ids)).delete(synchronize_session=False)
+
+
+def rebuild_usage_rollups(db: Session, chunk_rows: int = 2000) -> int:
+    """
+    Recalcula todos los agregados desde usage_reports, por lotes en orden de (date, id)
+    (una transacción por lote): cada lote ve antes todas las lecturas anteriores, así
+    los incrementos salen igual que al insertar. Solo para la carga inicial o una
+    reparación: no debe correr en paralelo con los sondeos. Devuelve la cantidad de
+    reportes procesados.
+    """
+    for model in ROLLUP_MODELS.values():
+        db.query(model).delete(synchronize_session=False)
+    db.commit()
+
+    columns = [UsageReport.id, UsageReport.printer_id, UsageReport.date,
+               UsageReport.pages_printed_mono, UsageReport.pages_printed_color, UsageReport.status,
+               *(getattr(UsageReport, column) for column in _TONER_COLUMNS)]
+    processed = 0
+    last: Optional[Tuple[datetime, int]] = None
+    while True:
+        query = db.query(*columns)
+        if last is not None:
+            query = query.filter(or_(
+                UsageReport.date > last[0], and_(UsageReport.date == last[0], UsageReport.id > last[1])
+            ))
+        rows = query.order_by(UsageReport.date, UsageReport.id).limit(chunk_rows).all()
+        if not rows:
+            return processed
+        add_usage_rollups(db, [row._asdict() for row in rows])
+        db.commit()
+        processed += len(rows)
+        last = (rows[-1].date, rows[-1].id)
@@ -0,0 +1,282 @@
+"""
+Proceso worker de la cola de recolección de contadores.
+
+    python -m app.workers.collection_worker
+
+Se pueden levantar varios procesos, en uno o más hosts, apuntando al mismo Redis
+y a la misma base de datos. Cada worker:
+
+1. Devuelve a la cola las tareas vencidas de workers caídos (sin heartbeat).
+2. Toma una tarea (un bloque de impresoras de una corrida) y renueva su visibilidad
+   desde un thread de heartbeat mientras la procesa.
+3. Lee y guarda las impresoras del bloque con el CollectionEngine, salteando las que
+   la corrida ya tiene registradas (reintentos), las leídas dentro de la ventana de
+   frescura de la corrida y las que otro proceso está leyendo en ese momento (lease
+   por impresora), y registra cada resultado en Redis.
+4. Cierra la tarea, o la devuelve a la cola si falló (hasta collection_queue_max_attempts).
+
+SIGTERM/SIGINT terminan la tarea en curso y luego salen.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+import logging
+import signal
+import threading
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import SessionLocal
+from ..models import CounterSchedule
+from ..services import collection_queue
+from ..services.collection_engine import CollectionEngine, CollectionOutcome
+from ..services.fleet_registry import FleetEntry, get_fleet_registry
+from ..services.latest_counters import get_latest_counters, get_recently_read
+from ..services.snmp import SNMPService
+from ..routers.counter_collection import (
+    build_collection_target,
+    fetch_printer_counters,
+    outcome_to_counter_data,
+    persist_monthly_counters,
+)
+from .polling import _leased, _persist_usage_reports, _poll_usage, _reported_today, _usage_target
+
+logger = logging.getLogger(__name__)
+
+_stop = threading.Event()
+
+
+def _printer_result(printer_id: int, success: bool, error: str = None, action: str = None, **extra) -> Dict[str, Any]:
+    return {
+        "printer_id": printer_id,
+        "success": success,
+        "error_message": error,
+        "action_taken": action,
+        **extra,
+    }
+
+
+def _usage_result(outcome: CollectionOutcome) -> Dict[str, Any]:
+    payload = outcome.target.payload
+    if outcome.success:
+        error = None
+    elif outcome.ping_ok is False:
+        error = f"Sin conectividad en los puertos {', '.join(map(str, outcome.target.ports))}"
+    else:
+        error = outcome.error
+    return _printer_result(
+        outcome.target.printer_id,
+        outcome.success,
+        error,
+        outcome.action,
+        printer_ip=outcome.target.ip,
+        printer_name=f"{payload.get('brand')} {payload.get('model')}",
+        ping_check=outcome.ping_ok,
+        response_time=round(outcome.ping_seconds + outcome.fetch_seconds, 3),
+    )
+
+
+def _skip_fresh_printers(db: Session, run: Dict[str, Any], printers: List[FleetEntry]) -> List[FleetEntry]:
+    """Registra como salteadas las impresoras leídas dentro de la ventana de la corrida."""
+    window = run.get("fresh_within_minutes") or 0
+    if window <= 0:
+        return printers
+
+    fresh = get_recently_read(db, [p.id for p in printers], datetime.now() - timedelta(minutes=window))
+    collection_queue.record_results(run["run_id"], [
+        _printer_result(
+            printer.id, True, action="fresh", printer_ip=printer.ip,
+            printer_name=f"{printer.brand} {printer.model}",
+            last_read_at=fresh[printer.id].isoformat(),
+        )
+        for printer in printers
+        if printer.id in fresh
+    ])
+    return [printer for printer in printers if printer.id not in fresh]
+
+
+def _collect_counters(db: Session, run: Dict[str, Any], printers: List[FleetEntry], snmp_service: SNMPService) -> None:
+    run_id = run["run_id"]
+    printers = _skip_fresh_printers(db, run, printers)
+    if not printers:
+        return
+    previous_counters_cache = get_latest_counters(db, [p.id for p in printers])
+
+    engine = CollectionEngine(
+        fetch=_leased(lambda target: fetch_printer_counters(target, snmp_service), holder="collection-worker"),
+        persist=lambda session, batch: persist_monthly_counters(
+            session, batch, run["year"], run["month"], previous_counters_cache, collection_run_id=run_id
+        ),
+        on_outcome=lambda outcome: collection_queue.record_results(
+            run_id, [outcome_to_counter_data(outcome).dict()]
+        ),
+    )
+    report = engine.run([build_collection_target(printer) for printer in printers])
+    logger.info(f"Corrida {run_id}: {len(printers)} impresoras, tiempos {report.timings}")
+
+
+def _collect_usage(db: Session, run: Dict[str, Any], printers: List[FleetEntry], snmp_service: SNMPService) -> None:
+    run_id = run["run_id"]
+
+    # Un reporte por impresora y día: también hace idempotentes los reintentos de la tarea
+    reported_today = _reported_today(db, [p.id for p in printers])
+    collection_queue.record_results(run_id, [
+        _printer_result(printer.id, True, action="fresh", printer_ip=printer.ip,
+                        printer_name=f"{printer.brand} {printer.model}")
+        for printer in printers
+        if printer.id in reported_today
+    ])
+
+    targets = [_usage_target(printer) for printer in printers if printer.id not in reported_today]
+    engine = CollectionEngine(
+        fetch=_leased(lambda target: _poll_usage(snmp_service, target), holder="collection-worker"),
+        persist=_persist_usage_reports,
+        on_outcome=lambda outcome: collection_queue.record_results(run_id, [_usage_result(outcome)]),
+    )
+    report = engine.run(targets)
+    logger.info(f"Corrida {run_id}: {len(targets)} impresoras, tiempos {report.timings}")
+
+
+def process_task(task: collection_queue.CollectionTask, snmp_service: SNMPService) -> None:
+    """Procesa las impresoras de la tarea que aún no tienen resultado en la corrida."""
+    run = collection_queue.get_run(task.run_id)
+    if run is None:
+        logger.warning(f"Corrida {task.run_id} inexistente o expirada; se descarta la tarea {task.task_id}")
+        return
+
+    recorded = collection_queue.get_recorded_printer_ids(task.run_id)
+    pending_ids = [printer_id for printer_id in task.printer_ids if printer_id not in recorded]
+    if not pending_ids:
+        return
+
+    db = SessionLocal()
+    try:
+        printers = get_fleet_registry().get_many(pending_ids)
+        found = {printer.id for printer in printers}
+        collection_queue.record_results(task.run_id, [
+            _printer_result(printer_id, False, "Impresora no encontrada")
+            for printer_id in pending_ids
+            if printer_id not in found
+        ])
+        if not printers:
+            return
+
+        if run["kind"] == collection_queue.KIND_USAGE:
+            _collect_usage(db, run, printers, snmp_service)
+        else:
+            _collect_counters(db, run, printers, snmp_service)
+    finally:
+        db.close()
+
+
+def _finish_schedule_run(run_id: str) -> None:
+    """Actualiza las estadísticas de error de la programación al terminar su corrida."""
+    run = collection_queue.get_run(run_id, include_results=True)
+    if not run or not run.get("schedule_id"):
+        return
+
+    errors = [
+        f"Printer {result['printer_id']} ({result.get('printer_ip')}): {result.get('error_message')}"
+        for result in run["results"]
+        if not result.get("success")
+    ]
+    db = SessionLocal()
+    try:
+        schedule = db.query(CounterSchedule).filter(CounterSchedule.id == run["schedule_id"]).first()
+        if not schedule:
+            return
+        if errors:
+            schedule.error_count += 1
+            schedule.last_error = "; ".join(errors[:3])  # Store first 3 errors
+        else:
+            schedule.last_error = None
+        db.commit()
+    finally:
+        db.close()
+    logger.info(
+        f"Programación {run['schedule_id']} terminada: {run['printers_successful']} correctas, "
+        f"{run['printers_failed']} fallidas"
+    )
+
+
+def _on_run_finished(task: collection_queue.CollectionTask) -> None:
+    run = collection_queue.get_run(task.run_id)
+    logger.info(f"Corrida {task.run_id} completada")
+    if run and run.get("source") == collection_queue.SOURCE_SCHEDULE:
+        _finish_schedule_run(task.run_id)
+
+
+def _heartbeat_loop(task: collection_queue.CollectionTask, done: threading.Event) -> None:
+    while not done.wait(settings.collection_worker_heartbeat_seconds):
+        try:
+            if not collection_queue.heartbeat(task):
+                logger.warning(f"La tarea {task.task_id} ya no pertenece a este worker (vencida y reasignada)")
+                return
+        except collection_queue.CollectionQueueError as e:
+            logger.warning(f"Heartbeat fallido para la tarea {task.task_id}: {e}")
+
+
+def _reap() -> None:
+    for task in collection_queue.reap_expired():
+        logger.error(f"Tarea {task.task_id} sin más intentos; sus impresoras pendientes se marcan como fallidas")
+        if collection_queue.fail_task(task, "Tarea abandonada tras agotar los reintentos"):
+            _on_run_finished(task)
+
+
+def run_worker() -> None:
+    """Bucle principal del worker (hasta recibir SIGTERM/SIGINT)."""
+    snmp_service = SNMPService()
+    logger.info("Worker de recolección iniciado")
+
+    while not _stop.is_set():
+        try:
+            _reap()
+            task = collection_queue.dequeue_task()
+        except collection_queue.CollectionQueueError as e:
+            logger.error(str(e))
+            _stop.wait(5)
+            continue
+
+        if task is None:
+            _stop.wait(settings.collection_worker_poll_seconds)
+            continue
+
+        logger.info(f"Tarea {task.task_id} (corrida {task.run_id}, intento {task.attempts + 1}): {len(task.printer_ids)} impresoras")
+        done = threading.Event()
+        threading.Thread(target=_heartbeat_loop, args=(task, done), daemon=True).start()
+        try:
+            process_task(task, snmp_service)
+        except Exception as e:
+            done.set()
+            logger.exception(f"Error procesando la tarea {task.task_id}: {e}")
+            try:
+                if collection_queue.release_task(task, str(e)):
+                    if collection_queue.fail_task(task, f"Error tras {settings.collection_queue_max_attempts} intentos: {e}"):
+                        _on_run_finished(task)
+            except collection_queue.CollectionQueueError as queue_error:
+                # La visibilidad vencerá y otro worker la retomará
+                logger.error(str(queue_error))
+            continue
+        finally:
+            done.set()
+
+        try:
+            if collection_queue.complete_task(task):
+                _on_run_finished(task)
+        except collection_queue.CollectionQueueError as e:
+            logger.error(str(e))
+
+    logger.info("Worker de recolección detenido")
+
+
+def _request_stop(signum, frame) -> None:
+    logger.info(f"Señal {signum} recibida: se termina la tarea en curso y se sale")
+    _stop.set()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+    run_worker()
@@ -0,0 +1,253 @@
+"""
+Colector de uso remoto: sondea impresoras por SNMP fuera del proceso de la API.
+
+    python -m app.workers.collector [--targets 10.20.0.0/24,10.20.1.15] [--once]
+
+Pensado para correr en la LAN de un sitio remoto: el sondeo SNMP queda local y la
+API central solo recibe lotes HTTP en POST /counter-collection/ingest, sin esperar
+la latencia de la WAN. En cada ciclo el colector:
+
+1. Recorre las IPs y subredes de collector_targets con el CollectionEngine (ping
+   TCP a los puertos de impresora y lectura SNMP en el pool de threads).
+2. Numera cada lectura con una secuencia creciente (microsegundos desde epoch, nunca
+   menor que la anterior) y la suma a las pendientes. Antes de numerar la primera
+   lectura lee la última secuencia aplicada en la API (GET .../ingest/cursor) y sigue
+   desde ahí: sin ese piso, un reinicio sin spool con el reloj atrasado generaría
+   secuencias ya aplicadas y la API descartaría esas lecturas como duplicadas.
+   Mientras la API no responda, las lecturas quedan pendientes sin numerar.
+3. Envía las pendientes en lotes de collector_batch_size, en orden. La API responde
+   la última secuencia aplicada y las confirmadas se descartan; si un envío falla
+   quedan pendientes y se reintentan en el ciclo siguiente. Reenviar es seguro: la
+   ingesta ignora las secuencias ya aplicadas.
+
+Las pendientes (hasta collector_max_pending) y la última secuencia se guardan en
+collector_spool_path si está configurado, así un reinicio no pierde lecturas.
+Usa la misma imagen y configuración que la API; DATABASE_URL y JWT_SECRET deben
+estar definidas pero el colector nunca se conecta a la base de datos.
+
+SIGTERM/SIGINT terminan el ciclo en curso y luego salen.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import argparse
+import ipaddress
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+import requests
+
+from ..config import settings
+from ..services.collection_engine import CollectionEngine, CollectionOutcome, CollectionTarget
+from ..services.snmp import SNMPService
+from ..services.usage_ingest import USAGE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+INGEST_PATH = "/counter-collection/ingest"
+CURSOR_PATH = "/counter-collection/ingest/cursor"
+
+_stop = threading.Event()
+
+
+def expand_targets(spec: str) -> List[str]:
+    """IPs a sondear a partir de una lista separada por comas de IPs y subredes CIDR."""
+    ips: List[str] = []
+    seen = set()
+    for item in (part.strip() for part in spec.split(",")):
+        if not item:
+            continue
+        network = ipaddress.ip_network(item, strict=False)
+        hosts = [network.network_address] if network.num_addresses == 1 else network.hosts()
+        for host in hosts:
+            ip = str(host)
+            if ip not in seen:
+                seen.add(ip)
+                ips.append(ip)
+    return ips
+
+
+class Spool:
+    """Lecturas pendientes de envío y secuencia del colector (opcionalmente en un archivo JSON)."""
+
+    def __init__(self, path: str = "", max_pending: int = 50000):
+        self.path = path
+        self.max_pending = max(1, max_pending)
+        self.pending: List[Dict[str, Any]] = []
+        self.last_sequence = 0
+        self.synced = False  # Secuencia alineada con el cursor de la API
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.pending = state.get("pending", [])
+            self.last_sequence = state.get("last_sequence", 0)
+            logger.info(f"Spool {path}: {len(self.pending)} lecturas pendientes")
+
+    def next_sequence(self) -> int:
+        self.last_sequence = max(self.last_sequence + 1, time.time_ns() // 1000)
+        return self.last_sequence
+
+    def sync(self, server_sequence: int) -> None:
+        """Toma como piso la última secuencia aplicada en la API y numera las pendientes sin número."""
+        self.last_sequence = max(self.last_sequence, server_sequence)
+        self.synced = True
+        self._number_pending()
+
+    def _number_pending(self) -> None:
+        for reading in self.pending:
+            if "sequence" not in reading:
+                reading["sequence"] = self.next_sequence()
+
+    def add(self, readings: List[Dict[str, Any]]) -> None:
+        self.pending.extend(readings)
+        if self.synced:
+            self._number_pending()
+        overflow = len(self.pending) - self.max_pending
+        if overflow > 0:
+            del self.pending[:overflow]
+            logger.warning(f"Spool lleno: se descartan las {overflow} lecturas pendientes más viejas")
+
+    def acknowledge(self, sequence: int) -> None:
+        self.pending = [reading for reading in self.pending if reading["sequence"] > sequence]
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        partial = f"{self.path}.tmp"
+        with open(partial, "w") as f:
+            json.dump({"last_sequence": self.last_sequence, "pending": self.pending}, f)
+        os.replace(partial, self.path)
+
+
+def read_printers(ips: List[str], snmp_profile: str, snmp_service: SNMPService) -> List[Dict[str, Any]]:
+    """Una lectura por IP que respondió SNMP (sin secuencia todavía)."""
+    readings: List[Dict[str, Any]] = []
+
+    def fetch(target: CollectionTarget) -> Dict[str, Any]:
+        data = snmp_service.poll_printer(target.ip, snmp_profile)
+        if data.get("status") == "offline":
+            return {"success": False, "error": "Sin respuesta SNMP"}
+        return {"success": True, "error": None, "usage": data, "read_at": datetime.utcnow().isoformat()}
+
+    def collect(db, outcomes: List[CollectionOutcome]) -> None:
+        # No hay base de datos: el "lote persistido" queda en memoria para el envío
+        for outcome in outcomes:
+            usage = outcome.data["usage"]
+            readings.append({
+                "ip": outcome.target.ip,
+                "read_at": outcome.data["read_at"],
+                **{name: usage[name] for name in USAGE_FIELDS if usage.get(name) is not None},
+            })
+            outcome.action = "read"
+
+    targets = [CollectionTarget(printer_id=index, ip=ip) for index, ip in enumerate(ips)]
+    engine = CollectionEngine(fetch=fetch, persist=collect, session_factory=lambda: None)
+    report = engine.run(targets)
+    logger.info(f"Ciclo de sondeo: {len(readings)} lecturas de {len(ips)} IPs; tiempos {report.timings}")
+    return readings
+
+
+def _headers() -> Dict[str, str]:
+    return {"X-Collector-Token": settings.collector_token} if settings.collector_token else {}
+
+
+def sync_sequence(spool: Spool, http: requests.Session, api_url: str, collector_id: str) -> bool:
+    """Alinea la secuencia del spool con el cursor del colector en la API. False si no respondió."""
+    try:
+        response = http.get(
+            api_url.rstrip("/") + CURSOR_PATH, params={"collector_id": collector_id}, headers=_headers(), timeout=30
+        )
+        response.raise_for_status()
+        server_sequence = int(response.json()["last_sequence"])
+    except (requests.RequestException, ValueError, KeyError) as e:
+        logger.error(f"No se pudo leer el cursor del colector en la API ({e}); se reintenta en el próximo ciclo")
+        return False
+    spool.sync(server_sequence)
+    logger.info(f"Secuencia del colector {collector_id} desde {spool.last_sequence}")
+    return True
+
+
+def push_pending(
+    spool: Spool, http: requests.Session, api_url: str, collector_id: str, batch_size: int
+) -> int:
+    """Envía las pendientes en lotes, en orden, hasta vaciarlas o hasta el primer error. Devuelve las aceptadas."""
+    if not spool.synced and not sync_sequence(spool, http, api_url, collector_id):
+        spool.save()
+        return 0
+    url = api_url.rstrip("/") + INGEST_PATH
+    headers = _headers()
+    accepted = 0
+    while spool.pending and not _stop.is_set():
+        batch = spool.pending[:max(1, batch_size)]
+        try:
+            response = http.post(
+                url, json={"collector_id": collector_id, "readings": batch}, headers=headers, timeout=60
+            )
+            response.raise_for_status()
+            result = response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Envío de {len(batch)} lecturas falló ({e}); {len(spool.pending)} quedan pendientes")
+            break
+        if result.get("unknown"):
+            logger.warning(f"La API no reconoce {len(result['unknown'])} IPs: {', '.join(result['unknown'][:10])}")
+        accepted += result.get("accepted", 0)
+        spool.acknowledge(result.get("last_sequence") or batch[-1]["sequence"])
+    spool.save()
+    return accepted
+
+
+def run_collector(
+    ips: List[str], api_url: str, collector_id: str, once: bool = False, spool: Optional[Spool] = None
+) -> None:
+    """Bucle principal del colector (hasta recibir SIGTERM/SIGINT, o un solo ciclo con ``once``)."""
+    spool = spool or Spool(settings.collector_spool_path, settings.collector_max_pending)
+    snmp_service = SNMPService()
+    http = requests.Session()
+    logger.info(f"Colector {collector_id} iniciado: {len(ips)} IPs, envío a {api_url}")
+
+    while not _stop.is_set():
+        started = time.monotonic()
+        try:
+            spool.add(read_printers(ips, settings.collector_snmp_profile, snmp_service))
+            spool.save()
+        except Exception as e:
+            logger.exception(f"Error en el ciclo de sondeo: {e}")
+        accepted = push_pending(spool, http, api_url, collector_id, settings.collector_batch_size)
+        logger.info(f"{accepted} lecturas aceptadas por la API, {len(spool.pending)} pendientes")
+        if once:
+            break
+        _stop.wait(max(0.0, settings.collector_interval_seconds - (time.monotonic() - started)))
+
+    logger.info("Colector detenido")
+
+
+def _request_stop(signum, frame) -> None:
+    logger.info(f"Señal {signum} recibida: se termina el ciclo en curso y se sale")
+    _stop.set()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Colector de uso remoto (SNMP local, ingesta por lotes en la API)")
+    parser.add_argument("--targets", default=settings.collector_targets, help="IPs y subredes CIDR separadas por comas")
+    parser.add_argument("--api-url", default=settings.collector_api_url, help="URL base de la API central")
+    parser.add_argument("--collector-id", default=settings.collector_id or socket.gethostname())
+    parser.add_argument("--once", action="store_true", help="Un solo ciclo de sondeo y envío")
+    args = parser.parse_args(argv)
+
+    ips = expand_targets(args.targets)
+    if not ips:
+        parser.error("Sin IPs a sondear: configurar COLLECTOR_TARGETS o --targets")
+
+    logging.basicConfig(level=logging.INFO)
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+    run_collector(ips, args.api_url, args.collector_id[:100], once=args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+Barridos automáticos de descubrimiento basados en DiscoveryConfig.
+
+Un job periódico revisa las configuraciones con ``sweep_enabled`` y, dentro de la
+ventana fuera de horario configurada, ejecuta el pipeline de descubrimiento acotado:
+
+1. Escaneo de puertos (rápido) sobre los rangos de la configuración.
+2. Descubrimiento SNMP/HTTP solo sobre las IPs que respondieron.
+3. Conciliación por número de serie: si una impresora conocida aparece con otra IP,
+   se actualiza su IP y se registra el cambio en PrinterIPHistory.
+
+El barrido respeta un presupuesto de red (workers y sondeos por segundo) y de CPU
+(loadavg), y nunca se solapa con la recolección de contadores: no arranca si hay una
+recolección en curso o una programación a punto de vencer, y se aborta entre lotes
+si una recolección comienza mientras tanto.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, time as dt_time
+from typing import Any, Callable, Dict, List, Optional
+import ipaddress
+import json
+import logging
+import os
+import time
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import SessionLocal
+from ..models import CounterSchedule, DiscoveryConfig, DiscoverySweepRun, Printer
+from ..services.scheduler_lease import JobLock
+
+logger = logging.getLogger(__name__)
+
+# Un barrido a la vez entre todos los procesos (scheduler del líder y disparos manuales)
+_sweep_lock = JobLock("discovery_sweep", ttl_seconds=120)
+
+
+class SweepAborted(Exception):
+    """El barrido se interrumpió para ceder recursos a la recolección de contadores."""
+
+
+def _parse_window(window: str) -> tuple[dt_time, dt_time]:
+    start_str, end_str = window.split("-")
+    start_h, start_m = map(int, start_str.strip().split(":"))
+    end_h, end_m = map(int, end_str.strip().split(":"))
+    return dt_time(start_h, start_m), dt_time(end_h, end_m)
+
+
+def is_within_sweep_window(now: Optional[datetime] = None) -> bool:
+    """Indica si ``now`` (hora local) cae dentro de la ventana de barridos; soporta ventanas que cruzan medianoche."""
+    now = now or datetime.now()
+    try:
+        start, end = _parse_window(settings.discovery_sweep_window)
+    except ValueError:
+        logger.warning(f"DISCOVERY_SWEEP_WINDOW inválida: {settings.discovery_sweep_window}")
+        return False
+
+    current = now.time()
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+def _cpu_budget_exceeded() -> bool:
+    try:
+        load_1m = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return False
+    cpus = os.cpu_count() or 1
+    return (load_1m / cpus) > settings.discovery_sweep_max_load_per_cpu
+
+
+def _collection_busy() -> bool:
+    """True si hay una recolección de contadores (manual o programada) en curso."""
+    from ..routers.counter_collection import is_collection_running
+    from .polling import get_auto_counter_runtime_status
+
+    return is_collection_running() or get_auto_counter_runtime_status()["is_busy"]
+
+
+def _collection_due_soon(db: Session, now: Optional[datetime] = None) -> bool:
+    """True si alguna programación de contadores activa vence dentro del margen de guarda."""
+    now = now or datetime.utcnow()
+    horizon = now + timedelta(minutes=settings.discovery_sweep_guard_minutes)
+    return db.query(CounterSchedule.id).filter(
+        CounterSchedule.is_active == True,
+        CounterSchedule.next_run <= horizon
+    ).first() is not None
+
+
+def parse_config_ranges(ip_ranges: str) -> List[str]:
+    """Expande los rangos separados por comas de una DiscoveryConfig en una lista de IPs únicas."""
+    from ..routers.printers import parse_ip_range
+
+    ips: Dict[str, None] = {}
+    for chunk in ip_ranges.split(","):
+        chunk = chunk.strip()
+        if chunk:
+            ips.update(dict.fromkeys(parse_ip_range(chunk)))
+    return sorted(ips, key=lambda ip: ipaddress.IPv4Address(ip))
+
+
+def _run_budgeted(
+    func: Callable[[str], Any],
+    ips: List[str],
+    should_abort: Callable[[], bool],
+) -> Dict[str, Any]:
+    """
+    Ejecuta ``func`` sobre cada IP respetando el presupuesto de red y CPU.
+    Procesa por lotes del tamaño del pool; entre lotes aplica el límite de
+    sondeos por segundo, espera si la CPU está saturada y verifica si debe abortar.
+    """
+    results: Dict[str, Any] = {}
+    workers = max(1, settings.discovery_sweep_max_workers)
+    min_batch_seconds = workers / max(0.1, settings.discovery_sweep_max_probes_per_second)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for offset in range(0, len(ips), workers):
+            if should_abort():
+                raise SweepAborted("Recolección de contadores en curso")
+
+            while _cpu_budget_exceeded():
+                logger.info("Barrido de descubrimiento en pausa: presupuesto de CPU excedido")
+                time.sleep(5)
+                if should_abort():
+                    raise SweepAborted("Recolección de contadores en curso")
+
+            batch = ips[offset:offset + workers]
+            batch_started = time.monotonic()
+            for ip, result in zip(batch, executor.map(func, batch)):
+                results[ip] = result
+
+            elapsed = time.monotonic() - batch_started
+            if elapsed < min_batch_seconds:
+                time.sleep(min_batch_seconds - elapsed)
+
+    return results
+
+
+def _reconcile_device(db: Session, device, run_details: Dict[str, list]) -> str:
+    """
+    Concilia un dispositivo descubierto con el inventario.
+    Retorna 'known', 'ip_changed', 'conflict' o 'new'.
+    """
+    from ..services.snmp import SNMPService
+
+    serial = (device.serial_number or "").strip()
+    if not serial:
+        by_ip = db.query(Printer.id).filter(Printer.ip == device.ip).first()
+        if by_ip:
+            return "known"
+        run_details["new_devices"].append({
+            "ip": device.ip, "brand": device.brand, "model": device.model, "serial_number": None,
+        })
+        return "new"
+
+    printer = db.query(Printer).filter(Printer.serial_number == serial).first()
+    if not printer:
+        run_details["new_devices"].append({
+            "ip": device.ip, "brand": device.brand, "model": device.model, "serial_number": serial,
+        })
+        return "new"
+
+    if printer.ip == device.ip:
+        return "known"
+
+    holder = db.query(Printer).filter(Printer.ip == device.ip, Printer.id != printer.id).first()
+    if holder:
+        run_details["conflicts"].append({
+            "printer_id": printer.id,
+            "serial_number": serial,
+            "new_ip": device.ip,
+            "held_by_printer_id": holder.id,
+        })
+        return "conflict"
+
+    old_ip = printer.ip
+    SNMPService().handle_ip_change(
+        db,
+        printer,
+        old_ip,
+        device.ip,
+        "discovery_sweep",
+        f"Detectado en barrido automático. Serial: {serial}"
+    )
+    run_details["ip_changes"].append({
+        "printer_id": printer.id,
+        "asset_tag": printer.asset_tag,
+        "old_ip": old_ip,
+        "new_ip": device.ip,
+    })
+    return "ip_changed"
+
+
+def run_discovery_config(
+    config_id: int,
+    db: Session,
+    trigger: str = "scheduled",
+    should_abort: Optional[Callable[[], bool]] = None,
+) -> DiscoverySweepRun:
+    """Ejecuta un barrido completo de una DiscoveryConfig y persiste el resultado."""
+    from ..routers.printers import DiscoveredDevice, discover_single_device, fill_discovered_hostnames, ping_single_ip
+    from ..services.medical_printer_service import discover_medical_printers
+
+    should_abort = should_abort or _collection_busy
+    config = db.query(DiscoveryConfig).filter(DiscoveryConfig.id == config_id).first()
+    if not config:
+        raise ValueError(f"DiscoveryConfig {config_id} no encontrada")
+
+    run = DiscoverySweepRun(config_id=config.id, trigger=trigger, status="running")
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+
+    started = time.monotonic()
+    run_details: Dict[str, list] = {"new_devices": [], "ip_changes": [], "conflicts": []}
+
+    try:
+        ips = parse_config_ranges(config.ip_ranges)
+        if len(ips) > settings.discovery_sweep_max_ips:
+            run.message = f"Rango truncado a {settings.discovery_sweep_max_ips} de {len(ips)} IPs"
+            ips = ips[:settings.discovery_sweep_max_ips]
+        run.ips_scanned = len(ips)
+
+        # Fase 1: escaneo de puertos
+        alive = _run_budgeted(lambda ip: ping_single_ip(ip, 1), ips, should_abort)
+        responsive = [ip for ip in ips if alive.get(ip)]
+        run.ips_responsive = len(responsive)
+
+        # Fase 2: descubrimiento SNMP/HTTP sobre IPs vivas
+        discovered = _run_budgeted(lambda ip: discover_single_device(ip, 3), responsive, should_abort)
+        devices = [d for d in discovered.values() if d.is_printer]
+
+        # Impresoras médicas (sin SNMP) entre las IPs vivas que no se identificaron
+        pending_medical = [ip for ip in responsive if not discovered.get(ip) or not discovered[ip].is_printer]
+        if pending_medical and not should_abort():
+            for info in discover_medical_printers(
+                ip_list=pending_medical,
+                port=20051,
+                timeout=3,
+                max_workers=min(settings.discovery_sweep_max_workers, 20)
+            ):
+                devices.append(DiscoveredDevice(
+                    ip=info['ip'],
+                    brand=info.get('brand'),
+                    model=info.get('model'),
+                    serial_number=info.get('serial_number'),
+                    is_printer=True,
+                    is_medical=True,
+                    snmp_profile='medical_web',
+                ))
+
+        fill_discovered_hostnames(devices)
+        run.printers_found = len(devices)
+
+        # Fase 3: conciliación con el inventario
+        for device in devices:
+            try:
+                outcome = _reconcile_device(db, device, run_details)
+            except Exception as e:
+                db.rollback()
+                run_details["conflicts"].append({"ip": device.ip, "error": str(e)})
+                continue
+            if outcome == "known":
+                run.known_printers += 1
+            elif outcome == "ip_changed":
+                run.known_printers += 1
+                run.ip_changes += 1
+            elif outcome == "new":
+                run.new_devices += 1
+
+        run.status = "completed"
+    except SweepAborted as e:
+        run.status = "aborted"
+        run.message = str(e)
+        logger.info(f"Barrido de '{config.name}' abortado: {e}")
+    except Exception as e:
+        db.rollback()
+        run.status = "error"
+        run.message = str(e)
+        logger.error(f"Error en barrido de '{config.name}': {e}")
+    finally:
+        run.finished_at = datetime.utcnow()
+        run.duration_seconds = round(time.monotonic() - started, 2)
+        run.details = json.dumps(run_details)
+        if run.status == "completed":
+            config.last_sweep_at = run.finished_at
+        db.commit()
+
+    logger.info(
+        f"Barrido '{config.name}' {run.status}: {run.ips_responsive}/{run.ips_scanned} IPs vivas, "
+        f"{run.printers_found} impresoras, {run.ip_changes} cambios de IP, {run.new_devices} nuevas "
+        f"({run.duration_seconds}s)"
+    )
+    return run
+
+
+def run_discovery_sweeps(force: bool = False):
+    """
+    Job programado: ejecuta los barridos pendientes de las configuraciones habilitadas.
+    Con ``force`` ignora la ventana horaria y el intervalo mínimo (no la protección
+    contra solapamiento con la recolección de contadores).
+    """
+    if not force and not is_within_sweep_window():
+        return
+
+    if not _sweep_lock.acquire(blocking=False):
+        print("Discovery sweep skipped: another sweep is still running")
+        return
+
+    db = SessionLocal()
+    try:
+        if _collection_busy() or _collection_due_soon(db):
+            print("Discovery sweep skipped: counter collection running or due soon")
+            return
+        if _cpu_budget_exceeded():
+            print("Discovery sweep skipped: CPU budget exceeded")
+            return
+
+        cutoff = datetime.utcnow() - timedelta(hours=settings.discovery_sweep_interval_hours)
+        query = db.query(DiscoveryConfig).filter(
+            DiscoveryConfig.is_active == True,
+            DiscoveryConfig.sweep_enabled == True
+        )
+        if not force:
+            query = query.filter(
+                (DiscoveryConfig.last_sweep_at.is_(None)) | (DiscoveryConfig.last_sweep_at < cutoff)
+            )
+        configs = query.order_by(DiscoveryConfig.last_sweep_at.asc().nullsfirst()).all()
+
+        for config in configs:
+            if not force and not is_within_sweep_window():
+                break
+            run = run_discovery_config(config.id, db, trigger="manual" if force else "scheduled")
+            if run.status == "aborted":
+                break
+    except Exception as e:
+        print(f"Error in run_discovery_sweeps: {str(e)}")
+    finally:
+        db.close()
+        _sweep_lock.release()
+
+
+def run_single_sweep_now(config_id: int):
+    """Ejecuta en segundo plano el barrido de una configuración (disparo manual)."""
+    if not _sweep_lock.acquire(blocking=False):
+        print(f"Discovery sweep for config {config_id} skipped: another sweep is still running")
+        return
+
+    db = SessionLocal()
+    try:
+        if _collection_busy():
+            print(f"Discovery sweep for config {config_id} skipped: counter collection running")
+            return
+        run_discovery_config(config_id, db, trigger="manual")
+    except Exception as e:
+        print(f"Error in run_single_sweep_now: {str(e)}")
+    finally:
+        db.close()
+        _sweep_lock.release()
+
+
+def is_sweep_running() -> bool:
+    """Indica si hay un barrido de descubrimiento en curso (en cualquier proceso)."""
+    return _sweep_lock.locked()
@@ -10,7 +10,7 @@ from sqlalchemy.orm import Session
 
 from ..config import settings
 from ..db import SessionLocal
-from ..models import Printer
+from ..services.fleet_registry import get_fleet_registry
 from ..services.medical_printer_service import DrypixScraper
 from ..services.cartridge_detection_service import CartridgeDetectionService
 from ..services.medical_alert_service import record_medical_counter_error
@@ -32,11 +32,7 @@ def poll_medical_printers_hourly():
     db: Session = SessionLocal()
     try:
         # Obtener todas las impresoras médicas
-        medical_printers = db.query(Printer).filter(
-            Printer.is_medical == True,
-            Printer.status == "active",
-            Printer.ignore_counters == False
-        ).all()
+        medical_printers = get_fleet_registry().select(medical=True)
         
         print(f"📋 Encontradas {len(medical_printers)} impresoras médicas")
         
@@ -130,14 +126,14 @@ def cleanup_old_snapshots_job():
     Ejecutar 1x día a las 3:00 AM
     
     Mantiene:
-    - Últimos 30 días: todos los snapshots horarios
-    - Más de 30 días: solo 1 snapshot por día
+    - Últimos retention_snapshots_days días (30): todos los snapshots horarios
+    - Más antiguos: solo 1 snapshot por día
     """
     logger.info("🧹 Iniciando limpieza de snapshots antiguos...")
     
     db: Session = SessionLocal()
     try:
-        deleted = CartridgeDetectionService.cleanup_old_snapshots(db, days_to_keep=30)
+        deleted = CartridgeDetectionService.cleanup_old_snapshots(db)
         logger.info(f"✅ Limpieza completada: {deleted} snapshots eliminados")
     except Exception as e:
         logger.error(f"Error en limpieza: {str(e)}")
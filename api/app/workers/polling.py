@@ -1,56 +1,133 @@
+from apscheduler.executors.pool import ProcessPoolExecutor
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from datetime import datetime, timedelta
 import asyncio
-import os
-import socket
+import multiprocessing
 from sqlalchemy.orm import Session
 import json
-from threading import Lock
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Optional, Set
 
+from ..config import settings
 from ..db import SessionLocal
-from ..models import Printer, UsageReport, CounterSchedule, MedicalPrinterCounter
+from ..models import UsageReport, CounterSchedule, MedicalPrinterCounter
 from ..services.snmp import SNMPService
 from ..services.medical_printer_service import DrypixScraper
 from ..services.medical_alert_service import record_medical_counter_error
 from ..services.exchange_rate_service import update_exchange_rates_task
+from ..services import adaptive_polling, collection_queue
+from ..services.collection_engine import DEFAULT_PING_PORTS, CollectionEngine, CollectionOutcome, CollectionTarget
+from ..services.counter_anomalies import analyze_counters
+from ..services.fleet_registry import FleetEntry, get_fleet_registry
+from ..services.printer_lease import OP_COLLECTION, PrinterBusyError, single_flight
+from ..services.partitions import maintain_partitions
+from ..services.retention import purge_usage_reports
+from ..services.usage_ingest import save_usage_rows, usage_row
+from ..services.scheduler_lease import JobLock
 from .hourly_medical_polling import poll_medical_printers_hourly, cleanup_old_snapshots_job
+from .discovery_sweeps import run_discovery_sweeps
 
 
-_scheduled_collection_lock = Lock()
-_auto_job_execution_lock = Lock()
-_runtime_lock = Lock()
-_running_auto_jobs: Dict[int, Dict[str, Any]] = {}
-_last_auto_jobs: list[Dict[str, Any]] = []
+# Also held across processes: the job runs in the process pool and may overlap a leadership handover
+_scheduled_collection_lock = JobLock("check_scheduled_counters", ttl_seconds=120)
 
+# Executor for the blocking jobs: a process pool keeps SNMP/DB work (and its GIL
+# contention) off the API event loop. Coroutine jobs stay on the loop.
+JOB_EXECUTOR = 'jobs'
 
-def _record_auto_job_finished(job_info: Dict[str, Any]):
-    with _runtime_lock:
-        _last_auto_jobs.insert(0, job_info)
-        # Keep only the last 20 finished jobs in memory.
-        del _last_auto_jobs[20:]
 
+def _job_executor() -> ProcessPoolExecutor:
+    # spawn: the children must not inherit the API's DB connections, Redis clients or threads
+    return ProcessPoolExecutor(
+        max_workers=settings.scheduler_job_processes,
+        pool_kwargs={'mp_context': multiprocessing.get_context('spawn')}
+    )
 
-def _is_snmp_port_reachable(ip: str, timeout_seconds: float = 0.4) -> bool:
-    """Fast TCP probe to avoid expensive SNMP timeouts on offline printers."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    try:
-        sock.settimeout(timeout_seconds)
-        return sock.connect_ex((ip, 161)) == 0
-    except Exception:
-        return False
-    finally:
+
+def _poll_usage(snmp_service: SNMPService, target: CollectionTarget) -> Dict[str, Any]:
+    """Read usage data for one printer (runs in the collection engine thread pool)."""
+    data = snmp_service.poll_printer(target.ip, target.payload['snmp_profile'])
+    return {'success': True, 'error': None, 'usage': data}
+
+
+def _leased(fetch: Callable[[CollectionTarget], Dict[str, Any]], holder: str) -> Callable[[CollectionTarget], Dict[str, Any]]:
+    """Read under the printer lease; a printer someone else is reading is skipped without waiting."""
+    def leased_fetch(target: CollectionTarget) -> Dict[str, Any]:
         try:
-            sock.close()
-        except Exception:
-            pass
+            return single_flight(
+                target.printer_id, OP_COLLECTION, lambda: fetch(target), wait_seconds=0, holder=holder
+            ).value
+        except PrinterBusyError as e:
+            return {'success': False, 'error': str(e), 'action': 'in_flight'}
+    return leased_fetch
+
+
+def _usage_target(printer: FleetEntry) -> CollectionTarget:
+    """
+    Quick TCP check so powered-off printers don't cost SNMP timeouts. SNMP itself is UDP
+    (most printers refuse TCP 161), so the check uses the usual printer TCP ports.
+    """
+    return CollectionTarget(
+        printer_id=printer.id,
+        ip=printer.ip,
+        ports=list(DEFAULT_PING_PORTS),
+        ping_timeout=0.4,
+        payload={'snmp_profile': printer.snmp_profile, 'brand': printer.brand, 'model': printer.model}
+    )
+
+
+def _reported_today(db: Session, printer_ids: List[int]) -> Set[int]:
+    """Printers that already have today's usage report (one query for the whole cycle)."""
+    today = datetime.utcnow().date()
+    return {
+        printer_id for (printer_id,) in db.query(UsageReport.printer_id).filter(
+            UsageReport.printer_id.in_(printer_ids),
+            UsageReport.date >= datetime.combine(today, datetime.min.time()),
+            UsageReport.date < datetime.combine(today + timedelta(days=1), datetime.min.time())
+        ).distinct()
+    }
+
+
+def _persist_usage_reports(db: Session, outcomes: list[CollectionOutcome]):
+    """Insert the usage reports of a batch with one multi-row INSERT and a single commit."""
+    now = datetime.utcnow()
+    rows = []
+    for outcome in outcomes:
+        rows.append(usage_row(outcome.target.printer_id, now, outcome.data['usage']))
+        outcome.action = "created"
+    # Toner/paper/status go to the change-only history, not to every usage report
+    save_usage_rows(db, rows)
+    db.commit()
+
+
+def _schedule_job_info(run: Dict[str, Any]) -> Dict[str, Any]:
+    """Runtime entry for the UI from a queued schedule run."""
+    return {
+        "schedule_id": run.get("schedule_id"),
+        "schedule_name": run.get("schedule_name"),
+        "run_id": run["run_id"],
+        "started_at": run.get("started_at") or run.get("created_at"),
+        "finished_at": run.get("finished_at"),
+        "status": run["status"],
+        "message": f"{run['printers_successful']} success, {run['printers_failed']} failed, {run['printers_skipped']} already reported today",
+        "printers_total": run["printers_total"],
+        "printers_processed": run["printers_processed"],
+        "printers_successful": run["printers_successful"],
+        "printers_failed": run["printers_failed"],
+        "printers_skipped": run["printers_skipped"],
+        "current_printer": None,
+    }
 
 
 def get_auto_counter_runtime_status() -> Dict[str, Any]:
-    """Return runtime status for automatic counter jobs for UI indicators."""
-    with _runtime_lock:
-        running_jobs = list(_running_auto_jobs.values())
-        last_jobs = list(_last_auto_jobs)
+    """Return runtime status for automatic counter jobs (read from the collection queue)."""
+    try:
+        runs = collection_queue.list_runs(limit=40, source=collection_queue.SOURCE_SCHEDULE)
+    except collection_queue.CollectionQueueError as e:
+        print(f"Auto counter runtime status unavailable: {e}")
+        runs = []
+
+    running_jobs = [_schedule_job_info(run) for run in runs if collection_queue.is_run_active(run)]
+    last_jobs = [_schedule_job_info(run) for run in runs if not collection_queue.is_run_active(run)][:20]
 
     return {
         "is_busy": len(running_jobs) > 0,
@@ -59,86 +136,115 @@ def get_auto_counter_runtime_status() -> Dict[str, Any]:
     }
 
 def poll_all_printers():
-    """Poll all printers and save usage reports"""
+    """Poll the printers that are due concurrently and save their usage reports in bulk"""
+    printers = get_fleet_registry().select(active_only=False)
+    if not printers:
+        print("No printers to poll")
+        return
+
+    now = datetime.utcnow()
     db = SessionLocal()
     try:
-        printers = db.query(Printer).filter(Printer.ignore_counters == False).all()
-        snmp_service = SNMPService()
-        
-        for printer in printers:
-            try:
-                # Check if we already have a report for today
-                today = datetime.now().date()
-                existing_report = db.query(UsageReport).filter(
-                    UsageReport.printer_id == printer.id,
-                    UsageReport.date >= datetime.combine(today, datetime.min.time()),
-                    UsageReport.date < datetime.combine(today + timedelta(days=1), datetime.min.time())
-                ).first()
-                
-                if existing_report:
-                    print(f"Report for printer {printer.id} ({printer.ip}) already exists for today")
-                    continue
-                
-                # Poll the printer
-                print(f"Polling printer {printer.id} ({printer.ip}) with profile {printer.snmp_profile}")
-                data = snmp_service.poll_printer(printer.ip, printer.snmp_profile)
-                
-                # Create usage report
-                usage_report = UsageReport(
-                    printer_id=printer.id,
-                    date=datetime.utcnow(),
-                    pages_printed_mono=data.get('pages_printed_mono', 0),
-                    pages_printed_color=data.get('pages_printed_color', 0),
-                    toner_level_black=data.get('toner_level_black'),
-                    toner_level_cyan=data.get('toner_level_cyan'),
-                    toner_level_magenta=data.get('toner_level_magenta'),
-                    toner_level_yellow=data.get('toner_level_yellow'),
-                    paper_level=data.get('paper_level'),
-                    status=data.get('status', 'unknown')
-                )
-                
-                db.add(usage_report)
-                db.commit()
-                print(f"Successfully polled and saved data for printer {printer.id}")
-                
-            except Exception as e:
-                print(f"Error polling printer {printer.id} ({printer.ip}): {str(e)}")
-                db.rollback()
-                continue
-                
+        printer_ids = [printer.id for printer in printers]
+        if settings.adaptive_polling_enabled:
+            # Each printer has its own interval (see services.adaptive_polling)
+            skipped, reason = adaptive_polling.not_due(db, printer_ids, now), "not due yet"
+        else:
+            skipped, reason = _reported_today(db, printer_ids), "already reported today"
     except Exception as e:
         print(f"Error in poll_all_printers: {str(e)}")
+        return
     finally:
         db.close()
 
-def cleanup_old_reports():
-    """Clean up old usage reports (older than 1 year)"""
+    targets = [_usage_target(printer) for printer in printers if printer.id not in skipped]
+    print(f"Polling {len(targets)} printers ({len(skipped)} {reason})")
+    if not targets:
+        return
+
+    # Printers a manual poll or a collection is already reading are skipped (action 'in_flight')
+    snmp_service = SNMPService()
+    engine = CollectionEngine(
+        fetch=_leased(lambda target: _poll_usage(snmp_service, target), holder="scheduler:poll_printers"),
+        persist=_persist_usage_reports,
+    )
+    try:
+        report = engine.run(targets)
+    except Exception as e:
+        print(f"Error in poll_all_printers: {str(e)}")
+        return
+
+    outcomes = report.outcomes
+    saved = sum(1 for outcome in outcomes if outcome.success)
+    busy = sum(1 for outcome in outcomes if outcome.action == "in_flight")
+    print(f"Poll cycle done: {saved} saved, {busy} skipped (already being read), "
+          f"{len(outcomes) - saved - busy} failed; timings {report.timings}")
+
+    if settings.adaptive_polling_enabled:
+        _reschedule_polls(outcomes, now)
+
+def _reschedule_polls(outcomes: List[CollectionOutcome], now: datetime):
+    """Recompute the poll interval of the printers just polled (failed ones retry next tick)."""
+    polled = [outcome.target.printer_id for outcome in outcomes if outcome.success]
+    failed = [outcome.target.printer_id for outcome in outcomes
+              if not outcome.success and outcome.action != "in_flight"]
     db = SessionLocal()
     try:
-        cutoff_date = datetime.utcnow() - timedelta(days=365)
-        deleted_count = db.query(UsageReport).filter(
-            UsageReport.created_at < cutoff_date
-        ).delete()
-        
+        intervals = adaptive_polling.reschedule(db, polled, failed, now)
         db.commit()
-        print(f"Cleaned up {deleted_count} old usage reports")
-        
+        if intervals:
+            values = sorted(intervals.values())
+            print(f"Poll intervals: min {values[0]} / median {values[len(values) // 2]} / max {values[-1]} minutes")
+    except Exception as e:
+        print(f"Error rescheduling polls: {str(e)}")
+        db.rollback()
+    finally:
+        db.close()
+
+def cleanup_old_reports():
+    """Delete usage reports past their retention in primary-key chunks"""
+    db = SessionLocal()
+    try:
+        result = purge_usage_reports(db)
+        print(f"Cleaned up {result.deleted} old usage reports in {result.chunks} chunks "
+              f"and {result.partitions_dropped} partitions ({result.seconds:.1f}s)")
     except Exception as e:
         print(f"Error in cleanup_old_reports: {str(e)}")
         db.rollback()
     finally:
         db.close()
 
+def maintain_table_partitions():
+    """Create upcoming monthly partitions and archive old monthly_counters partitions (PostgreSQL)"""
+    db = SessionLocal()
+    try:
+        summary = maintain_partitions(db)
+        print(f"Partition maintenance: {len(summary['created'])} created, {len(summary['archived'])} archived")
+    except Exception as e:
+        print(f"Error in maintain_table_partitions: {str(e)}")
+        db.rollback()
+    finally:
+        db.close()
+
+def analyze_counter_anomalies():
+    """Flag resets, wraps, jumps and flat-lining counters in the monthly_counters history"""
+    db = SessionLocal()
+    try:
+        summary = analyze_counters(db)
+        print(f"Counter anomaly analysis: {summary['anomalies_found']} anomalies "
+              f"in {summary['readings_analyzed']} readings ({summary['timings']['total_seconds']}s)")
+    except Exception as e:
+        print(f"Error in analyze_counter_anomalies: {str(e)}")
+        db.rollback()
+    finally:
+        db.close()
+
 def poll_medical_printers():
     """Poll all medical printers (DRYPIX) and save counter snapshots"""
     db = SessionLocal()
     try:
         # Get all active DRYPIX printers
-        medical_printers = db.query(Printer).filter(
-            Printer.status == "active",
-            Printer.ignore_counters == False,
-            Printer.is_medical == True
-        ).all()
+        medical_printers = get_fleet_registry().select(medical=True)
         
         if not medical_printers:
             print("No active medical printers found")
@@ -277,14 +383,17 @@ def poll_medical_printers():
 def start_scheduler(scheduler: AsyncIOScheduler):
     """Configure and start the scheduled tasks"""
     
+    scheduler.add_executor(_job_executor(), JOB_EXECUTOR)
+    
     # Poll printers every 30 minutes
     scheduler.add_job(
         poll_all_printers,
         'interval',
-        minutes=30,
+        minutes=settings.polling_min_interval_minutes if settings.adaptive_polling_enabled else 30,
         id='poll_printers',
         name='Poll all printers for usage data',
-        replace_existing=True
+        replace_existing=True,
+        executor=JOB_EXECUTOR
     )
     
     # Cleanup old reports daily at 2 AM
@@ -295,7 +404,20 @@ def start_scheduler(scheduler: AsyncIOScheduler):
         minute=0,
         id='cleanup_reports',
         name='Cleanup old usage reports',
-        replace_existing=True
+        replace_existing=True,
+        executor=JOB_EXECUTOR
+    )
+
+    # Monthly partitions: create upcoming months, archive old ones (no-op unless partitioned)
+    scheduler.add_job(
+        maintain_table_partitions,
+        'cron',
+        hour=1,
+        minute=30,
+        id='maintain_partitions',
+        name='Create and archive monthly table partitions',
+        replace_existing=True,
+        executor=JOB_EXECUTOR
     )
     
     # Update exchange rates daily at 9 AM
@@ -316,7 +438,20 @@ def start_scheduler(scheduler: AsyncIOScheduler):
         minutes=5,
         id='check_scheduled_counters',
         name='Check and execute scheduled counter jobs',
-        replace_existing=True
+        replace_existing=True,
+        executor=JOB_EXECUTOR
+    )
+    
+    # Counter anomaly analysis daily at 4 AM (after the night's collections)
+    scheduler.add_job(
+        analyze_counter_anomalies,
+        'cron',
+        hour=4,
+        minute=0,
+        id='analyze_counter_anomalies',
+        name='Analyze monthly counter history for anomalies',
+        replace_existing=True,
+        executor=JOB_EXECUTOR
     )
     
     # Poll medical printers daily at 7 AM (snapshots diarios históricos)
@@ -327,7 +462,8 @@ def start_scheduler(scheduler: AsyncIOScheduler):
         minute=0,
         id='poll_medical_printers',
         name='Poll medical printers (DRYPIX) for daily counters',
-        replace_existing=True
+        replace_existing=True,
+        executor=JOB_EXECUTOR
     )
     
     # Poll medical printers every hour (snapshots horarios + detección automática)
@@ -338,6 +474,7 @@ def start_scheduler(scheduler: AsyncIOScheduler):
         id='poll_medical_printers_hourly',
         name='Hourly medical printer snapshots with auto cartridge detection',
         replace_existing=True,
+        executor=JOB_EXECUTOR,
         misfire_grace_time=300,  # Ejecutar si se perdió por hasta 5 minutos
         coalesce=True  # Combinar ejecuciones perdidas en una sola
     )
@@ -350,17 +487,39 @@ def start_scheduler(scheduler: AsyncIOScheduler):
         minute=0,
         id='cleanup_old_snapshots',
         name='Cleanup old hourly snapshots (keep 30 days)',
-        replace_existing=True
+        replace_existing=True,
+        executor=JOB_EXECUTOR
+    )
+    
+    # Off-peak discovery sweeps (the job itself checks the configured window and budgets).
+    # Sweeps and manual runs share the Redis "discovery_sweep" JobLock, so only one runs at a time.
+    scheduler.add_job(
+        run_discovery_sweeps,
+        'interval',
+        minutes=15,
+        id='discovery_sweeps',
+        name='Scheduled discovery sweeps from DiscoveryConfig',
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1
     )
     
     print("Scheduled tasks configured:")
-    print("- Poll printers: every 30 minutes")
+    if settings.adaptive_polling_enabled:
+        print(f"- Poll printers: every {settings.polling_min_interval_minutes} minutes, each printer on its own interval "
+              f"({settings.polling_min_interval_minutes}-{settings.polling_max_interval_minutes} min)")
+    else:
+        print("- Poll printers: every 30 minutes")
     print("- Cleanup old reports: daily at 2:00 AM")
+    print("- Partition maintenance: daily at 1:30 AM")
     print("- Check scheduled counters: every 5 minutes")
     print("- Update exchange rates: daily at 9:00 AM")
     print("- Poll medical printers (daily): daily at 7:00 AM")
     print("- Poll medical printers (hourly): every hour for cartridge detection")
     print("- Cleanup old snapshots: daily at 3:00 AM")
+    print("- Counter anomaly analysis: daily at 4:00 AM")
+    print("- Discovery sweeps: every 15 minutes within the off-peak window")
+    print(f"- Blocking jobs run in a pool of {settings.scheduler_job_processes} processes")
 
 def check_scheduled_counters():
     """Check for scheduled counter jobs that need to be executed"""
@@ -370,232 +529,107 @@ def check_scheduled_counters():
 
     db = SessionLocal()
     try:
-        now = datetime.utcnow()
-        
-        # Get active schedules that are due to run
-        due_schedules = db.query(CounterSchedule).filter(
-            CounterSchedule.is_active == True,
-            CounterSchedule.next_run <= now
-        ).all()
-        
-        for schedule in due_schedules:
-            try:
-                print(f"Executing scheduled counter job: {schedule.name} (ID: {schedule.id})")
-                execute_scheduled_counter_job(schedule.id, db)
-            except Exception as e:
-                print(f"Error executing scheduled counter job {schedule.id}: {str(e)}")
-                # Update error count
-                schedule.error_count += 1
-                schedule.last_error = str(e)
-                db.commit()
-                
+        enqueue_due_schedules(db, datetime.utcnow())
     except Exception as e:
         print(f"Error in check_scheduled_counters: {str(e)}")
     finally:
         db.close()
         _scheduled_collection_lock.release()
 
-def execute_scheduled_counter_job(schedule_id: int, db: Session):
-    """Execute a specific scheduled counter job"""
-    started_at = datetime.utcnow()
-
-    if not _auto_job_execution_lock.acquire(blocking=False):
-        print(f"Schedule {schedule_id} skipped: another automatic counter job is already running")
-        _record_auto_job_finished({
-            "schedule_id": schedule_id,
-            "started_at": started_at.isoformat(),
-            "finished_at": datetime.utcnow().isoformat(),
-            "status": "skipped",
-            "message": "Another automatic counter job is already running",
-        })
-        return
+def enqueue_due_schedules(db: Session, now: datetime) -> Dict[int, List[int]]:
+    """
+    Enqueue every due schedule as its own collection run.
 
-    try:
-        schedule = db.query(CounterSchedule).filter(CounterSchedule.id == schedule_id).first()
-        if not schedule:
-            print(f"Schedule {schedule_id} not found")
-            return
+    Schedules with disjoint printers run side by side (each run has its own queue
+    and the workers take from them by priority/fairness). Overlapping schedules are
+    merged: each printer goes to the highest-priority due schedule that targets it
+    (ties: earliest next_run, then lowest id), so it is polled only once. Returns
+    schedule_id -> printer ids enqueued for it.
+    """
+    due_schedules = db.query(CounterSchedule).filter(
+        CounterSchedule.is_active == True,
+        CounterSchedule.next_run <= now
+    ).all()
+    due_schedules.sort(key=lambda s: (-(s.priority or 0), s.next_run, s.id))
 
-        with _runtime_lock:
-            _running_auto_jobs[schedule_id] = {
-                "schedule_id": schedule_id,
-                "schedule_name": schedule.name,
-                "started_at": started_at.isoformat(),
-                "status": "running",
-                "printers_total": 0,
-                "printers_processed": 0,
-                "printers_successful": 0,
-                "printers_failed": 0,
-                "current_printer": None,
-            }
-        
-        # Get target printers
-        if schedule.target_type == "all":
-            printers = db.query(Printer).filter(
-                Printer.status == "active",
-                Printer.ignore_counters == False
-            ).all()
-        elif schedule.target_type == "selection":
-            printer_ids = json.loads(schedule.printer_ids) if schedule.printer_ids else []
-            printers = db.query(Printer).filter(
-                Printer.id.in_(printer_ids),
-                Printer.status == "active",
-                Printer.ignore_counters == False
-            ).all()
-        else:  # single
-            printer_ids = json.loads(schedule.printer_ids) if schedule.printer_ids else []
-            if printer_ids:
-                printers = db.query(Printer).filter(
-                    Printer.id == printer_ids[0],
-                    Printer.status == "active",
-                    Printer.ignore_counters == False
-                ).all()
-            else:
-                printers = []
-        
-        if not printers:
-            print(f"No active printers found for schedule {schedule_id}")
-            _record_auto_job_finished({
-                "schedule_id": schedule_id,
-                "schedule_name": schedule.name,
-                "started_at": started_at.isoformat(),
-                "finished_at": datetime.utcnow().isoformat(),
-                "status": "completed",
-                "message": "No active printers found",
-                "printers_total": 0,
-                "printers_processed": 0,
-                "printers_successful": 0,
-                "printers_failed": 0,
-            })
-            return
+    claimed: Set[int] = set()
+    enqueued: Dict[int, List[int]] = {}
+    for schedule in due_schedules:
+        try:
+            print(f"Executing scheduled counter job: {schedule.name} (ID: {schedule.id}, priority {schedule.priority or 0})")
+            printer_ids = execute_scheduled_counter_job(schedule.id, db, exclude_ids=claimed)
+            claimed.update(printer_ids)
+            enqueued[schedule.id] = printer_ids
+        except Exception as e:
+            print(f"Error executing scheduled counter job {schedule.id}: {str(e)}")
+            db.rollback()
+            # Update error count
+            schedule.error_count += 1
+            schedule.last_error = str(e)
+            db.commit()
+    return enqueued
 
-        max_printers_per_run = max(1, int(os.getenv("AUTO_COUNTERS_MAX_PRINTERS_PER_RUN", "120")))
-        total_candidates = len(printers)
-        if total_candidates > max_printers_per_run:
-            printers = printers[:max_printers_per_run]
-            print(
-                f"Schedule {schedule_id}: limiting run to {max_printers_per_run} printers "
-                f"(from {total_candidates}) to protect resources"
-            )
-
-        with _runtime_lock:
-            if schedule_id in _running_auto_jobs:
-                _running_auto_jobs[schedule_id]["printers_total"] = len(printers)
-        
-        # Initialize SNMP service
-        snmp_service = SNMPService()
-        polled_count = 0
-        error_count = 0
-        errors = []
-        
-        # Poll each printer
-        for idx, printer in enumerate(printers, start=1):
-            try:
-                with _runtime_lock:
-                    if schedule_id in _running_auto_jobs:
-                        _running_auto_jobs[schedule_id]["current_printer"] = f"{printer.brand} {printer.model} ({printer.ip})"
-                        _running_auto_jobs[schedule_id]["printers_processed"] = idx - 1
-
-                if not _is_snmp_port_reachable(printer.ip):
-                    error_msg = f"Printer {printer.id} ({printer.ip}) unreachable on SNMP port 161"
-                    errors.append(error_msg)
-                    error_count += 1
-                    print(error_msg)
-                    with _runtime_lock:
-                        if schedule_id in _running_auto_jobs:
-                            _running_auto_jobs[schedule_id]["printers_failed"] = error_count
-                    continue
+def _schedule_printer_ids(schedule: CounterSchedule) -> List[int]:
+    """Target printers (active, counters enabled) of a schedule from the in-memory fleet registry."""
+    registry = get_fleet_registry()
+    if schedule.target_type == "all":
+        return [printer.id for printer in registry.select()]
+    selected_ids = json.loads(schedule.printer_ids) if schedule.printer_ids else []
+    if schedule.target_type == "single":
+        selected_ids = selected_ids[:1]
+    return [printer.id for printer in registry.select(printer_ids=selected_ids)] if selected_ids else []
 
-                # Check if we already have a report for today
-                today = datetime.utcnow().date()
-                existing_report = db.query(UsageReport).filter(
-                    UsageReport.printer_id == printer.id,
-                    UsageReport.date >= datetime.combine(today, datetime.min.time()),
-                    UsageReport.date < datetime.combine(today + timedelta(days=1), datetime.min.time())
-                ).first()
-                
-                if existing_report:
-                    print(f"Report for printer {printer.id} ({printer.ip}) already exists for today")
-                    continue
-                
-                # Poll the printer
-                data = snmp_service.poll_printer(printer.ip, printer.snmp_profile)
-                
-                # Create usage report
-                usage_report = UsageReport(
-                    printer_id=printer.id,
-                    date=datetime.utcnow(),
-                    pages_printed_mono=data.get('pages_printed_mono', 0),
-                    pages_printed_color=data.get('pages_printed_color', 0),
-                    toner_level_black=data.get('toner_level_black'),
-                    toner_level_cyan=data.get('toner_level_cyan'),
-                    toner_level_magenta=data.get('toner_level_magenta'),
-                    toner_level_yellow=data.get('toner_level_yellow'),
-                    paper_level=data.get('paper_level'),
-                    status=data.get('status', 'unknown')
-                )
-                
-                db.add(usage_report)
-                polled_count += 1
-                print(f"Successfully polled printer {printer.id} ({printer.ip})")
-                with _runtime_lock:
-                    if schedule_id in _running_auto_jobs:
-                        _running_auto_jobs[schedule_id]["printers_successful"] = polled_count
-                
-            except Exception as e:
-                error_msg = f"Error polling printer {printer.id} ({printer.ip}): {str(e)}"
-                errors.append(error_msg)
-                error_count += 1
-                print(error_msg)
-                with _runtime_lock:
-                    if schedule_id in _running_auto_jobs:
-                        _running_auto_jobs[schedule_id]["printers_failed"] = error_count
-                continue
-        
-        # Update schedule statistics
+def execute_scheduled_counter_job(schedule_id: int, db: Session, exclude_ids: Optional[Set[int]] = None) -> List[int]:
+    """
+    Enqueue a specific scheduled counter job.
+
+    The printers are polled by the collection worker processes; the schedule's
+    error statistics are updated by the worker when the run finishes. Printers in
+    exclude_ids were already claimed by a higher-priority schedule due in the same
+    check and are left out. Returns the printer ids enqueued for this schedule.
+    """
+    schedule = db.query(CounterSchedule).filter(CounterSchedule.id == schedule_id).first()
+    if not schedule:
+        print(f"Schedule {schedule_id} not found")
+        return []
+
+    targets = _schedule_printer_ids(schedule)
+    if not targets:
+        print(f"No active printers found for schedule {schedule_id}")
+        return []
+
+    printer_ids = [printer_id for printer_id in targets if printer_id not in (exclude_ids or ())]
+    if not printer_ids:
+        # Every printer is covered by another schedule's run: counts as this schedule's run
         schedule.last_run = datetime.utcnow()
         schedule.next_run = calculate_next_run_time(schedule)
         schedule.run_count += 1
-        
-        if errors:
-            schedule.error_count += 1
-            schedule.last_error = "; ".join(errors[:3])  # Store first 3 errors
-        else:
-            schedule.last_error = None
-        
         db.commit()
+        print(f"Scheduled job {schedule_id} merged: its {len(targets)} printers are covered by higher-priority schedules")
+        return []
 
-        with _runtime_lock:
-            running_info = _running_auto_jobs.get(schedule_id, {}).copy()
-
-        _record_auto_job_finished({
-            **running_info,
-            "schedule_id": schedule_id,
-            "schedule_name": schedule.name,
-            "finished_at": datetime.utcnow().isoformat(),
-            "status": "completed",
-            "message": f"{polled_count} success, {error_count} failed",
-            "printers_processed": len(printers),
-            "printers_successful": polled_count,
-            "printers_failed": error_count,
-        })
-        
-        print(f"Scheduled job {schedule_id} completed: {polled_count} printers polled, {error_count} errors")
-        
-    except Exception as e:
-        print(f"Error in execute_scheduled_counter_job: {str(e)}")
-        _record_auto_job_finished({
-            "schedule_id": schedule_id,
-            "started_at": started_at.isoformat(),
-            "finished_at": datetime.utcnow().isoformat(),
-            "status": "error",
-            "message": str(e),
-        })
-        raise
-    finally:
-        with _runtime_lock:
-            _running_auto_jobs.pop(schedule_id, None)
-        _auto_job_execution_lock.release()
+    run = collection_queue.enqueue_run(
+        collection_queue.KIND_USAGE,
+        printer_ids,
+        source=collection_queue.SOURCE_SCHEDULE,
+        schedule_id=schedule.id,
+        schedule_name=schedule.name,
+        priority=schedule.priority or 0
+    )
+    if run is None:
+        print(f"Schedule {schedule_id} skipped: its previous run is still in progress")
+        return []
+
+    # Update schedule statistics
+    schedule.last_run = datetime.utcnow()
+    schedule.next_run = calculate_next_run_time(schedule)
+    schedule.run_count += 1
+    db.commit()
+
+    merged = len(targets) - len(printer_ids)
+    print(f"Scheduled job {schedule_id} queued: run {run['run_id']}, {len(printer_ids)} printers in {run['tasks_total']} tasks"
+          + (f" ({merged} merged into higher-priority schedules)" if merged else ""))
+    return printer_ids
 
 def calculate_next_run_time(schedule: CounterSchedule) -> datetime:
     """Calculate the next run time for a schedule"""
@@ -0,0 +1,62 @@
+"""
+Tests de integración para el intervalo de sondeo adaptativo por impresora.
+"""
+
+from datetime import datetime, timedelta
+
+from app.models import PrinterPollSchedule, UsageReport
+from app.services.adaptive_polling import not_due, page_rates, poll_interval_minutes, reschedule, schedule_summary
+
+
+def test_interval_follows_page_and_toner_rates_within_bounds():
+    assert poll_interval_minutes(None, None) == 1440        # Sin historial: al máximo, como el sondeo diario
+    assert poll_interval_minutes(5000, None) == 72          # 250 páginas cada ~72 minutos
+    assert poll_interval_minutes(50000, None) == 15
+    assert poll_interval_minutes(5 / 30, 0.0) == 1440       # Casi sin uso: una vez por día
+    assert poll_interval_minutes(10, 4.0) == 720            # El tóner baja antes que las páginas
+
+
+def test_reschedule_spreads_the_fleet_and_cuts_load(test_db):
+    now = datetime(2025, 6, 10, 12, 0)
+    busy, idle, broken = 9901, 9902, 9903
+    reports = []
+    for hour in range(0, 48, 2):
+        when = now - timedelta(hours=48 - hour)
+        reports.append(UsageReport(printer_id=busy, date=when, pages_printed_mono=100000 + hour * 100))
+        reports.append(UsageReport(printer_id=idle, date=when, pages_printed_mono=5000))
+    test_db.add_all(reports)
+    test_db.commit()
+    try:
+        intervals = reschedule(test_db, [busy, idle], [broken], now)
+        test_db.commit()
+
+        assert intervals[busy] == 150    # 2400 páginas por día
+        assert intervals[idle] == 1440
+        assert not_due(test_db, [busy, idle, broken], now + timedelta(minutes=20)) == {busy, idle}
+        assert not_due(test_db, [busy, idle, broken], now + timedelta(hours=3)) == {idle}
+
+        summary = schedule_summary(test_db, fleet_size=3)
+        assert summary["printers_scheduled"] == 3
+        assert summary["load_ratio"] < 0.5
+    finally:
+        test_db.query(PrinterPollSchedule).filter(PrinterPollSchedule.printer_id.in_([busy, idle, broken])).delete()
+        test_db.query(UsageReport).filter(UsageReport.printer_id.in_([busy, idle])).delete()
+        test_db.commit()
+
+
+def test_page_rate_ignores_failed_polls_and_counter_resets(test_db):
+    now = datetime(2025, 6, 10, 12, 0)
+    printer_id = 9904
+    counters = [500000, 0, 500100, 500200, 40, 140]  # Un sondeo offline (0) y un reinicio del contador
+    test_db.add_all([
+        UsageReport(printer_id=printer_id, date=now - timedelta(hours=5 - hour), pages_printed_mono=pages,
+                    status="offline" if pages == 0 else None)
+        for hour, pages in enumerate(counters)
+    ])
+    test_db.commit()
+    try:
+        # 300 páginas en 5 horas, no ~500000 por el sondeo fallido
+        assert round(page_rates(test_db, [printer_id], now)[printer_id]) == 1440
+    finally:
+        test_db.query(UsageReport).filter(UsageReport.printer_id == printer_id).delete()
+        test_db.commit()
@@ -0,0 +1,81 @@
+"""
+Tests de integración para la asignación de asset tags en bloque.
+"""
+
+import pytest
+
+from app.models import AssetTagSequence, Printer
+from app.services.asset_tags import (
+    parse_asset_tag_number,
+    peek_asset_tags,
+    reserve_asset_tags,
+    release_unused_asset_tags,
+    register_asset_tag,
+)
+
+
+@pytest.fixture(scope="function")
+def clean_sequences(test_db):
+    test_db.query(AssetTagSequence).delete()
+    test_db.commit()
+    yield test_db
+    test_db.query(Printer).filter(Printer.asset_tag.like("PRT-%")).delete(synchronize_session=False)
+    test_db.query(AssetTagSequence).delete()
+    test_db.commit()
+
+
+class TestAssetTagAllocator:
+    """Tests para el allocator de asset tags PRT-XXX."""
+
+    def test_parse_asset_tag_number(self):
+        assert parse_asset_tag_number("PRT-007") == 7
+        assert parse_asset_tag_number("PRT-1234") == 1234
+        assert parse_asset_tag_number("PRT-ABC") is None
+        assert parse_asset_tag_number("INV-001") is None
+        assert parse_asset_tag_number(None) is None
+
+    def test_seeds_from_existing_printers(self, clean_sequences):
+        db = clean_sequences
+        db.add(Printer(brand="HP", model="M404", asset_tag="PRT-041", ip="10.99.0.1"))
+        db.commit()
+
+        assert peek_asset_tags(db, 2) == ["PRT-042", "PRT-043"]
+        # La previsualización no crea la secuencia
+        assert db.query(AssetTagSequence).count() == 0
+
+    def test_reserved_blocks_do_not_overlap(self, clean_sequences):
+        db = clean_sequences
+        first = reserve_asset_tags(db, 3)
+        second = reserve_asset_tags(db, 2)
+
+        assert first == ["PRT-001", "PRT-002", "PRT-003"]
+        assert second == ["PRT-004", "PRT-005"]
+
+    def test_release_returns_unused_tail_only_if_last_block(self, clean_sequences):
+        db = clean_sequences
+        block = reserve_asset_tags(db, 4)
+        assert release_unused_asset_tags(db, block[2:]) == 2
+        assert peek_asset_tags(db, 1) == ["PRT-003"]
+
+        block = reserve_asset_tags(db, 2)
+        reserve_asset_tags(db, 1)
+        # Otro lote reservó después: no se puede retroceder
+        assert release_unused_asset_tags(db, block[1:]) == 0
+
+    def test_register_manual_tag_advances_sequence(self, clean_sequences):
+        db = clean_sequences
+        reserve_asset_tags(db, 1)
+        register_asset_tag(db, "PRT-050")
+        db.commit()
+
+        assert peek_asset_tags(db, 1) == ["PRT-051"]
+
+    def test_release_stops_above_manual_tag_inside_block(self, clean_sequences):
+        db = clean_sequences
+        block = reserve_asset_tags(db, 5)  # PRT-001..005
+        db.add(Printer(brand="HP", model="M404", asset_tag="PRT-003", ip="10.99.0.3"))
+        register_asset_tag(db, "PRT-003")  # No adelanta: la secuencia ya está en 6
+        db.commit()
+
+        assert release_unused_asset_tags(db, block[1:]) == 2
+        assert peek_asset_tags(db, 1) == ["PRT-004"]
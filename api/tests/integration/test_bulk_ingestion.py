@@ -0,0 +1,116 @@
+"""
+Tests de integración para la ingesta por lotes de colectores remotos.
+"""
+
+import time
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.models import CollectorCursor, Printer, PrinterPollSchedule, PrinterStateChange, UsageReport
+from app.services import fleet_registry
+from app.services.fleet_registry import FleetRegistry
+from app.services.usage_rollups import delete_usage_rollups
+from app.workers.collector import Spool, expand_targets, push_pending
+
+
+@pytest.fixture
+def registry(monkeypatch, test_engine):
+    monkeypatch.setattr(settings, "fleet_registry_redis_enabled", False)
+    registry = FleetRegistry(sessionmaker(autocommit=False, autoflush=False, bind=test_engine))
+    monkeypatch.setattr(fleet_registry, "_registry", registry)
+    return registry
+
+
+@pytest.fixture
+def printers(registry, test_db):
+    rows = [
+        Printer(brand="HP", model="LaserJet M404", asset_tag=f"INGEST-{n}", ip=f"10.240.0.{n}")
+        for n in (1, 2)
+    ]
+    test_db.add_all(rows)
+    test_db.commit()
+    ids = [printer.id for printer in rows]
+    yield rows
+    test_db.query(UsageReport).filter(UsageReport.printer_id.in_(ids)).delete()
+    test_db.query(PrinterStateChange).filter(PrinterStateChange.printer_id.in_(ids)).delete()
+    test_db.query(PrinterPollSchedule).filter(PrinterPollSchedule.printer_id.in_(ids)).delete()
+    delete_usage_rollups(test_db, ids)
+    test_db.query(CollectorCursor).filter(CollectorCursor.collector_id.like("site-%")).delete(synchronize_session=False)
+    test_db.query(Printer).filter(Printer.id.in_(ids)).delete()
+    test_db.commit()
+
+
+def _reading(sequence, **fields):
+    return {"sequence": sequence, "read_at": "2025-06-10T12:00:00Z", "pages_printed_mono": 1000 + sequence,
+            "toner_level_black": 60.0, "status": "online", **fields}
+
+
+class TestBulkIngestion:
+
+    def test_resent_batch_is_not_duplicated(self, client, printers, test_db, monkeypatch):
+        monkeypatch.setattr(settings, "adaptive_polling_enabled", True)
+        first, second = printers
+        batch = {"collector_id": "site-a", "readings": [
+            _reading(3, ip=first.ip),
+            _reading(1, printer_id=second.id),
+            _reading(2, ip="10.240.9.9"),  # No registrada
+        ]}
+
+        response = client.post("/counter-collection/ingest", json=batch)
+        assert response.status_code == 200
+        assert response.json() == {"collector_id": "site-a", "accepted": 2, "duplicates": 0,
+                                   "unknown": ["10.240.9.9"], "last_sequence": 3}
+
+        again = client.post("/counter-collection/ingest", json=batch).json()
+        assert again["accepted"] == 0 and again["duplicates"] == 3
+
+        reports = test_db.query(UsageReport).filter(UsageReport.printer_id.in_([first.id, second.id])).all()
+        assert sorted(report.pages_printed_mono for report in reports) == [1001, 1003]
+        # El sondeo central no vuelve a consultarlas por la WAN enseguida
+        assert test_db.query(PrinterPollSchedule).filter(
+            PrinterPollSchedule.printer_id.in_([first.id, second.id])
+        ).count() == 2
+
+    def test_batch_limit_and_token(self, client, printers, monkeypatch):
+        monkeypatch.setattr(settings, "ingest_max_readings", 2)
+        batch = {"collector_id": "site-b", "readings": [_reading(n, ip=printers[0].ip) for n in (1, 2, 3)]}
+        assert client.post("/counter-collection/ingest", json=batch).status_code == 413
+
+        monkeypatch.setattr(settings, "collector_token", "s3cret")
+        batch["readings"] = batch["readings"][:2]
+        assert client.post("/counter-collection/ingest", json=batch).status_code == 401
+        response = client.post("/counter-collection/ingest", json=batch, headers={"X-Collector-Token": "s3cret"})
+        assert response.json()["accepted"] == 2
+
+        cursor = client.get("/counter-collection/ingest/cursor", params={"collector_id": "site-b"})
+        assert cursor.status_code == 401
+        cursor = client.get("/counter-collection/ingest/cursor", params={"collector_id": "site-b"},
+                            headers={"X-Collector-Token": "s3cret"})
+        assert cursor.json()["last_sequence"] == 2
+
+    def test_restarted_collector_continues_from_the_api_cursor(self, client, printers, test_db):
+        # Secuencia aplicada antes de un reinicio sin spool con el reloj atrasado
+        ahead = time.time_ns() // 1000 + 10 ** 12
+        batch = {"collector_id": "site-c", "readings": [_reading(ahead, ip=printers[0].ip)]}
+        assert client.post("/counter-collection/ingest", json=batch).json()["accepted"] == 1
+
+        spool = Spool()
+        spool.add([{"ip": printers[1].ip, "read_at": "2025-06-10T13:00:00Z", "pages_printed_mono": 2000}])
+        assert "sequence" not in spool.pending[0]  # Sin numerar hasta leer el cursor
+
+        assert push_pending(spool, client, "http://testserver", "site-c", batch_size=10) == 1
+        assert spool.last_sequence > ahead and spool.pending == []
+
+
+def test_collector_targets_and_sequences():
+    assert expand_targets("10.1.0.0/30, 10.1.0.2,10.1.5.7") == ["10.1.0.1", "10.1.0.2", "10.1.5.7"]
+
+    spool = Spool(max_pending=2)
+    spool.sync(0)
+    spool.add([{"ip": "10.1.0.1"}, {"ip": "10.1.0.2"}, {"ip": "10.1.0.3"}])
+    sequences = [reading["sequence"] for reading in spool.pending]
+    assert len(sequences) == 2 and sequences[0] < sequences[1]  # Se descarta la más vieja
+    spool.acknowledge(sequences[0])
+    assert [reading["ip"] for reading in spool.pending] == ["10.1.0.3"]
@@ -0,0 +1,76 @@
+"""
+Tests de integración para el motor de recolección (ping y lectura simulados).
+"""
+
+import time
+
+from app.services.collection_engine import CollectionEngine, CollectionTarget
+
+
+class FakeSession:
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class OfflineEngine(CollectionEngine):
+    """Motor sin red: todas las impresoras responden al ping y no toca la caché de alcanzabilidad."""
+
+    async def _ping(self, target):
+        return True, 80
+
+    def _load_known_down(self, targets):
+        return {}
+
+    def _flush_probe_results(self):
+        pass
+
+
+def _targets(count):
+    return [CollectionTarget(printer_id=n, ip=f"10.96.0.{n}") for n in range(1, count + 1)]
+
+
+def _persist_into(batches):
+    def persist(db, batch):
+        batches.append([outcome.target.printer_id for outcome in batch])
+        for outcome in batch:
+            outcome.action = "created"
+    return persist
+
+
+class TestCollectionEngine:
+
+    def test_budget_expiry_reports_unreached_printers(self):
+        def fetch(target):
+            if target.printer_id == 2:
+                time.sleep(2)
+            return {"success": True, "error": None}
+
+        batches = []
+        engine = OfflineEngine(
+            fetch, _persist_into(batches), budget_seconds=0.5, session_factory=FakeSession
+        )
+        report = engine.run(_targets(3))
+
+        assert report.budget_exceeded == 1
+        by_id = {outcome.target.printer_id: outcome for outcome in report.outcomes}
+        assert not by_id[2].success
+        assert "presupuesto" in by_id[2].error
+        assert by_id[1].success and by_id[3].success
+        assert sorted(sum(batches, [])) == [1, 3]
+
+    def test_writer_persists_in_batches(self):
+        batches = []
+        engine = OfflineEngine(
+            lambda target: {"success": True, "error": None},
+            _persist_into(batches), batch_size=2, session_factory=FakeSession,
+        )
+        report = engine.run(_targets(5))
+
+        assert all(outcome.success and outcome.action == "created" for outcome in report.outcomes)
+        assert sorted(sum(batches, [])) == [1, 2, 3, 4, 5]
+        assert all(len(batch) <= 2 for batch in batches)
+        assert len(batches) == 3
+        assert report.timings["db"]["count"] == 5
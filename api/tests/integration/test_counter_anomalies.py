@@ -0,0 +1,62 @@
+"""
+Tests de integración para el análisis de anomalías de contadores.
+"""
+
+from datetime import datetime, timedelta
+
+from app.services.counter_anomalies import (
+    KIND_FLATLINE,
+    KIND_JUMP,
+    KIND_RESET,
+    KIND_WRAP,
+    build_series,
+    detect_anomalies,
+)
+
+_START = datetime(2025, 1, 1, 8, 0)
+
+
+def _series(*printers):
+    """Una lectura diaria por impresora: printers = (printer_id, [totales...])."""
+    rows, counter_id = [], 0
+    for printer_id, totals in printers:
+        for day, total in enumerate(totals):
+            counter_id += 1
+            rows.append((counter_id, printer_id, _START + timedelta(days=day), total))
+    return build_series(rows)
+
+
+def _detect(series):
+    return detect_anomalies(series, jump_z=3.5, jump_min_pages=500, min_intervals=5, flatline_days=14)
+
+
+class TestDetectAnomalies:
+
+    def test_steady_printer_has_no_anomalies(self):
+        assert _detect(_series((1, [1000 + 100 * day for day in range(30)]))) == []
+
+    def test_reset_and_wrap_are_told_apart(self):
+        near_limit = 2 ** 32 - 50
+        anomalies = _detect(_series((1, [5000, 5100, 20, 120]), (2, [near_limit - 100, near_limit, 150])))
+
+        kinds = {(a.printer_id, a.kind) for a in anomalies}
+        assert kinds == {(1, KIND_RESET), (2, KIND_WRAP)}
+        wrap = next(a for a in anomalies if a.kind == KIND_WRAP)
+        assert wrap.delta == 200
+
+    def test_outlier_jump_uses_printer_own_rate(self):
+        totals = [1000 + 100 * day for day in range(20)]
+        totals[12:] = [total + 5000 for total in totals[12:]]
+        anomalies = _detect(_series((1, totals), (2, [10 * day for day in range(20)])))
+
+        assert [(a.printer_id, a.kind, a.counter_id) for a in anomalies] == [(1, KIND_JUMP, 13)]
+        assert anomalies[0].score > 3.5
+
+    def test_flatline_only_for_printers_that_print(self):
+        active = [1000 + 100 * day for day in range(10)] + [1900] * 20
+        idle = [500] * 30
+        anomalies = _detect(_series((1, active), (2, idle)))
+
+        assert [(a.printer_id, a.kind) for a in anomalies] == [(1, KIND_FLATLINE)]
+        # La racha se identifica por su primera lectura plana
+        assert anomalies[0].counter_id == 10 and anomalies[0].score == 20.0
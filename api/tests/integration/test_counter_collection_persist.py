@@ -0,0 +1,119 @@
+"""
+Tests de integración para la escritura en lote de contadores recolectados.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from sqlalchemy.exc import IntegrityError
+
+from app.models import LocationCounterSegment, MonthlyCounter, Printer, PrinterLatestCounter
+from app.routers import counter_collection
+from app.routers.counter_collection import build_collection_target, persist_monthly_counters
+from app.services.collection_engine import CollectionOutcome
+from app.services.latest_counters import get_recently_read, record_latest_counter
+from app.services.reachability import PROTOCOL_HTTP
+
+
+@pytest.fixture(scope="function")
+def printer(test_db):
+    printer = Printer(brand="HP", model="M404", asset_tag="RUN-001", ip="10.97.0.1", location="Piso 2")
+    test_db.add(printer)
+    test_db.commit()
+    yield printer
+    test_db.query(LocationCounterSegment).filter(LocationCounterSegment.printer_id == printer.id).delete()
+    test_db.query(PrinterLatestCounter).filter(PrinterLatestCounter.printer_id == printer.id).delete()
+    test_db.query(MonthlyCounter).filter(MonthlyCounter.printer_id == printer.id).delete()
+    test_db.delete(printer)
+    test_db.commit()
+
+
+@pytest.fixture(scope="function")
+def other_printer(test_db):
+    printer = Printer(brand="HP", model="M404", asset_tag="RUN-002", ip="10.97.0.2", location="Piso 3")
+    test_db.add(printer)
+    test_db.commit()
+    yield printer
+    test_db.query(LocationCounterSegment).filter(LocationCounterSegment.printer_id == printer.id).delete()
+    test_db.query(PrinterLatestCounter).filter(PrinterLatestCounter.printer_id == printer.id).delete()
+    test_db.query(MonthlyCounter).filter(MonthlyCounter.printer_id == printer.id).delete()
+    test_db.delete(printer)
+    test_db.commit()
+
+
+def _outcome(printer, total):
+    return CollectionOutcome(
+        target=build_collection_target(printer),
+        success=True,
+        data={'counters': {'bw_counter': total, 'color_counter': 0, 'total_counter': total, 'profile_used': 'hp'}},
+    )
+
+
+class TestPersistMonthlyCounters:
+    """Los reintentos de una tarea de la cola no deben duplicar lecturas."""
+
+    def test_retry_within_same_run_is_skipped(self, test_db, printer):
+        first = _outcome(printer, 1000)
+        persist_monthly_counters(test_db, [first], 2025, 3, collection_run_id="run-1")
+        retry = _outcome(printer, 1010)
+        persist_monthly_counters(test_db, [retry], 2025, 3, collection_run_id="run-1")
+
+        rows = test_db.query(MonthlyCounter).filter(MonthlyCounter.printer_id == printer.id).all()
+        assert len(rows) == 1
+        assert first.action == "created" and first.data['counter_id'] == rows[0].id
+        assert retry.action == "skipped"
+        assert test_db.get(PrinterLatestCounter, printer.id).counter_total == 1000
+
+    def test_new_run_creates_new_reading(self, test_db, printer):
+        persist_monthly_counters(test_db, [_outcome(printer, 1000)], 2025, 3, collection_run_id="run-1")
+        second = _outcome(printer, 1050)
+        persist_monthly_counters(test_db, [second], 2025, 3, collection_run_id="run-2")
+
+        assert second.action == "created"
+        assert test_db.query(MonthlyCounter).filter(MonthlyCounter.printer_id == printer.id).count() == 2
+        latest = test_db.get(PrinterLatestCounter, printer.id)
+        assert (latest.counter_total, latest.counter_id) == (1050, second.data['counter_id'])
+
+    def test_freshness_window_uses_latest_counter(self, test_db, printer):
+        persist_monthly_counters(test_db, [_outcome(printer, 1000)], 2025, 3, collection_run_id="run-1")
+
+        assert printer.id in get_recently_read(test_db, [printer.id], datetime.now() - timedelta(minutes=60))
+        assert get_recently_read(test_db, [printer.id], datetime.now() + timedelta(minutes=1)) == {}
+
+    def test_manual_counter_is_not_a_recent_read(self, test_db, printer):
+        persist_monthly_counters(test_db, [_outcome(printer, 1000)], 2025, 3, collection_run_id="run-1")
+        manual = MonthlyCounter(printer_id=printer.id, year=2025, month=3, counter_total=1100, recorded_at=datetime.now())
+        test_db.add(manual)
+        record_latest_counter(test_db, manual)
+        test_db.commit()
+
+        assert get_recently_read(test_db, [printer.id], datetime.now() - timedelta(minutes=60)) == {}
+
+    def test_failing_row_falls_back_to_row_by_row(self, test_db, printer, other_printer, monkeypatch):
+        insert = counter_collection._insert_monthly_counters
+
+        def insert_rejecting_other(db, rows):
+            if any(row['printer_id'] == other_printer.id for row in rows):
+                raise IntegrityError("INSERT INTO monthly_counters", {}, Exception("constraint violation"))
+            return insert(db, rows)
+
+        monkeypatch.setattr(counter_collection, "_insert_monthly_counters", insert_rejecting_other)
+        good, bad = _outcome(printer, 1000), _outcome(other_printer, 2000)
+        persist_monthly_counters(test_db, [good, bad], 2025, 3, collection_run_id="run-1")
+
+        assert good.success and good.action == "created"
+        assert not bad.success and "Error guardando contador" in bad.error
+        assert test_db.query(MonthlyCounter).filter(MonthlyCounter.printer_id == printer.id).count() == 1
+        assert test_db.query(MonthlyCounter).filter(MonthlyCounter.printer_id == other_printer.id).count() == 0
+        assert test_db.get(PrinterLatestCounter, printer.id).counter_total == 1000
+        assert test_db.get(PrinterLatestCounter, other_printer.id) is None
+
+
+class TestCollectionTarget:
+
+    def test_drypix_pings_only_the_http_port(self):
+        target = build_collection_target(Printer(id=1, brand="FUJI", model="DRYPIX 6000", ip="10.97.0.9"))
+
+        assert target.ports == [20051]
+        assert target.protocol == PROTOCOL_HTTP
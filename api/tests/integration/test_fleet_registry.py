@@ -0,0 +1,68 @@
+"""
+Tests de integración para el registro de la flota en memoria (sin Redis).
+"""
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.models import Printer
+from app.services import fleet_registry
+from app.services.fleet_registry import FleetEntry, FleetRegistry
+
+
+@pytest.fixture
+def registry(monkeypatch, test_engine):
+    monkeypatch.setattr(settings, "fleet_registry_redis_enabled", False)
+    registry = FleetRegistry(sessionmaker(autocommit=False, autoflush=False, bind=test_engine))
+    monkeypatch.setattr(fleet_registry, "_registry", registry)
+    return registry
+
+
+def _printer(suffix, **fields):
+    return Printer(
+        brand="HP", model="LaserJet M404", asset_tag=f"FLEET-{suffix}", ip=f"10.250.0.{suffix}", **fields
+    )
+
+
+class TestFleetRegistry:
+
+    def test_orm_commits_update_the_registry(self, registry, test_db):
+        active, ignored = _printer(1), _printer(2, ignore_counters=True)
+        test_db.add_all([active, ignored])
+        test_db.commit()
+        try:
+            assert active.id in [entry.id for entry in registry.select()]
+            assert ignored.id not in [entry.id for entry in registry.select()]
+
+            active.status = "inactive"
+            active.location = "Depósito"
+            test_db.commit()
+            entry = registry.get(active.id)
+            assert not entry.is_active and entry.location == "Depósito"
+
+            test_db.query(Printer).filter(Printer.id == ignored.id).update({"ignore_counters": False})
+            test_db.commit()
+            assert ignored.id in [entry.id for entry in registry.select()]
+        finally:
+            test_db.query(Printer).filter(Printer.id.in_([active.id, ignored.id])).delete()
+            test_db.commit()
+
+        assert registry.get_many([active.id, ignored.id]) == []
+
+    def test_memory_per_printer_stays_small_at_50k(self, registry):
+        models = ["LaserJet M404", "ECOSYS M2040dn", "DRYPIX 6000", "Aficio MP 305"]
+        rows = [
+            (printer_id, f"10.{printer_id // 65536}.{printer_id // 256 % 256}.{printer_id % 256}",
+             "HP", models[printer_id % 4], "generic_v2c", f"Piso {printer_id % 20}", None,
+             "active", False, printer_id % 4 == 2)
+            for printer_id in range(1, 50001)
+        ]
+        registry._entries = {row[0]: FleetEntry.from_row(row) for row in rows}
+        registry._loaded = True
+        registry._loaded_at = registry._checked_at = float("inf")
+
+        stats = registry.stats()
+        assert stats["printers"] == 50000
+        assert stats["bytes_per_printer"] < 300
+        assert len(registry.select(medical=True)) == 12500
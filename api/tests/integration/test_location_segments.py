@@ -0,0 +1,93 @@
+"""
+Tests de integración para el mantenimiento de segmentos de contadores por ubicación.
+"""
+
+from datetime import datetime
+
+import pytest
+
+from app.models import LocationCounterSegment, MonthlyCounter, Printer
+from app.services.location_counter_sync import (
+    apply_new_counters_to_segments,
+    rebuild_location_segments_for_month,
+    sync_location_segments_for_printer_month,
+)
+
+
+@pytest.fixture(scope="function")
+def printer(test_db):
+    printer = Printer(brand="HP", model="M404", asset_tag="SEG-001", ip="10.98.0.1")
+    test_db.add(printer)
+    test_db.commit()
+    yield printer
+    test_db.query(LocationCounterSegment).filter(LocationCounterSegment.printer_id == printer.id).delete()
+    test_db.query(MonthlyCounter).filter(MonthlyCounter.printer_id == printer.id).delete()
+    test_db.delete(printer)
+    test_db.commit()
+
+
+def _reading(printer_id, day, previous, current, location):
+    return MonthlyCounter(
+        printer_id=printer_id,
+        year=2025,
+        month=3,
+        counter_bw=current,
+        counter_color=0,
+        counter_total=current,
+        previous_counter_bw=previous,
+        previous_counter_color=0,
+        previous_counter_total=previous,
+        pages_printed_bw=current - previous,
+        pages_printed_color=0,
+        pages_printed_total=current - previous,
+        location_snapshot=location,
+        recorded_at=datetime(2025, 3, day, 8, 0),
+    )
+
+
+def _segments(db, printer_id):
+    return {
+        seg.location: (seg.counter_total_start, seg.counter_total_end, seg.pages_total)
+        for seg in db.query(LocationCounterSegment).filter(
+            LocationCounterSegment.printer_id == printer_id,
+            LocationCounterSegment.movement_id.is_(None),
+        )
+    }
+
+
+class TestLocationSegments:
+    """El camino incremental y el recálculo en SQL deben coincidir con el recálculo completo."""
+
+    READINGS = [(1, 100, 150, "Piso 1"), (2, 150, 180, "Piso 1"), (3, 180, 260, None), (4, 260, 300, "Piso 1")]
+
+    def test_incremental_matches_full_recompute(self, test_db, printer):
+        for day, previous, current, location in self.READINGS:
+            row = _reading(printer.id, day, previous, current, location)
+            test_db.add(row)
+            apply_new_counters_to_segments(test_db, [row])
+            test_db.commit()
+
+        incremental = _segments(test_db, printer.id)
+        sync_location_segments_for_printer_month(test_db, printer.id, 2025, 3)
+        test_db.commit()
+
+        assert incremental == _segments(test_db, printer.id)
+        assert incremental["Piso 1"] == (100, 300, 120)
+        assert incremental["Descubierto automaticamente"] == (180, 260, 80)
+
+    def test_bulk_rebuild_matches_full_recompute(self, test_db, printer):
+        for day, previous, current, location in self.READINGS:
+            test_db.add(_reading(printer.id, day, previous, current, location))
+        test_db.commit()
+
+        sync_location_segments_for_printer_month(test_db, printer.id, 2025, 3)
+        test_db.commit()
+        expected = _segments(test_db, printer.id)
+
+        test_db.query(LocationCounterSegment).filter(LocationCounterSegment.printer_id == printer.id).delete()
+        test_db.commit()
+        summary = rebuild_location_segments_for_month(test_db, 2025, 3)
+        test_db.commit()
+
+        assert _segments(test_db, printer.id) == expected
+        assert summary["created_segments"] == 2
@@ -0,0 +1,37 @@
+"""
+Tests de integración para el lag del event loop y el executor de los jobs bloqueantes.
+"""
+
+import asyncio
+import time
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from app.services.loop_lag import LoopLagMonitor
+from app.workers.polling import JOB_EXECUTOR, start_scheduler
+
+
+async def test_monitor_measures_blocking_calls():
+    monitor = LoopLagMonitor(interval=0.01, window=100)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    time.sleep(0.2)  # Bloquea el loop como lo hacía un job síncrono
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+
+    summary = monitor.summary()
+    assert summary["samples"] > 3
+    assert summary["max_ms"] >= 150
+    assert summary["p50_ms"] < 50
+
+
+def test_blocking_jobs_run_off_the_event_loop():
+    scheduler = AsyncIOScheduler()
+    start_scheduler(scheduler)
+
+    executors = {job.id: job.executor for job in scheduler.get_jobs()}
+    for job_id in ("poll_printers", "check_scheduled_counters", "poll_medical_printers",
+                   "poll_medical_printers_hourly", "cleanup_reports", "cleanup_old_snapshots"):
+        assert executors[job_id] == JOB_EXECUTOR
+    # Las corrutinas siguen en el loop
+    assert executors["update_exchange_rates"] == "default"
@@ -0,0 +1,19 @@
+"""
+Tests de integración para las particiones mensuales (en SQLite las tablas no se particionan).
+"""
+
+from datetime import date
+
+from app.services.partitions import add_months, maintain_partitions, partition_bounds, partition_name
+
+
+def test_month_bounds_cross_the_year():
+    assert add_months(2025, 12, 1) == (2026, 1)
+    assert add_months(2025, 1, -1) == (2024, 12)
+    assert partition_name("usage_reports", 2025, 3) == "usage_reports_y2025m03"
+    assert partition_bounds("monthly_counters", 2025, 12) == ("(2025, 12)", "(2026, 1)")
+    assert partition_bounds("usage_reports", 2025, 12) == ("('2025-12-01')", "('2026-01-01')")
+
+
+def test_maintenance_is_a_no_op_on_plain_tables(test_db):
+    assert maintain_partitions(test_db, today=date(2025, 6, 15)) == {"created": [], "archived": []}
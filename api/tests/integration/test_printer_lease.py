@@ -0,0 +1,56 @@
+"""
+Tests de integración para el lease por impresora (registro en proceso, sin Redis).
+"""
+
+import threading
+
+import pytest
+
+from app.config import settings
+from app.services.printer_lease import OP_BILLING, OP_USAGE, PrinterBusyError, single_flight
+
+
+@pytest.fixture(autouse=True)
+def local_leases(monkeypatch):
+    monkeypatch.setattr(settings, "printer_lease_redis_enabled", False)
+
+
+def _hold_lease(printer_id, operation, release, value):
+    started = threading.Event()
+
+    def read():
+        started.set()
+        release.wait(5)
+        return value
+
+    thread = threading.Thread(target=single_flight, args=(printer_id, operation, read))
+    thread.start()
+    started.wait(5)
+    return thread
+
+
+class TestSingleFlight:
+
+    def test_same_operation_reuses_result(self):
+        release = threading.Event()
+        leader = _hold_lease(9001, OP_USAGE, release, {"pages": 42})
+        calls = []
+
+        threading.Timer(0.2, release.set).start()
+        flight = single_flight(9001, OP_USAGE, lambda: calls.append(1), wait_seconds=5)
+        leader.join(5)
+
+        assert flight.shared and flight.value == {"pages": 42}
+        assert calls == []
+
+    def test_without_wait_reports_read_in_flight(self):
+        release = threading.Event()
+        leader = _hold_lease(9002, OP_USAGE, release, {})
+        try:
+            with pytest.raises(PrinterBusyError):
+                single_flight(9002, OP_BILLING, lambda: "otra lectura", wait_seconds=0)
+        finally:
+            release.set()
+            leader.join(5)
+
+        assert single_flight(9002, OP_BILLING, lambda: "otra lectura", wait_seconds=0).value == "otra lectura"
@@ -0,0 +1,73 @@
+"""
+Tests de integración para la retención por lotes de usage_reports y snapshots médicos.
+"""
+
+from datetime import datetime, timedelta
+
+from app.models import MedicalPrinterSnapshot, UsageReport
+from app.services.retention import purge_usage_reports, thin_medical_snapshots
+
+
+def test_usage_reports_are_purged_in_chunks(test_db):
+    now = datetime.utcnow()
+    # La retención corta por date (clave de partición), no por created_at
+    old = [UsageReport(printer_id=9701, date=now - timedelta(days=400), created_at=now) for _ in range(7)]
+    recent = UsageReport(printer_id=9701, date=now - timedelta(days=10), created_at=now - timedelta(days=400))
+    test_db.add_all(old + [recent])
+    test_db.commit()
+    try:
+        result = purge_usage_reports(test_db, days=365, chunk_rows=3, max_rows_per_second=0, now=now)
+
+        assert result.deleted == 7 and result.chunks == 3
+        remaining = test_db.query(UsageReport.id).filter(UsageReport.printer_id == 9701).all()
+        assert [row.id for row in remaining] == [recent.id]
+    finally:
+        test_db.query(UsageReport).filter(UsageReport.printer_id == 9701).delete()
+        test_db.commit()
+
+
+def test_old_snapshots_keep_the_first_of_each_day(test_db):
+    now = datetime(2026, 6, 30, 12, 0)
+    day = datetime(2026, 5, 30)
+    # El primero del día se inserta último para caer en otro lote
+    hours = [9, 10, 11, 12, 8]
+    snapshots = [
+        MedicalPrinterSnapshot(printer_id=9702, tray_number=1, films_available=50,
+                               snapshot_time=day + timedelta(hours=hour))
+        for hour in hours
+    ] + [MedicalPrinterSnapshot(printer_id=9702, tray_number=1, films_available=50, snapshot_time=now)]
+    for snapshot in snapshots:
+        test_db.add(snapshot)
+        test_db.flush()
+    test_db.commit()
+    try:
+        result = thin_medical_snapshots(test_db, days=30, chunk_rows=2, max_rows_per_second=0, now=now)
+
+        assert result.deleted == 4
+        kept = test_db.query(MedicalPrinterSnapshot.snapshot_time).filter(
+            MedicalPrinterSnapshot.printer_id == 9702
+        ).order_by(MedicalPrinterSnapshot.snapshot_time).all()
+        assert [row.snapshot_time for row in kept] == [day + timedelta(hours=8), now]
+    finally:
+        test_db.query(MedicalPrinterSnapshot).filter(MedicalPrinterSnapshot.printer_id == 9702).delete()
+        test_db.commit()
+
+
+def test_snapshot_thinning_only_scans_the_recently_expired_days(test_db):
+    now = datetime(2026, 6, 30, 12, 0)
+    old_day = datetime(2026, 4, 1)
+    test_db.add_all([
+        MedicalPrinterSnapshot(printer_id=9703, tray_number=1, films_available=50,
+                               snapshot_time=old_day + timedelta(hours=hour))
+        for hour in (8, 9, 10)
+    ])
+    test_db.commit()
+    try:
+        # Fuera de la ventana de la pasada diaria: no se revisa
+        assert thin_medical_snapshots(test_db, days=30, max_rows_per_second=0, now=now).deleted == 0
+
+        result = thin_medical_snapshots(test_db, days=30, max_rows_per_second=0, now=now, lookback_days=90)
+        assert result.deleted == 2
+    finally:
+        test_db.query(MedicalPrinterSnapshot).filter(MedicalPrinterSnapshot.printer_id == 9703).delete()
+        test_db.commit()
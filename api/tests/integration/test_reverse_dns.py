@@ -0,0 +1,71 @@
+"""
+Tests de integración para la resolución inversa en lote (resolver simulado).
+"""
+
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import dns.exception
+import pytest
+
+from app.services import reverse_dns
+
+
+@pytest.fixture
+def resolver(monkeypatch):
+    """Resolver falso: cuenta consultas por IP y tarda un poco en responder."""
+    calls = Counter()
+    lifetimes = []
+    lock = threading.Lock()
+
+    def resolve_address(ip, lifetime=None):
+        with lock:
+            calls[ip] += 1
+            lifetimes.append(lifetime)
+        time.sleep(0.05)
+        if ip.endswith(".99"):
+            raise dns.exception.Timeout()
+        return [SimpleNamespace(target=f"printer-{ip.rsplit('.', 1)[1]}.lab.")]
+
+    monkeypatch.setattr(reverse_dns.dns.resolver, "resolve_address", resolve_address)
+    reverse_dns.clear_cache()
+    yield SimpleNamespace(calls=calls, lifetimes=lifetimes)
+    reverse_dns.clear_cache()
+
+
+class TestResolveHostnames:
+
+    def test_concurrent_scans_with_duplicate_ips(self, resolver):
+        ips = ["10.0.0.1", "10.0.0.2", "10.0.0.1", "10.0.0.99", "10.0.0.2"]
+        results = []
+
+        def scan():
+            results.append(reverse_dns.resolve_hostnames(ips, timeout=2))
+
+        threads = [threading.Thread(target=scan) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        assert not any(thread.is_alive() for thread in threads)
+        assert len(results) == 8
+        for result in results:
+            assert result == {
+                "10.0.0.1": "printer-1.lab",
+                "10.0.0.2": "printer-2.lab",
+                "10.0.0.99": None,
+            }
+        assert resolver.calls == {"10.0.0.1": 1, "10.0.0.2": 1, "10.0.0.99": 1}
+
+    def test_timeout_applies_to_each_lookup_and_caches_failures(self, resolver):
+        reverse_dns.resolve_hostnames(["10.0.0.3", "10.0.0.99"], timeout=0.5)
+
+        assert resolver.lifetimes == [0.5, 0.5]
+        assert reverse_dns.get_cached_hostname("10.0.0.3") == (True, "printer-3.lab")
+        assert reverse_dns.get_cached_hostname("10.0.0.99") == (True, None)
+
+        reverse_dns.resolve_hostnames(["10.0.0.3", "10.0.0.99"], timeout=0.5)
+        assert resolver.calls == {"10.0.0.3": 1, "10.0.0.99": 1}
@@ -0,0 +1,72 @@
+"""
+Tests de integración para la ejecución concurrente de programaciones de contadores (sin Redis).
+"""
+
+from datetime import datetime, timedelta
+import json
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.models import CounterSchedule, Printer
+from app.services import collection_queue, fleet_registry
+from app.services.fleet_registry import FleetRegistry
+from app.workers.polling import enqueue_due_schedules
+
+
+@pytest.fixture
+def enqueued(monkeypatch, test_engine):
+    monkeypatch.setattr(settings, "fleet_registry_redis_enabled", False)
+    registry = FleetRegistry(sessionmaker(autocommit=False, autoflush=False, bind=test_engine))
+    monkeypatch.setattr(fleet_registry, "_registry", registry)
+
+    calls = []
+
+    def enqueue_run(kind, printer_ids, **kwargs):
+        calls.append((kwargs["schedule_id"], list(printer_ids), kwargs["priority"]))
+        return {"run_id": f"run-{len(calls)}", "tasks_total": 1}
+
+    monkeypatch.setattr(collection_queue, "enqueue_run", enqueue_run)
+    return calls
+
+
+def _schedule(name, printers, priority=0):
+    return CounterSchedule(
+        name=name, schedule_type="interval", interval_minutes=60, target_type="selection",
+        printer_ids=json.dumps([printer.id for printer in printers]), priority=priority,
+        next_run=datetime.utcnow() - timedelta(minutes=1), run_count=0, error_count=0,
+    )
+
+
+def test_overlapping_schedules_are_merged_by_priority(enqueued, test_db):
+    printers = [
+        Printer(brand="HP", model="LaserJet M404", asset_tag=f"SCHED-{i}", ip=f"10.251.0.{i}")
+        for i in range(1, 6)
+    ]
+    test_db.add_all(printers)
+    test_db.commit()
+    a, b, c, d, e = printers
+    low = _schedule("Piso 1", [a, b, c])
+    high = _schedule("Gerencia", [b, c, d], priority=5)
+    disjoint = _schedule("Depósito", [e])
+    covered = _schedule("Duplicada", [b, d])
+    test_db.add_all([low, high, disjoint, covered])
+    test_db.commit()
+    try:
+        result = enqueue_due_schedules(test_db, datetime.utcnow())
+
+        assert result[high.id] == [b.id, c.id, d.id]
+        assert result[low.id] == [a.id]
+        assert result[disjoint.id] == [e.id]
+        assert result[covered.id] == []
+        # Cada impresora se encola una sola vez; la de mayor prioridad va primero
+        assert enqueued[0] == (high.id, [b.id, c.id, d.id], 5)
+        assert sorted(pid for _, ids, _ in enqueued for pid in ids) == sorted(p.id for p in printers)
+        # La programación cubierta por otras igualmente avanza
+        test_db.refresh(covered)
+        assert covered.run_count == 1 and covered.next_run > datetime.utcnow()
+    finally:
+        for row in (low, high, disjoint, covered, *printers):
+            test_db.delete(row)
+        test_db.commit()
@@ -0,0 +1,77 @@
+"""
+Tests de integración para la coordinación del scheduler entre procesos (sin Redis).
+"""
+
+import pytest
+
+from app.config import settings
+from app.services import scheduler_lease
+from app.services.scheduler_lease import JobLock, SchedulerLeadership
+
+
+class _FakeScheduler:
+    def __init__(self):
+        self.paused = True
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+
+@pytest.fixture(autouse=True)
+def no_redis(monkeypatch):
+    monkeypatch.setattr(scheduler_lease, "_get_redis", lambda: None)
+
+
+class TestJobLock:
+
+    def test_lock_is_exclusive_until_released(self):
+        lock = JobLock("test-job")
+        assert lock.acquire(blocking=False)
+        assert lock.locked()
+        assert not lock.acquire(blocking=False)
+
+        lock.release()
+        assert not lock.locked()
+
+
+class TestSchedulerLeadership:
+
+    def test_process_starting_without_redis_waits_for_the_lease(self, monkeypatch):
+        scheduler = _FakeScheduler()
+        leadership = SchedulerLeadership([scheduler], renew_seconds=60)
+        leadership.start()
+        try:
+            assert not leadership.is_leader and scheduler.paused
+
+            # Redis vuelve: el reintento periódico toma el lease
+            monkeypatch.setattr(leadership._lease, "acquire", lambda: True)
+            leadership._elect()
+            assert leadership.is_leader and not scheduler.paused
+        finally:
+            monkeypatch.setattr(leadership._lease, "release", lambda: None)
+            leadership.stop()
+
+    def test_leader_without_election(self, monkeypatch):
+        monkeypatch.setattr(settings, "scheduler_leader_election", False)
+        scheduler = _FakeScheduler()
+        leadership = SchedulerLeadership([scheduler], renew_seconds=60)
+        leadership.start()
+        try:
+            assert leadership.is_leader and not scheduler.paused
+        finally:
+            leadership.stop()
+
+    def test_lost_lease_pauses_the_scheduler(self, monkeypatch):
+        scheduler = _FakeScheduler()
+        leadership = SchedulerLeadership([scheduler], renew_seconds=60)
+        monkeypatch.setattr(leadership._lease, "acquire", lambda: True)
+        leadership._elect()
+        assert leadership.is_leader and not scheduler.paused
+
+        # Otro proceso tomó el lease (venció durante una pausa larga del líder)
+        monkeypatch.setattr(leadership._lease, "renew", lambda: False)
+        leadership._elect()
+        assert not leadership.is_leader and scheduler.paused
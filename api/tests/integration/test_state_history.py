@@ -0,0 +1,51 @@
+"""
+Tests de integración para el historial de tóner y estado codificado por cambios.
+"""
+
+from datetime import datetime, timedelta
+
+from app.models import PrinterStateChange, UsageReport
+from app.services.state_history import record_states, state_series, usage_report_values
+
+
+def _reading(printer_id, when, black, status="online"):
+    return {
+        "printer_id": printer_id, "date": when, "pages_printed_mono": 10,
+        "toner_level_black": black, "toner_level_cyan": None, "toner_level_magenta": None,
+        "toner_level_yellow": None, "paper_level": 80.0, "status": status,
+    }
+
+
+def test_only_changes_are_stored_and_the_series_is_rebuilt(test_db):
+    start = datetime(2025, 5, 1)
+    # Un mes de lecturas cada 30 minutos con el tóner bajando ~6 puntos por semana
+    readings = [
+        _reading(9801, start + timedelta(minutes=30 * i), round(90 - i * 0.0018 * 10, 1))
+        for i in range(48 * 30)
+    ]
+    readings[700]["status"] = "error"
+    try:
+        for offset in range(0, len(readings), 48):
+            record_states(test_db, readings[offset:offset + 48], threshold=2.0)
+        test_db.commit()
+
+        stored = test_db.query(PrinterStateChange).filter(PrinterStateChange.printer_id == 9801).count()
+        assert stored < len(readings) * 0.1
+
+        series = state_series(test_db, 9801, start - timedelta(hours=1), start + timedelta(days=30), timedelta(days=1))
+        assert series[0]["toner_level_black"] is None  # Antes de la primera lectura
+        assert series[1]["toner_level_black"] == 90.0
+        # Cada punto reconstruido queda dentro del umbral de la lectura real
+        for point in series[1:]:
+            actual = max((r for r in readings if r["date"] <= point["time"]), key=lambda r: r["date"])
+            assert abs(point["toner_level_black"] - actual["toner_level_black"]) < 2.0
+    finally:
+        test_db.query(PrinterStateChange).filter(PrinterStateChange.printer_id == 9801).delete()
+        test_db.commit()
+
+
+def test_usage_reports_no_longer_carry_the_state():
+    values = usage_report_values(_reading(9802, datetime(2025, 5, 1), 50.0))
+    assert values["pages_printed_mono"] == 10
+    assert values["toner_level_black"] is None and values["status"] is None
+    UsageReport(**values)
@@ -0,0 +1,38 @@
+"""
+Tests de integración para el sondeo de uso programado (reportes diarios en lote).
+"""
+
+from app.models import UsageReport
+from app.services.collection_engine import CollectionOutcome, CollectionTarget
+from app.services.fleet_registry import FleetEntry
+from app.workers.polling import _persist_usage_reports, _reported_today, _usage_target
+
+
+def _outcome(printer_id, pages):
+    return CollectionOutcome(
+        target=CollectionTarget(printer_id=printer_id, ip=f"10.96.0.{printer_id}", ports=[161]),
+        success=True,
+        data={'usage': {'pages_printed_mono': pages, 'toner_level_black': 40.0, 'status': 'online'}},
+    )
+
+
+class TestUsageReports:
+
+    def test_batch_is_inserted_and_seen_as_reported_today(self, test_db):
+        outcomes = [_outcome(printer_id, 100 * printer_id) for printer_id in (9601, 9602, 9603)]
+        try:
+            _persist_usage_reports(test_db, outcomes)
+
+            assert {outcome.action for outcome in outcomes} == {"created"}
+            assert _reported_today(test_db, [9601, 9602, 9603, 9604]) == {9601, 9602, 9603}
+            report = test_db.query(UsageReport).filter(UsageReport.printer_id == 9602).one()
+            assert report.pages_printed_mono == 960200 and report.pages_printed_color == 0
+        finally:
+            test_db.query(UsageReport).filter(UsageReport.printer_id.in_([9601, 9602, 9603])).delete()
+            test_db.commit()
+
+    def test_reachability_check_does_not_rely_on_tcp_161(self):
+        # SNMP es UDP: la mayoría de las impresoras rechaza TCP 161
+        printer = FleetEntry(9604, "10.96.0.4", "HP", "LaserJet M404", "generic_v2c", None, None, 0)
+        ports = _usage_target(printer).ports
+        assert 9100 in ports and 80 in ports
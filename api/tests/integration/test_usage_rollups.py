@@ -0,0 +1,81 @@
+"""
+Tests de integración para los agregados de usage_reports por hora, día y mes.
+"""
+
+from datetime import datetime, timedelta
+
+from app.models import Printer, UsageReport, UsageRollupDaily, UsageRollupHourly, UsageRollupMonthly
+from app.services.usage_rollups import add_usage_rollups, rebuild_usage_rollups
+
+
+def _report(printer_id, date, mono, color=0, black=None):
+    return {
+        "printer_id": printer_id, "date": date, "pages_printed_mono": mono,
+        "pages_printed_color": color, "toner_level_black": black, "status": "online",
+    }
+
+
+def test_rollups_sum_counter_increments_per_period_and_are_served_by_reports(client, test_db):
+    printer = Printer(brand="HP", model="LaserJet M404", asset_tag="ROLLUP-1", ip="10.252.0.1")
+    test_db.add(printer)
+    test_db.commit()
+    # Contadores acumulados: la primera lectura es la base, luego +100/+5, +25 y +10
+    reports = [
+        _report(printer.id, datetime(2025, 3, 4, 9, 10), 1000, black=60.0),
+        _report(printer.id, datetime(2025, 3, 4, 9, 40), 1100, 5, black=15.0),
+        _report(printer.id, datetime(2025, 3, 20, 8, 0), 1125, 5),
+        _report(printer.id, datetime(2025, 4, 1, 8, 0), 1135, 5),
+    ]
+    try:
+        # Dos lotes, guardados como en save_usage_rows: el segundo parte de la lectura del primero
+        for batch in (reports[:1], reports[1:]):
+            test_db.add_all([UsageReport(**report) for report in batch])
+            test_db.flush()
+            add_usage_rollups(test_db, batch)
+        test_db.commit()
+
+        hour = test_db.get(UsageRollupHourly, (printer.id, datetime(2025, 3, 4, 9)))
+        assert (hour.pages_mono, hour.pages_color, hour.report_count, hour.min_toner_level) == (100, 5, 2, 15.0)
+        assert test_db.query(UsageRollupDaily).filter(UsageRollupDaily.printer_id == printer.id).count() == 3
+        march = test_db.get(UsageRollupMonthly, (printer.id, datetime(2025, 3, 1)))
+        assert (march.pages_mono, march.report_count) == (125, 3)
+
+        response = client.get("/reports/usage/monthly", params={"year": 2025, "printer_id": printer.id})
+        assert response.status_code == 200
+        months = {row["month_number"]: row for row in response.json()}
+        assert months[3]["total_pages"] == 130 and months[3]["report_count"] == 3
+        assert months[4]["pages_mono"] == 10 and months[5]["report_count"] == 0
+
+        # La reconstrucción desde el historial crudo da lo mismo
+        rebuild_usage_rollups(test_db, chunk_rows=3)
+        march = test_db.get(UsageRollupMonthly, (printer.id, datetime(2025, 3, 1)))
+        test_db.refresh(march)
+        assert (march.pages_mono, march.pages_color, march.report_count) == (125, 5, 3)
+    finally:
+        for model in (UsageRollupHourly, UsageRollupDaily, UsageRollupMonthly, UsageReport):
+            test_db.query(model).filter(model.printer_id == printer.id).delete()
+        test_db.delete(printer)
+        test_db.commit()
+
+
+def test_several_reports_per_day_do_not_inflate_the_day(test_db):
+    printer_id = 9905
+    day = datetime(2025, 5, 6)
+    counters = [20000, 20040, 0, 20100, 30, 50]  # Un sondeo fallido (0) y un reinicio del contador
+    reports = [
+        {**_report(printer_id, day + timedelta(hours=2 * n), pages), "status": "offline" if pages == 0 else "online"}
+        for n, pages in enumerate(counters)
+    ]
+    test_db.add_all([UsageReport(**report) for report in reports])
+    test_db.flush()
+    try:
+        add_usage_rollups(test_db, reports)
+        test_db.commit()
+
+        daily = test_db.get(UsageRollupDaily, (printer_id, day))
+        # 40 + 60 + 20 páginas, no la suma de los contadores
+        assert (daily.pages_mono, daily.report_count) == (120, 6)
+    finally:
+        for model in (UsageRollupHourly, UsageRollupDaily, UsageRollupMonthly, UsageReport):
+            test_db.query(model).filter(model.printer_id == printer_id).delete()
+        test_db.commit()
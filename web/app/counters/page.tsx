@@ -829,7 +829,20 @@ export default function Counters() {
       })
 
       if (response.ok) {
-        const result = await response.json()
+        // La API solo encola la corrida; los workers la procesan y aquí se consulta su estado
+        let result = await response.json()
+        setSyncProgress(prev => ({
+          ...prev!,
+          total: result.printers_total,
+          logs: [...prev!.logs, `📥 Corrida encolada: ${result.printers_total} impresoras en ${result.tasks_total} tareas`]
+        }))
+
+        await followCollectionRun(result.run_id)
+
+        const finalResponse = await fetch(`${API_BASE}/counter-collection/runs/${result.run_id}`)
+        if (finalResponse.ok) {
+          result = await finalResponse.json()
+        }
 
         setSyncProgress(prev => ({
           ...prev!,
@@ -843,6 +856,7 @@ export default function Counters() {
             `📊 Impresoras procesadas: ${result.printers_processed}`,
             `✅ Exitosas: ${result.printers_successful}`,
             `❌ Fallidas: ${result.printers_failed}`,
+            `⏭️ Salteadas (leídas hace menos de ${result.fresh_within_minutes} min o con otra lectura en curso): ${result.printers_skipped}`,
             `📝 Contadores creados: ${result.counters_created}`,
             `🔄 Contadores actualizados: ${result.counters_updated}`
           ]
@@ -920,6 +934,52 @@ export default function Counters() {
     }
   }
 
+  // Sigue una corrida encolada por SSE (eventos por impresora); si el stream falla, consulta su estado
+  const followCollectionRun = (runId: string) => new Promise<void>(resolve => {
+    const updateProgress = (progress: any, log?: string) => {
+      setSyncProgress(prev => ({
+        ...prev!,
+        current: progress.printers_processed ?? prev!.current,
+        total: progress.printers_total ?? prev!.total,
+        currentPrinter: log ?? prev!.currentPrinter,
+        logs: log ? [...prev!.logs, log].slice(-200) : prev!.logs
+      }))
+    }
+
+    const pollUntilCompleted = async () => {
+      while (true) {
+        await new Promise(wait => setTimeout(wait, 2000))
+        try {
+          const statusResponse = await fetch(`${API_BASE}/counter-collection/runs/${runId}?include_results=false`)
+          if (!statusResponse.ok) continue
+          const status = await statusResponse.json()
+          updateProgress(status)
+          if (status.status === 'completed') return resolve()
+        } catch (error) {
+          console.error('Error consultando la corrida:', error)
+        }
+      }
+    }
+
+    const source = new EventSource(`${API_BASE}/counter-collection/runs/${runId}/events`)
+    source.addEventListener('progress', (event: MessageEvent) => updateProgress(JSON.parse(event.data)))
+    source.addEventListener('printer', (event: MessageEvent) => {
+      const { result } = JSON.parse(event.data)
+      const latency = result.response_time != null ? ` ${Number(result.response_time).toFixed(2)}s` : ''
+      const detail = result.success ? (result.action_taken || 'ok') : (result.error_message || 'error')
+      updateProgress({}, `${result.success ? '✅' : '❌'} ${result.printer_name || `Impresora ${result.printer_id}`}${latency} - ${detail}`)
+    })
+    source.addEventListener('completed', (event: MessageEvent) => {
+      updateProgress(JSON.parse(event.data))
+      source.close()
+      resolve()
+    })
+    source.onerror = () => {
+      source.close()
+      pollUntilCompleted()
+    }
+  })
+
   const saveExecutionToHistory = async (result: any) => {
     try {
       const historyEntry = {
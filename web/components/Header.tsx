@@ -35,6 +35,7 @@ interface AlertStats {
 }
 
 interface AutoRuntimeJob {
+  run_id?: string
   schedule_id: number
   schedule_name?: string
   started_at: string
@@ -72,6 +73,7 @@ export default function Header({ isCollapsed, onToggleCollapse }: HeaderProps) {
   const [loadingAlerts, setLoadingAlerts] = useState(false)
   const userMenuRef = useRef<HTMLDivElement>(null)
   const notificationsRef = useRef<HTMLDivElement>(null)
+  const runningRunIds = useRef<Set<string | undefined>>(new Set())
   const router = useRouter()
   const { user, logout } = useAuth()
 
@@ -99,10 +101,37 @@ export default function Header({ isCollapsed, onToggleCollapse }: HeaderProps) {
     fetchAlertStats()
     fetchAutoRuntimeStatus()
     const interval = setInterval(fetchAlertStats, 60000)
-    const runtimeInterval = setInterval(fetchAutoRuntimeStatus, 10000)
+    // El progreso llega por SSE; la consulta periódica queda como respaldo
+    const runtimeInterval = setInterval(fetchAutoRuntimeStatus, 60000)
+    const events = new EventSource(`${API_BASE}/counter-collection/events`)
+    const onScheduleEvent = (event: MessageEvent) => {
+      const progress = JSON.parse(event.data)
+      if (progress.source !== 'schedule') return
+      if (event.type === 'completed' || !runningRunIds.current.has(progress.run_id)) {
+        fetchAutoRuntimeStatus()
+        return
+      }
+      setAutoRuntimeStatus(prev => ({
+        ...prev,
+        running_jobs: prev.running_jobs.map(job =>
+          job.run_id === progress.run_id
+            ? {
+                ...job,
+                printers_total: progress.printers_total,
+                printers_processed: progress.printers_processed,
+                printers_successful: progress.printers_successful,
+                printers_failed: progress.printers_failed
+              }
+            : job
+        )
+      }))
+    }
+    events.addEventListener('progress', onScheduleEvent)
+    events.addEventListener('completed', onScheduleEvent)
     return () => {
       clearInterval(interval)
       clearInterval(runtimeInterval)
+      events.close()
     }
   }, [])
 
@@ -128,6 +157,7 @@ export default function Header({ isCollapsed, onToggleCollapse }: HeaderProps) {
       const response = await fetch(`${API_BASE}/auto-counters/runtime-status`)
       if (!response.ok) return
       const data = await response.json()
+      runningRunIds.current = new Set(data.running_jobs.map((job: AutoRuntimeJob) => job.run_id))
       setAutoRuntimeStatus(data)
     } catch (error) {
       console.error('Error fetching auto runtime status:', error)